@@ -0,0 +1,223 @@
+"""Analytics over the transcript store.
+
+Queries never load the whole store. Partitions are selected from their
+directory names before any file is opened, only the columns a query needs
+are read, and counts and latency histograms are aggregated one partition at
+a time. Request counts come from Parquet footers without reading any rows.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .metrics import LatencyHistogram
+
+
+@dataclass(frozen=True)
+class Partition:
+    """One hour of stored transcripts."""
+    start: datetime  # Start of the hour, UTC
+    path: Path
+
+    @property
+    def files(self) -> list[Path]:
+        """Complete Parquet files of the partition."""
+        return sorted(self.path.glob("*.parquet"))
+
+
+def _as_datetime(value: date | datetime | str | None) -> datetime | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def partitions(
+    directory: str | Path,
+    start: date | datetime | str | None = None,
+    end: date | datetime | str | None = None,
+) -> list[Partition]:
+    """
+    List the hourly partitions of a store, oldest first.
+
+    Args:
+        directory: Root directory of the store
+        start: First hour to include (naive values are UTC)
+        end: Hour to stop before (exclusive)
+
+    Returns:
+        Partitions whose hour falls in [start, end)
+    """
+    start, end = _as_datetime(start), _as_datetime(end)
+    found = []
+    for hour_dir in Path(directory).glob("date=*/hour=*"):
+        try:
+            moment = datetime.strptime(
+                f"{hour_dir.parent.name[5:]} {hour_dir.name[5:]}", "%Y-%m-%d %H"
+            ).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        if start is not None and moment < start.replace(minute=0, second=0, microsecond=0):
+            continue
+        if end is not None and moment >= end:
+            continue
+        found.append(Partition(moment, hour_dir))
+    return sorted(found, key=lambda partition: partition.start)
+
+
+def iter_frames(
+    directory: str | Path,
+    columns: list[str] | None = None,
+    start: date | datetime | str | None = None,
+    end: date | datetime | str | None = None,
+) -> Iterator[tuple[Partition, pd.DataFrame]]:
+    """
+    Read the store one partition at a time.
+
+    Args:
+        directory: Root directory of the store
+        columns: Columns to read; all when None
+        start: First hour to include
+        end: Hour to stop before (exclusive)
+
+    Yields:
+        Each non-empty partition with its records
+    """
+    for partition in partitions(directory, start, end):
+        files = partition.files
+        if files:
+            yield partition, pd.concat(
+                [pd.read_parquet(path, columns=columns) for path in files], ignore_index=True
+            )
+
+
+def load(
+    directory: str | Path,
+    columns: list[str] | None = None,
+    start: date | datetime | str | None = None,
+    end: date | datetime | str | None = None,
+) -> pd.DataFrame:
+    """
+    Load the records of a time range into one DataFrame.
+
+    Prefer the aggregate functions below, which keep at most one partition
+    in memory; this is for ad-hoc exploration of a bounded range.
+    """
+    frames = [frame for _, frame in iter_frames(directory, columns, start, end)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def hourly_load(
+    directory: str | Path,
+    start: date | datetime | str | None = None,
+    end: date | datetime | str | None = None,
+) -> pd.DataFrame:
+    """
+    Requests per hour, and how many were answered by the greeting stage.
+
+    Returns:
+        DataFrame indexed by hour (UTC) with "requests", "greetings" and
+        "greeting_share" columns
+    """
+    rows = []
+    for partition in partitions(directory, start, end):
+        requests = greetings = 0
+        for path in partition.files:
+            requests += pq.ParquetFile(path).metadata.num_rows
+            stages = pq.read_table(path, columns=["stage"]).column("stage")
+            greetings += stages.to_pylist().count("greeting")
+        if requests:
+            rows.append((partition.start, requests, greetings))
+
+    frame = pd.DataFrame(rows, columns=["hour", "requests", "greetings"]).set_index("hour")
+    frame["greeting_share"] = frame["greetings"] / frame["requests"]
+    return frame
+
+
+def language_mix(
+    directory: str | Path,
+    start: date | datetime | str | None = None,
+    end: date | datetime | str | None = None,
+) -> pd.DataFrame:
+    """
+    Share of requests per detected greeting language.
+
+    Requests without a detected language are counted under "none".
+
+    Returns:
+        DataFrame indexed by language with "requests" and "share" columns,
+        most frequent first
+    """
+    counts = pd.Series(dtype="int64")
+    for _, frame in iter_frames(directory, ["language"], start, end):
+        counts = counts.add(frame["language"].fillna("none").value_counts(), fill_value=0)
+
+    counts = counts.astype("int64").sort_values(ascending=False)
+    total = counts.sum()
+    return pd.DataFrame({
+        "requests": counts,
+        "share": counts / total if total else counts.astype("float64"),
+    }).rename_axis("language")
+
+
+def latency_percentiles(
+    directory: str | Path,
+    start: date | datetime | str | None = None,
+    end: date | datetime | str | None = None,
+    by: str = "stage",
+    percentiles: tuple[float, ...] = (0.5, 0.95, 0.99),
+) -> pd.DataFrame:
+    """
+    Latency percentiles in milliseconds, overall and per group.
+
+    Only the latency and grouping columns are read. Each partition's
+    latencies are added to one histogram per group (0.1% precision), so
+    memory depends on the number of groups rather than of requests.
+    Percentiles are nearest-rank values from the histograms.
+
+    Args:
+        directory: Root directory of the store
+        start: First hour to include
+        end: Hour to stop before (exclusive)
+        by: Column to group by, e.g. "stage", "language" or "tenant";
+            requests without a value are grouped under "none"
+        percentiles: Quantiles to compute, between 0 and 1
+
+    Returns:
+        DataFrame indexed by group (plus an "all" row) with a "requests"
+        column and one "pNN" column per percentile
+    """
+    histograms: dict[str, LatencyHistogram] = {}
+    for _, frame in iter_frames(directory, ["latency_ms", by], start, end):
+        # Recorded in whole microseconds, so equal values are recorded at once
+        latencies = frame["latency_ms"].round(3)
+        for (group, latency), count in latencies.groupby(frame[by].fillna("none")).value_counts().items():
+            histograms.setdefault(group, LatencyHistogram()).record(latency / 1000, count)
+
+    names = [f"p{percentile * 100:g}" for percentile in percentiles]
+    if not histograms:
+        return pd.DataFrame(columns=["requests", *names]).rename_axis(by)
+
+    overall = LatencyHistogram()
+    for histogram in histograms.values():
+        overall.merge(histogram)
+
+    def summarize(histogram: LatencyHistogram) -> list:
+        return [histogram.total] + [
+            histogram.value_at_percentile(percentile * 100) * 1000 for percentile in percentiles
+        ]
+
+    rows = {group: summarize(histograms[group]) for group in sorted(histograms)}
+    rows["all"] = summarize(overall)
+    frame = pd.DataFrame.from_dict(rows, orient="index", columns=["requests", *names])
+    frame["requests"] = frame["requests"].astype("int64")
+    return frame.rename_axis(by)
@@ -4,24 +4,429 @@ This module provides HTTP endpoints for interacting with TBBot's
 educational AI agent functionality through a REST API.
 """
 
+import asyncio
+import atexit
+import json
 import logging
-from fastapi import FastAPI, HTTPException
+import secrets
+import signal
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from .greeting import GreetingAgent
-from .models import ChatRequest, ChatResponse, HealthResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from . import batching, context, faq, history, idempotency, lifecycle, memory, metrics, prompts, routing
+from pydantic import ValidationError
+from .config import Config
+from .greeting import DEFAULT_GREETINGS_PATH, GreetingAgent, GreetingTable, set_greeting_table
+from .health import ReadinessChecker, any_backend_check, backend_check
+from .logging_config import configure_logging, request_id_var
+from .loopmonitor import LoopMonitor
+from .middleware import DrainMiddleware, RequestIdMiddleware, TracingMiddleware
+from .models import (
+    ChatFrame,
+    ChatFrameReply,
+    ChatRequest,
+    ChatResponse,
+    HealthResponse,
+    HistoryChatRequest,
+    HistoryChatResponse,
+    MemorySnapshotResponse,
+    ReadinessResponse,
+    ReloadResponse,
+)
+from .registry import AgentRegistry, UnknownTenantError
+from .tracing import current_span, tracer
+from .transcripts import TranscriptRecord, TranscriptWriter
+from .usage import BudgetExceeded, UsageLedger, ledger
 
-# Configure logger for API module
+# Configure logger for API module; records are written by a background thread
+log_handler = configure_logging()
 logger = logging.getLogger(__name__)
 
+# Initialize the default agent; per-tenant agents are built on first use
+agent = GreetingAgent()
+registry = AgentRegistry.from_config()
+metrics.register("pipeline", lambda: agent.pipeline.stats_snapshot())
+metrics.register("agents", lambda: registry.stats_snapshot())
+metrics.register("usage", lambda: ledger.snapshot()["total"])
+metrics.register("prompts", lambda: prompts.stats.as_dict())
+metrics.register("batching", batching.stats_snapshot)
+metrics.register("routing", routing.stats_snapshot)
+metrics.register("context", lambda: context.conversations.stats_snapshot())
+metrics.register("history", lambda: history.cache.stats_snapshot())
+metrics.register("idempotency", lambda: idempotency.store.stats_snapshot())
+
+# Warm-up before reporting ready and drain on shutdown
+inflight = lifecycle.InFlight()
+warmup: lifecycle.WarmupReport | None = None
+metrics.register("lifecycle", lambda: {
+    **inflight.stats_snapshot(),
+    "warmup": warmup.as_dict() if warmup is not None else None,
+})
+
+# Chat exchanges are recorded for analytics by a background writer, if enabled
+transcripts = TranscriptWriter.from_config()
+if transcripts is not None:
+    atexit.register(transcripts.stop)
+    metrics.register("transcripts", lambda: transcripts.stats_snapshot())
+
+# Event-loop lag and stalls caused by blocking calls, if enabled
+loop_monitor = LoopMonitor.from_config()
+if loop_monitor is not None:
+    metrics.register("event_loop", lambda: loop_monitor.stats_snapshot())
+
+# Allocation tracing for the memory snapshot endpoint, if enabled
+memory_diagnostics = memory.MemoryDiagnostics.from_config()
+metrics.register("memory", lambda: {
+    "rss_bytes": memory.rss_bytes(),
+    **(memory_diagnostics.stats_snapshot() if memory_diagnostics is not None else {"tracing": False}),
+})
+
+# Readiness is computed in the background and served from cache
+readiness = ReadinessChecker(
+    interval=Config.READINESS_INTERVAL_S,
+    timeout=Config.READINESS_CHECK_TIMEOUT_S,
+)
+readiness.register("agent", lambda: agent._initialized)
+readiness.register("warmed_up", lambda: warmup is not None)
+readiness.register("accepting", lambda: inflight.accepting)
+readiness.register(
+    "log_queue",
+    lambda: log_handler is None or log_handler.queue.qsize() < Config.READINESS_MAX_QUEUE_DEPTH,
+)
+if Config.OPENAI_API_BASES:
+    readiness.register("backend", any_backend_check(
+        [url for _, url in routing.parse_backends(Config.OPENAI_API_BASES)], Config.OPENAI_API_KEY
+    ))
+elif Config.OPENAI_API_BASE:
+    readiness.register("backend", backend_check(Config.OPENAI_API_BASE, Config.OPENAI_API_KEY))
+
+
+# Serializes reloads; requests never wait on it
+_reload_lock = threading.Lock()
+_background_tasks: set[asyncio.Task] = set()
+_stop_task: asyncio.Task | None = None
+
+
+def reload_configuration() -> ReloadResponse:
+    """
+    Re-read configuration and greeting tables and swap in fresh agents.
+    
+    Everything is loaded and built first, from the new settings staged on
+    this thread only, then swapped in together with the settings under
+    ``Config.lock``, so in-flight requests finish on the version they
+    started with and new requests see the new one. If anything fails to
+    load, neither the settings nor the components change.
+    
+    Returns:
+        ReloadResponse with the new greeting table version and changed settings
+        
+    Raises:
+        OSError: If a configured file cannot be read
+        ValueError: If a configured file is malformed
+    """
+    global agent, registry
+    
+    with _reload_lock:
+        values = Config.load()
+        with Config.staged(values):
+            table = GreetingTable.from_file(Config.GREETINGS_PATH or DEFAULT_GREETINGS_PATH)
+            # Re-read FAQ and example files; agents built below get fresh copies
+            faq.load_index.cache_clear()
+            prompts.load_examples.cache_clear()
+            new_agent = GreetingAgent()
+            new_registry = AgentRegistry.from_config()
+            limits = UsageLedger.from_config()
+            conversations = context.ConversationContext.from_config()
+            sample_rate = Config.TRACE_SAMPLE_RATE
+        
+        with Config.lock:
+            changed = Config.apply(values)
+            set_greeting_table(table)
+            agent = new_agent
+            registry = new_registry
+            # Budgets and prices change; totals accumulated so far are kept
+            ledger.budgets, ledger.prices = limits.budgets, limits.prices
+            # Likewise, recorded conversations are kept under the new compaction settings
+            current = context.conversations
+            current.token_budget, current.keep_turns = conversations.token_budget, conversations.keep_turns
+            current.segment_turns, current.summarizer = conversations.segment_turns, conversations.summarizer
+            tracer.sample_rate = sample_rate
+    
+    logger.info(
+        "Configuration reloaded",
+        extra={"greetings_version": table.version, "changed": changed}
+    )
+    return ReloadResponse(greetings_version=table.version, changed=changed)
+
+
+async def _reload_in_background() -> None:
+    try:
+        await run_in_threadpool(reload_configuration)
+    except Exception:
+        logger.error("Configuration reload failed; previous configuration kept", exc_info=True)
+
+
+def _on_sighup() -> None:
+    task = asyncio.create_task(_reload_in_background())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _install_signal_handler(loop: asyncio.AbstractEventLoop, signum: int, callback, *args) -> bool:
+    try:
+        loop.add_signal_handler(signum, callback, *args)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # No such signal on this platform, or the loop is not on the main thread
+        return False
+    return True
+
+
+def _hand_off_sigterm(previous) -> None:
+    """Pass SIGTERM on to the handler installed before ours, normally the server's."""
+    if callable(previous):
+        previous(signal.SIGTERM, None)
+    elif previous != signal.SIG_IGN:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.raise_signal(signal.SIGTERM)
+
+
+async def _stop_gracefully(previous) -> None:
+    """
+    Drain before the server is told to stop.
+    
+    uvicorn closes its listening sockets and waits for open connections
+    before running lifespan shutdown, so by then the load balancer can no
+    longer see the worker go unready. Readiness is failed first, while
+    requests are still served, for PRE_STOP_DELAY_S; then new requests are
+    refused and those in flight get up to DRAIN_TIMEOUT_S to finish.
+    """
+    inflight.stopping = True
+    readiness.set_check("accepting", False)
+    logger.info("SIGTERM received; stopping", extra={"pre_stop_delay_s": Config.PRE_STOP_DELAY_S})
+    try:
+        await asyncio.sleep(Config.PRE_STOP_DELAY_S)
+        inflight.draining = True
+        if not await inflight.drain(Config.DRAIN_TIMEOUT_S):
+            logger.warning("Drain timed out with requests in flight", extra={"in_flight": inflight.active})
+    except asyncio.CancelledError:
+        if _stop_task is not asyncio.current_task():
+            # Lifespan shutdown got there first; the server is stopping already
+            raise
+    _hand_off_sigterm(previous)
+
+
+def _on_sigterm(previous) -> None:
+    global _stop_task
+    if _stop_task is None or _stop_task.done():
+        _stop_task = asyncio.create_task(_stop_gracefully(previous))
+    else:
+        # A second SIGTERM skips what is left of the pre-stop delay and drain
+        _stop_task.cancel()
+
+
+async def warm_up() -> lifecycle.WarmupReport:
+    """
+    Warm the default agent, the WARMUP_TENANTS agents and their backends.
+    
+    Warm-up that fails or exceeds WARMUP_TIMEOUT_S is logged and cut
+    short; a cold worker is better than one that never becomes ready.
+    
+    Returns:
+        The warm-up report, partial if warm-up did not complete
+    """
+    report = lifecycle.WarmupReport()
+    if not Config.WARMUP_ENABLED:
+        return report
+    
+    tenants = [tenant.strip() for tenant in Config.WARMUP_TENANTS.split(",") if tenant.strip()]
+    try:
+        await asyncio.wait_for(
+            lifecycle.warm_up(agent, registry, tenants, report=report), Config.WARMUP_TIMEOUT_S
+        )
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up timed out; serving partially warm", extra=report.as_dict())
+    except Exception:
+        logger.error("Warm-up failed; serving partially warm", exc_info=True)
+    else:
+        logger.info("Warm-up complete", extra=report.as_dict())
+    return report
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up, run readiness checks, the loop monitor and the signal handlers, and drain on shutdown."""
+    global warmup, _stop_task
+    
+    loop = asyncio.get_running_loop()
+    if Config.shutdown_budget_s() > Config.SHUTDOWN_DEADLINE_S:
+        logger.warning(
+            "Shutdown may be killed mid-drain: PRE_STOP_DELAY_S + DRAIN_TIMEOUT_S + SHUTDOWN_GRACE_S "
+            "exceeds SHUTDOWN_DEADLINE_S",
+            extra={"budget_s": Config.shutdown_budget_s(), "deadline_s": Config.SHUTDOWN_DEADLINE_S},
+        )
+    sighup_installed = _install_signal_handler(loop, signal.SIGHUP, _on_sighup)
+    # The server's own SIGTERM handler runs once the drain is done
+    previous_sigterm = signal.getsignal(signal.SIGTERM)
+    sigterm_installed = _install_signal_handler(loop, signal.SIGTERM, _on_sigterm, previous_sigterm)
+    
+    monitor = loop_monitor
+    if monitor is not None:
+        await monitor.start()
+    warmup = await warm_up()
+    await readiness.start()
+    try:
+        yield
+    finally:
+        if _stop_task is not None and not _stop_task.done():
+            stop_task, _stop_task = _stop_task, None
+            stop_task.cancel()
+        _stop_task = None
+        # Without a SIGTERM first (e.g. test clients, other servers) drain here:
+        # refuse new work, report not ready, then let in-flight requests finish.
+        # After a SIGTERM drain, a second one would exceed the shutdown budget
+        if not inflight.draining:
+            inflight.draining = True
+            readiness.set_check("accepting", False)
+            if not await inflight.drain(Config.DRAIN_TIMEOUT_S):
+                logger.warning("Drain timed out with requests in flight", extra={"in_flight": inflight.active})
+        await readiness.stop()
+        # The app object outlives this server, e.g. across test clients
+        inflight.resume()
+        if transcripts is not None:
+            await run_in_threadpool(transcripts.flush)
+        # Spans still queued would be lost when the process exits
+        await run_in_threadpool(tracer.close)
+        if sighup_installed:
+            loop.remove_signal_handler(signal.SIGHUP)
+        if sigterm_installed:
+            loop.remove_signal_handler(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, previous_sigterm)
+        if monitor is not None:
+            await monitor.stop()
+
+
 # Initialize FastAPI app with metadata
 app = FastAPI(
     title="TBBot API",
     description="Educational AI agent for teaching AI agent development",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(DrainMiddleware, inflight=inflight)
 
-# Initialize agent instance
-agent = GreetingAgent()
+
+async def agent_for(tenant: str | None) -> GreetingAgent:
+    """
+    Select the agent serving a tenant.
+    
+    Args:
+        tenant: Tenant name, or None for the default agent
+        
+    Returns:
+        The tenant's agent; agents not built yet are built on the threadpool
+        
+    Raises:
+        UnknownTenantError: If the tenant is not configured
+    """
+    if not tenant:
+        return agent
+    
+    selected = registry.peek(tenant)
+    if selected is None:
+        selected = await run_in_threadpool(registry.get, tenant)
+    return selected
+
+
+async def process_message(
+    message: str,
+    selected: GreetingAgent | None = None,
+    session_id: str | None = None,
+    tenant: str | None = None,
+    attributes: dict | None = None,
+    history: list[dict] | None = None,
+    language: str | None = None,
+) -> str:
+    """
+    Run a message through an agent without stalling the event loop.
+    
+    Pipelines made only of in-memory stages are run inline, which is cheaper
+    than a thread hop; pipelines with I/O or model stages are run on the
+    threadpool.
+    
+    Args:
+        message: The student's input message
+        selected: Agent to use; defaults to the default agent
+        session_id: Session the message belongs to
+        tenant: Tenant the message belongs to
+        attributes: Optional dict receiving the answering stage and language
+        history: Earlier messages sent by the client instead of a session
+        language: Student's language detected earlier in the conversation
+        
+    Returns:
+        The agent's response
+    """
+    selected = selected or agent
+    if selected.is_blocking:
+        return await run_in_threadpool(
+            selected.process_message, message, session_id=session_id, tenant=tenant, attributes=attributes,
+            history=history, language=language,
+        )
+    return selected.process_message(
+        message, session_id=session_id, tenant=tenant, attributes=attributes, history=history, language=language
+    )
+
+
+def record_transcript(
+    channel: str,
+    message: str,
+    response: str | None,
+    attributes: dict,
+    started: float,
+    latency_s: float,
+    status: str,
+    session_id: str | None = None,
+    tenant: str | None = None,
+) -> None:
+    """
+    Queue a chat exchange for the transcript store; a no-op when it is disabled.
+    
+    Only builds a record and enqueues it; the background writer does the rest.
+    
+    Args:
+        channel: "http", "history" or "ws"
+        message: The student's message
+        response: The agent's response, or None if the request failed
+        attributes: Details filled in by the agent (stage, language)
+        started: Wall-clock time the request arrived
+        latency_s: Processing time in seconds
+        status: "ok", "budget" or "error"
+        session_id: Session the message belongs to
+        tenant: Tenant the message belongs to
+    """
+    writer = transcripts
+    if writer is None:
+        return
+    writer.record(TranscriptRecord(
+        timestamp=started,
+        channel=channel,
+        status=status,
+        latency_ms=latency_s * 1000,
+        message_chars=len(message),
+        response_chars=len(response or ""),
+        stage=attributes.get("stage"),
+        language=attributes.get("language"),
+        tenant=tenant,
+        session_id=session_id,
+        message=message,
+        response=response,
+    ))
 
 
 def configure_cors(app: FastAPI, origins: list[str]) -> None:
@@ -51,32 +456,103 @@ def configure_cors(app: FastAPI, origins: list[str]) -> None:
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(
+    request: ChatRequest,
+    response: Response,
+    x_tenant_id: str | None = Header(default=None),
+    x_session_id: str | None = Header(default=None),
+    idempotency_key: str | None = Header(default=None, max_length=255),
+) -> ChatResponse:
     """
     Process student message and return agent response.
     
     Args:
         request: ChatRequest containing the student's message
+        response: Response whose headers mark replayed answers
+        x_tenant_id: Optional X-Tenant-Id header selecting a course agent
+        x_session_id: Optional X-Session-Id header used for usage budgets
+        idempotency_key: Optional Idempotency-Key header; a retry with the
+                         same key gets the first request's answer (marked
+                         with Idempotent-Replayed: true) instead of a new one
         
     Returns:
         ChatResponse with the agent's response
         
     Raises:
-        HTTPException: 500 status if internal error occurs during processing
+        HTTPException: 404 status for an unknown tenant, 422 status when the
+                       idempotency key was used for a different request,
+                       429 status when a usage budget is exhausted, 500
+                       status if internal error occurs during processing
+    """
+    # Body parsing and validation ran before this handler; attribute the
+    # time since the request span opened to them
+    root = current_span()
+    if root is not None:
+        tracer.record_span("request.validate", root.start_ns)
+    
+    try:
+        selected = await agent_for(x_tenant_id)
+    except UnknownTenantError:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    
+    if idempotency_key is None:
+        return await answer_chat(request.message, selected, x_session_id, x_tenant_id)
+    
+    # Keys are scoped per tenant; the session is part of the request
+    try:
+        result, replayed = await idempotency.store.run(
+            f"{x_tenant_id or ''}\0{idempotency_key}",
+            idempotency.fingerprint(request.message, x_session_id),
+            lambda: answer_chat(request.message, selected, x_session_id, x_tenant_id),
+        )
+    except idempotency.IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+async def answer_chat(
+    message: str,
+    selected: GreetingAgent,
+    session_id: str | None,
+    tenant: str | None,
+) -> ChatResponse:
+    """
+    Answer a /chat message and record its transcript.
+    
+    Raises:
+        HTTPException: 429 status when a usage budget is exhausted, 500
+                       status if internal error occurs during processing
     """
+    started, clock = time.time(), time.perf_counter()
+    attributes: dict = {}
+    response_text = None
+    status_label = "error"
     try:
         # Process message through the agent
-        response_text = agent.process_message(request.message)
+        with tracer.span("agent.process_message", message_length=len(message)):
+            response_text = await process_message(message, selected, session_id, tenant, attributes)
+        status_label = "ok"
         
         # Return response wrapped in ChatResponse model
         return ChatResponse(response=response_text)
         
-    except Exception as e:
-        # Log the error with full context for debugging
+    except BudgetExceeded as exc:
+        status_label = "budget"
+        logger.warning("Usage budget exceeded", extra={"scope": exc.scope, "request_id": request_id_var.get()})
+        raise HTTPException(status_code=429, detail="Usage budget exceeded")
+        
+    except Exception:
+        # Log the error with full context for debugging; formatting of the
+        # traceback happens on the logging thread, not here
         logger.error(
-            f"Error processing message in chat endpoint: {e}",
+            "Error processing message in chat endpoint",
             exc_info=True,
-            extra={"message_length": len(request.message)}
+            extra={
+                "message_length": len(message),
+                "request_id": request_id_var.get(),
+            }
         )
         
         # Return 500 status with generic error message
@@ -85,6 +561,245 @@ async def chat(request: ChatRequest) -> ChatResponse:
             status_code=500,
             detail="Internal server error"
         )
+    
+    finally:
+        record_transcript(
+            "http", message, response_text, attributes, started,
+            time.perf_counter() - clock, status_label, session_id, tenant,
+        )
+
+
+@app.post("/chat/history", response_model=HistoryChatResponse)
+async def chat_history(
+    request: HistoryChatRequest,
+    x_tenant_id: str | None = Header(default=None),
+) -> HistoryChatResponse:
+    """
+    Answer the last message of a conversation held by the client.
+    
+    The client sends the whole conversation every turn and no session is
+    kept. State derived from the conversation is cached per prefix, so
+    only the messages after the longest previously seen prefix are
+    processed (see ``history``).
+    
+    Args:
+        request: The conversation, ending with the new user message
+        x_tenant_id: Optional X-Tenant-Id header selecting a course agent
+        
+    Returns:
+        HistoryChatResponse with the agent's response and the hash of the
+        conversation including it
+        
+    Raises:
+        HTTPException: 404 status for an unknown tenant, 429 status when a
+                       usage budget is exhausted, 500 status if internal
+                       error occurs during processing
+    """
+    try:
+        selected = await agent_for(x_tenant_id)
+    except UnknownTenantError:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    
+    cache = history.cache
+    earlier = [message.model_dump() for message in request.messages[:-1]]
+    message = request.messages[-1].content
+    started, clock = time.time(), time.perf_counter()
+    attributes: dict = {}
+    response_text = None
+    status_label = "error"
+    try:
+        with tracer.span("history.prepare", messages=len(earlier)):
+            if cache.is_blocking:
+                prepared = await run_in_threadpool(cache.prepare, earlier)
+            else:
+                prepared = cache.prepare(earlier)
+        with tracer.span("agent.process_message", message_length=len(message)):
+            response_text = await process_message(
+                message, selected, None, x_tenant_id, attributes, prepared.messages, prepared.state.language
+            )
+        if cache.is_blocking:
+            prefix_hash = await run_in_threadpool(cache.remember, prepared, message, response_text)
+        else:
+            prefix_hash = cache.remember(prepared, message, response_text)
+        status_label = "ok"
+        return HistoryChatResponse(
+            response=response_text,
+            prefix_hash=prefix_hash,
+            language=attributes.get("language") or prepared.state.language,
+        )
+    
+    except BudgetExceeded as exc:
+        status_label = "budget"
+        logger.warning("Usage budget exceeded", extra={"scope": exc.scope, "request_id": request_id_var.get()})
+        raise HTTPException(status_code=429, detail="Usage budget exceeded")
+    
+    except Exception:
+        logger.error(
+            "Error processing message in history chat endpoint",
+            exc_info=True,
+            extra={"message_length": len(message), "request_id": request_id_var.get()},
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    finally:
+        record_transcript(
+            "history", message, response_text, attributes, started,
+            time.perf_counter() - clock, status_label, None, x_tenant_id,
+        )
+
+
+def _frame_id(raw: str) -> str | None:
+    """Best-effort correlation id of a frame that failed validation."""
+    try:
+        frame = json.loads(raw)
+    except ValueError:
+        return None
+    frame_id = frame.get("id") if isinstance(frame, dict) else None
+    return frame_id if isinstance(frame_id, str) else None
+
+
+@app.websocket("/ws/chat")
+async def chat_stream(websocket: WebSocket) -> None:
+    """
+    Persistent chat session over a WebSocket.
+    
+    Each inbound text frame is a JSON ``ChatFrame``; each reply is a
+    ``ChatFrameReply`` carrying the same ``id`` so clients can pipeline
+    several messages and match replies; frames that fail validation get an
+    error reply, with their ``id`` if it can be read. Frames are handled one at a time
+    and the next frame is only read once the previous reply has been
+    written, so a client that reads slowly throttles its own input
+    through the socket buffers instead of growing server-side queues.
+    
+    The X-Tenant-Id handshake header selects the agent for the whole
+    session; unknown tenants are refused with close code 1008. Usage is
+    accounted to the X-Session-Id handshake header, or to the connection.
+    
+    Args:
+        websocket: The accepted WebSocket connection
+    """
+    tenant = websocket.headers.get("x-tenant-id")
+    session_id = websocket.headers.get("x-session-id") or uuid.uuid4().hex
+    try:
+        selected = await agent_for(tenant)
+    except UnknownTenantError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    # Language of the latest greeting on this connection
+    language = None
+    
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            
+            try:
+                frame = ChatFrame.model_validate_json(raw)
+            except ValidationError:
+                reply = ChatFrameReply(id=_frame_id(raw), error="Invalid frame")
+            else:
+                started, clock = time.time(), time.perf_counter()
+                attributes: dict = {}
+                try:
+                    with inflight.track():
+                        response_text = await process_message(
+                            frame.message, selected, session_id, tenant, attributes, language=language
+                        )
+                    language = attributes.get("language") or language
+                    reply = ChatFrameReply(id=frame.id, response=response_text)
+                    status_label = "ok"
+                except BudgetExceeded:
+                    reply = ChatFrameReply(id=frame.id, error="Usage budget exceeded")
+                    status_label = "budget"
+                except Exception:
+                    logger.error(
+                        "Error processing message in chat stream",
+                        exc_info=True,
+                        extra={"message_length": len(frame.message)}
+                    )
+                    reply = ChatFrameReply(id=frame.id, error="Internal server error")
+                    status_label = "error"
+                record_transcript(
+                    "ws", frame.message, reply.response, attributes, started,
+                    time.perf_counter() - clock, status_label, session_id, tenant,
+                )
+            
+            await websocket.send_text(reply.model_dump_json(exclude_none=True))
+            if inflight.draining:
+                # The reply was delivered; ask the client to reconnect elsewhere
+                await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+                return
+            
+    except WebSocketDisconnect:
+        # Client closed the session; nothing left to clean up
+        pass
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    """
+    Guard admin endpoints with the ADMIN_TOKEN shared secret.
+    
+    Raises:
+        HTTPException: 404 status when no admin token is configured, 403
+                       status when the X-Admin-Token header does not match
+    """
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.post("/admin/reload", response_model=ReloadResponse, dependencies=[Depends(require_admin)])
+async def admin_reload() -> ReloadResponse:
+    """
+    Reload configuration and greeting tables without restarting.
+    
+    The same reload runs when the process receives SIGHUP.
+    
+    Returns:
+        ReloadResponse with the new greeting table version and changed settings
+        
+    Raises:
+        HTTPException: 400 status if a file failed to load; the previous
+                       configuration is kept
+    """
+    try:
+        return await run_in_threadpool(reload_configuration)
+    except (OSError, ValueError):
+        logger.error("Configuration reload failed; previous configuration kept", exc_info=True)
+        raise HTTPException(status_code=400, detail="Reload failed; previous configuration kept")
+
+
+@app.post("/admin/memory/snapshots", response_model=MemorySnapshotResponse, dependencies=[Depends(require_admin)])
+async def admin_memory_snapshot(
+    limit: int = Query(default=20, ge=1, le=500),
+    group_by: str = Query(default="lineno", pattern="^(lineno|filename|traceback)$"),
+    diff_from: int | None = Query(default=None),
+) -> MemorySnapshotResponse:
+    """
+    Take a tracemalloc snapshot and report the largest allocation sites.
+    
+    Args:
+        limit: Allocation sites listed
+        group_by: Group allocations by "lineno", "filename" or "traceback"
+        diff_from: Snapshot id to diff against; defaults to the previous snapshot
+    
+    Returns:
+        MemorySnapshotResponse with the top sites and those that changed most
+        
+    Raises:
+        HTTPException: 404 status when memory diagnostics are disabled or
+                       diff_from is no longer kept
+    """
+    if memory_diagnostics is None:
+        raise HTTPException(status_code=404, detail="Memory diagnostics are disabled")
+    try:
+        # Snapshots of a large heap take a while; keep them off the event loop
+        report = await run_in_threadpool(memory_diagnostics.snapshot, limit, group_by, diff_from)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return MemorySnapshotResponse(**report)
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -96,3 +811,69 @@ async def health() -> HealthResponse:
         HealthResponse with status "healthy"
     """
     return HealthResponse(status="healthy")
+
+
+@app.get("/livez", response_model=HealthResponse)
+async def livez() -> HealthResponse:
+    """
+    Liveness probe: the process is up and its event loop is serving.
+    
+    Returns:
+        HealthResponse with status "healthy"
+    """
+    return HealthResponse(status="healthy")
+
+
+@app.get("/readyz", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readyz() -> JSONResponse:
+    """
+    Readiness probe served from the cached result of background checks.
+    
+    Returns:
+        200 with status "ready" when every check passed in the latest round,
+        503 with status "not ready" otherwise (including before the first round)
+    """
+    state = readiness.state
+    body = ReadinessResponse(status="ready" if state.ready else "not ready", checks=state.checks)
+    return JSONResponse(status_code=200 if state.ready else 503, content=body.model_dump())
+
+
+@app.get("/metrics")
+async def get_metrics() -> dict:
+    """
+    Snapshot of in-process metrics, e.g. per-stage pipeline hit rates.
+    
+    Returns:
+        Mapping of metrics section name to its current values
+    """
+    return metrics.snapshot()
+
+
+@app.get("/usage", dependencies=[Depends(require_admin)])
+async def get_usage() -> dict:
+    """
+    Model token usage and estimated cost since startup.
+    
+    Admin only: per-tenant spend and session counts are not for clients.
+    
+    Returns:
+        Global and per-tenant totals and the number of tracked sessions
+    """
+    return ledger.snapshot()
+
+
+@app.get("/usage/sessions/{session_id}", dependencies=[Depends(require_admin)])
+async def get_session_usage(session_id: str) -> dict:
+    """
+    Model token usage and estimated cost of one session.
+    
+    Admin only: session ids are client-chosen, so anyone could look up
+    another student's usage.
+    
+    Raises:
+        HTTPException: 404 status if the session has no recorded usage
+    """
+    totals = ledger.session(session_id)
+    if totals is None:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return totals.as_dict()
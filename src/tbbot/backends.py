@@ -0,0 +1,250 @@
+"""Client for OpenAI-compatible chat-completions backends.
+
+The client keeps a pooled HTTP connection per event loop and reports token
+usage and latency with every completion. `run_sync` lets synchronous
+pipeline stages call it from a worker thread.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import anyio.from_thread
+import httpx
+
+
+@dataclass
+class Completion:
+    """A completed chat request."""
+    text: str
+    model: str
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    latency_s: float = 0.0
+    backend: str | None = None
+
+
+class BackendError(Exception):
+    """Raised when a backend call fails or returns an unusable response."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChatBackend:
+    """OpenAI-compatible chat-completions client."""
+
+    def __init__(
+        self,
+        api_base: str,
+        api_key: str = "",
+        timeout: float = 30.0,
+        name: str | None = None,
+        batch_path: str | None = None,
+    ):
+        """
+        Initialize the backend client.
+
+        Args:
+            api_base: Base URL, e.g. https://api.openai.com/v1
+            api_key: Bearer token
+            timeout: Request timeout in seconds
+            name: Name used in metrics; defaults to the base URL
+            batch_path: Path of a batched chat-completions endpoint, e.g.
+                        /batch/chat/completions; None if unsupported
+        """
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.name = name or self.api_base
+        self.batch_path = batch_path
+        # Connection pools are bound to the loop that opened them, and the
+        # server's loop and batch or reload threads may use one backend at once
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # Clients of closed loops can no longer close their connections; let them go
+            for closed in [other for other in self._clients if other.is_closed()]:
+                del self._clients[closed]
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            client = self._clients[loop] = httpx.AsyncClient(
+                base_url=self.api_base, headers=headers, timeout=self.timeout
+            )
+        return client
+
+    async def complete(self, messages: list[dict], model: str, **params: Any) -> Completion:
+        """
+        Request a chat completion.
+
+        Args:
+            messages: Chat messages in OpenAI format
+            model: Model name
+            **params: Extra request parameters (temperature, max_tokens, ...)
+
+        Returns:
+            The completion with usage and latency
+
+        Raises:
+            BackendError: On transport errors, non-2xx responses or malformed bodies
+        """
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().post(
+                "/chat/completions",
+                json={"model": model, "messages": messages, **params},
+            )
+        except httpx.HTTPError as exc:
+            raise BackendError(f"{self.name}: {type(exc).__name__}") from exc
+
+        if response.status_code >= 400:
+            raise BackendError(f"{self.name}: HTTP {response.status_code}", response.status_code)
+
+        try:
+            body = response.json()
+        except ValueError as exc:
+            raise BackendError(f"{self.name}: malformed response") from exc
+        return self._parse_completion(body, model, time.perf_counter() - start)
+
+    async def warm(self) -> bool:
+        """
+        Open a pooled connection ahead of the first completion.
+
+        Returns:
+            Whether the backend answered; any status below 500 counts
+        """
+        try:
+            response = await self._get_client().get("/models")
+        except httpx.HTTPError:
+            return False
+        return response.status_code < 500
+
+    @property
+    def supports_batch(self) -> bool:
+        """Whether several completions can be requested in one call."""
+        return self.batch_path is not None
+
+    async def complete_batch(
+        self, requests: list[tuple[list[dict], str]], **params: Any
+    ) -> list[Completion | BackendError]:
+        """
+        Request several chat completions in one call.
+
+        Args:
+            requests: (messages, model) pairs
+            **params: Extra request parameters applied to every item
+
+        Returns:
+            A completion or an error for each request, in order
+
+        Raises:
+            BackendError: If the whole call fails
+        """
+        if self.batch_path is None:
+            raise BackendError(f"{self.name}: batching not supported")
+
+        start = time.perf_counter()
+        payload = {"requests": [{"model": model, "messages": messages, **params} for messages, model in requests]}
+        try:
+            response = await self._get_client().post(self.batch_path, json=payload)
+        except httpx.HTTPError as exc:
+            raise BackendError(f"{self.name}: {type(exc).__name__}") from exc
+
+        if response.status_code >= 400:
+            raise BackendError(f"{self.name}: HTTP {response.status_code}", response.status_code)
+
+        try:
+            items = response.json()["responses"]
+        except (ValueError, KeyError, TypeError) as exc:
+            raise BackendError(f"{self.name}: malformed response") from exc
+        if len(items) != len(requests):
+            raise BackendError(f"{self.name}: batch returned {len(items)} of {len(requests)} responses")
+
+        latency = time.perf_counter() - start
+        results: list[Completion | BackendError] = []
+        for item, (_, model) in zip(items, requests):
+            status = item.get("status", 500)
+            if status >= 400:
+                results.append(BackendError(f"{self.name}: HTTP {status}", status))
+                continue
+            try:
+                results.append(self._parse_completion(item.get("body"), model, latency))
+            except BackendError as exc:
+                results.append(exc)
+        return results
+
+    def _parse_completion(self, body: dict, model: str, latency_s: float) -> Completion:
+        try:
+            text = body["choices"][0]["message"]["content"] or ""
+        except (KeyError, IndexError, TypeError) as exc:
+            raise BackendError(f"{self.name}: malformed response") from exc
+
+        usage = body.get("usage") or {}
+        return Completion(
+            text=text,
+            model=body.get("model", model),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            latency_s=latency_s,
+            backend=self.name,
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled connections opened from the running loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_backend(
+    api_base: str, api_key: str = "", timeout: float = 30.0, batch_path: str | None = None
+) -> ChatBackend:
+    """Return one backend per base URL and credentials, shared by every agent using it."""
+    return ChatBackend(api_base, api_key, timeout=timeout, batch_path=batch_path)
+
+
+# Event loops of threads running coroutines through run_sync without a server
+_thread_loops = threading.local()
+
+
+def _thread_loop() -> asyncio.AbstractEventLoop:
+    loop = getattr(_thread_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _thread_loops.loop = asyncio.new_event_loop()
+    return loop
+
+
+def run_sync(func: Callable[..., Awaitable], *args: Any) -> Any:
+    """
+    Run a coroutine function from synchronous code.
+
+    From an AnyIO worker thread (e.g. a handler offloaded with
+    run_in_threadpool) the coroutine runs on the server's event loop, reusing
+    its connection pools. Without any event loop (scripts, batch jobs) each
+    thread runs it on a loop of its own, kept from one call to the next so
+    that connection pools are reused too. Calling it from an event loop
+    thread is an error: the caller would block the loop.
+    """
+    try:
+        # Raises RuntimeError unless this thread was started by AnyIO
+        anyio.from_thread.check_cancelled()
+    except RuntimeError:
+        pass
+    else:
+        return anyio.from_thread.run(func, *args)
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return _thread_loop().run_until_complete(func(*args))
+    raise RuntimeError("run_sync() called from an event loop thread; offload the caller to a worker thread")
@@ -0,0 +1,184 @@
+"""Micro-batching of concurrent model calls.
+
+Requests arriving within a short window are collected and sent to the
+backend as one batched call, and each caller gets its own result back.
+A batch is dispatched when it reaches the size limit or when the window
+opened by its first request closes, so a lone request waits at most one
+window. Backends without a batch endpoint get the collected requests as
+concurrent single calls.
+
+Batches are collected per event loop, since a shared batcher is also used
+from ``run_sync`` callers on their own threads' loops.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+from .backends import BackendError, ChatBackend, Completion
+
+
+@dataclass
+class BatchStats:
+    """Batcher counters, across every event loop the batcher is used from."""
+    batches: int = 0
+    items: int = 0
+    full_batches: int = 0
+    wait_ns: int = 0
+    max_wait_ns: int = 0
+
+    def as_dict(self, max_batch: int) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "mean_fill": self.items / self.batches / max_batch if self.batches else 0.0,
+            "full_batches": self.full_batches,
+            "mean_added_latency_ms": self.wait_ns / self.items / 1e6 if self.items else 0.0,
+            "max_added_latency_ms": self.max_wait_ns / 1e6,
+        }
+
+
+@dataclass
+class _Pending:
+    messages: list[dict]
+    model: str
+    future: asyncio.Future
+    enqueued_ns: int
+
+
+@dataclass
+class _LoopBatch:
+    """The batch being collected on one event loop."""
+    pending: list[_Pending] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+    tasks: set[asyncio.Task] = field(default_factory=set)
+
+
+class MicroBatcher:
+    """Collect concurrent completions into batched backend calls."""
+
+    def __init__(self, backend: ChatBackend, window_ms: float = 5.0, max_batch: int = 16):
+        """
+        Initialize the batcher.
+
+        Args:
+            backend: Backend receiving the batches
+            window_ms: Longest time a request waits for others to join it
+            max_batch: Batch size that triggers immediate dispatch
+        """
+        self.backend = backend
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.stats = BatchStats()
+        self._stats_lock = threading.Lock()
+        # Timers and futures belong to one loop; a batch never mixes loops
+        self._batches: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopBatch] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def complete(self, messages: list[dict], model: str) -> Completion:
+        """
+        Request a completion as part of the next batch.
+
+        Has the same signature and errors as ChatBackend.complete, so it can
+        stand in for it.
+
+        Raises:
+            BackendError: If the batch or this item failed
+        """
+        loop = asyncio.get_running_loop()
+        state = self._batches.get(loop)
+        if state is None:
+            state = self._batches[loop] = _LoopBatch()
+
+        future = loop.create_future()
+        state.pending.append(_Pending(messages, model, future, time.perf_counter_ns()))
+
+        if len(state.pending) >= self.max_batch:
+            self._flush(state)
+        elif state.timer is None:
+            state.timer = loop.call_later(self.window, self._flush, state)
+
+        return await future
+
+    def _flush(self, state: _LoopBatch) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        batch, state.pending = state.pending, []
+        if not batch:
+            return
+
+        now = time.perf_counter_ns()
+        with self._stats_lock:
+            stats = self.stats
+            stats.batches += 1
+            stats.items += len(batch)
+            stats.full_batches += len(batch) >= self.max_batch
+            for item in batch:
+                waited = now - item.enqueued_ns
+                stats.wait_ns += waited
+                stats.max_wait_ns = max(stats.max_wait_ns, waited)
+
+        task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+
+    async def _dispatch(self, batch: list[_Pending]) -> None:
+        try:
+            if len(batch) == 1:
+                results = [await self._single(batch[0])]
+            elif self.backend.supports_batch:
+                results = await self.backend.complete_batch([(item.messages, item.model) for item in batch])
+            else:
+                results = await asyncio.gather(*(self._single(item) for item in batch))
+        except Exception as exc:
+            # Any failure, not only backend errors, must reach every caller
+            # rather than leave them waiting forever
+            results = [exc] * len(batch)
+
+        for item, result in zip(batch, results):
+            if item.future.done():
+                # The caller was cancelled while waiting
+                continue
+            if isinstance(result, BaseException):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    async def _single(self, item: _Pending) -> Completion | BackendError:
+        try:
+            return await self.backend.complete(item.messages, item.model)
+        except BackendError as exc:
+            return exc
+
+    def stats_snapshot(self) -> dict:
+        """Batch fill and added latency statistics."""
+        return {"window_ms": self.window * 1000, "max_batch": self.max_batch, **self.stats.as_dict(self.max_batch)}
+
+
+# Batchers shared by every stage using the same backend
+_shared: dict[ChatBackend, MicroBatcher] = {}
+
+
+def shared_batcher(backend: ChatBackend, window_ms: float = 5.0, max_batch: int = 16) -> MicroBatcher:
+    """
+    Return the batcher for a backend, creating it on first use.
+
+    A batcher with other settings, e.g. from before a configuration reload,
+    is replaced; stages built earlier keep using the old one.
+    """
+    batcher = _shared.get(backend)
+    if batcher is None:
+        batcher = _shared.setdefault(backend, MicroBatcher(backend, window_ms, max_batch))
+    if (batcher.window, batcher.max_batch) != (window_ms / 1000, max_batch):
+        batcher = _shared[backend] = MicroBatcher(backend, window_ms, max_batch)
+    return batcher
+
+
+def stats_snapshot() -> dict:
+    """Statistics of every shared batcher, by backend name."""
+    return {batcher.backend.name: batcher.stats_snapshot() for batcher in list(_shared.values())}
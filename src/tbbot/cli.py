@@ -0,0 +1,243 @@
+"""Command-line interface for TBBot.
+
+Usage:
+    tbbot serve [--host HOST] [--port PORT]
+    tbbot batch INPUT OUTPUT [--workers N] [--chunk-size N] [--field NAME] [--resume]
+    tbbot report TRANSCRIPTS_DIR [--since TIME] [--until TIME] [--by COLUMN]
+    tbbot load (URL | --local) [--endpoint NAME] [--mode open|closed] [--rate N] [--concurrency N]
+               [--duration S] [--output REPORT] [--compare BASELINE]
+    tbbot soak (URL | --local) [--duration S] [--rate N] [--interval S] [--warmup S] [--max-growth-mb N]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from contextlib import nullcontext
+
+from .offline import BatchSummary, run_batch
+
+
+def _print_progress(summary: BatchSummary) -> None:
+    print(
+        f"\r{summary.processed + summary.skipped} records "
+        f"({summary.rate:,.0f}/s, {summary.errors} errors)",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def _serve(args: argparse.Namespace) -> int:
+    # Imported here so the other commands do not build the application
+    import uvicorn
+
+    from .api import app
+    from .config import Config
+
+    # uvicorn's own wait for open connections, after the app has drained on
+    # SIGTERM; without a timeout it could wait forever
+    uvicorn.run(app, host=args.host, port=args.port, timeout_graceful_shutdown=Config.SHUTDOWN_GRACE_S)
+    return 0
+
+
+def _batch(args: argparse.Namespace) -> int:
+    summary = run_batch(
+        args.input,
+        args.output,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        field=args.field,
+        resume=args.resume,
+        progress=None if args.quiet else _print_progress,
+    )
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(
+        f"Processed {summary.processed} records in {summary.elapsed_s:.1f}s "
+        f"({summary.rate:,.0f}/s), skipped {summary.skipped}, {summary.errors} errors",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def _report(args: argparse.Namespace) -> int:
+    # Imported here so the batch command does not pay for pandas
+    from . import analytics
+
+    load = analytics.hourly_load(args.directory, args.since, args.until)
+    if load.empty:
+        print(f"No transcripts in {args.directory}", file=sys.stderr)
+        return 1
+
+    print("Hourly load\n" + load.to_string(float_format="{:.1%}".format))
+    print("\nLanguage mix\n" + analytics.language_mix(args.directory, args.since, args.until).to_string(
+        float_format="{:.1%}".format
+    ))
+    print(f"\nLatency (ms) by {args.by}\n" + analytics.latency_percentiles(
+        args.directory, args.since, args.until, by=args.by
+    ).to_string(float_format="{:.1f}".format))
+    return 0
+
+
+def _load(args: argparse.Namespace) -> int:
+    # Imported here so the other commands do not pay for the HTTP clients
+    from . import loadgen
+
+    if (args.url is None) == (not args.local):
+        print("Give either a server URL or --local", file=sys.stderr)
+        return 2
+    mix = loadgen.MessageMix.bundled(args.greeting_ratio, loadgen.parse_weights(args.languages), args.seed)
+
+    server = loadgen.local_server(args.stub_latency_ms) if args.local else nullcontext(args.url)
+    with server as url:
+        report = asyncio.run(loadgen.run_load(
+            url,
+            endpoint=args.endpoint,
+            mode=args.mode,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            duration_s=args.duration,
+            warmup_s=args.warmup,
+            mix=mix,
+            max_in_flight=args.max_in_flight,
+            poisson=args.arrivals == "poisson",
+            timeout_s=args.timeout,
+            seed=args.seed,
+        ))
+
+    print(report.format())
+    if args.compare:
+        print("\n" + loadgen.compare(loadgen.read_report(args.compare), report))
+    if args.output:
+        loadgen.write_report(report, args.output)
+    return 0 if report.requests else 1
+
+
+def _soak(args: argparse.Namespace) -> int:
+    from . import loadgen, soak
+
+    if (args.url is None) == (not args.local):
+        print("Give either a server URL or --local", file=sys.stderr)
+        return 2
+
+    server = loadgen.local_server(args.stub_latency_ms) if args.local else nullcontext(args.url)
+    with server as url:
+        report = asyncio.run(soak.run_soak(
+            url,
+            duration_s=args.duration,
+            rate=args.rate,
+            sample_interval_s=args.interval,
+            warmup_s=args.warmup,
+            max_growth_bytes=int(args.max_growth_mb * 2**20),
+            endpoint=args.endpoint,
+        ))
+
+    print(report.format())
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report.as_dict(), output, indent=2)
+    return 0 if report.bounded else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with one subcommand per tool."""
+    parser = argparse.ArgumentParser(prog="tbbot", description="TBBot command-line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser(
+        "serve",
+        help="Run the API server",
+        description="Run the API server; on SIGTERM it reports not ready, drains and then stops.",
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    serve.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    serve.set_defaults(handler=_serve)
+
+    batch = commands.add_parser(
+        "batch",
+        help="Process archived messages through the agent",
+        description="Run every message of a JSONL or CSV file through the agent and write JSONL results in order.",
+    )
+    batch.add_argument("input", help="JSONL or CSV file with one message per record")
+    batch.add_argument("output", help="JSONL file receiving one result per input record")
+    batch.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    batch.add_argument("--chunk-size", type=int, default=1000, help="Messages per worker task")
+    batch.add_argument("--field", default="message", help="Field or column holding the message")
+    batch.add_argument("--resume", action="store_true", help="Continue an interrupted run")
+    batch.add_argument("--quiet", action="store_true", help="Do not report progress")
+    batch.set_defaults(handler=_batch)
+
+    report = commands.add_parser(
+        "report",
+        help="Summarize stored chat transcripts",
+        description="Print hourly load, language mix and latency percentiles from the transcript store.",
+    )
+    report.add_argument("directory", help="Transcript store directory (TRANSCRIPTS_DIR)")
+    report.add_argument("--since", default=None, help="First hour to include, ISO format (UTC)")
+    report.add_argument("--until", default=None, help="Hour to stop before, ISO format (UTC)")
+    report.add_argument("--by", default="stage", help="Column to group latencies by (stage, language, tenant...)")
+    report.set_defaults(handler=_report)
+
+    load = commands.add_parser(
+        "load",
+        help="Measure latency and throughput under synthetic traffic",
+        description=(
+            "Send a mix of greetings and questions to a TBBot server at a fixed arrival rate (open loop) "
+            "or from a fixed number of clients (closed loop), and report latency percentiles and throughput."
+        ),
+    )
+    load.add_argument("url", nargs="?", default=None, help="Server root URL, e.g. http://127.0.0.1:8000")
+    load.add_argument("--local", action="store_true", help="Start a local server backed by the LLM stand-in")
+    load.add_argument("--stub-latency-ms", type=float, default=50.0, help="Stand-in model latency with --local")
+    load.add_argument("--endpoint", choices=("chat", "history", "health", "ws"), default="chat")
+    load.add_argument("--mode", choices=("open", "closed"), default="open")
+    load.add_argument("--rate", type=float, default=50.0, help="Open loop: requests per second")
+    load.add_argument("--arrivals", choices=("constant", "poisson"), default="constant",
+                      help="Open loop: spacing of arrivals")
+    load.add_argument("--concurrency", type=int, default=10,
+                      help="Closed loop: clients; ws: connections in either mode")
+    load.add_argument("--max-in-flight", type=int, default=1000,
+                      help="Open loop: outstanding requests beyond which arrivals are dropped")
+    load.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    load.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before the run")
+    load.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    load.add_argument("--greeting-ratio", type=float, default=0.3, help="Share of messages that are greetings")
+    load.add_argument("--languages", default=None, help="Traffic weights by language, e.g. en=2,ca=1")
+    load.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible message sequence")
+    load.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    load.add_argument("--compare", default=None, help="JSON report of an earlier run to compare against")
+    load.set_defaults(handler=_load)
+
+    soak = commands.add_parser(
+        "soak",
+        help="Check that server memory stays bounded under long steady traffic",
+        description=(
+            "Send chat requests at a fixed rate for a long time, sample the server's RSS from /metrics "
+            "and fail if it grows by more than --max-growth-mb after the warm-up."
+        ),
+    )
+    soak.add_argument("url", nargs="?", default=None, help="Server root URL, e.g. http://127.0.0.1:8000")
+    soak.add_argument("--local", action="store_true",
+                      help="Start a local server backed by the LLM stand-in (RSS then includes the load generator)")
+    soak.add_argument("--stub-latency-ms", type=float, default=50.0, help="Stand-in model latency with --local")
+    soak.add_argument("--endpoint", choices=("chat", "history"), default="chat")
+    soak.add_argument("--duration", type=float, default=3600.0, help="Total seconds, warm-up included")
+    soak.add_argument("--rate", type=float, default=20.0, help="Requests per second")
+    soak.add_argument("--interval", type=float, default=10.0, help="Seconds between RSS samples")
+    soak.add_argument("--warmup", type=float, default=60.0, help="Seconds before growth is measured")
+    soak.add_argument("--max-growth-mb", type=float, default=50.0, help="Allowed RSS growth after the warm-up")
+    soak.add_argument("--output", default=None, help="Write the samples as JSON to this file")
+    soak.set_defaults(handler=_soak)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the command-line interface."""
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
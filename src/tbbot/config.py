@@ -4,28 +4,175 @@ This module handles loading environment variables from .env files
 and provides configuration settings for the application.
 """
 
+import importlib.util
 import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Iterator
 from dotenv import load_dotenv, find_dotenv
 
 # Load environment variables from .env file
 # Search for .env in current directory and parent directories
 load_dotenv(find_dotenv(), override=True)
 
+# Settings read in place of Config's own while a reload builds components
+_staged: ContextVar[dict | None] = ContextVar("staged_config", default=None)
 
-class Config:
-    """Application configuration loaded from environment variables."""
+
+class _ConfigType(type):
+    def __getattribute__(cls, name):
+        staged = _staged.get()
+        if staged is not None and name in staged:
+            return staged[name]
+        return type.__getattribute__(cls, name)
+
+
+class Config(metaclass=_ConfigType):
+    """
+    Application configuration loaded from environment variables.
+    
+    Settings are replaced while requests are being served: ``load`` reads
+    new values without touching this class, components are built from them
+    inside ``staged``, and ``apply`` swaps them in at once under ``lock``.
+    Each setting read on its own is always a complete value, but two reads
+    may straddle a reload; code that needs several related settings to
+    agree should read them from one ``snapshot()``.
+    """
+    
+    lock = threading.RLock()
     
     # OpenAI Configuration
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_API_BASE: str | None = os.getenv("OPENAI_API_BASE")
     
+    # Routing across several backends (optional; overrides OPENAI_API_BASE)
+    OPENAI_API_BASES: str = os.getenv("OPENAI_API_BASES", "")
+    ROUTING_METRIC: str = os.getenv("ROUTING_METRIC", "ewma").lower()
+    ROUTING_EWMA_ALPHA: float = float(os.getenv("ROUTING_EWMA_ALPHA", "0.3"))
+    ROUTING_EXPLORE: float = float(os.getenv("ROUTING_EXPLORE", "0.05"))
+    BREAKER_FAILURES: int = int(os.getenv("BREAKER_FAILURES", "5"))
+    BREAKER_RESET_S: float = float(os.getenv("BREAKER_RESET_S", "30"))
+    
+    # Hedged model calls (0 disables; max share of calls duplicated)
+    HEDGE_FRACTION: float = float(os.getenv("HEDGE_FRACTION", "0"))
+    HEDGE_MIN_DELAY_MS: float = float(os.getenv("HEDGE_MIN_DELAY_MS", "20"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    
+    # Model fallback for messages no cheaper stage answers
+    LLM_FALLBACK_ENABLED: bool = os.getenv("LLM_FALLBACK_ENABLED", "false").lower() == "true"
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    LLM_TIMEOUT_S: float = float(os.getenv("LLM_TIMEOUT_S", "30"))
+    LLM_SYSTEM_PROMPT: str = os.getenv("LLM_SYSTEM_PROMPT", "")
+    LLM_COURSE_CONTEXT: str = os.getenv("LLM_COURSE_CONTEXT", "")
+    LLM_EXAMPLES_PATH: str | None = os.getenv("LLM_EXAMPLES_PATH")
+    
+    # Micro-batching of concurrent model calls
+    LLM_BATCH_ENABLED: bool = os.getenv("LLM_BATCH_ENABLED", "false").lower() == "true"
+    LLM_BATCH_WINDOW_MS: float = float(os.getenv("LLM_BATCH_WINDOW_MS", "5"))
+    LLM_BATCH_MAX_SIZE: int = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+    LLM_BATCH_PATH: str = os.getenv("LLM_BATCH_PATH", "")
+    
+    # Conversation history sent to the model (0 tokens disables history)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+    CONTEXT_KEEP_TURNS: int = int(os.getenv("CONTEXT_KEEP_TURNS", "6"))
+    CONTEXT_SEGMENT_TURNS: int = int(os.getenv("CONTEXT_SEGMENT_TURNS", "8"))
+    CONTEXT_SUMMARY_MODEL: str = os.getenv("CONTEXT_SUMMARY_MODEL", "")
+    CONTEXT_MAX_SESSIONS: int = int(os.getenv("CONTEXT_MAX_SESSIONS", "10000"))
+    
+    # History sent by clients of /chat/history (0 tokens sends none to the model)
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+    HISTORY_CACHE_SIZE: int = int(os.getenv("HISTORY_CACHE_SIZE", "10000"))
+    
+    # Responses stored for Idempotency-Key retries of /chat
+    IDEMPOTENCY_TTL_S: float = float(os.getenv("IDEMPOTENCY_TTL_S", "3600"))
+    IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    
+    # Token accounting and budgets for model calls (0 disables a limit)
+    LLM_PRICES: str | None = os.getenv("LLM_PRICES")
+    LLM_DOWNGRADE_MODEL: str = os.getenv("LLM_DOWNGRADE_MODEL", "")
+    BUDGET_REQUEST_TOKENS: int = int(os.getenv("BUDGET_REQUEST_TOKENS", "0"))
+    BUDGET_SESSION_TOKENS: int = int(os.getenv("BUDGET_SESSION_TOKENS", "0"))
+    BUDGET_TENANT_USD: float = float(os.getenv("BUDGET_TENANT_USD", "0"))
+    BUDGET_ACTION: str = os.getenv("BUDGET_ACTION", "reject").lower()
+    USAGE_MAX_SESSIONS: int = int(os.getenv("USAGE_MAX_SESSIONS", "10000"))
+    
+    # Fuzzy FAQ answering (disabled unless a FAQ file is given). Unlike the
+    # greeting tables, the bundled data/faq.json is not a default: its canned
+    # answers are course content, and a deployment for another course would
+    # answer with them before its model or tenant prompt is consulted
+    FAQ_PATH: str | None = os.getenv("FAQ_PATH")
+    FAQ_THRESHOLD: float = float(os.getenv("FAQ_THRESHOLD", "0.8"))
+    
+    # Greeting keywords and responses (defaults to the bundled table)
+    GREETINGS_PATH: str | None = os.getenv("GREETINGS_PATH")
+    
+    # Admin endpoints (disabled unless a token is set)
+    ADMIN_TOKEN: str | None = os.getenv("ADMIN_TOKEN")
+    
+    # Per-course/tenant agents (optional), selected with the X-Tenant-Id header
+    TENANTS_PATH: str | None = os.getenv("TENANTS_PATH")
+    TENANT_MAX_AGENTS: int = int(os.getenv("TENANT_MAX_AGENTS", "32"))
+    TENANT_IDLE_TTL_S: float = float(os.getenv("TENANT_IDLE_TTL_S", "900"))
+    
+    # Columnar transcript store for traffic analytics (disabled unless a directory is set)
+    TRANSCRIPTS_DIR: str | None = os.getenv("TRANSCRIPTS_DIR")
+    TRANSCRIPTS_BATCH_SIZE: int = int(os.getenv("TRANSCRIPTS_BATCH_SIZE", "1000"))
+    TRANSCRIPTS_FLUSH_S: float = float(os.getenv("TRANSCRIPTS_FLUSH_S", "5"))
+    TRANSCRIPTS_QUEUE_SIZE: int = int(os.getenv("TRANSCRIPTS_QUEUE_SIZE", "10000"))
+    TRANSCRIPTS_INCLUDE_TEXT: bool = os.getenv("TRANSCRIPTS_INCLUDE_TEXT", "false").lower() == "true"
+    
     # LangWatch Configuration (optional)
     LANGWATCH_API_KEY: str | None = os.getenv("LANGWATCH_API_KEY")
     
     # Scenario Testing Configuration
     SCENARIO_BATCH_RUN_ID: str | None = os.getenv("SCENARIO_BATCH_RUN_ID")
     SCENARIO_CACHE_KEY: str | None = os.getenv("SCENARIO_CACHE_KEY")
+    SCENARIO_LLM_CACHE: str = os.getenv("SCENARIO_LLM_CACHE", "off")
+    SCENARIO_LLM_CACHE_DIR: str = os.getenv("SCENARIO_LLM_CACHE_DIR", "tests/.llm_cache")
+    
+    # Logging Configuration
+    LOG_PIPELINE: bool = os.getenv("LOG_PIPELINE", "true").lower() == "true"
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    # Records per second per error signature, not a sampling fraction;
+    # LOG_SAMPLE_RATE and LOG_SAMPLE_BURST are deprecated names still read
+    LOG_RATE_LIMIT_PER_S: float = float(os.getenv("LOG_RATE_LIMIT_PER_S", os.getenv("LOG_SAMPLE_RATE", "1.0")))
+    LOG_RATE_LIMIT_BURST: int = int(os.getenv("LOG_RATE_LIMIT_BURST", os.getenv("LOG_SAMPLE_BURST", "10")))
+    
+    # Tracing Configuration
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.0"))
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "memory")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    
+    # Readiness Configuration
+    READINESS_INTERVAL_S: float = float(os.getenv("READINESS_INTERVAL_S", "5"))
+    READINESS_CHECK_TIMEOUT_S: float = float(os.getenv("READINESS_CHECK_TIMEOUT_S", "2"))
+    READINESS_MAX_QUEUE_DEPTH: int = int(os.getenv("READINESS_MAX_QUEUE_DEPTH", "5000"))
+    
+    # Startup warm-up and shutdown drain
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_TIMEOUT_S: float = float(os.getenv("WARMUP_TIMEOUT_S", "10"))
+    WARMUP_TENANTS: str = os.getenv("WARMUP_TENANTS", "")
+    PRE_STOP_DELAY_S: float = float(os.getenv("PRE_STOP_DELAY_S", "5"))
+    DRAIN_TIMEOUT_S: float = float(os.getenv("DRAIN_TIMEOUT_S", "20"))
+    # uvicorn's wait for connections still open once the drain is done
+    SHUTDOWN_GRACE_S: float = float(os.getenv("SHUTDOWN_GRACE_S", "2"))
+    # Time the platform allows between SIGTERM and SIGKILL: Kubernetes'
+    # terminationGracePeriodSeconds (default 30) or Docker's --stop-timeout
+    # (default 10, so run the image with --stop-timeout 30)
+    SHUTDOWN_DEADLINE_S: float = float(os.getenv("SHUTDOWN_DEADLINE_S", "30"))
+    
+    # Event-loop lag monitor (cheap enough to stay on)
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_MONITOR_INTERVAL_MS: float = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+    LOOP_STALL_THRESHOLD_MS: float = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+    
+    # Memory diagnostics (admin endpoint; tracing disabled by default)
+    MEMORY_DIAGNOSTICS_ENABLED: bool = os.getenv("MEMORY_DIAGNOSTICS_ENABLED", "false").lower() == "true"
+    MEMORY_TRACE_FRAMES: int = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+    MEMORY_MAX_SNAPSHOTS: int = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "10"))
     
     @classmethod
     def validate(cls) -> None:
@@ -40,6 +187,90 @@ class Config:
     def is_configured(cls) -> bool:
         """Check if minimum required configuration is present."""
         return bool(cls.OPENAI_API_KEY)
+    
+    @classmethod
+    def shutdown_budget_s(cls) -> float:
+        """Longest time from SIGTERM to exit: pre-stop delay, drain, then uvicorn's grace."""
+        return cls.PRE_STOP_DELAY_S + cls.DRAIN_TIMEOUT_S + cls.SHUTDOWN_GRACE_S
+    
+    @classmethod
+    def snapshot(cls) -> dict:
+        """
+        Consistent copy of all settings.
+        
+        Returns:
+            Setting names mapped to their values, never mixing values from
+            before and after a reload
+        """
+        with cls.lock:
+            values = {name: value for name, value in vars(cls).items() if name.isupper()}
+        return {**values, **(_staged.get() or {})}
+    
+    @classmethod
+    def apply(cls, values: dict) -> list[str]:
+        """
+        Replace settings all at once.
+        
+        Args:
+            values: Setting names mapped to their new values
+        
+        Returns:
+            Names of the settings whose value changed
+        """
+        with cls.lock:
+            current = vars(cls)
+            changed = [name for name, value in values.items() if current.get(name) != value]
+            for name in changed:
+                setattr(cls, name, values[name])
+        return changed
+    
+    @classmethod
+    def load(cls) -> dict:
+        """
+        Re-read the .env file and environment variables, without applying them.
+        
+        Settings are recomputed by evaluating this module again in a fresh
+        namespace.
+        
+        Returns:
+            Setting names mapped to their new values
+        """
+        spec = importlib.util.find_spec(__name__)
+        fresh = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(fresh)
+        return fresh.Config.snapshot()
+    
+    @classmethod
+    @contextmanager
+    def staged(cls, values: dict) -> Iterator[None]:
+        """
+        Read ``values`` instead of the current settings, in this context only.
+        
+        Components built from configuration inside the block see the new
+        settings while requests elsewhere keep reading the current ones.
+        
+        Args:
+            values: Setting names mapped to the values to read
+        """
+        token = _staged.set(values)
+        try:
+            yield
+        finally:
+            _staged.reset(token)
+    
+    @classmethod
+    def reload(cls) -> list[str]:
+        """
+        Re-read the .env file and environment variables and apply them.
+        
+        Components that read a setting at construction time only see the
+        new value once rebuilt; see ``load`` and ``staged`` to build them
+        before the settings change.
+        
+        Returns:
+            Names of the settings whose value changed
+        """
+        return cls.apply(cls.load())
 
 
 # Create a singleton instance
@@ -0,0 +1,396 @@
+"""Conversation history with bounded, compacted model context.
+
+Turns are recorded per session. When a model stage needs the history of a
+session it gets, within a token budget:
+
+- a running summary of older turns, as one system message;
+- the remaining turns verbatim, most importantly the last few.
+
+Older turns are folded into the summary in fixed segments: once a segment
+of turns falls out of the recent window it is summarized together with the
+previous summary, exactly once, and its raw turns are dropped. The summary
+therefore changes once per segment rather than every turn, which keeps
+prompts stable between segments, and per-session memory stays bounded.
+
+Folding may call a model, so it never runs while a turn is recorded:
+reading history folds what is due first (model stages read it off the
+event loop), and a segment leaving the window is also queued for a
+background thread, so sessions whose history is rarely read stay bounded.
+
+Greetings carry no content the model needs, so only the first greeting
+turn of a session is kept; repeated "hola" turns answered by the greeting
+stage are dropped when recorded.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass, field
+from typing import Callable
+
+from . import usage
+from .backends import BackendError, ChatBackend, run_sync
+from .config import Config
+from .routing import RoutedBackend, backend_from_config
+from .usage import MESSAGE_OVERHEAD_TOKENS, estimate_prompt_tokens, estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+@dataclass(frozen=True)
+class Turn:
+    """One exchange: the student's message and the answer it got."""
+    user: str
+    assistant: str
+    stage: str | None = None
+
+    @property
+    def estimated_tokens(self) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(self.user)
+        if self.assistant:
+            tokens += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(self.assistant)
+        return tokens
+
+    def messages(self) -> list[dict]:
+        """The turn as chat messages; unanswered turns only have the user message."""
+        messages = [{"role": "user", "content": self.user}]
+        if self.assistant:
+            messages.append({"role": "assistant", "content": self.assistant})
+        return messages
+
+
+# Folds new turns into the previous summary: (previous summary, turns) -> summary
+Summarizer = Callable[[str, list[Turn]], str]
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def extractive_summary(previous: str, turns: list[Turn], max_chars: int = 1500) -> str:
+    """
+    Summarize turns locally by listing clipped exchanges.
+
+    The oldest lines are dropped once the summary exceeds ``max_chars``.
+    Greeting turns are left out.
+
+    Args:
+        previous: Summary of the turns before these
+        turns: Turns to add
+
+    Returns:
+        The new summary
+    """
+    lines = previous.splitlines() if previous else []
+    for turn in turns:
+        if turn.stage == "greeting":
+            continue
+        line = f"- Student: {_clip(turn.user, 160)}"
+        if turn.assistant:
+            line += f" | TBBot: {_clip(turn.assistant, 160)}"
+        lines.append(line)
+
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ModelSummarizer:
+    """Summarize turns with a chat model, falling back to an extractive summary."""
+
+    INSTRUCTIONS = (
+        "You maintain a running summary of a tutoring conversation between a student and TBBot. "
+        "Update the summary with the new exchanges. Keep the student's goals, questions, and what "
+        "was already explained; drop greetings and small talk. Answer with the summary only, "
+        "in at most {words} words."
+    )
+
+    def __init__(self, backend: ChatBackend | RoutedBackend, model: str, max_words: int = 150):
+        """
+        Initialize the summarizer.
+
+        Args:
+            backend: Backend used for summaries
+            model: Model name sent to the backend
+            max_words: Requested summary length
+        """
+        self.backend = backend
+        self.model = model
+        self.max_words = max_words
+
+    def __call__(self, previous: str, turns: list[Turn]) -> str:
+        transcript = "\n".join(
+            f"Student: {turn.user}\nTBBot: {turn.assistant}" for turn in turns if turn.stage != "greeting"
+        )
+        if not transcript:
+            return previous
+        messages = [
+            {"role": "system", "content": self.INSTRUCTIONS.format(words=self.max_words)},
+            {"role": "user", "content": f"Summary so far:\n{previous or '(none)'}\n\nNew exchanges:\n{transcript}"},
+        ]
+        try:
+            completion = run_sync(self.backend.complete, messages, self.model)
+        except BackendError:
+            logger.warning("Summary model call failed; using an extractive summary", exc_info=True)
+            return extractive_summary(previous, turns)
+
+        usage.ledger.record(
+            self.model,
+            completion.prompt_tokens if completion.prompt_tokens is not None else estimate_prompt_tokens(messages),
+            completion.completion_tokens if completion.completion_tokens is not None else estimate_tokens(completion.text),
+            estimated=completion.prompt_tokens is None,
+        )
+        return completion.text.strip()
+
+
+@dataclass
+class _Session:
+    turns: list[Turn] = field(default_factory=list)  # Turns not folded into the summary yet
+    summary: str = ""
+    greeted: bool = False
+    fold_queued: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Held while folding, which may call a model; `lock` is only held briefly
+    fold_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class ContextStats:
+    """Compaction counters. Updated without locks, so approximate under threads."""
+    turns: int = 0
+    deduplicated_greetings: int = 0
+    summaries: int = 0
+    builds: int = 0
+    history_tokens: int = 0
+    dropped_turns: int = 0  # Verbatim turns left out to fit the budget
+
+    def as_dict(self) -> dict:
+        return {
+            "turns": self.turns,
+            "deduplicated_greetings": self.deduplicated_greetings,
+            "summaries": self.summaries,
+            "builds": self.builds,
+            "mean_history_tokens": self.history_tokens / self.builds if self.builds else 0.0,
+            "dropped_turns": self.dropped_turns,
+        }
+
+
+class ConversationContext:
+    """Per-session conversation history, compacted for model prompts."""
+
+    def __init__(
+        self,
+        token_budget: int = 1000,
+        keep_turns: int = 6,
+        segment_turns: int = 8,
+        summarizer: Summarizer | None = None,
+        max_sessions: int = 10_000,
+    ):
+        """
+        Initialize the context manager.
+
+        Args:
+            token_budget: Largest estimated size of the history sent with a
+                          request; 0 disables history altogether
+            keep_turns: Most recent turns always kept verbatim (budget permitting)
+            segment_turns: Older turns folded into the summary at a time
+            summarizer: Folds turns into a summary; defaults to extractive_summary
+            max_sessions: Sessions tracked at once; least recently used are dropped
+        """
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.segment_turns = segment_turns
+        self.summarizer = summarizer or extractive_summary
+        self.max_sessions = max_sessions
+        self.stats = ContextStats()
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._lock = threading.Lock()
+        self._folder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tbbot-context-fold")
+
+    @classmethod
+    def from_config(cls) -> "ConversationContext":
+        """Build the context manager from CONTEXT_* configuration."""
+        summarizer = None
+        if Config.CONTEXT_SUMMARY_MODEL:
+            summarizer = ModelSummarizer(backend_from_config(), Config.CONTEXT_SUMMARY_MODEL)
+        return cls(
+            token_budget=Config.CONTEXT_TOKEN_BUDGET,
+            keep_turns=Config.CONTEXT_KEEP_TURNS,
+            segment_turns=Config.CONTEXT_SEGMENT_TURNS,
+            summarizer=summarizer,
+            max_sessions=Config.CONTEXT_MAX_SESSIONS,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether history is kept and sent at all."""
+        return self.token_budget > 0
+
+    def _session(self, session_id: str, create: bool) -> _Session | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            elif create:
+                session = self._sessions[session_id] = _Session()
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            return session
+
+    def record(self, session_id: str, user: str, assistant: str, stage: str | None = None) -> None:
+        """
+        Append a turn to a session's history.
+
+        Never folds on the caller's thread; a segment pushed out of the recent
+        window is queued for the background folder.
+
+        Args:
+            session_id: Session the turn belongs to
+            user: The student's message
+            assistant: The answer, empty if none
+            stage: Pipeline stage that answered
+        """
+        if not self.enabled:
+            return
+        session = self._session(session_id, create=True)
+        with session.lock:
+            if stage == "greeting":
+                if session.greeted:
+                    self.stats.deduplicated_greetings += 1
+                    return
+                session.greeted = True
+            session.turns.append(Turn(user, assistant, stage))
+            queue = not session.fold_queued and self._due(session)
+            session.fold_queued = session.fold_queued or queue
+        self.stats.turns += 1
+        if queue:
+            self._folder.submit(self._fold_in_background, session)
+
+    def _due(self, session: _Session) -> bool:
+        return len(session.turns) - self.keep_turns >= self.segment_turns
+
+    def _compact(self, session: _Session) -> None:
+        # The summarizer runs outside `session.lock`, so recording is never
+        # held up by it; `fold_lock` keeps each segment folded exactly once
+        with session.fold_lock:
+            while True:
+                with session.lock:
+                    if not self._due(session):
+                        return
+                    summary, segment = session.summary, session.turns[:self.segment_turns]
+                summary = self.summarizer(summary, segment)
+                with session.lock:
+                    session.summary, session.turns = summary, session.turns[self.segment_turns:]
+                self.stats.summaries += 1
+
+    def _fold_in_background(self, session: _Session) -> None:
+        try:
+            self._compact(session)
+        except Exception:
+            logger.warning("Folding conversation history failed", exc_info=True)
+        finally:
+            with session.lock:
+                session.fold_queued = False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait for the folds queued so far.
+
+        Returns:
+            Whether they finished within the timeout
+        """
+        try:
+            self._folder.submit(lambda: None).result(timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def fold(self, summary: str, turns: list[Turn]) -> tuple[str, list[Turn]]:
+        """
+        Fold every complete segment that has left the recent window into the summary.
+
+        Segments are folded oldest first, each exactly once.
+
+        Args:
+            summary: Summary of the turns before ``turns``
+            turns: Turns not folded yet
+
+        Returns:
+            The new summary and the turns still kept verbatim
+        """
+        while len(turns) - self.keep_turns >= self.segment_turns:
+            summary = self.summarizer(summary, turns[:self.segment_turns])
+            turns = turns[self.segment_turns:]
+            self.stats.summaries += 1
+        return summary, turns
+
+    def fit(self, summary: str, turns: list[Turn], budget: int) -> list[dict]:
+        """
+        History messages for a summary and verbatim turns, within a token budget.
+
+        Args:
+            summary: Summary of older turns, possibly empty
+            turns: Verbatim turns, oldest first
+            budget: Largest estimated size of the messages
+
+        Returns:
+            Chat messages: the summary (if any) followed by verbatim turns,
+            oldest verbatim turns dropped first when over budget
+        """
+        messages: list[dict] = []
+        remaining = budget
+        if summary:
+            summary_message = {"role": "system", "content": SUMMARY_HEADER + summary}
+            cost = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(summary_message["content"])
+            if cost <= remaining:
+                messages.append(summary_message)
+                remaining -= cost
+
+        kept: list[Turn] = []
+        for turn in reversed(turns):
+            if turn.estimated_tokens > remaining:
+                break
+            kept.append(turn)
+            remaining -= turn.estimated_tokens
+        self.stats.dropped_turns += len(turns) - len(kept)
+        for turn in reversed(kept):
+            messages.extend(turn.messages())
+
+        self.stats.builds += 1
+        self.stats.history_tokens += budget - remaining
+        return messages
+
+    def history(self, session_id: str | None, budget: int | None = None) -> list[dict]:
+        """
+        Compacted history of a session, to place before the new message.
+
+        Args:
+            session_id: Session to look up; None has no history
+            budget: Token budget overriding the configured one
+
+        Returns:
+            Chat messages: the summary (if any) followed by verbatim turns,
+            oldest verbatim turns dropped first when over budget
+        """
+        if not self.enabled or not session_id:
+            return []
+        session = self._session(session_id, create=False)
+        if session is None:
+            return []
+
+        self._compact(session)
+        with session.lock:
+            summary, turns = session.summary, list(session.turns)
+        return self.fit(summary, turns, self.token_budget if budget is None else budget)
+
+    def stats_snapshot(self) -> dict:
+        """Compaction counters and the number of tracked sessions."""
+        return {**self.stats.as_dict(), "sessions": len(self._sessions)}
+
+
+conversations = ConversationContext.from_config()
@@ -0,0 +1,273 @@
+"""Fuzzy FAQ matching for TBBot.
+
+Question/answer pairs are loaded per language from a JSON file and indexed
+once at startup. Every distinct word of the questions is stored in a
+BK-tree keyed on edit distance, so each word of a message can be matched
+to the question vocabulary within a small typo tolerance ("agnet" ->
+"agent") without scanning it. Matched words lead through an inverted index
+to candidate questions, which are scored by length-weighted word overlap.
+When the student's language is known, only questions in that language are
+candidates, so words shared between languages cannot pick another
+language's answer.
+
+File format:
+    {
+        "en": [{"question": "What is an agent?", "answer": "..."}],
+        "ca": [{"question": "Què és un agent?", "answer": "..."}]
+    }
+"""
+
+import functools
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from .pipeline import AgentRequest, CostClass, Stage
+from .tracing import tracer
+
+
+_WORD = re.compile(r"\w+")
+
+# Distinct message words whose vocabulary matches are remembered
+_TOKEN_CACHE_SIZE = 4096
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase a text and split it into distinct words, keeping their order."""
+    return list(dict.fromkeys(_WORD.findall(text.lower())))
+
+
+def typo_tolerance(word: str) -> int:
+    """Number of edits tolerated when matching a word of this length."""
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 5:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int, transpositions: bool = True) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions).
+
+    Stops early and returns limit + 1 once the distance is known to exceed
+    `limit`, which keeps comparisons against distant words cheap. With
+    `transpositions` off this is the plain Levenshtein distance.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous: list[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if transpositions and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree for finding words within an edit distance.
+
+    Pruning relies on the triangle inequality, which the optimal string
+    alignment distance does not satisfy ("ca" -> "ac" -> "abc" is 1 + 1, but
+    "ca" -> "abc" is 3). The tree is therefore keyed on Levenshtein distance.
+    A transposition costs two Levenshtein edits, so searches walk the tree
+    with twice the tolerance and keep the words within tolerance under the
+    alignment distance.
+    """
+
+    # Upper bound used when computing the distance between stored words
+    _MAX_DISTANCE = 64
+
+    def __init__(self, words):
+        self._root: tuple[str, dict] | None = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        """Insert a word."""
+        if self._root is None:
+            self._root = (word, {})
+            return
+
+        node_word, children = self._root
+        while True:
+            distance = edit_distance(word, node_word, self._MAX_DISTANCE, transpositions=False)
+            if distance == 0:
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (word, {})
+                return
+            node_word, children = child
+
+    def search(self, word: str, tolerance: int) -> list[tuple[int, str]]:
+        """Return (distance, word) pairs for stored words within `tolerance` edits."""
+        if self._root is None:
+            return []
+
+        radius = 2 * tolerance
+        found = []
+        pending = [self._root]
+        while pending:
+            node_word, children = pending.pop()
+            # Distances beyond the radius only matter for pruning; cap the work
+            distance = edit_distance(word, node_word, radius + len(word) + len(node_word), transpositions=False)
+            if distance <= radius:
+                # Never more than the Levenshtein distance, often less
+                alignment = edit_distance(word, node_word, tolerance) if distance else 0
+                if alignment <= tolerance:
+                    found.append((alignment, node_word))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    pending.append(child)
+        return found
+
+
+@dataclass(frozen=True)
+class FAQEntry:
+    """A question/answer pair."""
+    language: str
+    question: str
+    answer: str
+
+
+@dataclass(frozen=True)
+class FAQMatch:
+    """A matched FAQ entry and how similar the message was to its question."""
+    entry: FAQEntry
+    similarity: float
+
+
+class FAQIndex:
+    """Immutable fuzzy index over FAQ questions; safe to share between agents."""
+
+    def __init__(self, entries: list[FAQEntry]):
+        """
+        Build the index.
+
+        Args:
+            entries: Question/answer pairs
+        """
+        self.entries = tuple(entries)
+        self._questions = tuple(tokenize(entry.question) for entry in self.entries)
+        self._weights = tuple(sum(map(len, words)) for words in self._questions)
+
+        postings: dict[str, list[int]] = {}
+        for index, words in enumerate(self._questions):
+            for word in words:
+                postings.setdefault(word, []).append(index)
+        self._postings = {word: tuple(ids) for word, ids in postings.items()}
+        self._vocabulary = BKTree(self._postings)
+        self._token_cache: dict[str, dict[str, int]] = {}
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "FAQIndex":
+        """Load and index a per-language FAQ JSON file."""
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+
+        entries = [
+            FAQEntry(language, item["question"], item["answer"])
+            for language, items in data.items()
+            for item in items
+        ]
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _vocabulary_matches(self, token: str) -> dict[str, int]:
+        """Map vocabulary words within typo tolerance of a token to their distance."""
+        matches = self._token_cache.get(token)
+        if matches is None:
+            if token in self._postings:
+                # Exact words are the common case and need no tree walk
+                matches = {token: 0}
+            else:
+                matches = {word: distance for distance, word in self._vocabulary.search(token, typo_tolerance(token))}
+            if len(self._token_cache) >= _TOKEN_CACHE_SIZE:
+                self._token_cache.clear()
+            self._token_cache[token] = matches
+        return matches
+
+    def lookup(self, message: str, threshold: float, language: str | None = None) -> FAQMatch | None:
+        """
+        Find the FAQ entry whose question best matches a message.
+
+        Similarity is a Dice coefficient over words weighted by their length:
+        twice the length of the question words matched (allowing typos),
+        divided by the total word length of message and question.
+
+        Args:
+            message: The student's message
+            threshold: Minimum similarity in [0, 1]
+            language: Student's language; only its questions are considered.
+                      None considers every language
+
+        Returns:
+            The best match at or above the threshold, or None
+        """
+        tokens = tokenize(message)
+        if not tokens:
+            return None
+        query_weight = sum(map(len, tokens))
+
+        # Question index -> matched question word -> length weight
+        matched: dict[int, dict[str, int]] = {}
+        for token in tokens:
+            for word in self._vocabulary_matches(token):
+                for index in self._postings[word]:
+                    matched.setdefault(index, {})[word] = len(word)
+
+        best: FAQMatch | None = None
+        for index, words in matched.items():
+            if language is not None and self.entries[index].language != language:
+                continue
+            similarity = 2 * sum(words.values()) / (query_weight + self._weights[index])
+            if similarity >= threshold and (best is None or similarity > best.similarity):
+                best = FAQMatch(self.entries[index], min(similarity, 1.0))
+        return best
+
+
+@functools.lru_cache(maxsize=None)
+def load_index(path: str) -> FAQIndex:
+    """Load a FAQ file once per process; agents configured with the same file share its index."""
+    return FAQIndex.from_file(path)
+
+
+class FAQStage(Stage):
+    """Pipeline stage answering frequently asked questions, typos included."""
+
+    name = "faq"
+    cost = CostClass.CPU
+
+    def __init__(self, index: FAQIndex, threshold: float = 0.8):
+        """
+        Initialize the stage.
+
+        Args:
+            index: Prebuilt FAQ index
+            threshold: Minimum similarity for a match
+        """
+        self.index = index
+        self.threshold = threshold
+
+    def handle(self, request: AgentRequest) -> str | None:
+        """Return the answer of the best matching FAQ entry, if any."""
+        with tracer.span("faq.lookup") as span:
+            match = self.index.lookup(request.message, self.threshold, request.language)
+            if match is None:
+                return None
+            span.set_attribute("similarity", round(match.similarity, 3))
+            span.set_attribute("language", match.entry.language)
+            return match.entry.answer
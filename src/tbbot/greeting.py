@@ -2,12 +2,22 @@
 
 This module contains the greeting detection logic and agent handler
 for processing student greetings and generating appropriate responses.
+Greeting keywords and responses are loaded from a JSON table that can be
+reloaded at runtime.
 """
 
+import hashlib
+import json
 import logging
 from dataclasses import dataclass
+from pathlib import Path
 from time import time
 
+from . import context
+from .config import Config
+from .pipeline import AgentRequest, CostClass, Pipeline, Stage
+from .tracing import tracer
+
 
 @dataclass
 class Message:
@@ -23,6 +33,88 @@ class Response:
     timestamp: float
 
 
+# Bundled greeting tables, used unless GREETINGS_PATH points elsewhere
+DEFAULT_GREETINGS_PATH = Path(__file__).parent / "data" / "greetings.json"
+
+
+@dataclass(frozen=True)
+class GreetingTable:
+    """
+    Compiled, immutable greeting keywords and responses.
+    
+    Tables are never modified in place: reloading compiles a new table and
+    swaps the module-level reference, so a request that took a reference
+    sees one consistent version throughout.
+    """
+    keywords: dict[str, tuple[int, str]]  # keyword -> (priority, language)
+    responses: dict[str, str]
+    default_language: str
+    version: str
+    
+    @classmethod
+    def compile(cls, data: dict) -> "GreetingTable":
+        """
+        Compile a greeting table from its JSON form.
+        
+        Args:
+            data: Mapping with "languages" (in priority order, each with
+                  "code", "keywords" and "response") and "default_language"
+                  
+        Raises:
+            ValueError: If the table is malformed
+        """
+        try:
+            languages = data["languages"]
+            keywords: dict[str, tuple[int, str]] = {}
+            responses: dict[str, str] = {}
+            for priority, entry in enumerate(languages):
+                responses[entry["code"]] = entry["response"]
+                for keyword in entry["keywords"]:
+                    # Earlier languages win when a keyword is listed twice
+                    keywords.setdefault(keyword.lower(), (priority, entry["code"]))
+            default_language = data.get("default_language", languages[0]["code"])
+        except (KeyError, IndexError, TypeError) as exc:
+            raise ValueError(f"Malformed greeting table: {exc!r}") from exc
+        
+        if default_language not in responses:
+            raise ValueError(f"Default language {default_language!r} has no response")
+        
+        digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+        return cls(keywords, responses, default_language, digest)
+    
+    @classmethod
+    def from_file(cls, path: str | Path) -> "GreetingTable":
+        """Load and compile a greeting table from a JSON file."""
+        with open(path, encoding="utf-8") as handle:
+            return cls.compile(json.load(handle))
+    
+    def detect(self, message: str) -> str | None:
+        """Return the language of the highest-priority greeting word in a message."""
+        if not message:
+            return None
+        
+        matches = [self.keywords[word] for word in message.lower().split() if word in self.keywords]
+        return min(matches)[1] if matches else None
+    
+    def respond(self, language: str) -> str:
+        """Return the greeting response for a language, or the default language's."""
+        return self.responses.get(language, self.responses[self.default_language])
+
+
+_table = GreetingTable.from_file(Config.GREETINGS_PATH or DEFAULT_GREETINGS_PATH)
+
+
+def greeting_table() -> GreetingTable:
+    """Return the greeting table currently in use."""
+    return _table
+
+
+def set_greeting_table(table: GreetingTable) -> None:
+    """Atomically replace the greeting table used by new requests."""
+    global _table
+    _table = table
+
+
 def detect_greeting_language(message: str) -> str | None:
     """
     Detects if a message contains a greeting and returns the language.
@@ -33,30 +125,7 @@ def detect_greeting_language(message: str) -> str | None:
     Returns:
         Language code ('en', 'ca', 'eu', 'gl') if greeting detected, None otherwise
     """
-    if not message or not message.strip():
-        return None
-    
-    # Convert to lowercase for case-insensitive matching
-    message_lower = message.lower()
-    
-    # Define greetings by language with priority order
-    # Order matters: first match wins
-    greetings = [
-        (["hello", "hi", "hey"], "en"),  # English
-        (["hola"], "ca"),  # Catalan
-        (["kaixo"], "eu"),  # Basque
-        (["ola"], "gl"),  # Galician
-    ]
-    
-    # Split message into words for whole-word matching
-    words = message_lower.split()
-    
-    # Check each language's greetings in priority order
-    for keywords, language in greetings:
-        if any(keyword in words for keyword in keywords):
-            return language
-    
-    return None
+    return _table.detect(message)
 
 
 def generate_greeting_response(language: str) -> str:
@@ -69,26 +138,69 @@ def generate_greeting_response(language: str) -> str:
     Returns:
         The greeting response string in the specified language
     """
-    responses = {
-        "en": "Hi, my name is TBBot. I am here to help you with your questions",
-        "ca": "Hola, el meu nom és TBBot. Estic aquí per ajudar-te amb les teves preguntes",
-        "eu": "Kaixo, nire izena TBBot da. Hemen nago zure galderekin laguntzeko",
-        "gl": "Ola, o meu nome é TBBot. Estou aquí para axudarche coas túas preguntas",
-    }
+    return _table.respond(language)
+
+
+class GreetingStage(Stage):
+    """Pipeline stage answering greetings in the student's language."""
+    
+    name = "greeting"
+    cost = CostClass.MICRO
+    
+    def handle(self, request: AgentRequest) -> str | None:
+        """Return the greeting response, or None if the message is not a greeting."""
+        # Use one table for detection and response even if a reload swaps it meanwhile
+        table = _table
+        
+        # Detect if the message is a greeting and get the language
+        with tracer.span("greeting.detect") as span:
+            language = table.detect(request.message)
+            span.set_attribute("language", language)
+        
+        if language:
+            request.attributes["language"] = language
+            # Generate and return greeting response in detected language
+            with tracer.span("greeting.respond"):
+                return table.respond(language)
+        
+        return None
+
+
+def default_stages() -> list[Stage]:
+    """Build the pipeline stages enabled by configuration."""
+    stages: list[Stage] = [GreetingStage()]
     
-    return responses.get(language, responses["en"])
+    if Config.FAQ_PATH:
+        from .faq import FAQStage, load_index
+        stages.append(FAQStage(load_index(Config.FAQ_PATH), Config.FAQ_THRESHOLD))
+    
+    if Config.LLM_FALLBACK_ENABLED:
+        from .llm import LLMStage
+        stages.append(LLMStage.from_config())
+    
+    return stages
 
 
 class GreetingAgent:
     """
     TBBot agent that handles greeting detection and response.
+    
+    Messages run through a cost-ordered pipeline of stages; the first stage
+    that answers wins and unanswered messages get an empty response.
     """
     
-    def __init__(self):
-        """Initialize the agent with Agno framework."""
+    def __init__(self, stages: list[Stage] | None = None):
+        """
+        Initialize the agent with Agno framework.
+        
+        Args:
+            stages: Pipeline stages; defaults to the stages enabled by configuration
+        """
         try:
             # Initialize logging
             self.logger = logging.getLogger(__name__)
+            
+            self.pipeline = Pipeline(stages if stages is not None else default_stages())
             self.logger.info("GreetingAgent initialized successfully")
             
             # Agent is ready to process messages
@@ -98,23 +210,47 @@ class GreetingAgent:
             # Log initialization failure with details
             logging.error(f"GreetingAgent initialization failed: {e}")
             raise
+    
+    @property
+    def is_blocking(self) -> bool:
+        """Whether processing may block on I/O and should run off the event loop."""
+        return self.pipeline.max_cost >= CostClass.IO
+
+    @property
+    def uses_history(self) -> bool:
+        """Whether a stage sends session history to a model, so turns are worth recording."""
+        return self.pipeline.max_cost >= CostClass.MODEL
         
-    def process_message(self, message: str) -> str:
+    def process_message(
+        self,
+        message: str,
+        session_id: str | None = None,
+        tenant: str | None = None,
+        attributes: dict | None = None,
+        history: list[dict] | None = None,
+        language: str | None = None,
+    ) -> str:
         """
         Process a student message and return appropriate response.
         
         Args:
             message: The student's input message
+            session_id: Session the message belongs to, for usage accounting
+            tenant: Tenant the message belongs to, for usage accounting
+            attributes: Optional dict receiving request details: the
+                        answering "stage" and, for greetings, the "language"
+            history: Earlier chat messages sent by the client, used instead
+                     of the session's recorded history
+            language: Student's language detected earlier in the conversation
             
         Returns:
             Response string (greeting in detected language or empty)
         """
-        # Detect if the message is a greeting and get the language
-        language = detect_greeting_language(message)
-        
-        if language:
-            # Generate and return greeting response in detected language
-            return generate_greeting_response(language)
-        
-        # Return empty string for non-greeting messages
-        return ""
+        request = AgentRequest(message, session_id=session_id, tenant=tenant, history=history, language=language)
+        if attributes is not None:
+            request.attributes = attributes
+        result = self.pipeline.run(request)
+        request.attributes["stage"] = result.stage
+        if session_id and self.uses_history:
+            context.conversations.record(session_id, message, result.response, result.stage)
+        return result.response
@@ -0,0 +1,144 @@
+"""Readiness checking for TBBot.
+
+Dependency checks (agent initialized, backend reachable, queues drained
+enough, ...) are run periodically by a background task and the result is
+cached, so readiness probes are answered in O(1) and never fan out to
+dependencies themselves.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], bool | Awaitable[bool]]
+
+
+@dataclass(frozen=True)
+class ReadinessState:
+    """Result of the latest round of readiness checks."""
+    ready: bool = False
+    checks: dict[str, bool] = field(default_factory=dict)
+    checked_at: float | None = None
+
+
+class ReadinessChecker:
+    """Run registered checks in the background and cache the outcome."""
+
+    def __init__(self, interval: float = 5.0, timeout: float = 2.0):
+        """
+        Initialize the checker.
+
+        Args:
+            interval: Seconds between rounds of checks
+            timeout: Seconds each asynchronous check may take before it counts as failed
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self.state = ReadinessState()
+        self._checks: dict[str, Check] = {}
+        self._task: asyncio.Task | None = None
+
+    def register(self, name: str, check: Check) -> None:
+        """
+        Register a readiness check.
+
+        Args:
+            name: Name reported in the readiness response
+            check: Callable returning True when healthy; may be a coroutine
+                   function. Synchronous checks must be cheap.
+        """
+        self._checks[name] = check
+
+    async def _run_check(self, name: str, check: Check) -> bool:
+        try:
+            result = check()
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, self.timeout)
+            return bool(result)
+        except Exception:
+            logger.warning("Readiness check failed", exc_info=True, extra={"check": name})
+            return False
+
+    async def run_checks(self) -> ReadinessState:
+        """Run every check once, concurrently, and cache the result."""
+        names = list(self._checks)
+        results = await asyncio.gather(*(self._run_check(name, self._checks[name]) for name in names))
+        checks = dict(zip(names, results))
+
+        # Swap in a new immutable state so probes never see a partial update
+        self.state = ReadinessState(ready=all(results), checks=checks, checked_at=time.time())
+        return self.state
+
+    def set_check(self, name: str, ok: bool) -> None:
+        """Update one check's cached result now, without waiting for the next round."""
+        checks = {**self.state.checks, name: ok}
+        self.state = ReadinessState(ready=all(checks.values()), checks=checks, checked_at=time.time())
+
+    async def _loop(self) -> None:
+        while True:
+            await self.run_checks()
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """Run a first round of checks, then keep checking in the background."""
+        await self.run_checks()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def backend_check(api_base: str, api_key: str = "") -> Check:
+    """
+    Build a check that an OpenAI-compatible backend answers.
+
+    Any response below 500 counts as reachable; authentication problems are
+    not a reason to take the instance out of rotation.
+
+    Args:
+        api_base: Base URL of the backend (e.g. http://localhost:8001/v1)
+        api_key: Bearer token sent with the request
+    """
+    url = f"{api_base.rstrip('/')}/models"
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    async def check() -> bool:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(url, headers=headers)
+            return response.status_code < 500
+
+    return check
+
+
+def any_backend_check(api_bases: list[str], api_key: str = "") -> Check:
+    """
+    Build a check that at least one of several backends answers.
+
+    With routing across backends, one reachable backend is enough to serve.
+
+    Args:
+        api_bases: Base URLs of the backends
+        api_key: Bearer token sent with the requests
+    """
+    checks = [backend_check(api_base, api_key) for api_base in api_bases]
+
+    async def check() -> bool:
+        results = await asyncio.gather(*(single() for single in checks), return_exceptions=True)
+        return any(result is True for result in results)
+
+    return check
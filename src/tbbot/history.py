@@ -0,0 +1,241 @@
+"""Incremental processing of conversation history held by the client.
+
+Clients of the stateless chat endpoint send the whole conversation every
+turn instead of holding a server session. Rebuilding the model context
+from all of it each turn would make every turn cost as much as the
+conversation so far, so the state derived from a conversation prefix
+(summary of older turns, verbatim recent turns, detected language) is
+cached under a hash of that prefix:
+
+- prefix hashes are chained, ``h(k + 1) = H(h(k), message k)``, so the hash
+  of every prefix falls out of one cheap pass over the history;
+- a request resumes from the longest cached prefix and only processes the
+  messages after it;
+- after answering, the state including the new exchange is cached as well,
+  so when the client sends the history back with one new message, only
+  that message is new work.
+
+Summaries are only computed when a segment of turns is folded (see
+``context.ConversationContext.fold``), and each cached prefix carries its
+summary, so no segment is summarized twice on the common path.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+
+from . import context as session_context
+from .config import Config
+from .context import ConversationContext, Turn, extractive_summary
+from .greeting import detect_greeting_language
+
+
+# Hash of the empty conversation
+EMPTY_PREFIX = hashlib.blake2b(b"", digest_size=16).hexdigest()
+
+
+def chain(prefix_hash: str, role: str, content: str) -> str:
+    """Hash of a prefix extended by one message."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(bytes.fromhex(prefix_hash))
+    digest.update(role.encode())
+    digest.update(b"\0")
+    digest.update(content.encode())
+    return digest.hexdigest()
+
+
+def prefix_hashes(messages: list[dict]) -> list[str]:
+    """Hashes of every prefix of a conversation; element k covers the first k messages."""
+    hashes = [EMPTY_PREFIX]
+    for message in messages:
+        hashes.append(chain(hashes[-1], message["role"], message["content"]))
+    return hashes
+
+
+@dataclass(frozen=True)
+class PrefixState:
+    """State derived from a conversation prefix."""
+    summary: str = ""
+    turns: tuple[Turn, ...] = ()  # Turns not folded into the summary yet
+    pending: str | None = None  # Trailing user message without an answer yet
+    pending_greeting: bool = False
+    greeted: bool = False
+    language: str | None = None  # Language of the latest greeting
+
+    def verbatim(self) -> list[Turn]:
+        """Verbatim turns, including a trailing unanswered message."""
+        turns = list(self.turns)
+        if self.pending is not None:
+            turns.append(Turn(self.pending, "", "greeting" if self.pending_greeting else None))
+        return turns
+
+
+@dataclass
+class Prepared:
+    """History of a request, ready to send with its new message."""
+    prefix_hash: str
+    state: PrefixState
+    messages: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class HistoryStats:
+    """Prefix cache counters. Updated without locks, so approximate under threads."""
+    requests: int = 0
+    hits: int = 0  # Requests resuming from a cached prefix
+    reused_messages: int = 0
+    processed_messages: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> dict:
+        total = self.reused_messages + self.processed_messages
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.requests if self.requests else 0.0,
+            "reused_messages": self.reused_messages,
+            "processed_messages": self.processed_messages,
+            "reuse_rate": self.reused_messages / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class PrefixCache:
+    """Derived conversation state cached per prefix hash, least recently used evicted."""
+
+    def __init__(
+        self,
+        token_budget: int = 1000,
+        max_entries: int = 10_000,
+        conversations: ConversationContext | None = None,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            token_budget: Largest estimated size of the history sent with a
+                          request; 0 sends no history
+            max_entries: Prefixes cached at once
+            conversations: Compaction settings and summarizer; defaults to
+                           the process-wide conversation context
+        """
+        self.token_budget = token_budget
+        self.max_entries = max_entries
+        self.conversations = conversations
+        self.stats = HistoryStats()
+        self._states: OrderedDict[str, PrefixState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "PrefixCache":
+        """Build the cache from HISTORY_* configuration."""
+        return cls(Config.HISTORY_TOKEN_BUDGET, Config.HISTORY_CACHE_SIZE)
+
+    @property
+    def _context(self) -> ConversationContext:
+        return self.conversations or session_context.conversations
+
+    @property
+    def is_blocking(self) -> bool:
+        """Whether processing may call a summary model and should run off the event loop."""
+        return self._context.summarizer is not extractive_summary
+
+    def _get(self, prefix_hash: str) -> PrefixState | None:
+        with self._lock:
+            state = self._states.get(prefix_hash)
+            if state is not None:
+                self._states.move_to_end(prefix_hash)
+            return state
+
+    def _put(self, prefix_hash: str, state: PrefixState) -> None:
+        with self._lock:
+            self._states[prefix_hash] = state
+            self._states.move_to_end(prefix_hash)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _extend(self, state: PrefixState, role: str, content: str) -> PrefixState:
+        turns = list(state.turns)
+        if role == "user":
+            if state.pending is not None:
+                # Two user messages in a row: the first one went unanswered
+                turns.append(Turn(state.pending, "", "greeting" if state.pending_greeting else None))
+            language = detect_greeting_language(content)
+            state = replace(
+                state, pending=content, pending_greeting=language is not None,
+                language=language or state.language,
+            )
+        else:
+            user, greeting = state.pending or "", state.pending_greeting
+            state = replace(state, pending=None, pending_greeting=False)
+            # Like session history, only the first greeting exchange is kept
+            if not (greeting and state.greeted):
+                turns.append(Turn(user, content, "greeting" if greeting else None))
+            state = replace(state, greeted=state.greeted or greeting)
+
+        summary, turns = self._context.fold(state.summary, turns)
+        return replace(state, summary=summary, turns=tuple(turns))
+
+    def prepare(self, messages: list[dict]) -> Prepared:
+        """
+        Derive the model history of a conversation, resuming from the longest cached prefix.
+
+        Args:
+            messages: Earlier messages, oldest first, each with a "role"
+                      ("user" or "assistant") and "content"
+
+        Returns:
+            The prefix hash, its derived state and the history messages to send
+        """
+        hashes = prefix_hashes(messages)
+        state, start = PrefixState(), 0
+        for length in range(len(messages), 0, -1):
+            cached = self._get(hashes[length])
+            if cached is not None:
+                state, start = cached, length
+                break
+
+        for message in messages[start:]:
+            state = self._extend(state, message["role"], message["content"])
+        if start < len(messages):
+            self._put(hashes[-1], state)
+
+        self.stats.requests += 1
+        self.stats.hits += start > 0
+        self.stats.reused_messages += start
+        self.stats.processed_messages += len(messages) - start
+
+        history = []
+        if self.token_budget > 0:
+            history = self._context.fit(state.summary, state.verbatim(), self.token_budget)
+        return Prepared(hashes[-1], state, history)
+
+    def remember(self, prepared: Prepared, message: str, response: str) -> str:
+        """
+        Cache the state of a conversation extended by a new exchange.
+
+        The client's next request starts with exactly this prefix, so it
+        resumes here.
+
+        Args:
+            prepared: History the message was answered with
+            message: The new user message
+            response: The answer given to it
+
+        Returns:
+            Hash of the extended prefix
+        """
+        state = self._extend(prepared.state, "user", message)
+        state = self._extend(state, "assistant", response)
+        prefix_hash = chain(chain(prepared.prefix_hash, "user", message), "assistant", response)
+        self._put(prefix_hash, state)
+        return prefix_hash
+
+    def stats_snapshot(self) -> dict:
+        """Cache counters and the number of cached prefixes."""
+        return {**self.stats.as_dict(), "prefixes": len(self._states)}
+
+
+cache = PrefixCache.from_config()
@@ -0,0 +1,178 @@
+"""Idempotency keys for safe client retries.
+
+Clients that time out and retry would otherwise have the message answered
+twice, paying for a second model call and recording the turn twice in the
+conversation. A request carrying an ``Idempotency-Key`` header is answered
+at most once per key:
+
+- while the first request with a key is running, retries with the same key
+  wait for that computation instead of starting their own;
+- once it succeeds, its response is stored for a TTL and returned to
+  repeats as is;
+- failures are not stored, so the client can retry them.
+
+A key reused with a different request (other message or session) is
+rejected rather than answered with the wrong response. Stored responses are
+bounded in number; the oldest are evicted first.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from .config import Config
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different request."""
+
+
+def fingerprint(*parts: str | None) -> str:
+    """Digest identifying a request, to tell a retry from a reused key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update((part or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class _Stored:
+    fingerprint: str
+    value: Any
+    expires_at: float
+
+
+@dataclass
+class IdempotencyStats:
+    """Idempotency store counters. Only touched from the event loop, so exact."""
+    requests: int = 0
+    replayed: int = 0  # Answered from a stored response
+    attached: int = 0  # Waited for a request with the same key still running
+    conflicts: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "replayed": self.replayed,
+            "attached": self.attached,
+            "conflicts": self.conflicts,
+            "evictions": self.evictions,
+        }
+
+
+class IdempotencyStore:
+    """
+    Responses stored per idempotency key, and computations still running.
+
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, ttl_s: float = 3600.0, max_entries: int = 10_000):
+        """
+        Initialize an empty store.
+
+        Args:
+            ttl_s: Seconds a completed response is returned to repeats
+            max_entries: Completed responses kept at once; the oldest are
+                         evicted first
+        """
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.stats = IdempotencyStats()
+        # Insertion order is expiry order, since every entry gets the same TTL
+        self._stored: OrderedDict[str, _Stored] = OrderedDict()
+        self._running: dict[str, tuple[str, asyncio.Task]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @classmethod
+    def from_config(cls) -> "IdempotencyStore":
+        """Build the store from IDEMPOTENCY_* configuration."""
+        return cls(Config.IDEMPOTENCY_TTL_S, Config.IDEMPOTENCY_MAX_ENTRIES)
+
+    def _evict(self, now: float) -> None:
+        while self._stored:
+            key, stored = next(iter(self._stored.items()))
+            if stored.expires_at > now and len(self._stored) <= self.max_entries:
+                break
+            del self._stored[key]
+            self.stats.evictions += stored.expires_at > now
+
+    def _lookup(self, key: str, request_fingerprint: str) -> _Stored | None:
+        stored = self._stored.get(key)
+        if stored is None or stored.expires_at <= time.monotonic():
+            return None
+        if stored.fingerprint != request_fingerprint:
+            self.stats.conflicts += 1
+            raise IdempotencyConflict(key)
+        return stored
+
+    def _store(self, key: str, request_fingerprint: str, task: asyncio.Task) -> None:
+        if self._running.get(key, (None, None))[1] is task:
+            del self._running[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        self._stored.pop(key, None)
+        self._stored[key] = _Stored(request_fingerprint, task.result(), now + self.ttl_s)
+        self._evict(now)
+
+    async def run(
+        self,
+        key: str,
+        request_fingerprint: str,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> tuple[Any, bool]:
+        """
+        Compute the response for a key at most once.
+
+        Args:
+            key: Idempotency key, scoped by the caller (e.g. per tenant)
+            request_fingerprint: Digest of the request, see ``fingerprint``
+            compute: Produces the response; only called when no stored or
+                     running response exists for the key
+
+        Returns:
+            The response, and whether it was computed by an earlier request
+
+        Raises:
+            IdempotencyConflict: If the key was used for a different request
+            Exception: Whatever ``compute`` raised, also for attached retries
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Running tasks belong to one loop; stored responses carry over
+            self._loop, self._running = loop, {}
+        self.stats.requests += 1
+
+        stored = self._lookup(key, request_fingerprint)
+        if stored is not None:
+            self.stats.replayed += 1
+            return stored.value, True
+
+        running = self._running.get(key)
+        if running is not None:
+            running_fingerprint, task = running
+            if running_fingerprint != request_fingerprint:
+                self.stats.conflicts += 1
+                raise IdempotencyConflict(key)
+            self.stats.attached += 1
+            # A retry giving up must not cancel the computation others wait for
+            return await asyncio.shield(task), True
+
+        # Run as a task so that the computation finishes, and is stored, even
+        # if the request that started it goes away
+        task = loop.create_task(compute())
+        self._running[key] = (request_fingerprint, task)
+        task.add_done_callback(lambda done: self._store(key, request_fingerprint, done))
+        return await asyncio.shield(task), False
+
+    def stats_snapshot(self) -> dict:
+        return {**self.stats.as_dict(), "stored": len(self._stored), "running": len(self._running)}
+
+
+store = IdempotencyStore.from_config()
@@ -0,0 +1,209 @@
+"""Startup warm-up and graceful shutdown drain for TBBot workers.
+
+A fresh worker is slow on its first requests: modules are imported lazily,
+pydantic builds its validators on first use, caches are empty and no
+backend connection is open. Warm-up pays these costs before the worker
+reports ready, by running representative messages through every stage
+below the model tier, building the agents of configured tenants and
+opening pooled connections to model backends. No model call is made.
+
+On shutdown the worker drains. Servers such as uvicorn stop listening and
+wait for open connections before the application hears about shutdown, so
+draining starts from the SIGTERM handler instead (see ``api.lifespan``):
+
+1. stopping: readiness fails while requests are still served, for
+   PRE_STOP_DELAY_S, so the load balancer takes the worker out of rotation;
+2. draining: new requests that still arrive are refused with 503 (probes
+   excepted), and requests already running are given time to finish;
+3. the server's own shutdown then runs, with little or nothing left to wait for.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from fastapi.concurrency import run_in_threadpool
+
+from .greeting import GreetingAgent
+from .models import ChatFrame, ChatFrameReply, ChatRequest, ChatResponse
+from .pipeline import AgentRequest, CostClass
+from .registry import AgentRegistry
+
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MESSAGES = (
+    "hello",
+    "hola",
+    "kaixo",
+    "bonjour",
+    "what is an AI agent?",
+)
+
+
+@dataclass
+class WarmupReport:
+    """What warm-up did and how long it took."""
+    messages: int = 0
+    tenants: list[str] = field(default_factory=list)
+    backends: dict[str, bool] = field(default_factory=dict)  # Backend name -> answered
+    duration_s: float = 0.0
+    completed: bool = False  # False if warm-up timed out or failed part way
+
+    def as_dict(self) -> dict:
+        return {
+            "messages": self.messages,
+            "tenants": self.tenants,
+            "backends": self.backends,
+            "duration_ms": self.duration_s * 1000,
+            "completed": self.completed,
+        }
+
+
+def warm_agent(agent: GreetingAgent, messages: tuple[str, ...] = WARMUP_MESSAGES) -> int:
+    """
+    Run messages through an agent's stages below the model tier.
+
+    Stages are called directly, so pipeline statistics, usage and
+    conversation history are not affected. Request and response models are
+    validated and serialized on the way, as the endpoints do.
+
+    Args:
+        agent: Agent to warm
+        messages: Messages to run
+
+    Returns:
+        Number of messages run
+    """
+    stages = [stage for stage in agent.pipeline.stages if stage.cost < CostClass.MODEL]
+    for index, message in enumerate(messages):
+        ChatRequest.model_validate_json(ChatRequest(message=message).model_dump_json())
+        frame = ChatFrame.model_validate_json(ChatFrame(id=str(index), message=message).model_dump_json())
+        answer = ""
+        for stage in stages:
+            result = stage.handle(AgentRequest(frame.message))
+            if result is not None:
+                answer = result
+                break
+        ChatResponse(response=answer).model_dump_json()
+        ChatFrameReply(id=frame.id, response=answer).model_dump_json(exclude_none=True)
+    return len(messages)
+
+
+def model_backends(agents: list[GreetingAgent]) -> list:
+    """Distinct backends used by the agents' model stages."""
+    backends = {}
+    for agent in agents:
+        for stage in agent.pipeline.stages:
+            backend = getattr(stage, "backend", None)
+            if backend is not None:
+                backends[id(backend)] = backend
+    return list(backends.values())
+
+
+async def warm_up(
+    agent: GreetingAgent,
+    registry: AgentRegistry | None = None,
+    tenants: list[str] | None = None,
+    messages: tuple[str, ...] = WARMUP_MESSAGES,
+    report: WarmupReport | None = None,
+) -> WarmupReport:
+    """
+    Warm a worker before it reports ready.
+
+    Args:
+        agent: Default agent
+        registry: Registry building the tenants' agents
+        tenants: Tenants whose agents are built and warmed
+        messages: Messages run through each agent
+        report: Report to fill in, so callers keep partial results on timeout
+
+    Returns:
+        The filled-in report
+    """
+    report = report or WarmupReport()
+    start = time.perf_counter()
+    try:
+        agents = [agent]
+        for tenant in tenants or []:
+            if registry is None or tenant not in registry:
+                logger.warning("Unknown tenant in warm-up list", extra={"tenant": tenant})
+                continue
+            agents.append(await run_in_threadpool(registry.get, tenant))
+            report.tenants.append(tenant)
+
+        # Also starts the threadpool that blocking pipelines run on
+        for selected in agents:
+            report.messages += await run_in_threadpool(warm_agent, selected, messages)
+
+        backends = [backend for backend in model_backends(agents) if hasattr(backend, "warm")]
+        answered = await asyncio.gather(*(backend.warm() for backend in backends))
+        report.backends = {backend.name: ok for backend, ok in zip(backends, answered)}
+        report.completed = True
+    finally:
+        report.duration_s = time.perf_counter() - start
+    return report
+
+
+class InFlight:
+    """
+    Count requests in progress and refuse new ones while draining.
+
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.stopping = False  # Shutdown announced; readiness fails, requests still served
+        self.draining = False
+        self.rejected = 0
+        self.drain_s: float | None = None
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count a request as in flight for the duration of the block."""
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    @property
+    def accepting(self) -> bool:
+        """Whether the worker should receive new traffic."""
+        return not (self.stopping or self.draining)
+
+    def resume(self) -> None:
+        """Accept requests again, e.g. before the app is started anew."""
+        self.stopping = False
+        self.draining = False
+
+    async def drain(self, timeout: float, poll_interval: float = 0.05) -> bool:
+        """
+        Stop accepting requests and wait for those in flight to finish.
+
+        Args:
+            timeout: Longest wait in seconds
+            poll_interval: Seconds between checks
+
+        Returns:
+            True if every request finished in time
+        """
+        self.draining = True
+        start = time.monotonic()
+        while self.active and time.monotonic() - start < timeout:
+            await asyncio.sleep(poll_interval)
+        self.drain_s = time.monotonic() - start
+        return self.active == 0
+
+    def stats_snapshot(self) -> dict:
+        return {
+            "in_flight": self.active,
+            "stopping": self.stopping,
+            "draining": self.draining,
+            "rejected": self.rejected,
+            "drain_ms": self.drain_s * 1000 if self.drain_s is not None else None,
+        }
@@ -0,0 +1,133 @@
+"""Model-backed fallback stage for the TBBot pipeline.
+
+Messages that no cheaper stage could answer are sent to an
+OpenAI-compatible backend. This is the most expensive stage and always
+runs last.
+"""
+
+from . import context as session_context
+from . import usage
+from .backends import ChatBackend, run_sync
+from .batching import MicroBatcher, shared_batcher
+from .config import Config
+from .context import ConversationContext
+from .pipeline import AgentRequest, CostClass, Stage
+from .prompts import FewShotExample, PromptBuilder, load_examples
+from .routing import RoutedBackend, backend_from_config
+from .tracing import tracer
+from .usage import Action, UsageLedger, estimate_tokens
+
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are TBBot, a friendly tutor that helps students learn how to build AI agents. "
+    "Answer concisely and in the language the student used."
+)
+
+
+class LLMStage(Stage):
+    """Answer a message with a chat completion."""
+
+    name = "llm"
+    cost = CostClass.MODEL
+
+    def __init__(
+        self,
+        backend: ChatBackend | RoutedBackend,
+        model: str,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        ledger: UsageLedger | None = None,
+        context: str = "",
+        examples: tuple[FewShotExample, ...] = (),
+        batcher: MicroBatcher | None = None,
+        conversations: ConversationContext | None = None,
+    ):
+        """
+        Initialize the stage.
+
+        Args:
+            backend: Backend used for completions
+            model: Model name sent to the backend
+            system_prompt: System prompt prepended to every request
+            ledger: Usage ledger enforcing budgets; defaults to the process-wide one
+            context: Course context added to the system message
+            examples: Few-shot exchanges shown before the student's message
+            batcher: Micro-batcher to send completions through instead of
+                     calling the backend directly
+            conversations: Source of compacted session history; defaults to
+                           the process-wide one
+        """
+        self.backend = backend
+        self.model = model
+        self.system_prompt = system_prompt
+        self.ledger = ledger
+        self.prompt = PromptBuilder(system_prompt, context, examples)
+        self.batcher = batcher
+        self.conversations = conversations
+
+    def handle(self, request: AgentRequest) -> str | None:
+        """
+        Return the model's answer to the message.
+
+        Raises:
+            BudgetExceeded: If the request, its session or its tenant is over budget
+        """
+        ledger = self.ledger or usage.ledger
+        conversations = self.conversations or session_context.conversations
+        with tracer.span("prompt.build"):
+            history = request.history
+            if history is None:
+                history = conversations.history(request.session_id)
+            prompt = self.prompt.build(request, history)
+        messages, prompt_estimate = prompt.messages, prompt.estimated_tokens
+
+        model = self.model
+        if ledger.check(prompt_estimate, request.session_id, request.tenant) == Action.DOWNGRADE:
+            model = ledger.budgets.downgrade_model
+
+        with tracer.span("backend.complete", model=model) as span:
+            client = self.batcher or self.backend
+            completion = run_sync(client.complete, messages, model)
+            span.set_attribute("backend", completion.backend)
+
+        # Fall back to local estimates when the backend reports no usage
+        estimated = completion.prompt_tokens is None or completion.completion_tokens is None
+        ledger.record(
+            model,
+            completion.prompt_tokens if completion.prompt_tokens is not None else prompt_estimate,
+            completion.completion_tokens if completion.completion_tokens is not None else estimate_tokens(completion.text),
+            request.session_id,
+            request.tenant,
+            estimated=estimated,
+        )
+        return completion.text
+
+    @classmethod
+    def from_config(
+        cls,
+        model: str | None = None,
+        system_prompt: str | None = None,
+        context: str | None = None,
+        examples_path: str | None = None,
+    ) -> "LLMStage":
+        """
+        Build the stage from LLM_* and OPENAI_* configuration.
+
+        Args:
+            model: Model overriding LLM_MODEL
+            system_prompt: System prompt overriding LLM_SYSTEM_PROMPT
+            context: Course context overriding LLM_COURSE_CONTEXT
+            examples_path: Few-shot examples file overriding LLM_EXAMPLES_PATH
+        """
+        backend = backend_from_config(Config.LLM_BATCH_PATH or None)
+        batcher = None
+        if Config.LLM_BATCH_ENABLED:
+            batcher = shared_batcher(backend, Config.LLM_BATCH_WINDOW_MS, Config.LLM_BATCH_MAX_SIZE)
+        examples_path = examples_path or Config.LLM_EXAMPLES_PATH
+        return cls(
+            backend,
+            model or Config.LLM_MODEL,
+            system_prompt or Config.LLM_SYSTEM_PROMPT or DEFAULT_SYSTEM_PROMPT,
+            context=context or Config.LLM_COURSE_CONTEXT,
+            examples=load_examples(examples_path) if examples_path else (),
+            batcher=batcher,
+        )
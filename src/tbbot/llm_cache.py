@@ -0,0 +1,221 @@
+"""Record/replay cache for LLM calls made during scenario tests.
+
+This module stores LLM request/response pairs in a local content-addressed
+store so that scenario tests can be replayed deterministically without
+network access. Requests are keyed by a hash of the model, the normalized
+prompt and the sampling parameters that influence the reply.
+"""
+
+import functools
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+
+# Request parameters that change the reply and therefore belong in the key.
+# Credentials, endpoints and timeouts are deliberately left out so recordings
+# are portable between machines and providers.
+KEYED_PARAMS = (
+    "model",
+    "messages",
+    "tools",
+    "tool_choice",
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "response_format",
+    "reasoning_effort",
+)
+
+MODES = ("off", "record", "replay", "auto")
+
+
+class LLMCacheMiss(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for the cache."""
+    hits: int = 0
+    misses: int = 0
+
+
+def _normalize(value: Any) -> Any:
+    """Normalize a request value so cosmetic differences hash the same."""
+    if isinstance(value, str):
+        # Collapse runs of whitespace; prompt templates often differ only in
+        # indentation between library versions
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def request_key(kwargs: dict, namespace: str | None = None) -> str:
+    """
+    Compute the content address of an LLM request.
+
+    Args:
+        kwargs: Keyword arguments passed to the completion call
+        namespace: Optional namespace (e.g. SCENARIO_CACHE_KEY) mixed into the key
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    keyed = {name: _normalize(kwargs[name]) for name in KEYED_PARAMS if kwargs.get(name) is not None}
+    keyed["namespace"] = namespace
+    payload = json.dumps(keyed, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _default_response_factory(data: dict) -> Any:
+    """Rebuild a litellm ModelResponse from its recorded form."""
+    import litellm
+
+    return litellm.ModelResponse(**data)
+
+
+class LLMCache:
+    """
+    Content-addressed store of recorded LLM responses.
+
+    Modes:
+        off: calls pass straight through
+        record: every call goes to the provider and its response is stored
+        replay: only recorded responses are returned; misses raise LLMCacheMiss
+        auto: recorded responses are replayed and misses are recorded
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        mode: str = "auto",
+        namespace: str | None = None,
+        response_factory: Callable[[dict], Any] = _default_response_factory,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Root directory of the store
+            mode: One of 'off', 'record', 'replay', 'auto'
+            namespace: Optional namespace mixed into every key
+            response_factory: Builds a response object from recorded data
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode!r}. Expected one of {MODES}")
+
+        self.directory = Path(directory)
+        self.mode = mode
+        self.namespace = namespace
+        self.response_factory = response_factory
+        self.stats = CacheStats()
+        self._originals: dict[str, Callable] = {}
+
+    def path_for(self, key: str) -> Path:
+        """Return the file path holding the response for a key."""
+        return self.directory / key[:2] / f"{key}.json"
+
+    def lookup(self, key: str) -> dict | None:
+        """Return the recorded response data for a key, if any."""
+        try:
+            with open(self.path_for(key), encoding="utf-8") as handle:
+                return json.load(handle)["response"]
+        except FileNotFoundError:
+            return None
+
+    def store(self, key: str, kwargs: dict, response: Any) -> None:
+        """Record a response under a key, writing atomically."""
+        data = response.model_dump() if hasattr(response, "model_dump") else response
+        record = {
+            "request": {name: kwargs[name] for name in KEYED_PARAMS if kwargs.get(name) is not None},
+            "response": data,
+        }
+
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(record, handle, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp_path, path)
+
+    def _replay(self, kwargs: dict) -> tuple[str | None, Any]:
+        """Look up a request, returning its key and replayed response (or None)."""
+        if self.mode == "off" or kwargs.get("stream"):
+            return None, None
+
+        key = request_key(kwargs, self.namespace)
+        if self.mode != "record":
+            data = self.lookup(key)
+            if data is not None:
+                self.stats.hits += 1
+                return key, self.response_factory(data)
+
+        self.stats.misses += 1
+        if self.mode == "replay":
+            raise LLMCacheMiss(
+                f"No recorded response for {kwargs.get('model')} request {key[:12]}. "
+                "Re-run with SCENARIO_LLM_CACHE=auto and network access to record it."
+            )
+        return key, None
+
+    def wrap(self, completion: Callable) -> Callable:
+        """Wrap a synchronous completion function with the cache."""
+        @functools.wraps(completion)
+        def cached_completion(**kwargs):
+            key, response = self._replay(kwargs)
+            if response is not None:
+                return response
+
+            response = completion(**kwargs)
+            if key is not None:
+                self.store(key, kwargs, response)
+            return response
+
+        return cached_completion
+
+    def wrap_async(self, acompletion: Callable) -> Callable:
+        """Wrap an asynchronous completion function with the cache."""
+        @functools.wraps(acompletion)
+        async def cached_acompletion(**kwargs):
+            key, response = self._replay(kwargs)
+            if response is not None:
+                return response
+
+            response = await acompletion(**kwargs)
+            if key is not None:
+                self.store(key, kwargs, response)
+            return response
+
+        return cached_acompletion
+
+    def install(self) -> None:
+        """Route litellm.completion and litellm.acompletion through the cache."""
+        if self._originals or self.mode == "off":
+            return
+
+        import litellm
+
+        self._originals = {
+            "completion": litellm.completion,
+            "acompletion": litellm.acompletion,
+        }
+        litellm.completion = self.wrap(litellm.completion)
+        litellm.acompletion = self.wrap_async(litellm.acompletion)
+
+    def uninstall(self) -> None:
+        """Restore the original litellm functions."""
+        if not self._originals:
+            return
+
+        import litellm
+
+        for name, original in self._originals.items():
+            setattr(litellm, name, original)
+        self._originals = {}
@@ -0,0 +1,519 @@
+"""Load generator for TBBot servers.
+
+Answers questions like "how many requests per second can one worker serve
+at p99 < 50 ms" repeatably, in two modes:
+
+- open loop: requests arrive at a fixed rate (constant or Poisson spacing)
+  whatever the server does, and latency is measured from each request's
+  scheduled send time. A server that stalls is charged for every request
+  queued behind the stall, so percentiles are not flattered by the load
+  generator waiting (coordinated omission);
+- closed loop: a fixed number of clients each send a request, wait for the
+  answer and send the next, which measures capacity at that concurrency.
+
+Messages are drawn from a mix of greetings and course questions by
+language, taken from the bundled greeting table and FAQ. Latencies go into
+an HDR-style histogram (log-linear buckets with a fixed number of
+significant digits), so percentiles have a bounded relative error and the
+JSON reports of different runs can be compared bucket for bucket.
+
+Endpoints: ``chat`` (POST /chat), ``history`` (POST /chat/history),
+``health`` (GET /health) and ``ws`` (frames over a pool of /ws/chat
+connections).
+"""
+
+import asyncio
+import itertools
+import json
+import random
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator
+
+import httpx
+
+from .config import Config
+from .greeting import DEFAULT_GREETINGS_PATH
+from .metrics import LatencyHistogram
+
+
+ENDPOINTS = ("chat", "history", "health", "ws")
+MODES = ("open", "closed")
+REPORTED_PERCENTILES = (50.0, 90.0, 99.0, 99.9, 100.0)
+DEFAULT_FAQ_PATH = Path(__file__).parent / "data" / "faq.json"
+
+# Sends request number i and returns its status label ("200", "ok", "error", ...)
+Send = Callable[[int], Awaitable[str]]
+
+
+@dataclass
+class MessageMix:
+    """Weighted mix of greetings and questions by language."""
+    greetings: dict[str, list[str]]  # Language -> greeting messages
+    questions: dict[str, list[str]]  # Language -> other messages
+    weights: dict[str, float]  # Language -> relative share of traffic
+    greeting_ratio: float = 0.3
+    rng: random.Random = field(default_factory=random.Random)
+
+    @classmethod
+    def bundled(
+        cls,
+        greeting_ratio: float = 0.3,
+        weights: dict[str, float] | None = None,
+        seed: int | None = None,
+    ) -> "MessageMix":
+        """
+        Build a mix from the configured greeting table and the bundled FAQ questions.
+
+        Args:
+            greeting_ratio: Share of messages that are greetings
+            weights: Relative traffic per language; defaults to every
+                     bundled language equally
+            seed: Random seed for a reproducible sequence of messages
+        """
+        table = json.loads(Path(Config.GREETINGS_PATH or DEFAULT_GREETINGS_PATH).read_text(encoding="utf-8"))
+        greetings: dict[str, list[str]] = {}
+        for entry in table["languages"]:
+            greetings[entry["code"]] = [
+                text for keyword in entry["keywords"] for text in (keyword, f"{keyword} tbbot")
+            ]
+        faq = json.loads(DEFAULT_FAQ_PATH.read_text(encoding="utf-8"))
+        questions = {language: [entry["question"] for entry in entries] for language, entries in faq.items()}
+
+        weights = weights or {language: 1.0 for language in greetings}
+        unknown = set(weights) - set(greetings)
+        if unknown:
+            raise ValueError(f"No bundled messages for languages: {', '.join(sorted(unknown))}")
+        return cls(greetings, questions, weights, greeting_ratio, random.Random(seed))
+
+    def sample(self) -> tuple[str, str, bool]:
+        """Draw a message; returns the message, its language and whether it is a greeting."""
+        language = self.rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        questions = self.questions.get(language)
+        greeting = not questions or self.rng.random() < self.greeting_ratio
+        pool = self.greetings[language] if greeting else questions
+        return self.rng.choice(pool), language, greeting
+
+
+def parse_weights(spec: str | None) -> dict[str, float] | None:
+    """Parse "en=2,ca=1" into relative weights; None or empty gives None."""
+    if not spec:
+        return None
+    weights = {}
+    for item in spec.split(","):
+        language, _, weight = item.partition("=")
+        weights[language.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+@dataclass
+class LoadReport:
+    """Outcome of a load run; latencies exclude the warm-up period."""
+    endpoint: str
+    mode: str
+    duration_s: float
+    histogram: LatencyHistogram
+    statuses: Counter = field(default_factory=Counter)
+    dropped: int = 0  # Open loop: arrivals not sent because max_in_flight were outstanding (also errors)
+    target_rate: float | None = None
+    concurrency: int | None = None
+
+    @property
+    def requests(self) -> int:
+        return self.histogram.total
+
+    @property
+    def errors(self) -> int:
+        return sum(count for status, count in self.statuses.items() if status not in ("200", "ok"))
+
+    @property
+    def throughput(self) -> float:
+        """Completed requests per second."""
+        return self.requests / self.duration_s if self.duration_s else 0.0
+
+    def percentiles_ms(self) -> dict[str, float]:
+        return {
+            f"p{percentile:g}": self.histogram.value_at_percentile(percentile) * 1000
+            for percentile in REPORTED_PERCENTILES
+        }
+
+    def as_dict(self) -> dict:
+        """JSON-serializable form, loadable with ``from_dict``."""
+        return {
+            "endpoint": self.endpoint,
+            "mode": self.mode,
+            "target_rate": self.target_rate,
+            "concurrency": self.concurrency,
+            "duration_s": self.duration_s,
+            "requests": self.requests,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "throughput": self.throughput,
+            "mean_ms": self.histogram.mean * 1000,
+            "latency_ms": self.percentiles_ms(),
+            "statuses": dict(self.statuses),
+            "histogram": self.histogram.as_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoadReport":
+        return cls(
+            endpoint=data["endpoint"],
+            mode=data["mode"],
+            duration_s=data["duration_s"],
+            histogram=LatencyHistogram.from_dict(data["histogram"]),
+            statuses=Counter(data["statuses"]),
+            dropped=data["dropped"],
+            target_rate=data["target_rate"],
+            concurrency=data["concurrency"],
+        )
+
+    def format(self) -> str:
+        """Human-readable summary."""
+        load = f"{self.target_rate:g} req/s offered" if self.mode == "open" else f"{self.concurrency} clients"
+        lines = [
+            f"{self.endpoint} {self.mode} loop, {load}, {self.duration_s:g}s",
+            f"  requests   {self.requests} ({self.throughput:,.1f}/s), {self.errors} errors ({self.dropped} dropped)",
+            f"  mean       {self.histogram.mean * 1000:.2f} ms",
+        ]
+        lines += [f"  {name:<10} {value:.2f} ms" for name, value in self.percentiles_ms().items()]
+        if self.errors:
+            lines.append("  statuses   " + ", ".join(f"{status}: {count}" for status, count in sorted(self.statuses.items())))
+        return "\n".join(lines)
+
+
+def compare(baseline: LoadReport, current: LoadReport) -> str:
+    """Side-by-side table of two reports with relative changes."""
+    rows = [("throughput /s", baseline.throughput, current.throughput), ("errors", baseline.errors, current.errors)]
+    rows += [("mean ms", baseline.histogram.mean * 1000, current.histogram.mean * 1000)]
+    before, after = baseline.percentiles_ms(), current.percentiles_ms()
+    rows += [(f"{name} ms", before[name], after[name]) for name in before]
+
+    lines = [f"{'':<14}{'baseline':>12}{'current':>12}{'change':>10}"]
+    for name, old, new in rows:
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        lines.append(f"{name:<14}{old:>12.2f}{new:>12.2f}{change:>10}")
+    return "\n".join(lines)
+
+
+async def run_open(
+    send: Send,
+    rate: float,
+    duration_s: float,
+    warmup_s: float = 0.0,
+    max_in_flight: int = 1000,
+    poisson: bool = False,
+    rng: random.Random | None = None,
+) -> tuple[LatencyHistogram, Counter, int]:
+    """
+    Send requests at a fixed arrival rate, whatever the response times.
+
+    Latency is measured from the time each request was scheduled, not from
+    when it could actually be sent. Arrivals dropped because max_in_flight
+    requests are outstanding are counted as errors with status "dropped",
+    so shedding load does not make the server look better.
+
+    Args:
+        send: Sends request number i and returns its status label
+        rate: Arrivals per second
+        duration_s: Measured period after the warm-up
+        warmup_s: Initial period whose requests are sent but not recorded
+        max_in_flight: Outstanding requests beyond which arrivals are dropped
+        poisson: Exponentially distributed gaps instead of constant ones
+        rng: Random source for Poisson arrivals
+
+    Returns:
+        Latency histogram, status counts and number of dropped arrivals
+    """
+    loop = asyncio.get_running_loop()
+    rng = rng or random.Random()
+    histogram, statuses = LatencyHistogram(), Counter()
+    dropped = 0
+    tasks: set[asyncio.Task] = set()
+    start = loop.time()
+    end = warmup_s + duration_s
+
+    async def one(number: int, offset: float) -> None:
+        status = await send(number)
+        if offset >= warmup_s:
+            histogram.record(loop.time() - (start + offset))
+            statuses[status] += 1
+
+    # Arrival times as offsets from the start; constant ones are computed, not
+    # accumulated, so a run sends exactly rate * duration requests
+    offset = 0.0
+    for number in itertools.count():
+        if offset >= end:
+            break
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_in_flight:
+            if offset >= warmup_s:
+                dropped += 1
+                statuses["dropped"] += 1
+        else:
+            task = asyncio.create_task(one(number, offset))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        offset = offset + rng.expovariate(rate) if poisson else (number + 1) / rate
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return histogram, statuses, dropped
+
+
+async def run_closed(
+    send: Send,
+    concurrency: int,
+    duration_s: float,
+    warmup_s: float = 0.0,
+    think_time_s: float = 0.0,
+) -> tuple[LatencyHistogram, Counter]:
+    """
+    Run clients that each send a request, wait for the answer and repeat.
+
+    Args:
+        send: Sends request number i and returns its status label
+        concurrency: Number of clients
+        duration_s: Measured period after the warm-up
+        warmup_s: Initial period whose requests are sent but not recorded
+        think_time_s: Pause of each client between requests
+
+    Returns:
+        Latency histogram and status counts
+    """
+    loop = asyncio.get_running_loop()
+    histogram, statuses = LatencyHistogram(), Counter()
+    numbers = itertools.count()
+    start = loop.time()
+    measure_from, end = start + warmup_s, start + warmup_s + duration_s
+
+    async def client() -> None:
+        while loop.time() < end:
+            sent = loop.time()
+            status = await send(next(numbers))
+            if sent >= measure_from:
+                histogram.record(loop.time() - sent)
+                statuses[status] += 1
+            if think_time_s:
+                await asyncio.sleep(think_time_s)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return histogram, statuses
+
+
+def http_sender(client: httpx.AsyncClient, endpoint: str, mix: MessageMix) -> Send:
+    """Build a sender for an HTTP endpoint of a TBBot server."""
+    async def send(number: int) -> str:
+        try:
+            if endpoint == "health":
+                response = await client.get("/health")
+            else:
+                message = mix.sample()[0]
+                if endpoint == "chat":
+                    response = await client.post("/chat", json={"message": message})
+                else:
+                    payload = {"messages": [{"role": "user", "content": message}]}
+                    response = await client.post("/chat/history", json=payload)
+        except httpx.HTTPError as exc:
+            return type(exc).__name__
+        return str(response.status_code)
+
+    return send
+
+
+class WebSocketPool:
+    """Persistent /ws/chat connections, each carrying one frame at a time."""
+
+    def __init__(self, url: str, size: int, timeout_s: float = 30.0):
+        """
+        Initialize the pool; connections are opened by ``open``.
+
+        A connection that fails is replaced by a new one. If it cannot be
+        replaced the pool shrinks, and once it is empty frames fail at once
+        with status "no_connection" instead of waiting forever.
+
+        Args:
+            url: Server root URL (http:// or https://)
+            size: Number of connections
+            timeout_s: Time to wait for a reply before the frame counts as failed
+        """
+        self.url = url.replace("http", "ws", 1).rstrip("/") + "/ws/chat"
+        self.size = size
+        self.timeout_s = timeout_s
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._connections: list = []
+
+    async def _connect(self):
+        # Imported here; only this endpoint needs a WebSocket client
+        from websockets.asyncio.client import connect
+
+        connection = await connect(self.url)
+        self._connections.append(connection)
+        return connection
+
+    async def open(self) -> None:
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._connect())
+
+    async def _replace(self, connection):
+        # Drop a connection that failed; returns its replacement, or None
+        self._connections.remove(connection)
+        try:
+            await connection.close()
+        except Exception:
+            pass
+        try:
+            return await self._connect()
+        except Exception:
+            if not self._connections:
+                # Wake the senders waiting for a connection: none will come
+                self._idle.put_nowait(None)
+            return None
+
+    async def close(self) -> None:
+        for connection in self._connections:
+            await connection.close()
+        self._connections.clear()
+
+    def sender(self, mix: MessageMix) -> Send:
+        """Build a sender writing one frame on the next idle connection."""
+        async def send(number: int) -> str:
+            connection = await self._idle.get()
+            if connection is None:
+                # The pool is empty; pass the news on to the next sender
+                self._idle.put_nowait(None)
+                return "no_connection"
+            try:
+                await connection.send(json.dumps({"id": str(number), "message": mix.sample()[0]}))
+                reply = json.loads(await asyncio.wait_for(connection.recv(), self.timeout_s))
+            except Exception as exc:
+                # The connection may be unusable, e.g. a reply is still due
+                connection = await self._replace(connection)
+                return type(exc).__name__
+            finally:
+                if connection is not None:
+                    self._idle.put_nowait(connection)
+            return "error" if "error" in reply else "ok"
+
+        return send
+
+
+async def run_load(
+    url: str,
+    endpoint: str = "chat",
+    mode: str = "open",
+    rate: float = 50.0,
+    concurrency: int = 10,
+    duration_s: float = 10.0,
+    warmup_s: float = 1.0,
+    mix: MessageMix | None = None,
+    max_in_flight: int = 1000,
+    poisson: bool = False,
+    timeout_s: float = 30.0,
+    seed: int | None = None,
+) -> LoadReport:
+    """
+    Drive a TBBot server and report latency and throughput.
+
+    Args:
+        url: Server root URL, e.g. http://127.0.0.1:8000
+        endpoint: One of ENDPOINTS
+        mode: "open" (fixed arrival rate) or "closed" (fixed concurrency)
+        rate: Open loop: arrivals per second
+        concurrency: Closed loop: number of clients; for "ws" also the
+                     number of connections in either mode
+        duration_s: Measured period
+        warmup_s: Unrecorded period before it
+        mix: Messages to send; defaults to the bundled mix
+        max_in_flight: Open loop: outstanding requests beyond which arrivals are dropped
+        poisson: Open loop: Poisson instead of evenly spaced arrivals
+        timeout_s: Per-request timeout
+        seed: Random seed for messages and arrivals
+
+    Returns:
+        The run's report
+    """
+    if endpoint not in ENDPOINTS:
+        raise ValueError(f"Unknown endpoint {endpoint!r}; expected one of {', '.join(ENDPOINTS)}")
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+    mix = mix or MessageMix.bundled(seed=seed)
+
+    pool = None
+    limits = httpx.Limits(max_connections=max_in_flight if mode == "open" else concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout_s, limits=limits) as client:
+        if endpoint == "ws":
+            pool = WebSocketPool(url, concurrency, timeout_s)
+            await pool.open()
+            send = pool.sender(mix)
+        else:
+            send = http_sender(client, endpoint, mix)
+
+        try:
+            if mode == "open":
+                histogram, statuses, dropped = await run_open(
+                    send, rate, duration_s, warmup_s, max_in_flight, poisson, random.Random(seed)
+                )
+            else:
+                histogram, statuses = await run_closed(send, concurrency, duration_s, warmup_s)
+                dropped = 0
+        finally:
+            if pool is not None:
+                await pool.close()
+
+    return LoadReport(
+        endpoint=endpoint,
+        mode=mode,
+        duration_s=duration_s,
+        histogram=histogram,
+        statuses=statuses,
+        dropped=dropped,
+        target_rate=rate if mode == "open" else None,
+        concurrency=concurrency if mode == "closed" or endpoint == "ws" else None,
+    )
+
+
+@contextmanager
+def local_server(stub_latency_ms: float = 50.0) -> Iterator[str]:
+    """
+    Serve TBBot on a free local port, answering non-greetings through the LLM stand-in.
+
+    The default agent is rebuilt with the model fallback pointed at a
+    stand-in server started for the occasion; the configuration and agent
+    are restored on exit.
+
+    Yields:
+        Root URL of the TBBot server
+    """
+    from . import api
+    from .greeting import GreetingAgent
+    from .stub_llm import AppServer, LatencyProfile, StubServer
+
+    settings = {"OPENAI_API_BASES": "", "LLM_FALLBACK_ENABLED": True}
+    previous = {name: getattr(Config, name) for name in ("OPENAI_API_BASE", *settings)}
+    previous_agent = api.agent
+    with StubServer(LatencyProfile(latency_ms=stub_latency_ms)) as stub:
+        try:
+            for name, value in {"OPENAI_API_BASE": stub.base_url, **settings}.items():
+                setattr(Config, name, value)
+            api.agent = GreetingAgent()
+            with AppServer(api.app, name="tbbot") as server:
+                yield server.url
+        finally:
+            for name, value in previous.items():
+                setattr(Config, name, value)
+            api.agent = previous_agent
+
+
+def write_report(report: LoadReport, path: str | Path) -> None:
+    """Write a report as JSON, for later comparison."""
+    Path(path).write_text(json.dumps(report.as_dict(), indent=2), encoding="utf-8")
+
+
+def read_report(path: str | Path) -> LoadReport:
+    """Read a report written by ``write_report``."""
+    return LoadReport.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
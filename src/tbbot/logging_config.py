@@ -0,0 +1,269 @@
+"""Non-blocking structured logging for TBBot.
+
+Log records produced on the request path are only stamped with the current
+request id and handed to a bounded queue; a background thread formats them
+as JSON lines and writes them in batches. Repeated errors with the same
+signature are rate-limited so an error storm cannot saturate log I/O.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import TextIO
+
+from .config import Config
+
+
+# Request id of the request currently being handled, set by RequestIdMiddleware
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Render a record, including `extra` fields, as a JSON line."""
+        entry = {
+            "timestamp": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exc_type"] = record.exc_info[0].__name__ if record.exc_info[0] else None
+            entry["exc_text"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            entry["exc_text"] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SignatureRateLimiter(logging.Filter):
+    """
+    Rate-limit records per error signature with a token bucket.
+
+    The signature is the logger, level, call site and exception type, so one
+    failing code path cannot drown out others. Each signature may emit
+    `burst` records at once and then `rate` records per second; the number of
+    suppressed records is attached to the next record that gets through.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 10, max_signatures: int = 1024):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Records per second allowed per signature once the burst is spent
+            burst: Records allowed per signature in a burst
+            max_signatures: Number of signatures tracked before the oldest is forgotten
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_signatures = max_signatures
+        self._buckets: OrderedDict[tuple, list] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Return True if the record may be emitted."""
+        # Only warnings and above are sampled; they are what storms are made of
+        if record.levelno < logging.WARNING:
+            return True
+
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        signature = (record.name, record.levelno, record.pathname, record.lineno, exc_type)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(signature)
+            if bucket is None:
+                # [tokens, last refill time, suppressed count]
+                bucket = [float(self.burst), now, 0]
+                self._buckets[signature] = bucket
+                if len(self._buckets) > self.max_signatures:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(signature)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+            return True
+
+
+class QueueingHandler(logging.Handler):
+    """
+    Hand records to a bounded queue without ever blocking the caller.
+
+    Only the cheap work happens here: the message is interpolated and the
+    request id captured from the caller's context. Exception formatting and
+    serialization are left to the background writer. When the queue is full
+    the record is dropped and counted instead of waiting.
+    """
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__()
+        self.queue = record_queue
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Enqueue a record for the background writer."""
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if getattr(record, "request_id", None) is None:
+                record.request_id = request_id_var.get()
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class BatchWriter:
+    """Background thread that formats queued records and writes them in batches."""
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        record_queue: queue.Queue,
+        stream: TextIO,
+        formatter: logging.Formatter,
+        batch_size: int = 256,
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            record_queue: Queue filled by QueueingHandler
+            stream: Destination stream
+            formatter: Formatter applied on the background thread
+            batch_size: Maximum records written per flush
+        """
+        self.queue = record_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        self._thread = threading.Thread(target=self._run, name="tbbot-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flush outstanding records and stop the writer thread."""
+        if self._thread is None:
+            return
+        # Blocking put is fine here: this runs at shutdown, off the request path
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = any(item is self._STOP for item in batch)
+            self._write([item for item in batch if item is not self._STOP])
+            if stopping:
+                return
+
+    def _write(self, records: list[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                lines.append(json.dumps({"level": "ERROR", "message": "Unformattable log record"}))
+
+        if lines:
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except Exception:
+                # Logging must never take the service down
+                pass
+
+
+_pipeline: tuple[logging.Logger, QueueingHandler, BatchWriter] | None = None
+
+
+def configure_logging(stream: TextIO | None = None) -> QueueingHandler | None:
+    """
+    Install the non-blocking JSON logging pipeline on the tbbot package logger.
+
+    Calling it again is a no-op while a pipeline is installed. Does nothing
+    when LOG_PIPELINE is disabled, leaving the host's logging setup alone.
+
+    Args:
+        stream: Destination stream (defaults to stderr)
+
+    Returns:
+        The installed queueing handler, or None if the pipeline is disabled
+    """
+    global _pipeline
+
+    if not Config.LOG_PIPELINE:
+        return None
+    if _pipeline is not None:
+        return _pipeline[1]
+
+    record_queue: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    handler = QueueingHandler(record_queue)
+    handler.addFilter(SignatureRateLimiter(rate=Config.LOG_RATE_LIMIT_PER_S, burst=Config.LOG_RATE_LIMIT_BURST))
+
+    writer = BatchWriter(record_queue, stream or sys.stderr, JsonFormatter())
+    writer.start()
+
+    # The package logger, i.e. "tbbot" (or "src.tbbot" when imported that way)
+    package_logger = logging.getLogger(__name__.rpartition(".")[0])
+    package_logger.addHandler(handler)
+    package_logger.setLevel(Config.LOG_LEVEL)
+    package_logger.propagate = False
+
+    _pipeline = (package_logger, handler, writer)
+    atexit.register(shutdown_logging)
+    return handler
+
+
+def shutdown_logging() -> None:
+    """Remove the pipeline and flush any queued records."""
+    global _pipeline
+
+    if _pipeline is None:
+        return
+
+    package_logger, handler, writer = _pipeline
+    package_logger.removeHandler(handler)
+    package_logger.propagate = True
+    writer.stop()
+    _pipeline = None
@@ -0,0 +1,162 @@
+"""Event-loop lag monitor.
+
+A blocking call inside an ``async def`` handler stalls every request on the
+worker, and shows up only as unexplained latency spikes. The monitor makes
+stalls visible:
+
+- a ticker task sleeps for a fixed interval and records how late it wakes
+  up; the lateness is the event loop's lag, kept in a latency histogram;
+- a watchdog thread checks the ticker's heartbeat. When the loop has not
+  come back for longer than the stall threshold, the loop is still inside
+  the blocking call, so the watchdog captures the loop thread's stack and
+  logs it with the request id of the task that was running.
+
+The ticker costs one wake-up per interval and the watchdog a few per
+threshold; stacks are only captured during stalls, so the monitor can stay
+on in production.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from .config import Config
+from .logging_config import request_id_var
+from .metrics import LatencyHistogram
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Measure event-loop lag and capture the stack of calls that stall it."""
+
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.1, stack_limit: int = 30):
+        """
+        Initialize the monitor; it runs between ``start`` and ``stop``.
+
+        Args:
+            interval: Seconds between lag measurements
+            stall_threshold: Seconds without a heartbeat after which the
+                             loop counts as stalled and its stack is captured
+            stack_limit: Innermost frames kept from a captured stack
+        """
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stack_limit = stack_limit
+        self.histogram = LatencyHistogram()
+        self.stalls = 0
+        self.last_stall: dict | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._ticker: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._beat = 0.0
+        self._reported_beat: float | None = None
+
+    @classmethod
+    def from_config(cls) -> "LoopMonitor | None":
+        """Build the monitor from LOOP_MONITOR_* configuration; None when disabled."""
+        if not Config.LOOP_MONITOR_ENABLED:
+            return None
+        return cls(Config.LOOP_MONITOR_INTERVAL_MS / 1000, Config.LOOP_STALL_THRESHOLD_MS / 1000)
+
+    @property
+    def running(self) -> bool:
+        return self._ticker is not None and not self._ticker.done()
+
+    async def start(self) -> None:
+        """Start monitoring the running event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._ticker = asyncio.create_task(self._tick(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stop the ticker and the watchdog."""
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _tick(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._beat = time.monotonic()
+            self.histogram.record(lag)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                if self.last_stall is not None and self.last_stall["lag_ms"] is None:
+                    # The watchdog saw this stall while it lasted; complete its record
+                    self.last_stall["lag_ms"] = lag * 1000
+
+    def _watch(self) -> None:
+        poll = min(self.interval, self.stall_threshold) / 2
+        while not self._stopped.wait(poll):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked >= self.stall_threshold and beat != self._reported_beat:
+                self._reported_beat = beat
+                self._capture(blocked)
+
+    def _capture(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=self.stack_limit)
+        task = asyncio.current_task(self._loop)
+        request_id = None
+        if task is not None:
+            request_id = task.get_context().get(request_id_var)
+
+        self.last_stall = {
+            "time": time.time(),
+            "blocked_ms": blocked * 1000,
+            "lag_ms": None,  # Filled in once the loop comes back
+            "request_id": request_id,
+            "task": task.get_name() if task is not None else None,
+            "location": stack[-1].strip().splitlines()[0] if stack else None,
+        }
+        logger.warning(
+            "Event loop blocked",
+            extra={
+                "request_id": request_id,
+                "blocked_ms": round(blocked * 1000, 1),
+                "task": self.last_stall["task"],
+                "stack": "".join(stack),
+            },
+        )
+
+    def stats_snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "samples": self.histogram.total,
+            "mean_lag_ms": self.histogram.mean * 1000,
+            "lag_ms": {
+                f"p{percentile:g}": self.histogram.value_at_percentile(percentile) * 1000
+                for percentile in (50, 99, 99.9, 100)
+            },
+            "stalls": self.stalls,
+            "last_stall": self.last_stall,
+        }
@@ -0,0 +1,165 @@
+"""Memory diagnostics for long-running TBBot workers.
+
+When a worker grows in RSS over hours, tracemalloc snapshots show which
+source lines hold the memory: caches, log buffers, request state that is
+never released. Snapshots are taken on demand through an admin endpoint,
+kept in a small ring, and diffed against each other to show what grew.
+
+Tracing slows allocations down and costs memory of its own, so it only
+runs when MEMORY_DIAGNOSTICS_ENABLED is set; otherwise nothing here is
+started and only the process RSS is reported.
+"""
+
+import itertools
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+
+from .config import Config
+
+
+# Allocations made by the import machinery and by tracemalloc itself are noise
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+GROUP_BY = ("lineno", "filename", "traceback")
+
+
+def rss_bytes() -> int | None:
+    """
+    Resident set size of this process.
+
+    Returns:
+        Current RSS on Linux, peak RSS on other Unix systems, None elsewhere
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (AttributeError, OSError):
+        return None
+    # Reported in bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _site(stat: tracemalloc.Statistic | tracemalloc.StatisticDiff) -> dict:
+    site = {
+        "location": " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback),
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        site.update(size_diff_bytes=stat.size_diff, count_diff=stat.count_diff)
+    return site
+
+
+class MemoryDiagnostics:
+    """tracemalloc snapshots taken on demand, the latest few kept for diffs."""
+
+    def __init__(self, frames: int = 1, max_snapshots: int = 10):
+        """
+        Initialize diagnostics; tracing starts with ``start``.
+
+        Args:
+            frames: Stack frames stored per allocation; more frames show the
+                    callers of an allocation site but cost more memory
+            max_snapshots: Snapshots kept for diffing, oldest dropped first
+        """
+        self.frames = frames
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict[int, tracemalloc.Snapshot] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "MemoryDiagnostics | None":
+        """Start diagnostics from MEMORY_* configuration; None when disabled."""
+        if not Config.MEMORY_DIAGNOSTICS_ENABLED:
+            return None
+        diagnostics = cls(Config.MEMORY_TRACE_FRAMES, Config.MEMORY_MAX_SNAPSHOTS)
+        diagnostics.start()
+        return diagnostics
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """Start tracing allocations; allocations made before are not seen."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self) -> None:
+        """Stop tracing and drop the kept snapshots."""
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def snapshot(self, limit: int = 20, group_by: str = "lineno", diff_from: int | None = None) -> dict:
+        """
+        Take a snapshot and report the largest allocation sites.
+
+        Blocks while the snapshot is taken and compared, which can take a
+        while in a large process; call it off the event loop.
+
+        Args:
+            limit: Allocation sites listed
+            group_by: "lineno", "filename" or "traceback"
+            diff_from: Snapshot id to diff against; defaults to the previous
+                       snapshot, if one is kept
+
+        Returns:
+            The snapshot id, traced and resident memory, the top allocation
+            sites and, when there is an earlier snapshot, the sites that
+            grew or shrank the most since it
+
+        Raises:
+            ValueError: If group_by is unknown or diff_from is not kept
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        self.start()
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        traced, peak = tracemalloc.get_traced_memory()
+
+        with self._lock:
+            if diff_from is None and self._snapshots:
+                diff_from = next(reversed(self._snapshots))
+            if diff_from is not None and diff_from not in self._snapshots:
+                raise ValueError(f"Snapshot {diff_from} is not kept")
+            previous = self._snapshots.get(diff_from) if diff_from is not None else None
+            snapshot_id = next(self._ids)
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+        report = {
+            "id": snapshot_id,
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+            "rss_bytes": rss_bytes(),
+            "top": [_site(stat) for stat in snapshot.statistics(group_by)[:limit]],
+            "diff_from": diff_from,
+            "diff": [],
+        }
+        if previous is not None:
+            report["diff"] = [_site(stat) for stat in snapshot.compare_to(previous, group_by)[:limit]]
+        return report
+
+    def stats_snapshot(self) -> dict:
+        traced, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+            "snapshots": list(self._snapshots),
+        }
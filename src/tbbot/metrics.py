@@ -0,0 +1,138 @@
+"""In-process metrics registry for TBBot.
+
+Components register a provider returning a JSON-serializable snapshot of
+their counters; the /metrics endpoint collects all providers on demand, so
+nothing is aggregated on the request path.
+"""
+
+import math
+from typing import Callable
+
+
+_providers: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    """
+    Register a metrics provider.
+
+    Args:
+        name: Section name in the metrics snapshot
+        provider: Callable returning the section's current values
+    """
+    _providers[name] = provider
+
+
+def unregister(name: str) -> None:
+    """Remove a metrics provider if registered."""
+    _providers.pop(name, None)
+
+
+def snapshot() -> dict:
+    """Collect the current values of every registered provider."""
+    return {name: provider() for name, provider in _providers.items()}
+
+
+class LatencyHistogram:
+    """
+    Latency histogram with bounded relative error, after HdrHistogram.
+
+    Values are recorded in microseconds. Each power of two is split into the
+    same number of linear sub-buckets, enough that any value is reported
+    within ``10**-significant_digits`` of what was recorded.
+    """
+
+    def __init__(self, significant_digits: int = 3):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            significant_digits: Decimal digits of precision kept (1-5)
+        """
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.significant_digits = significant_digits
+        self._sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self._half_count = 1 << (self._sub_bucket_bits - 1)
+        self.counts: dict[int, int] = {}
+        self.total = 0
+        self.max_us = 0
+        self.min_us: int | None = None
+        self._sum_us = 0
+
+    def _index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self._sub_bucket_bits)
+        return shift * self._half_count + (value >> shift)
+
+    def _highest_equivalent(self, index: int) -> int:
+        # Largest value recorded into the bucket at this index
+        if index < 2 * self._half_count:
+            return index
+        shift = index // self._half_count - 1
+        sub_bucket = index - shift * self._half_count
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds: float, count: int = 1) -> None:
+        """Record a latency in seconds, ``count`` times."""
+        value = max(0, round(seconds * 1e6))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self._sum_us += value * count
+        self.max_us = max(self.max_us, value)
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add the recordings of a histogram with the same precision."""
+        if other.significant_digits != self.significant_digits:
+            raise ValueError("Cannot merge histograms of different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self._sum_us += other._sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def value_at_percentile(self, percentile: float) -> float:
+        """
+        Latency in seconds below which the given percentage of recordings fall.
+
+        Args:
+            percentile: Percentage between 0 and 100
+        """
+        if not self.total:
+            return 0.0
+        rank = max(1, math.ceil(percentile * self.total / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    @property
+    def mean(self) -> float:
+        """Mean latency in seconds."""
+        return self._sum_us / self.total / 1e6 if self.total else 0.0
+
+    def as_dict(self) -> dict:
+        """JSON-serializable form, loadable with ``from_dict``."""
+        return {
+            "significant_digits": self.significant_digits,
+            "total": self.total,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+            "sum_us": self._sum_us,
+            "counts": {str(index): count for index, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        histogram = cls(data["significant_digits"])
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.total = data["total"]
+        histogram.min_us = data["min_us"]
+        histogram.max_us = data["max_us"]
+        histogram._sum_us = data["sum_us"]
+        return histogram
@@ -0,0 +1,161 @@
+"""ASGI middleware for TBBot.
+
+Middleware here is written against the raw ASGI interface rather than
+Starlette's BaseHTTPMiddleware, which adds a task and a memory stream to
+every request.
+"""
+
+import json
+import re
+import uuid
+
+from .lifecycle import InFlight
+from .logging_config import request_id_var
+from .tracing import new_trace_id, tracer
+
+
+REQUEST_ID_HEADER = b"x-request-id"
+TRACE_ID_HEADER = b"x-trace-id"
+TRACEPARENT_HEADER = b"traceparent"
+
+# W3C trace context: version-traceid-parentid-flags
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class RequestIdMiddleware:
+    """
+    Assign every HTTP request an id and expose it to logging.
+
+    A client-supplied X-Request-ID header is reused; otherwise a new id is
+    generated. The id is stored in `request_id_var` for the duration of the
+    request and echoed in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                # Bound the length so clients cannot inflate every log line
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class TracingMiddleware:
+    """
+    Open a trace for every HTTP request.
+
+    The trace id comes from a W3C ``traceparent`` header (whose sampled flag
+    is honoured), else from ``X-Trace-Id``, else is generated. Requests
+    without an upstream decision are sampled at TRACE_SAMPLE_RATE. The trace
+    id is always returned in the X-Trace-Id response header so clients can
+    quote it, whether or not spans were recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = parent_id = sampled = None
+        for name, value in scope["headers"]:
+            if name == TRACEPARENT_HEADER:
+                match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+                if match:
+                    trace_id, parent_id = match.group(1), match.group(2)
+                    sampled = bool(int(match.group(3), 16) & 1)
+                    break
+            elif name == TRACE_ID_HEADER and trace_id is None:
+                candidate = value.decode("latin-1").strip().lower()
+                if _TRACE_ID.match(candidate):
+                    trace_id = candidate
+
+        if trace_id is None:
+            trace_id = new_trace_id()
+        if sampled is None:
+            sampled = tracer.should_sample()
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (TRACE_ID_HEADER, trace_id.encode("latin-1"))]
+                root.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        with tracer.trace(
+            f"{scope['method']} {scope['path']}",
+            trace_id,
+            sampled,
+            parent_id=parent_id,
+        ) as root:
+            await self.app(scope, receive, send_with_trace_id)
+
+
+class DrainMiddleware:
+    """
+    Track in-flight HTTP requests and refuse new work while draining.
+
+    While draining, HTTP requests get 503 with ``Connection: close`` and
+    WebSocket handshakes are rejected; probe paths are still served so
+    orchestrators can watch readiness drop. WebSocket sessions are not
+    counted here, since they stay open between messages; the chat stream
+    tracks each message it processes instead.
+    """
+
+    def __init__(self, app, inflight: InFlight, exempt: tuple[str, ...] = ("/health", "/livez", "/readyz")):
+        self.app = app
+        self.inflight = inflight
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        if self.inflight.draining and scope["path"] not in self.exempt:
+            self.inflight.rejected += 1
+            if scope["type"] == "websocket":
+                # Closing before accepting rejects the handshake
+                await send({"type": "websocket.close", "code": 1012})
+                return
+            body = json.dumps({"detail": "Server is shutting down"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"connection", b"close"),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        if scope["type"] == "websocket":
+            await self.app(scope, receive, send)
+            return
+        with self.inflight.track():
+            await self.app(scope, receive, send)
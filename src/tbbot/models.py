@@ -1,6 +1,8 @@
 """Pydantic models for FastAPI request/response validation."""
 
-from pydantic import BaseModel, Field
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
 
 
 class ChatRequest(BaseModel):
@@ -15,7 +17,88 @@ class ChatResponse(BaseModel):
     response: str = Field(..., description="Agent's response")
 
 
+class HistoryMessage(BaseModel):
+    """One message of a conversation held by the client."""
+
+    role: Literal["user", "assistant"] = Field(..., description="Who sent the message")
+    content: str = Field(..., description="Message text")
+
+
+class HistoryChatRequest(BaseModel):
+    """Request model for the stateless chat endpoint."""
+
+    messages: list[HistoryMessage] = Field(
+        ..., min_length=1, description="Whole conversation, oldest first, ending with the new user message"
+    )
+
+    @field_validator("messages")
+    @classmethod
+    def ends_with_user_message(cls, messages: list[HistoryMessage]) -> list[HistoryMessage]:
+        if messages[-1].role != "user" or not messages[-1].content:
+            raise ValueError("the last message must be a non-empty user message")
+        return messages
+
+
+class HistoryChatResponse(BaseModel):
+    """Response model for the stateless chat endpoint."""
+
+    response: str = Field(..., description="Agent's response")
+    prefix_hash: str = Field(..., description="Hash of the conversation including this response")
+    language: str | None = Field(default=None, description="Language of the latest greeting in the conversation")
+
+
+class ChatFrame(BaseModel):
+    """Inbound WebSocket frame for the chat stream endpoint."""
+
+    id: str | None = Field(default=None, description="Client correlation id echoed in the reply")
+    message: str = Field(..., min_length=1, description="Student's message")
+
+
+class ChatFrameReply(BaseModel):
+    """Outbound WebSocket frame for the chat stream endpoint."""
+
+    id: str | None = Field(default=None, description="Correlation id of the originating frame")
+    response: str | None = Field(default=None, description="Agent's response")
+    error: str | None = Field(default=None, description="Error description if the frame failed")
+
+
 class HealthResponse(BaseModel):
     """Response model for health check."""
 
     status: str = Field(default="healthy", description="Service status")
+
+
+class ReadinessResponse(BaseModel):
+    """Response model for the readiness probe."""
+
+    status: str = Field(..., description="'ready' or 'not ready'")
+    checks: dict[str, bool] = Field(default_factory=dict, description="Outcome of each dependency check")
+
+
+class ReloadResponse(BaseModel):
+    """Response model for the configuration reload endpoint."""
+
+    greetings_version: str = Field(..., description="Version of the greeting table now in use")
+    changed: list[str] = Field(default_factory=list, description="Configuration settings whose value changed")
+
+
+class AllocationSite(BaseModel):
+    """Memory held by one allocation site in a tracemalloc snapshot."""
+
+    location: str = Field(..., description="file:line of the site, callers appended with ' <- '")
+    size_bytes: int = Field(..., description="Memory held by live allocations from the site")
+    count: int = Field(..., description="Number of live allocations from the site")
+    size_diff_bytes: int | None = Field(default=None, description="Change in size since the compared snapshot")
+    count_diff: int | None = Field(default=None, description="Change in count since the compared snapshot")
+
+
+class MemorySnapshotResponse(BaseModel):
+    """Response model for the memory snapshot endpoint."""
+
+    id: int = Field(..., description="Snapshot id, usable as diff_from later")
+    traced_bytes: int = Field(..., description="Memory held by traced allocations")
+    peak_traced_bytes: int = Field(..., description="Peak of traced memory since tracing started")
+    rss_bytes: int | None = Field(default=None, description="Resident set size of the process")
+    top: list[AllocationSite] = Field(default_factory=list, description="Largest allocation sites")
+    diff_from: int | None = Field(default=None, description="Id of the snapshot diffed against")
+    diff: list[AllocationSite] = Field(default_factory=list, description="Sites that changed the most since diff_from")
@@ -0,0 +1,239 @@
+"""Offline batch processing of archived student messages.
+
+Records are streamed from a JSONL or CSV file and sent in chunks to a
+process pool, where they are parsed, run through ``GreetingAgent`` and
+serialized. Results are written as JSONL in input order: each output line
+is the input record plus ``response`` and ``stage`` (or ``error``). Only a
+bounded number of chunks is in flight, so memory stays constant regardless
+of input size.
+
+Because output is written in order, one line per input record, an
+interrupted run is resumed by counting the complete lines already written
+and skipping that many input records.
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+from .greeting import GreetingAgent
+from .pipeline import AgentRequest
+
+
+# Agent of the current worker process, built once per process
+_agent: GreetingAgent | None = None
+
+
+@dataclass
+class BatchSummary:
+    """Outcome of a batch run."""
+    processed: int = 0
+    skipped: int = 0
+    errors: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Records processed per second."""
+        return self.processed / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def _init_worker() -> None:
+    global _agent
+    _agent = GreetingAgent()
+
+
+def _process_record(record: dict | None, field: str) -> dict:
+    if record is None:
+        return {"error": "invalid record"}
+
+    message = record.get(field)
+    if not isinstance(message, str) or not message:
+        return {**record, "error": "missing message"}
+    try:
+        result = _agent.pipeline.run(AgentRequest(message))
+    except Exception as exc:
+        return {**record, "error": type(exc).__name__}
+    return {**record, "response": result.response, "stage": result.stage}
+
+
+def process_chunk(items: list[str | dict], field: str = "message") -> tuple[str, int]:
+    """
+    Process a chunk of input records in the current process.
+
+    Parsing and serialization happen here rather than in the reading
+    process, so they scale with the number of workers.
+
+    Args:
+        items: Raw JSONL lines or CSV rows
+        field: Name of the field or column holding the message
+
+    Returns:
+        The output lines (newline-terminated) and the number of errors
+    """
+    if _agent is None:
+        _init_worker()
+
+    lines = []
+    errors = 0
+    for item in items:
+        if isinstance(item, str):
+            try:
+                record = json.loads(item)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                record = None
+        else:
+            record = item
+        result = _process_record(record, field)
+        errors += "error" in result
+        lines.append(json.dumps(result, ensure_ascii=False))
+    return "\n".join(lines) + "\n", errors
+
+
+def read_items(path: str | Path) -> Iterator[str | dict]:
+    """
+    Stream input records without parsing JSON.
+
+    Args:
+        path: JSONL file (blank lines are skipped) or .csv file with a header row
+
+    Yields:
+        Raw JSONL lines or CSV rows
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8", newline="") as handle:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(handle)
+            return
+        for line in handle:
+            if line.strip():
+                yield line
+
+
+def completed_records(path: str | Path) -> int:
+    """
+    Count complete output lines, truncating a partially written last line.
+
+    Args:
+        path: Output file of an earlier run
+
+    Returns:
+        Number of records already written; 0 if the file does not exist
+    """
+    try:
+        handle = open(path, "r+b")
+    except FileNotFoundError:
+        return 0
+
+    with handle:
+        count = 0
+        last_newline = -1
+        offset = 0
+        while block := handle.read(1 << 20):
+            count += block.count(b"\n")
+            position = block.rfind(b"\n")
+            if position != -1:
+                last_newline = offset + position
+            offset += len(block)
+        if last_newline + 1 != offset:
+            handle.truncate(last_newline + 1)
+    return count
+
+
+def _chunks(items: Iterator[str | dict], size: int) -> Iterator[list[str | dict]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(
+    input_path: str | Path,
+    output_path: str | Path,
+    workers: int | None = None,
+    chunk_size: int = 1000,
+    field: str = "message",
+    resume: bool = False,
+    progress: Callable[[BatchSummary], None] | None = None,
+) -> BatchSummary:
+    """
+    Process every message of an input file and write results in order.
+
+    Args:
+        input_path: JSONL or CSV input
+        output_path: JSONL output
+        workers: Worker processes; defaults to the CPU count, 1 runs inline
+        chunk_size: Messages sent to a worker at a time
+        field: Name of the field or column holding the message
+        resume: Continue after the records already in the output file
+                instead of overwriting it
+        progress: Called with the running summary after each chunk
+
+    Returns:
+        Summary of the run
+    """
+    workers = workers or os.cpu_count() or 1
+    summary = BatchSummary()
+    start = time.perf_counter()
+
+    items = read_items(input_path)
+    if resume:
+        summary.skipped = completed_records(output_path)
+        for _ in range(summary.skipped):
+            if next(items, None) is None:
+                break
+
+    pool = None
+    if workers > 1:
+        # Spawned rather than forked: forking a process that runs threads
+        # (log writer, HTTP clients) can deadlock the children
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    # Enough chunks in flight to keep every worker busy while the head is written
+    max_in_flight = workers * 2
+    pending: deque[tuple[int, Future | tuple[str, int]]] = deque()
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+        def write_head() -> None:
+            size, result = pending.popleft()
+            text, errors = result.result() if isinstance(result, Future) else result
+            output.write(text)
+            output.flush()
+            summary.processed += size
+            summary.errors += errors
+            summary.elapsed_s = time.perf_counter() - start
+            if progress is not None:
+                progress(summary)
+
+        try:
+            for chunk in _chunks(items, chunk_size):
+                if pool is None:
+                    pending.append((len(chunk), process_chunk(chunk, field)))
+                else:
+                    pending.append((len(chunk), pool.submit(process_chunk, chunk, field)))
+                if pool is None or len(pending) >= max_in_flight:
+                    write_head()
+            while pending:
+                write_head()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    summary.elapsed_s = time.perf_counter() - start
+    return summary
@@ -0,0 +1,130 @@
+"""Cost-ordered handler pipeline for TBBot.
+
+A message is offered to a chain of stages ordered from cheapest to most
+expensive (greeting detection, FAQ lookup, retrieval, model fallback...).
+The first stage that returns an answer short-circuits the chain, so most
+requests are answered in the cheapest tier and only the rest fall through
+to expensive stages. Per-stage call/hit/latency statistics are kept.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+from .tracing import tracer
+
+
+class CostClass(IntEnum):
+    """Latency/cost tier a stage belongs to; lower runs first."""
+    MICRO = 0   # In-memory lookups, microseconds
+    CPU = 1     # In-process computation, sub-millisecond
+    IO = 2      # Local I/O or retrieval, milliseconds
+    MODEL = 3   # Remote model calls, hundreds of milliseconds
+
+
+@dataclass
+class AgentRequest:
+    """A message and the context it arrived with."""
+    message: str
+    session_id: str | None = None
+    tenant: str | None = None
+    attributes: dict = field(default_factory=dict)
+    history: list[dict] | None = None  # Earlier messages given by the client; None uses the session
+    language: str | None = None  # Student's language detected earlier, e.g. from a greeting
+
+
+class Stage(ABC):
+    """A pipeline stage that may answer a request."""
+
+    name: str = "stage"
+    cost: CostClass = CostClass.MICRO
+
+    @abstractmethod
+    def handle(self, request: AgentRequest) -> str | None:
+        """
+        Try to answer a request.
+
+        Args:
+            request: The incoming request
+
+        Returns:
+            The answer, or None to pass the request to the next stage
+        """
+
+
+@dataclass
+class StageStats:
+    """Counters for one stage. Updated without locks, so approximate under threads."""
+    calls: int = 0
+    hits: int = 0
+    total_ns: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.calls if self.calls else 0.0,
+            "mean_us": self.total_ns / self.calls / 1000 if self.calls else 0.0,
+        }
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of running a request through the pipeline."""
+    response: str
+    stage: str | None
+
+
+class Pipeline:
+    """Run stages in cost order until one answers."""
+
+    def __init__(self, stages: list[Stage], fallback: str = ""):
+        """
+        Initialize the pipeline.
+
+        Args:
+            stages: Stages in any order; they are sorted by cost class,
+                    keeping the given order within a class
+            fallback: Response returned when no stage answers
+        """
+        self.stages = sorted(stages, key=lambda stage: stage.cost)
+        self.fallback = fallback
+        self.stats = {stage.name: StageStats() for stage in self.stages}
+
+    @property
+    def max_cost(self) -> CostClass:
+        """Cost class of the most expensive stage."""
+        return max((stage.cost for stage in self.stages), default=CostClass.MICRO)
+
+    def run(self, request: AgentRequest) -> PipelineResult:
+        """
+        Offer a request to each stage in order.
+
+        Args:
+            request: The incoming request
+
+        Returns:
+            The first answer and the name of the stage that gave it, or the
+            fallback response with stage None
+        """
+        for stage in self.stages:
+            stats = self.stats[stage.name]
+            start = time.perf_counter_ns()
+            with tracer.span(f"stage.{stage.name}", cost=stage.cost.name):
+                answer = stage.handle(request)
+            stats.total_ns += time.perf_counter_ns() - start
+            stats.calls += 1
+
+            if answer is not None:
+                stats.hits += 1
+                return PipelineResult(answer, stage.name)
+
+        return PipelineResult(self.fallback, None)
+
+    def stats_snapshot(self) -> dict:
+        """Per-stage statistics in pipeline order."""
+        return {
+            stage.name: {"cost": stage.cost.name, **self.stats[stage.name].as_dict()}
+            for stage in self.stages
+        }
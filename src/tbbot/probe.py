@@ -0,0 +1,52 @@
+"""Minimal HTTP probe for container health checks.
+
+Uses only the socket module so it can run as a plain script with
+``python -I -S``, skipping site-packages initialization (and the virtualenv's
+.pth processing), which is most of an interpreter's start-up cost:
+
+    python -I -S /app/src/tbbot/probe.py http://127.0.0.1:8000/livez
+
+Exits 0 when the endpoint answers 200 and 1 otherwise.
+"""
+
+import socket
+import sys
+
+
+def probe(url: str, timeout: float = 2.0) -> bool:
+    """
+    Send a GET request and report whether it returned 200.
+
+    Args:
+        url: http:// URL to request
+        timeout: Connect and read timeout in seconds
+
+    Returns:
+        True if the response status is 200
+    """
+    if not url.startswith("http://"):
+        raise ValueError("Only http:// URLs are supported")
+
+    address, _, path = url[len("http://"):].partition("/")
+    host, _, port = address.partition(":")
+
+    try:
+        with socket.create_connection((host, int(port or 80)), timeout=timeout) as sock:
+            sock.sendall(
+                f"GET /{path} HTTP/1.0\r\nHost: {address}\r\nConnection: close\r\n\r\n".encode("ascii")
+            )
+            status_line = sock.makefile("rb").readline().decode("latin-1")
+    except OSError:
+        return False
+
+    parts = status_line.split()
+    return len(parts) >= 2 and parts[1] == "200"
+
+
+def main(argv: list[str]) -> int:
+    url = argv[1] if len(argv) > 1 else "http://127.0.0.1:8000/livez"
+    return 0 if probe(url) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
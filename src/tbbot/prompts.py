@@ -0,0 +1,166 @@
+"""Prompt assembly for model-backed stages.
+
+Prompts are laid out as a static prefix (system prompt, course context,
+few-shot examples) followed by per-request content (conversation history,
+the student's message). The prefix is compiled once per distinct
+configuration and reused as-is, so every request sharing a configuration
+sends a byte-identical prefix and benefits from provider-side prompt
+caching. Build time and the share of prompts reusing an already-sent
+prefix are tracked.
+
+Examples file format:
+    [{"user": "What is a tool?", "assistant": "A function the agent can call..."}]
+"""
+
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from .pipeline import AgentRequest
+from .usage import MESSAGE_OVERHEAD_TOKENS, estimate_prompt_tokens, estimate_tokens
+
+
+# Distinct prefixes remembered when measuring prefix reuse
+_SEEN_PREFIXES = 1024
+
+
+@dataclass(frozen=True)
+class FewShotExample:
+    """An example exchange shown to the model."""
+    user: str
+    assistant: str
+
+
+@dataclass(frozen=True)
+class CompiledPrefix:
+    """
+    Static leading messages shared by every prompt of one configuration.
+
+    The message dicts are shared between prompts and must not be modified.
+    """
+    messages: tuple[dict, ...]
+    digest: str
+    estimated_tokens: int
+
+
+@dataclass
+class Prompt:
+    """Messages for one model call."""
+    messages: list[dict]
+    estimated_tokens: int
+    prefix_digest: str
+
+
+@functools.lru_cache(maxsize=256)
+def compile_prefix(system_prompt: str, context: str = "", examples: tuple[FewShotExample, ...] = ()) -> CompiledPrefix:
+    """
+    Compile the static prefix for a configuration.
+
+    Args:
+        system_prompt: Instructions for the model
+        context: Course context appended to the system message
+        examples: Few-shot exchanges placed after the system message
+
+    Returns:
+        The compiled prefix; equal arguments return the same object
+    """
+    system = system_prompt if not context else f"{system_prompt}\n\nCourse context:\n{context}"
+    messages = [{"role": "system", "content": system}]
+    for example in examples:
+        messages.append({"role": "user", "content": example.user})
+        messages.append({"role": "assistant", "content": example.assistant})
+
+    encoded = json.dumps(messages, ensure_ascii=False, separators=(",", ":")).encode()
+    return CompiledPrefix(
+        messages=tuple(messages),
+        digest=hashlib.sha256(encoded).hexdigest()[:16],
+        # The reply-priming tokens are counted once, with the prefix
+        estimated_tokens=estimate_prompt_tokens(messages),
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def load_examples(path: str) -> tuple[FewShotExample, ...]:
+    """Load few-shot examples from a JSON file once per process."""
+    with open(Path(path), encoding="utf-8") as handle:
+        return tuple(FewShotExample(item["user"], item["assistant"]) for item in json.load(handle))
+
+
+class PromptStats:
+    """Prompt build counters, updated from worker threads under a lock."""
+
+    def __init__(self):
+        self.builds = 0
+        self.total_ns = 0
+        self.prefix_reused = 0
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        # Concurrent reordering and eviction of _seen can raise KeyError
+        self._lock = threading.Lock()
+
+    def observe(self, digest: str, elapsed_ns: int) -> None:
+        """Count one build and whether its prefix was sent before."""
+        with self._lock:
+            self.builds += 1
+            self.total_ns += elapsed_ns
+            if digest in self._seen:
+                self.prefix_reused += 1
+                self._seen.move_to_end(digest)
+            else:
+                self._seen[digest] = None
+                if len(self._seen) > _SEEN_PREFIXES:
+                    self._seen.popitem(last=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "builds": self.builds,
+            "mean_build_us": self.total_ns / self.builds / 1000 if self.builds else 0.0,
+            "prefix_reuse_rate": self.prefix_reused / self.builds if self.builds else 0.0,
+            "distinct_prefixes": len(self._seen),
+        }
+
+
+stats = PromptStats()
+
+
+class PromptBuilder:
+    """Build prompts from a compiled prefix and per-request content."""
+
+    def __init__(self, system_prompt: str, context: str = "", examples: tuple[FewShotExample, ...] = ()):
+        """
+        Initialize the builder.
+
+        Args:
+            system_prompt: Instructions for the model
+            context: Course context appended to the system message
+            examples: Few-shot exchanges placed after the system message
+        """
+        self.prefix = compile_prefix(system_prompt, context, tuple(examples))
+
+    def build(self, request: AgentRequest, history: list[dict] | None = None) -> Prompt:
+        """
+        Build the messages for a request.
+
+        Args:
+            request: The incoming request
+            history: Earlier conversation turns, placed after the prefix
+
+        Returns:
+            The prompt; its leading messages are the shared prefix
+        """
+        start = time.perf_counter_ns()
+        prefix = self.prefix
+        messages = list(prefix.messages)
+        tokens = prefix.estimated_tokens
+        for turn in history or ():
+            messages.append(turn)
+            tokens += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(turn["content"])
+        messages.append({"role": "user", "content": request.message})
+        tokens += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(request.message)
+
+        stats.observe(prefix.digest, time.perf_counter_ns() - start)
+        return Prompt(messages, tokens, prefix.digest)
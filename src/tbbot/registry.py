@@ -0,0 +1,215 @@
+"""Per-tenant agent registry for TBBot.
+
+One deployment can serve several courses ("tenants"), each with its own
+FAQ, model and system prompt. Tenants are declared in a JSON file:
+
+    {
+        "course-a": {"faq_path": "faqs/course-a.json", "llm_fallback": true},
+        "course-b": {"llm_model": "gpt-4o", "course_context": "...", "examples_path": "..."}
+    }
+
+Agents are built on first use. Immutable heavy resources (FAQ indexes,
+backend clients) are shared between tenants configured with the same
+source, and agents idle for too long or beyond the agent count cap are
+evicted least recently used first, so the number of agents in memory
+follows active tenants rather than configured ones.
+
+The cap counts agents, not bytes: one tenant's FAQ index, few-shot
+examples or prompt cache can be arbitrarily large, so size
+TENANT_MAX_AGENTS for the largest tenants' resources.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from .config import Config
+from .greeting import GreetingAgent, GreetingStage
+from .pipeline import Stage
+
+
+class UnknownTenantError(KeyError):
+    """Raised when a request names a tenant that is not configured."""
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    """Agent settings for one tenant; unset values fall back to global configuration."""
+    faq_path: str | None = None
+    faq_threshold: float | None = None
+    llm_fallback: bool | None = None
+    llm_model: str | None = None
+    system_prompt: str | None = None
+    course_context: str | None = None
+    examples_path: str | None = None
+
+    def stages(self) -> list[Stage]:
+        """Build the pipeline stages for this tenant."""
+        stages: list[Stage] = [GreetingStage()]
+
+        faq_path = self.faq_path or Config.FAQ_PATH
+        if faq_path:
+            from .faq import FAQStage, load_index
+            threshold = self.faq_threshold if self.faq_threshold is not None else Config.FAQ_THRESHOLD
+            stages.append(FAQStage(load_index(faq_path), threshold))
+
+        llm_fallback = self.llm_fallback if self.llm_fallback is not None else Config.LLM_FALLBACK_ENABLED
+        if llm_fallback:
+            from .llm import LLMStage
+            stages.append(LLMStage.from_config(
+                self.llm_model, self.system_prompt, self.course_context, self.examples_path
+            ))
+
+        return stages
+
+
+def load_tenants(path: str | Path) -> dict[str, TenantConfig]:
+    """
+    Load tenant settings from a JSON file.
+
+    Raises:
+        ValueError: If a tenant has unknown settings
+    """
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+
+    tenants = {}
+    for name, settings in data.items():
+        try:
+            tenants[name] = TenantConfig(**settings)
+        except TypeError as exc:
+            raise ValueError(f"Invalid settings for tenant {name!r}: {exc}") from exc
+    return tenants
+
+
+@dataclass
+class RegistryStats:
+    """Registry counters."""
+    hits: int = 0
+    builds: int = 0
+    evictions: int = 0
+
+
+class AgentRegistry:
+    """Lazily built, LRU-evicted agents keyed by tenant."""
+
+    def __init__(
+        self,
+        tenants: dict[str, TenantConfig],
+        max_agents: int = 32,
+        idle_ttl: float = 900.0,
+        factory: Callable[[TenantConfig], GreetingAgent] | None = None,
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            tenants: Settings per tenant name
+            max_agents: Most agents kept in memory at once, whatever their size
+            idle_ttl: Seconds after which an unused agent is evicted
+            factory: Builds an agent from tenant settings
+        """
+        self.tenants = tenants
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl
+        self.factory = factory or (lambda tenant: GreetingAgent(stages=tenant.stages()))
+        self.stats = RegistryStats()
+        # Tenant -> (agent, last use); least recently used first
+        self._agents: OrderedDict[str, tuple[GreetingAgent, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: dict[str, threading.Lock] = {}
+
+    @classmethod
+    def from_config(cls) -> "AgentRegistry":
+        """Build the registry from TENANTS_PATH and TENANT_* configuration."""
+        tenants = load_tenants(Config.TENANTS_PATH) if Config.TENANTS_PATH else {}
+        return cls(tenants, Config.TENANT_MAX_AGENTS, Config.TENANT_IDLE_TTL_S)
+
+    def __contains__(self, tenant: str) -> bool:
+        return tenant in self.tenants
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def peek(self, tenant: str) -> GreetingAgent | None:
+        """
+        Return a tenant's agent if it is already built, marking it used.
+
+        Never builds, so it is safe to call from the event loop.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._agents.get(tenant)
+            if entry is None:
+                return None
+            self._agents[tenant] = (entry[0], now)
+            self._agents.move_to_end(tenant)
+            self.stats.hits += 1
+            return entry[0]
+
+    def get(self, tenant: str) -> GreetingAgent:
+        """
+        Return a tenant's agent, building it on first use.
+
+        Building may load files, so call this from a worker thread when the
+        agent is not cached yet. Concurrent first requests for one tenant
+        build a single agent.
+
+        Raises:
+            UnknownTenantError: If the tenant is not configured
+        """
+        if tenant not in self.tenants:
+            raise UnknownTenantError(tenant)
+
+        agent = self.peek(tenant)
+        if agent is not None:
+            return agent
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(tenant, threading.Lock())
+
+        with build_lock:
+            agent = self.peek(tenant)
+            if agent is not None:
+                return agent
+
+            agent = self.factory(self.tenants[tenant])
+            with self._lock:
+                self._agents[tenant] = (agent, time.monotonic())
+                self.stats.builds += 1
+                while len(self._agents) > self.max_agents:
+                    self._agents.popitem(last=False)
+                    self.stats.evictions += 1
+            return agent
+
+    def evict(self, tenant: str) -> bool:
+        """Drop a tenant's agent; it is rebuilt on next use."""
+        with self._lock:
+            return self._agents.pop(tenant, None) is not None
+
+    def _evict_idle(self, now: float) -> None:
+        # Entries are kept in last-use order, so only the head can be idle
+        while self._agents:
+            tenant, (_, last_used) = next(iter(self._agents.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self._agents[tenant]
+            self.stats.evictions += 1
+
+    def stats_snapshot(self) -> dict:
+        """Registry counters and the tenants currently loaded."""
+        with self._lock:
+            loaded = list(self._agents)
+        return {
+            "configured": len(self.tenants),
+            "loaded": loaded,
+            "max_agents": self.max_agents,
+            "hits": self.stats.hits,
+            "builds": self.stats.builds,
+            "evictions": self.stats.evictions,
+        }
@@ -0,0 +1,526 @@
+"""Latency-aware routing across several OpenAI-compatible backends.
+
+``RoutedBackend`` has the interface of ``ChatBackend`` and sends each call
+to the backend with the best recent latency: an exponentially weighted
+moving average (EWMA) or the p95 of the last calls. A small share of calls
+explores the other backends so their latency estimates stay current.
+
+Each backend has a circuit breaker. After a run of consecutive failures it
+opens and the backend is ejected from rotation; once the reset timeout has
+passed it is half-open and the next call is sent there as a probe, with
+the other backends as failover. A successful probe closes the breaker.
+Failed calls fail over to the next backend, so one bad provider costs a
+retry rather than an error.
+
+Optionally, calls are hedged: when a call has not answered within the p95
+latency of its backend, a duplicate is sent to the next best backend (or
+the same one if it is the only one) and the first answer wins; the other
+call is cancelled. Each call earns a fraction of a hedge credit and each
+hedge spends a whole one, so hedges never exceed that fraction of traffic
+beyond a small burst.
+
+OPENAI_API_BASES format:
+    primary=https://api.example.com/v1,backup=http://127.0.0.1:8001/v1
+(names are optional; unnamed backends are named after their URL)
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable
+
+from .backends import BackendError, ChatBackend, Completion, shared_backend
+from .config import Config
+
+
+METRICS = ("ewma", "p95")
+
+# Hedge credits that can accumulate during quiet periods
+HEDGE_BURST = 5.0
+
+
+class BreakerState(str, Enum):
+    """Circuit breaker states."""
+    CLOSED = "closed"        # Healthy, in rotation
+    OPEN = "open"            # Ejected until the reset timeout passes
+    HALF_OPEN = "half_open"  # Waiting for a probe call to decide
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker. Not thread-safe; the router serializes access."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout_s: Time an open breaker waits before allowing a probe
+            clock: Monotonic time source, replaceable in tests
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout_s
+        self.clock = clock
+        self.failures = 0
+        self.trips = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> BreakerState:
+        """Current state; an open breaker turns half-open once its timeout has passed."""
+        if self._opened_at is None:
+            return BreakerState.CLOSED
+        if self.clock() - self._opened_at < self.reset_timeout:
+            return BreakerState.OPEN
+        return BreakerState.HALF_OPEN
+
+    def available(self) -> bool:
+        """Whether a call may be sent: closed, or half-open with no probe in flight."""
+        state = self.state
+        return state == BreakerState.CLOSED or (state == BreakerState.HALF_OPEN and not self._probing)
+
+    def acquire(self) -> None:
+        """Mark a call as sent; in half-open state it becomes the probe."""
+        if self.state == BreakerState.HALF_OPEN:
+            self._probing = True
+
+    def release(self) -> None:
+        """Forget a call that was cancelled before it finished, freeing the probe slot."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        """Close the breaker and reset the failure count."""
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a failure; opens the breaker at the threshold or when a probe fails."""
+        self.failures += 1
+        if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+            self._opened_at = self.clock()
+            self.trips += 1
+        self._probing = False
+
+
+class LatencyTracker:
+    """EWMA and windowed p95 of call latencies."""
+
+    def __init__(self, alpha: float = 0.3, window: int = 128):
+        """
+        Initialize the tracker.
+
+        Args:
+            alpha: Weight of the newest sample in the EWMA
+            window: Recent samples kept for the p95
+        """
+        self.alpha = alpha
+        self.ewma: float | None = None
+        self.samples: deque[float] = deque(maxlen=window)
+        self._p95: float | None = None
+
+    def observe(self, latency_s: float) -> None:
+        """Add a latency sample."""
+        self.ewma = latency_s if self.ewma is None else self.alpha * latency_s + (1 - self.alpha) * self.ewma
+        self.samples.append(latency_s)
+        self._p95 = None
+
+    @property
+    def p95(self) -> float | None:
+        """95th percentile of the recent samples, None before the first."""
+        if self._p95 is None and self.samples:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return self._p95
+
+
+@dataclass
+class RouteStats:
+    """Per-backend routing counters."""
+    calls: int = 0
+    failures: int = 0
+    explored: int = 0
+
+
+class _Route:
+    def __init__(self, backend: ChatBackend, breaker: CircuitBreaker, tracker: LatencyTracker):
+        self.backend = backend
+        self.breaker = breaker
+        self.tracker = tracker
+        self.stats = RouteStats()
+
+
+def is_backend_failure(exc: BackendError) -> bool:
+    """Whether an error says something about the backend (transport, 5xx, 429) rather than the request."""
+    return exc.status_code is None or exc.status_code >= 500 or exc.status_code == 429
+
+
+class RoutedBackend:
+    """Send calls to the fastest healthy backend, failing over to the others."""
+
+    def __init__(
+        self,
+        backends: list[ChatBackend],
+        metric: str = "ewma",
+        alpha: float = 0.3,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        explore: float = 0.05,
+        hedge_fraction: float = 0.0,
+        hedge_min_delay_s: float = 0.02,
+        hedge_min_samples: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            backends: Backends to route between, at least one
+            metric: Latency statistic to rank by, "ewma" or "p95"
+            alpha: EWMA weight of the newest latency sample
+            failure_threshold: Consecutive failures that eject a backend
+            reset_timeout_s: Time an ejected backend waits before a probe
+            explore: Share of calls sent to a random other healthy backend
+            hedge_fraction: Largest share of calls that may be hedged; 0 disables hedging
+            hedge_min_delay_s: Shortest wait before hedging, whatever the p95
+            hedge_min_samples: Latency samples a backend needs before its calls are hedged
+            clock: Monotonic time source, replaceable in tests
+            rng: Random source for exploration, replaceable in tests
+
+        Raises:
+            ValueError: If no backend is given or the metric is unknown
+        """
+        if not backends:
+            raise ValueError("RoutedBackend needs at least one backend")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown routing metric {metric!r}; expected one of {METRICS}")
+        self.routes = [
+            _Route(backend, CircuitBreaker(failure_threshold, reset_timeout_s, clock), LatencyTracker(alpha))
+            for backend in backends
+        ]
+        self.metric = metric
+        self.explore = explore
+        self.hedge_fraction = hedge_fraction
+        self.hedge_min_delay = hedge_min_delay_s
+        self.hedge_min_samples = hedge_min_samples
+        self.name = "routed(" + ",".join(backend.name for backend in backends) + ")"
+        self.calls = 0
+        self.failovers = 0
+        self.unavailable = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_suppressed = 0
+        self._hedge_credit = 0.0
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def _score(self, route: _Route) -> float:
+        tracker = route.tracker
+        value = tracker.ewma if self.metric == "ewma" else tracker.p95
+        # Backends without samples go first, so every backend gets measured
+        return 0.0 if value is None else value
+
+    def _plan(self, routes: list[_Route]) -> list[_Route]:
+        # Caller holds the lock. Half-open backends are probed first: the
+        # probe needs real traffic, and failover covers a failed probe.
+        available = [route for route in routes if route.breaker.available()]
+        probes = [route for route in available if route.breaker.state == BreakerState.HALF_OPEN]
+        ranked = sorted((route for route in available if route not in probes), key=self._score)
+        if len(ranked) > 1 and self._rng.random() < self.explore:
+            explored = ranked.pop(self._rng.randrange(1, len(ranked)))
+            ranked.insert(0, explored)
+            explored.stats.explored += 1
+        return probes[:1] + ranked
+
+    def _acquire(self, route: _Route) -> bool:
+        # Caller holds the lock
+        if not route.breaker.available():
+            # Tripped, or taken as a probe by a concurrent call, since planning
+            return False
+        route.breaker.acquire()
+        route.stats.calls += 1
+        return True
+
+    async def _attempt(self, route: _Route, call: Callable[[ChatBackend], Any]) -> Any:
+        # One call to an acquired route, with breaker and latency accounting
+        start = time.perf_counter()
+        try:
+            result = await call(route.backend)
+        except asyncio.CancelledError:
+            with self._lock:
+                # Not observed: a hedge cancelled early would record a short
+                # latency for the backend that was too slow to win
+                route.breaker.release()
+            raise
+        except BackendError as exc:
+            with self._lock:
+                if is_backend_failure(exc):
+                    route.breaker.record_failure()
+                    route.stats.failures += 1
+                else:
+                    # The backend answered; the request itself was refused
+                    route.breaker.record_success()
+            raise
+
+        with self._lock:
+            route.breaker.record_success()
+            route.tracker.observe(time.perf_counter() - start)
+        return result
+
+    def _hedge_delay(self, route: _Route) -> float | None:
+        # Caller holds the lock
+        tracker = route.tracker
+        if len(tracker.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, tracker.p95)
+
+    async def _hedged(
+        self, route: _Route, plan: list[_Route], tried: set[int], call: Callable[[ChatBackend], Any]
+    ) -> Any:
+        with self._lock:
+            delay = self._hedge_delay(route)
+        primary = asyncio.ensure_future(self._attempt(route, call))
+        tasks = [primary]
+        try:
+            if delay is None:
+                return await primary
+
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            with self._lock:
+                if self._hedge_credit < 1:
+                    self.hedges_suppressed += 1
+                    hedge_route = None
+                else:
+                    # Prefer another backend; with none available, duplicate on the same one
+                    others = [other for other in plan if id(other) not in tried and other.breaker.available()]
+                    hedge_route = others[0] if others else route
+                    if self._acquire(hedge_route):
+                        self._hedge_credit -= 1
+                        self.hedges += 1
+                        tried.add(id(hedge_route))
+                    else:
+                        hedge_route = None
+            if hedge_route is None:
+                return await primary
+
+            hedge = asyncio.ensure_future(self._attempt(hedge_route, call))
+            tasks.append(hedge)
+            pending = {primary, hedge}
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        if task is hedge:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    if not isinstance(exc, BackendError) or not is_backend_failure(exc):
+                        raise exc
+                    error = exc
+            raise error
+        finally:
+            # Cancel the loser, or every attempt if the caller was cancelled,
+            # and let their accounting run before returning
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _route(self, routes: list[_Route], call: Callable[[ChatBackend], Any], hedge: bool = False) -> Any:
+        with self._lock:
+            plan = self._plan(routes)
+            self.calls += 1
+            hedge = hedge and self.hedge_fraction > 0
+            if hedge:
+                self._hedge_credit = min(self._hedge_credit + self.hedge_fraction, HEDGE_BURST)
+            if not plan:
+                self.unavailable += 1
+        if not plan:
+            raise BackendError(f"{self.name}: no backend available", 503)
+
+        last_error: BackendError | None = None
+        tried: set[int] = set()
+        for route in plan:
+            if id(route) in tried:
+                continue
+            with self._lock:
+                if not self._acquire(route):
+                    continue
+                if last_error is not None:
+                    self.failovers += 1
+            tried.add(id(route))
+
+            try:
+                if hedge:
+                    return await self._hedged(route, plan, tried, call)
+                return await self._attempt(route, call)
+            except BackendError as exc:
+                if not is_backend_failure(exc):
+                    raise
+                last_error = exc
+
+        raise last_error or BackendError(f"{self.name}: no backend available", 503)
+
+    async def complete(self, messages: list[dict], model: str, **params: Any) -> Completion:
+        """
+        Request a chat completion from the best available backend.
+
+        Raises:
+            BackendError: If every attempted backend failed, or with status
+                          503 if every backend is ejected
+        """
+        return await self._route(
+            self.routes, lambda backend: backend.complete(messages, model, **params), hedge=True
+        )
+
+    @property
+    def supports_batch(self) -> bool:
+        """Whether any backend accepts batched calls."""
+        return any(route.backend.supports_batch for route in self.routes)
+
+    async def complete_batch(
+        self, requests: list[tuple[list[dict], str]], **params: Any
+    ) -> list[Completion | BackendError]:
+        """
+        Request several completions in one call to the best batch-capable backend.
+
+        Raises:
+            BackendError: If the whole call failed on every attempted backend
+        """
+        routes = [route for route in self.routes if route.backend.supports_batch]
+        if not routes:
+            raise BackendError(f"{self.name}: batching not supported")
+        return await self._route(routes, lambda backend: backend.complete_batch(requests, **params))
+
+    async def warm(self) -> bool:
+        """Open connections to every backend; True if any of them answered."""
+        results = await asyncio.gather(*(route.backend.warm() for route in self.routes))
+        return any(results)
+
+    async def aclose(self) -> None:
+        """Close pooled connections of every backend."""
+        for route in self.routes:
+            await route.backend.aclose()
+
+    def stats_snapshot(self) -> dict:
+        """Breaker state, latency and routing counters per backend."""
+        with self._lock:
+            backends = {}
+            for route in self.routes:
+                tracker, breaker = route.tracker, route.breaker
+                backends[route.backend.name] = {
+                    "state": breaker.state.value,
+                    "consecutive_failures": breaker.failures,
+                    "ejections": breaker.trips,
+                    "ewma_ms": tracker.ewma * 1000 if tracker.ewma is not None else None,
+                    "p95_ms": tracker.p95 * 1000 if tracker.p95 is not None else None,
+                    "calls": route.stats.calls,
+                    "failures": route.stats.failures,
+                    "explored": route.stats.explored,
+                }
+        return {
+            "metric": self.metric,
+            "calls": self.calls,
+            "failovers": self.failovers,
+            "unavailable": self.unavailable,
+            "hedges": self.hedges,
+            "hedge_rate": self.hedges / self.calls if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedges_suppressed": self.hedges_suppressed,
+            "backends": backends,
+        }
+
+
+def parse_backends(spec: str) -> list[tuple[str | None, str]]:
+    """
+    Parse an OPENAI_API_BASES value.
+
+    Returns:
+        (name or None, base URL) pairs in the given order
+    """
+    backends = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, url = item.partition("=")
+        if separator and "://" not in name:
+            backends.append((name.strip(), url.strip()))
+        else:
+            backends.append((None, item))
+    return backends
+
+
+# Routers shared by every stage using the same configuration
+_shared: dict[tuple, RoutedBackend] = {}
+_shared_lock = threading.Lock()
+
+
+def backend_from_config(batch_path: str | None = None) -> ChatBackend | RoutedBackend:
+    """
+    Build the model backend from configuration.
+
+    OPENAI_API_BASES selects routing across several backends; otherwise the
+    single OPENAI_API_BASE (or OpenAI) is used, wrapped in a router of one
+    when HEDGE_FRACTION enables hedging. Equal configurations share one
+    backend or router, and with it connection pools and routing state.
+
+    Args:
+        batch_path: Batch endpoint path of the backends, if any
+    """
+    if not Config.OPENAI_API_BASES and Config.HEDGE_FRACTION <= 0:
+        return shared_backend(
+            Config.OPENAI_API_BASE or "https://api.openai.com/v1",
+            Config.OPENAI_API_KEY,
+            Config.LLM_TIMEOUT_S,
+            batch_path,
+        )
+
+    bases = Config.OPENAI_API_BASES or Config.OPENAI_API_BASE or "https://api.openai.com/v1"
+    key = (
+        bases, Config.OPENAI_API_KEY, Config.LLM_TIMEOUT_S, batch_path,
+        Config.ROUTING_METRIC, Config.ROUTING_EWMA_ALPHA, Config.ROUTING_EXPLORE,
+        Config.BREAKER_FAILURES, Config.BREAKER_RESET_S,
+        Config.HEDGE_FRACTION, Config.HEDGE_MIN_DELAY_MS, Config.HEDGE_MIN_SAMPLES,
+    )
+    with _shared_lock:
+        router = _shared.get(key)
+        if router is None:
+            backends = [
+                ChatBackend(url, Config.OPENAI_API_KEY, Config.LLM_TIMEOUT_S, name=name, batch_path=batch_path)
+                for name, url in parse_backends(bases)
+            ]
+            router = _shared[key] = RoutedBackend(
+                backends,
+                metric=Config.ROUTING_METRIC,
+                alpha=Config.ROUTING_EWMA_ALPHA,
+                failure_threshold=Config.BREAKER_FAILURES,
+                reset_timeout_s=Config.BREAKER_RESET_S,
+                explore=Config.ROUTING_EXPLORE,
+                hedge_fraction=Config.HEDGE_FRACTION,
+                hedge_min_delay_s=Config.HEDGE_MIN_DELAY_MS / 1000,
+                hedge_min_samples=Config.HEDGE_MIN_SAMPLES,
+            )
+    return router
+
+
+def stats_snapshot() -> dict:
+    """Statistics of every shared router, by router name."""
+    return {router.name: router.stats_snapshot() for router in list(_shared.values())}
@@ -0,0 +1,163 @@
+"""Soak test: drive a server for a long time and check its memory stays bounded.
+
+Leaks in a long-running worker show up as RSS that keeps growing under
+steady traffic, long after caches have filled. The soak harness sends
+requests at a fixed rate (see ``loadgen``) and samples the server's RSS
+from ``/metrics`` at regular intervals. After a warm-up, during which
+caches and pools are allowed to fill, the median RSS of the last quarter
+of samples is compared with that of the first quarter.
+
+A run only passes when that comparison can be made and every request
+succeeded: too few samples after the warm-up make the run inconclusive,
+and any failed request fails it, since a server answering with errors
+says nothing about memory under real traffic.
+"""
+
+import asyncio
+import math
+import statistics
+from dataclasses import dataclass, field
+
+import httpx
+
+from .loadgen import MessageMix, http_sender, run_open
+
+
+@dataclass
+class MemorySample:
+    """Server memory at one point of a soak run."""
+    elapsed_s: float
+    rss_bytes: int
+    requests: int  # Requests completed so far
+    errors: int
+
+
+@dataclass
+class SoakReport:
+    """Memory samples of a soak run and whether growth stayed within bounds."""
+    # Samples after the warm-up needed to compare the first and last quarter
+    MIN_SAMPLES = 4
+
+    max_growth_bytes: int
+    warmup_s: float
+    samples: list[MemorySample] = field(default_factory=list)
+
+    @property
+    def requests(self) -> int:
+        return self.samples[-1].requests if self.samples else 0
+
+    @property
+    def errors(self) -> int:
+        return self.samples[-1].errors if self.samples else 0
+
+    @property
+    def measured(self) -> list[int]:
+        """RSS of the samples taken after the warm-up."""
+        return [sample.rss_bytes for sample in self.samples if sample.elapsed_s >= self.warmup_s]
+
+    @property
+    def growth_bytes(self) -> int | None:
+        """RSS growth after the warm-up, between the first and last quarter of samples; None if too few."""
+        measured = self.measured
+        if len(measured) < self.MIN_SAMPLES:
+            return None
+        quarter = len(measured) // 4
+        return int(statistics.median(measured[-quarter:]) - statistics.median(measured[:quarter]))
+
+    @property
+    def verdict(self) -> str:
+        """Verdict of the run: "bounded", or why it did not pass."""
+        growth = self.growth_bytes
+        if growth is None:
+            return f"inconclusive ({len(self.measured)} samples after the warm-up, need {self.MIN_SAMPLES})"
+        if self.errors:
+            return f"failed ({self.errors} of {self.requests} requests failed)"
+        return "bounded" if growth <= self.max_growth_bytes else "NOT bounded"
+
+    @property
+    def bounded(self) -> bool:
+        """Whether the run passed: enough samples, no failed request and growth within the limit."""
+        return self.verdict == "bounded"
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "growth_bytes": self.growth_bytes,
+            "max_growth_bytes": self.max_growth_bytes,
+            "bounded": self.bounded,
+            "verdict": self.verdict,
+            "samples": [vars(sample) for sample in self.samples],
+        }
+
+    def format(self) -> str:
+        """Human-readable summary with one line per sample."""
+        lines = [f"{'elapsed s':>10}{'rss MiB':>10}{'requests':>10}{'errors':>8}"]
+        lines += [
+            f"{sample.elapsed_s:>10.0f}{sample.rss_bytes / 2**20:>10.1f}{sample.requests:>10}{sample.errors:>8}"
+            for sample in self.samples
+        ]
+        growth = "n/a" if self.growth_bytes is None else f"{self.growth_bytes / 2**20:+.1f} MiB"
+        lines.append(
+            f"RSS growth after warm-up: {growth} "
+            f"(limit {self.max_growth_bytes / 2**20:.1f} MiB): {self.verdict}"
+        )
+        return "\n".join(lines)
+
+
+async def run_soak(
+    url: str,
+    duration_s: float,
+    rate: float = 20.0,
+    sample_interval_s: float = 10.0,
+    warmup_s: float = 60.0,
+    max_growth_bytes: int = 50 * 2**20,
+    endpoint: str = "chat",
+    mix: MessageMix | None = None,
+    timeout_s: float = 30.0,
+) -> SoakReport:
+    """
+    Drive a server at a fixed rate and sample its RSS.
+
+    Args:
+        url: Server root URL
+        duration_s: Total run time, warm-up included
+        rate: Requests per second
+        sample_interval_s: Seconds between RSS samples
+        warmup_s: Initial period whose samples are not used to judge growth
+        max_growth_bytes: RSS growth after the warm-up still considered bounded
+        endpoint: "chat" or "history"
+        mix: Messages to send; defaults to the bundled mix
+        timeout_s: Per-request timeout
+
+    Returns:
+        The run's samples and verdict
+
+    Raises:
+        httpx.HTTPError: If the server's memory metrics cannot be read
+    """
+    mix = mix or MessageMix.bundled()
+    report = SoakReport(max_growth_bytes, warmup_s)
+    loop = asyncio.get_running_loop()
+    requests = errors = 0
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout_s) as client:
+        send = http_sender(client, endpoint, mix)
+
+        async def sample() -> None:
+            response = await client.get("/metrics")
+            response.raise_for_status()
+            rss = response.json()["memory"]["rss_bytes"]
+            report.samples.append(MemorySample(loop.time() - start, rss, requests, errors))
+
+        start = loop.time()
+        await sample()
+        # Traffic is planned per interval, so the time spent sampling does not shorten the run
+        intervals = math.ceil(duration_s / sample_interval_s)
+        for index in range(intervals):
+            interval = min(sample_interval_s, duration_s - index * sample_interval_s)
+            _, statuses, _ = await run_open(send, rate, interval)
+            requests += sum(statuses.values())
+            errors += sum(count for status, count in statuses.items() if status != "200")
+            await sample()
+    return report
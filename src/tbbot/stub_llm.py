@@ -0,0 +1,459 @@
+"""Local OpenAI-compatible stand-in server for load tests and benchmarks.
+
+This module provides a small chat-completions server that behaves like an
+OpenAI-compatible provider without calling any model. Latency, token
+throughput, error rates and rate limiting are configurable so that the
+concurrency and timeout behaviour of TBBot can be measured reproducibly.
+
+Point TBBot at it with ``OPENAI_API_BASE=http://127.0.0.1:8001/v1``.
+
+Besides the standard endpoint it serves ``POST /v1/batch/chat/completions``,
+which answers several chat requests in one round trip and is used by the
+micro-batcher (see ``tbbot.batching``).
+
+Run it standalone with:
+    python -m tbbot.stub_llm --port 8001 --latency-ms 200 --tokens-per-second 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Behaviour of the stand-in server.
+
+    Attributes:
+        distribution: Time-to-first-token distribution ('fixed', 'uniform',
+                      'exponential' or 'lognormal')
+        latency_ms: Mean time to first token in milliseconds; the median
+                    for 'lognormal', whose mean is higher
+        jitter_ms: Spread of the delays: half-width for 'uniform'; for
+                   'lognormal' jitter_ms / latency_ms is the standard
+                   deviation of the underlying normal, so the shape of the
+                   tail stays the same when latency_ms changes
+        tokens_per_second: Completion token generation rate (0 means instant)
+        error_rate: Fraction of requests answered with a 500 error
+        rate_limit_rate: Fraction of requests answered with a 429 error
+        retry_after_s: Retry-After value sent with 429 responses
+        reply: Fixed completion text; when empty the last user message is echoed
+        seed: Random seed for reproducible runs
+    """
+    distribution: str = "fixed"
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_s: int = 1
+    reply: str = ""
+    seed: int | None = None
+
+    def __post_init__(self):
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution: {self.distribution!r}. "
+                f"Expected one of {DISTRIBUTIONS}"
+            )
+
+    @classmethod
+    def from_env(cls) -> "LatencyProfile":
+        """Build a profile from STUB_LLM_* environment variables."""
+        seed = os.getenv("STUB_LLM_SEED")
+        return cls(
+            distribution=os.getenv("STUB_LLM_DISTRIBUTION", "fixed"),
+            latency_ms=float(os.getenv("STUB_LLM_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("STUB_LLM_JITTER_MS", "0")),
+            tokens_per_second=float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "0")),
+            error_rate=float(os.getenv("STUB_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("STUB_LLM_RATE_LIMIT_RATE", "0")),
+            retry_after_s=int(os.getenv("STUB_LLM_RETRY_AFTER_S", "1")),
+            reply=os.getenv("STUB_LLM_REPLY", ""),
+            seed=int(seed) if seed else None,
+        )
+
+
+@dataclass
+class StubStats:
+    """Counters describing the traffic the stand-in server has seen."""
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    completion_tokens: int = 0
+    batches: int = 0
+    batched_items: int = 0
+
+
+@dataclass
+class StubState:
+    """Mutable server state shared by the request handlers."""
+    profile: LatencyProfile
+    stats: StubStats = field(default_factory=StubStats)
+    rng: random.Random = field(default_factory=random.Random)
+
+    def __post_init__(self):
+        self.rng.seed(self.profile.seed)
+
+    def first_token_delay(self) -> float:
+        """Draw a time-to-first-token delay in seconds from the profile."""
+        profile = self.profile
+        mean = profile.latency_ms
+
+        if profile.distribution == "uniform":
+            delay_ms = self.rng.uniform(mean - profile.jitter_ms, mean + profile.jitter_ms)
+        elif profile.distribution == "exponential":
+            delay_ms = self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+        elif profile.distribution == "lognormal":
+            # Parameterize so the median equals latency_ms
+            sigma = profile.jitter_ms / mean if mean > 0 else 0.0
+            delay_ms = mean * self.rng.lognormvariate(0, sigma) if mean > 0 else 0.0
+        else:
+            delay_ms = mean
+
+        return max(delay_ms, 0.0) / 1000
+
+
+def _completion_text(profile: LatencyProfile, messages: list[dict]) -> str:
+    """Return the completion text for a request."""
+    if profile.reply:
+        return profile.reply
+
+    for message in reversed(messages):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return f"Echo: {message['content']}"
+    return "Echo:"
+
+
+def _count_tokens(text: str) -> int:
+    """Cheap whitespace token count used for usage reporting."""
+    return len(text.split())
+
+
+def _completion_body(model: str, text: str, messages: list[dict]) -> dict:
+    """Build a non-streaming chat.completion body with usage."""
+    prompt_tokens = sum(
+        _count_tokens(message.get("content") or "")
+        for message in messages
+        if isinstance(message.get("content"), str)
+    )
+    completion_tokens = len(text.split(" "))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _error_body(message: str, error_type: str, status_code: int) -> dict:
+    """Build an OpenAI-style error body."""
+    return {"error": {"message": message, "type": error_type, "code": status_code}}
+
+
+def _error_response(status_code: int, message: str, error_type: str, headers: dict | None = None) -> JSONResponse:
+    """Build an OpenAI-style error response."""
+    return JSONResponse(
+        status_code=status_code,
+        content=_error_body(message, error_type, status_code),
+        headers=headers,
+    )
+
+
+def create_stub_app(profile: LatencyProfile | None = None) -> FastAPI:
+    """
+    Create the stand-in chat-completions application.
+
+    Args:
+        profile: Behaviour profile; defaults to one read from the environment
+
+    Returns:
+        FastAPI application exposing /v1/chat/completions,
+        /v1/batch/chat/completions and /v1/models
+    """
+    app = FastAPI(title="TBBot LLM stand-in")
+    state = StubState(profile=profile or LatencyProfile.from_env())
+    app.state.stub = state
+
+    @app.get("/v1/models")
+    async def list_models() -> dict:
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "tbbot"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats = state.stats
+        stats.requests += 1
+
+        # Failures are decided up front, like a provider rejecting at the edge
+        roll = state.rng.random()
+        if roll < state.profile.rate_limit_rate:
+            stats.rate_limited += 1
+            return _error_response(
+                429, "Rate limit reached", "rate_limit_error",
+                headers={"Retry-After": str(state.profile.retry_after_s)},
+            )
+        if roll < state.profile.rate_limit_rate + state.profile.error_rate:
+            stats.errors += 1
+            return _error_response(500, "Simulated upstream failure", "server_error")
+
+        model = body.get("model", "stub")
+        text = _completion_text(state.profile, body.get("messages", []))
+        tokens = text.split(" ")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        token_delay = 1 / state.profile.tokens_per_second if state.profile.tokens_per_second > 0 else 0.0
+        first_token_delay = state.first_token_delay()
+
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        stats.completion_tokens += len(tokens)
+
+        if body.get("stream"):
+            async def event_stream():
+                try:
+                    await asyncio.sleep(first_token_delay)
+                    for index, token in enumerate(tokens):
+                        if index and token_delay:
+                            await asyncio.sleep(token_delay)
+                        chunk = {
+                            "id": completion_id,
+                            "object": "chat.completion.chunk",
+                            "created": created,
+                            "model": model,
+                            "choices": [{
+                                "index": 0,
+                                "delta": {"content": token if index == 0 else f" {token}"},
+                                "finish_reason": None,
+                            }],
+                        }
+                        yield f"data: {json.dumps(chunk)}\n\n"
+                    final = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    }
+                    yield f"data: {json.dumps(final)}\n\n"
+                    yield "data: [DONE]\n\n"
+                finally:
+                    stats.in_flight -= 1
+
+            return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+        try:
+            await asyncio.sleep(first_token_delay + token_delay * max(len(tokens) - 1, 0))
+        finally:
+            stats.in_flight -= 1
+
+        return _completion_body(model, text, body.get("messages", []))
+
+    @app.post("/v1/batch/chat/completions")
+    async def batch_chat_completions(request: Request):
+        """
+        Answer several chat requests in one round trip.
+
+        The body is ``{"requests": [<chat completion request>, ...]}`` and
+        the reply ``{"responses": [{"status": 200, "body": {...}}, ...]}`` in
+        the same order. Items are generated in parallel, so the batch takes
+        one first-token delay plus the generation time of its longest item.
+        """
+        items = (await request.json()).get("requests", [])
+        stats = state.stats
+        stats.requests += 1
+        stats.batches += 1
+        stats.batched_items += len(items)
+
+        # Rate limiting applies to the whole call, errors to single items
+        if state.rng.random() < state.profile.rate_limit_rate:
+            stats.rate_limited += 1
+            return _error_response(
+                429, "Rate limit reached", "rate_limit_error",
+                headers={"Retry-After": str(state.profile.retry_after_s)},
+            )
+
+        responses = []
+        longest = 0
+        for item in items:
+            if state.rng.random() < state.profile.error_rate:
+                stats.errors += 1
+                responses.append({"status": 500, "body": _error_body("Simulated upstream failure", "server_error", 500)})
+                continue
+            messages = item.get("messages", [])
+            text = _completion_text(state.profile, messages)
+            body = _completion_body(item.get("model", "stub"), text, messages)
+            longest = max(longest, body["usage"]["completion_tokens"])
+            stats.completion_tokens += body["usage"]["completion_tokens"]
+            responses.append({"status": 200, "body": body})
+
+        token_delay = 1 / state.profile.tokens_per_second if state.profile.tokens_per_second > 0 else 0.0
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            await asyncio.sleep(state.first_token_delay() + token_delay * max(longest - 1, 0))
+        finally:
+            stats.in_flight -= 1
+
+        return {"responses": responses}
+
+    return app
+
+
+class AppServer:
+    """
+    ASGI app served by uvicorn on a background thread.
+
+    Usable as a context manager from pytest fixtures and load-test scripts.
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0, lifespan: str = "on", name: str = "app-server"):
+        """
+        Initialize the server.
+
+        Args:
+            app: ASGI application to serve
+            host: Interface to bind
+            port: Port to bind; 0 picks a free port
+            lifespan: Uvicorn lifespan mode ("on", "off" or "auto")
+            name: Name of the serving thread
+        """
+        self.app = app
+        self.host = host
+        self.port = port or _free_port(host)
+        self.name = name
+        self._server = uvicorn.Server(
+            uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", lifespan=lifespan)
+        )
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """Root URL of the server."""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "AppServer":
+        """Start serving on a daemon thread and wait until it accepts connections."""
+        self._thread = threading.Thread(target=self._server.run, name=self.name, daemon=True)
+        self._thread.start()
+
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"{self.name} failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and wait for the thread to exit."""
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def __enter__(self) -> "AppServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class StubServer(AppServer):
+    """
+    Stand-in server running on a background thread.
+
+    Usable as a context manager from pytest fixtures and load-test scripts:
+
+        with StubServer(LatencyProfile(latency_ms=50)) as server:
+            os.environ["OPENAI_API_BASE"] = server.base_url
+    """
+
+    def __init__(self, profile: LatencyProfile | None = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initialize the server.
+
+        Args:
+            profile: Behaviour profile for the stand-in
+            host: Interface to bind
+            port: Port to bind; 0 picks a free port
+        """
+        super().__init__(create_stub_app(profile), host, port, lifespan="off", name="stub-llm")
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI-compatible base URL, suitable for OPENAI_API_BASE."""
+        return f"{self.url}/v1"
+
+    @property
+    def stats(self) -> StubStats:
+        """Traffic counters of the running server."""
+        return self.app.state.stub.stats
+
+
+def _free_port(host: str) -> int:
+    """Ask the OS for a currently unused TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the stand-in server from the command line."""
+    defaults = LatencyProfile.from_env()
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server for TBBot load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default=defaults.distribution)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--retry-after-s", type=int, default=defaults.retry_after_s)
+    parser.add_argument("--reply", default=defaults.reply)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args(argv)
+
+    profile = LatencyProfile(
+        distribution=args.distribution,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_s=args.retry_after_s,
+        reply=args.reply,
+        seed=args.seed,
+    )
+    uvicorn.run(create_stub_app(profile), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
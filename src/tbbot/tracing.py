@@ -0,0 +1,270 @@
+"""Lightweight request tracing for TBBot.
+
+Each request gets a trace id (taken from an incoming ``traceparent`` or
+``X-Trace-Id`` header, or generated) and sampled traces record spans for
+the stages of the agent pipeline. When a request is not sampled, opening a
+span costs a single context-variable lookup and returns a shared no-op.
+
+Finished traces are handed to a pluggable exporter; in-memory and JSON
+lines file exporters are provided.
+"""
+
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Iterator, Protocol
+
+from .config import Config
+from .logging_config import BatchWriter
+
+
+@dataclass
+class Span:
+    """A timed operation within a trace."""
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        """Span duration in milliseconds."""
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value) -> None:
+        """Attach an attribute to the span."""
+        self.attributes[key] = value
+
+
+@dataclass
+class _Trace:
+    """Spans collected for one sampled request."""
+    trace_id: str
+    spans: list[Span] = field(default_factory=list)
+
+
+class Exporter(Protocol):
+    """Receives the spans of each finished trace."""
+
+    def export(self, spans: list[Span]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class InMemoryExporter:
+    """Keep the most recent spans in memory, e.g. for tests and debugging."""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+    def close(self) -> None:
+        pass
+
+
+class _SpanFormatter:
+    """Format a span as a JSON line for BatchWriter."""
+
+    def format(self, span: Span) -> str:
+        entry = asdict(span)
+        entry["duration_ms"] = span.duration_ms
+        return json.dumps(entry, default=str)
+
+
+class JsonlFileExporter:
+    """Append spans as JSON lines to a file from a background thread."""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer: BatchWriter | None = None
+        self._open()
+
+    def _open(self) -> None:
+        # Caller holds the lock, or is the constructor
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._writer = BatchWriter(self.queue, self._file, _SpanFormatter())
+        self._writer.start()
+
+    def export(self, spans: list[Span]) -> None:
+        if self._writer is None:
+            with self._lock:
+                # Closed at a shutdown, and the app is being served again
+                if self._writer is None:
+                    self._open()
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+
+    def close(self) -> None:
+        """Write the queued spans and close the file; the next export reopens it."""
+        with self._lock:
+            if self._writer is None:
+                return
+            self._writer.stop()
+            self._file.close()
+            self._writer = self._file = None
+
+
+class _NoopSpan:
+    """Stand-in yielded when the current request is not being traced."""
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def _noop_context() -> Iterator[_NoopSpan]:
+    yield _NOOP_SPAN
+
+
+_current_trace: ContextVar[_Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    """Generate a W3C-compatible 128-bit trace id."""
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Tracer:
+    """Create spans for sampled requests and hand finished traces to an exporter."""
+
+    def __init__(self, sample_rate: float = 0.0, exporter: Exporter | None = None):
+        """
+        Initialize the tracer.
+
+        Args:
+            sample_rate: Fraction of requests traced when no upstream decision exists
+            exporter: Destination for finished traces; None disables export
+        """
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def close(self) -> None:
+        """Write out spans still queued by the exporter, e.g. at shutdown."""
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def should_sample(self) -> bool:
+        """Make a head-based sampling decision for a new trace."""
+        return self.exporter is not None and random.random() < self.sample_rate
+
+    @contextmanager
+    def trace(self, name: str, trace_id: str, sampled: bool, parent_id: str | None = None, **attributes):
+        """
+        Open the root span of a request.
+
+        Args:
+            name: Root span name
+            trace_id: Trace id of the request
+            sampled: Whether spans are recorded for this request
+            parent_id: Span id of the caller's span, if propagated
+            **attributes: Attributes for the root span
+        """
+        if not sampled or self.exporter is None:
+            yield _NOOP_SPAN
+            return
+
+        trace = _Trace(trace_id)
+        root = Span(trace_id, _new_span_id(), parent_id, name, time.perf_counter_ns(), attributes=attributes)
+        trace.spans.append(root)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            yield root
+        finally:
+            root.end_ns = time.perf_counter_ns()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self.exporter.export(trace.spans)
+
+    def span(self, name: str, **attributes):
+        """
+        Open a child span of the current span.
+
+        Returns a no-op context when the current request is not traced.
+
+        Args:
+            name: Span name
+            **attributes: Attributes for the span
+        """
+        if _current_trace.get() is None:
+            return _noop_context()
+        return self._span(name, attributes)
+
+    @contextmanager
+    def _span(self, name: str, attributes: dict):
+        trace = _current_trace.get()
+        parent = _current_span.get()
+        span = Span(trace.trace_id, _new_span_id(), parent.span_id if parent else None,
+                    name, time.perf_counter_ns(), attributes=attributes)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes["error"] = type(exc).__name__
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            _current_span.reset(token)
+
+    def record_span(self, name: str, start_ns: int, end_ns: int | None = None, **attributes) -> None:
+        """
+        Record an already-finished span under the current span.
+
+        Used for work measured outside a `with` block, such as request
+        parsing and validation done by the framework before the handler runs.
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        parent = _current_span.get()
+        trace.spans.append(Span(
+            trace.trace_id, _new_span_id(), parent.span_id if parent else None,
+            name, start_ns, end_ns or time.perf_counter_ns(), attributes,
+        ))
+
+
+def current_span() -> Span | None:
+    """Return the active span of a traced request, if any."""
+    return _current_span.get()
+
+
+def _exporter_from_config() -> Exporter | None:
+    if Config.TRACE_EXPORTER == "memory":
+        return InMemoryExporter()
+    if Config.TRACE_EXPORTER == "file":
+        return JsonlFileExporter(Config.TRACE_FILE)
+    return None
+
+
+# Process-wide tracer used by the API and the agent pipeline
+tracer = Tracer(sample_rate=Config.TRACE_SAMPLE_RATE, exporter=_exporter_from_config())
@@ -0,0 +1,220 @@
+"""Columnar transcript store for chat traffic.
+
+Each chat exchange becomes a ``TranscriptRecord`` handed to a bounded queue;
+nothing on the request path touches the disk. A background thread collects
+records into batches and writes each batch as a Parquet file under a
+date/hour partition (UTC)::
+
+    TRANSCRIPTS_DIR/date=2026-10-19/hour=14/part-<id>.parquet
+
+Files are written under a temporary name and renamed into place, so readers
+only ever see complete files. See ``analytics`` for queries over the store.
+
+pyarrow is only imported once a writer writes, so workers without
+TRANSCRIPTS_DIR do not load it.
+"""
+
+import functools
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .config import Config
+
+
+@functools.cache
+def schema():
+    """Arrow schema of the stored records."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("channel", pa.string()),
+        ("tenant", pa.string()),
+        ("session_id", pa.string()),
+        ("status", pa.string()),
+        ("stage", pa.string()),
+        ("language", pa.string()),
+        ("latency_ms", pa.float64()),
+        ("message_chars", pa.int32()),
+        ("response_chars", pa.int32()),
+        ("message", pa.string()),
+        ("response", pa.string()),
+    ])
+
+
+@dataclass
+class TranscriptRecord:
+    """One request/response exchange."""
+    timestamp: float  # Seconds since the epoch, when the request arrived
+    channel: str  # "http", "history" or "ws"
+    status: str  # "ok", "budget" or "error"
+    latency_ms: float
+    message_chars: int
+    response_chars: int
+    stage: str | None = None
+    language: str | None = None
+    tenant: str | None = None
+    session_id: str | None = None
+    message: str | None = None  # Only kept when text storage is enabled
+    response: str | None = None
+
+    @property
+    def partition(self) -> str:
+        """Relative directory of the record's date/hour partition."""
+        moment = datetime.fromtimestamp(self.timestamp, timezone.utc)
+        return f"date={moment:%Y-%m-%d}/hour={moment:%H}"
+
+
+@dataclass
+class WriterStats:
+    """Writer counters; ``dropped`` is updated by callers, the rest by the writer thread."""
+    queued: int = 0
+    dropped: int = 0
+    written: int = 0
+    files: int = 0
+    errors: int = 0
+
+
+class _Flush:
+    """Queue marker asking the writer to write what it holds and signal."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class TranscriptWriter:
+    """Write transcript records to partitioned Parquet files from a background thread."""
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        directory: str | Path,
+        batch_size: int = 1000,
+        flush_interval_s: float = 5.0,
+        queue_size: int = 10000,
+        include_text: bool = False,
+    ):
+        """
+        Initialize the writer and start its thread.
+
+        Args:
+            directory: Root directory of the store
+            batch_size: Records that trigger a write
+            flush_interval_s: Longest time a record waits before being written
+            queue_size: Records held before new ones are dropped
+            include_text: Store message and response text, not just their lengths
+        """
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_s
+        self.include_text = include_text
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats = WriterStats()
+        self._thread = threading.Thread(target=self._run, name="tbbot-transcript-writer", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls) -> "TranscriptWriter | None":
+        """Build the writer from configuration; None when TRANSCRIPTS_DIR is unset."""
+        if not Config.TRANSCRIPTS_DIR:
+            return None
+        return cls(
+            Config.TRANSCRIPTS_DIR,
+            batch_size=Config.TRANSCRIPTS_BATCH_SIZE,
+            flush_interval_s=Config.TRANSCRIPTS_FLUSH_S,
+            queue_size=Config.TRANSCRIPTS_QUEUE_SIZE,
+            include_text=Config.TRANSCRIPTS_INCLUDE_TEXT,
+        )
+
+    def record(self, record: TranscriptRecord) -> None:
+        """Queue a record without blocking; it is dropped and counted when the queue is full."""
+        if not self.include_text:
+            record.message = record.response = None
+        try:
+            self.queue.put_nowait(record)
+            self.stats.queued += 1
+        except queue.Full:
+            self.stats.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Write every record queued so far.
+
+        Returns:
+            Whether the writer finished within the timeout
+        """
+        if not self._thread.is_alive():
+            return False
+        marker = _Flush()
+        self.queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def stop(self) -> None:
+        """Write outstanding records and stop the writer thread."""
+        if not self._thread.is_alive():
+            return
+        # Blocking put is fine here: this runs at shutdown, off the request path
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=5)
+
+    def stats_snapshot(self) -> dict:
+        """Writer counters and the current queue depth."""
+        return {**asdict(self.stats), "queue_depth": self.queue.qsize()}
+
+    def _run(self) -> None:
+        batch: list[TranscriptRecord] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, TranscriptRecord):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch full, interval elapsed, flush requested or stopping
+            self._write(batch)
+            batch, deadline = [], None
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is self._STOP:
+                return
+
+    def _write(self, records: list[TranscriptRecord]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        by_partition: dict[str, list[dict]] = {}
+        for record in records:
+            by_partition.setdefault(record.partition, []).append(asdict(record))
+
+        for partition, rows in by_partition.items():
+            for row in rows:
+                row["timestamp"] = int(row["timestamp"] * 1000)
+            try:
+                table = pa.Table.from_pylist(rows, schema=schema())
+                target = self.directory / partition
+                target.mkdir(parents=True, exist_ok=True)
+                name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+                temporary = target / f".{name}.tmp"
+                pq.write_table(table, temporary)
+                os.replace(temporary, target / name)
+            except Exception:
+                # Analytics must never take the service down
+                self.stats.errors += 1
+                continue
+            self.stats.written += len(rows)
+            self.stats.files += 1
@@ -0,0 +1,249 @@
+"""Token and cost accounting for model calls.
+
+Every model call records prompt/completion tokens and an estimated cost
+against the global, per-tenant and per-session totals. Budgets on those
+totals are checked before a call: over budget, the call is rejected or
+sent to a cheaper model. Token counts come from the backend's usage report
+when present, otherwise from a local character-based estimate, so
+accounting never needs a tokenizer or a network round trip.
+
+Session budgets are advisory: sessions are named by the client's
+``X-Session-Id`` header, so a client that omits it or sends a new one per
+request is never held to a session budget. They keep well-behaved clients
+from runaway conversations; spending is only capped by tenant budgets, for
+requests made on behalf of a configured tenant.
+"""
+
+import json
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from enum import Enum
+
+from .config import Config
+
+
+# USD per million (prompt, completion) tokens; extended or overridden by LLM_PRICES
+DEFAULT_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+# Average characters per token for English-like text
+CHARS_PER_TOKEN = 4
+
+# Per-message framing tokens added by chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class BudgetExceeded(Exception):
+    """Raised when a model call would exceed a configured budget."""
+
+    def __init__(self, scope: str):
+        super().__init__(f"{scope} budget exceeded")
+        self.scope = scope
+
+
+class Action(str, Enum):
+    """What to do with a call that is over budget."""
+    ALLOW = "allow"
+    DOWNGRADE = "downgrade"
+    REJECT = "reject"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text without a tokenizer."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_prompt_tokens(messages: list[dict]) -> int:
+    """Estimate the prompt tokens of chat messages, including framing."""
+    return sum(MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message["content"]) for message in messages) + 3
+
+
+@dataclass
+class UsageTotals:
+    """Accumulated usage for one scope."""
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    estimated: int = 0  # Requests whose tokens were estimated locally
+    rejected: int = 0
+    downgraded: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "total_tokens": self.total_tokens, "cost_usd": round(self.cost_usd, 6)}
+
+
+@dataclass(frozen=True)
+class Budgets:
+    """Spending limits; zero disables a limit. Session limits are advisory, see the module docstring."""
+    request_tokens: int = 0
+    session_tokens: int = 0
+    tenant_cost_usd: float = 0.0
+    over_budget: Action = Action.REJECT
+    downgrade_model: str = ""
+
+
+class UsageLedger:
+    """Thread-safe usage totals and budget checks."""
+
+    def __init__(
+        self,
+        budgets: Budgets | None = None,
+        prices: dict[str, tuple[float, float]] | None = None,
+        max_sessions: int = 10_000,
+    ):
+        """
+        Initialize the ledger.
+
+        Args:
+            budgets: Limits enforced by check()
+            prices: USD per million (prompt, completion) tokens by model
+            max_sessions: Sessions tracked at once; least recently used are dropped
+        """
+        self.budgets = budgets or Budgets()
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self.max_sessions = max_sessions
+        self.total = UsageTotals()
+        self._tenants: dict[str, UsageTotals] = {}
+        self._sessions: OrderedDict[str, UsageTotals] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "UsageLedger":
+        """Build the ledger from BUDGET_* and LLM_PRICES configuration."""
+        prices = dict(DEFAULT_PRICES)
+        if Config.LLM_PRICES:
+            prices.update({model: tuple(price) for model, price in json.loads(Config.LLM_PRICES).items()})
+        budgets = Budgets(
+            request_tokens=Config.BUDGET_REQUEST_TOKENS,
+            session_tokens=Config.BUDGET_SESSION_TOKENS,
+            tenant_cost_usd=Config.BUDGET_TENANT_USD,
+            over_budget=Action(Config.BUDGET_ACTION),
+            downgrade_model=Config.LLM_DOWNGRADE_MODEL,
+        )
+        return cls(budgets, prices, Config.USAGE_MAX_SESSIONS)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimated cost in USD; unknown models cost nothing."""
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def _session(self, session_id: str) -> UsageTotals:
+        # Caller holds the lock
+        totals = self._sessions.get(session_id)
+        if totals is None:
+            totals = self._sessions[session_id] = UsageTotals()
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return totals
+
+    def _scopes(self, session_id: str | None, tenant: str | None) -> list[UsageTotals]:
+        # Caller holds the lock
+        scopes = [self.total]
+        if tenant:
+            scopes.append(self._tenants.setdefault(tenant, UsageTotals()))
+        if session_id:
+            scopes.append(self._session(session_id))
+        return scopes
+
+    def check(self, prompt_tokens: int, session_id: str | None = None, tenant: str | None = None) -> Action:
+        """
+        Decide whether a model call may go ahead.
+
+        Args:
+            prompt_tokens: Estimated prompt tokens of the call
+            session_id: Session making the call
+            tenant: Tenant making the call
+
+        Returns:
+            ALLOW, or DOWNGRADE when over budget and downgrading is configured
+
+        Raises:
+            BudgetExceeded: When over budget and rejecting is configured, or
+                            when the request alone is too large (a cheaper
+                            model would not make it smaller)
+        """
+        budgets = self.budgets
+        if budgets.request_tokens and prompt_tokens > budgets.request_tokens:
+            scope, action = "request", Action.REJECT
+        elif not (budgets.session_tokens or budgets.tenant_cost_usd):
+            return Action.ALLOW
+        else:
+            with self._lock:
+                session = self._sessions.get(session_id) if session_id else None
+                tenant_totals = self._tenants.get(tenant) if tenant else None
+                if budgets.session_tokens and session and session.total_tokens >= budgets.session_tokens:
+                    scope = "session"
+                elif budgets.tenant_cost_usd and tenant_totals and tenant_totals.cost_usd >= budgets.tenant_cost_usd:
+                    scope = "tenant"
+                else:
+                    return Action.ALLOW
+            action = budgets.over_budget
+            if action == Action.DOWNGRADE and not budgets.downgrade_model:
+                action = Action.REJECT
+
+        with self._lock:
+            for totals in self._scopes(session_id, tenant):
+                if action == Action.REJECT:
+                    totals.rejected += 1
+                else:
+                    totals.downgraded += 1
+
+        if action == Action.REJECT:
+            raise BudgetExceeded(scope)
+        return action
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        session_id: str | None = None,
+        tenant: str | None = None,
+        estimated: bool = False,
+    ) -> float:
+        """
+        Record a completed model call.
+
+        Returns:
+            The call's estimated cost in USD
+        """
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            for totals in self._scopes(session_id, tenant):
+                totals.requests += 1
+                totals.prompt_tokens += prompt_tokens
+                totals.completion_tokens += completion_tokens
+                totals.cost_usd += cost
+                totals.estimated += estimated
+        return cost
+
+    def session(self, session_id: str) -> UsageTotals | None:
+        """Usage of one session, if tracked."""
+        with self._lock:
+            totals = self._sessions.get(session_id)
+            return UsageTotals(**asdict(totals)) if totals else None
+
+    def snapshot(self) -> dict:
+        """Global and per-tenant totals."""
+        with self._lock:
+            return {
+                "total": self.total.as_dict(),
+                "tenants": {tenant: totals.as_dict() for tenant, totals in self._tenants.items()},
+                "sessions": len(self._sessions),
+            }
+
+
+ledger = UsageLedger.from_config()
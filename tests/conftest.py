@@ -6,8 +6,12 @@ including environment variable validation for scenario tests.
 
 import pytest
 import os
+import sys
 from pathlib import Path
 
+# Per-test LLM cache hit/miss counts, reported in the terminal summary
+_llm_cache_stats: dict = {}
+
 
 def pytest_configure(config):
     """Configure pytest and validate environment for scenario tests."""
@@ -15,6 +19,9 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "agent_test: mark test as an agent scenario test"
     )
+    config.addinivalue_line(
+        "markers", "perf: mark test as a performance scaling test"
+    )
     
     # Check if running scenario tests
     test_args = config.args
@@ -22,8 +29,14 @@ def pytest_configure(config):
         "scenario" in str(arg) for arg in test_args
     ) if test_args else False
     
+    # Replaying recorded LLM calls needs neither network nor an API key;
+    # use litellm's bundled model cost map instead of fetching it
+    replaying = os.getenv("SCENARIO_LLM_CACHE") == "replay"
+    if replaying:
+        os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+    
     # Validate OpenAI API key for scenario tests
-    if running_scenarios and not os.getenv("OPENAI_API_KEY"):
+    if running_scenarios and not replaying and not os.getenv("OPENAI_API_KEY"):
         pytest.exit(
             "\n\n"
             "❌ OPENAI_API_KEY not found!\n\n"
@@ -46,3 +59,64 @@ def check_env_config():
         pytest.skip("Environment not configured - OPENAI_API_KEY required")
     
     return config
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """Local OpenAI-compatible stand-in server wired into OPENAI_API_BASE."""
+    from tbbot.stub_llm import StubServer
+    
+    with StubServer() as server:
+        monkeypatch.setenv("OPENAI_API_BASE", server.base_url)
+        # Tests import the package both as `tbbot` and `src.tbbot`
+        for module_name in ("tbbot.config", "src.tbbot.config"):
+            module = sys.modules.get(module_name)
+            if module is not None:
+                monkeypatch.setattr(module.Config, "OPENAI_API_BASE", server.base_url)
+        yield server
+
+
+@pytest.fixture(scope="session")
+def llm_cache():
+    """Session-wide record/replay cache wrapped around litellm calls."""
+    from tbbot.config import Config
+    from tbbot.llm_cache import LLMCache
+    
+    cache = LLMCache(
+        Config.SCENARIO_LLM_CACHE_DIR,
+        mode=Config.SCENARIO_LLM_CACHE,
+        namespace=Config.SCENARIO_CACHE_KEY,
+    )
+    cache.install()
+    yield cache
+    cache.uninstall()
+
+
+@pytest.fixture(autouse=True)
+def llm_cache_stats(request):
+    """Route agent scenario tests through the LLM cache and record hits/misses."""
+    if request.node.get_closest_marker("agent_test") is None:
+        yield
+        return
+    
+    cache = request.getfixturevalue("llm_cache")
+    if cache.mode == "off":
+        yield
+        return
+    
+    hits, misses = cache.stats.hits, cache.stats.misses
+    yield
+    _llm_cache_stats[request.node.nodeid] = (
+        cache.stats.hits - hits,
+        cache.stats.misses - misses,
+    )
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report LLM cache hits and misses per scenario test."""
+    if not _llm_cache_stats:
+        return
+    
+    terminalreporter.section("LLM cache")
+    for nodeid, (hits, misses) in _llm_cache_stats.items():
+        terminalreporter.write_line(f"{hits:4d} hits {misses:4d} misses  {nodeid}")
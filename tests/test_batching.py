@@ -0,0 +1,197 @@
+"""Tests for micro-batching of model calls and the stand-in batch endpoint."""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api, batching
+from src.tbbot.backends import BackendError, ChatBackend, Completion
+from src.tbbot.batching import MicroBatcher, shared_batcher
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.llm import LLMStage
+
+BATCH_PATH = "/batch/chat/completions"
+
+
+def user(text):
+    """Chat messages holding a single user message."""
+    return [{"role": "user", "content": text}]
+
+
+class TestBatchEndpoint:
+    """Test the stand-in batch endpoint through the backend client."""
+
+    def test_batch_returns_results_in_order(self, stub_llm):
+        """Test that one call answers every item in order."""
+        backend = ChatBackend(stub_llm.base_url, batch_path=BATCH_PATH)
+
+        results = asyncio.run(backend.complete_batch([(user(f"q{i}"), "stub") for i in range(3)]))
+
+        assert [result.text for result in results] == ["Echo: q0", "Echo: q1", "Echo: q2"]
+        assert all(result.prompt_tokens for result in results)
+        assert stub_llm.stats.batches == 1
+        assert stub_llm.stats.batched_items == 3
+
+    def test_item_errors_are_returned_per_item(self, stub_llm):
+        """Test that failing items come back as errors without failing the batch."""
+        stub_llm.app.state.stub.profile.error_rate = 1.0
+        backend = ChatBackend(stub_llm.base_url, batch_path=BATCH_PATH)
+
+        results = asyncio.run(backend.complete_batch([(user("a"), "stub"), (user("b"), "stub")]))
+
+        assert all(isinstance(result, BackendError) and result.status_code == 500 for result in results)
+
+    def test_unsupported_backend_refuses_batches(self):
+        """Test that batching requires a configured batch endpoint."""
+        with pytest.raises(BackendError):
+            asyncio.run(ChatBackend("http://127.0.0.1:9/v1").complete_batch([(user("a"), "m")]))
+
+
+class TestMicroBatcher:
+    """Test collecting concurrent calls into batches."""
+
+    def test_concurrent_calls_share_batches(self, stub_llm):
+        """Test that calls are grouped up to the batch size and fanned back out."""
+        batcher = MicroBatcher(ChatBackend(stub_llm.base_url, batch_path=BATCH_PATH), window_ms=50, max_batch=4)
+
+        async def burst():
+            return await asyncio.gather(*(batcher.complete(user(f"m{i}"), "stub") for i in range(10)))
+
+        results = asyncio.run(burst())
+
+        assert [result.text for result in results] == [f"Echo: m{i}" for i in range(10)]
+        assert stub_llm.stats.batches == 3
+        snapshot = batcher.stats_snapshot()
+        assert snapshot["batches"] == 3
+        assert snapshot["full_batches"] == 2
+        assert snapshot["mean_fill"] == pytest.approx(10 / 12)
+
+    def test_lone_call_waits_one_window(self, stub_llm):
+        """Test that a single call is dispatched when the window closes."""
+        batcher = MicroBatcher(ChatBackend(stub_llm.base_url, batch_path=BATCH_PATH), window_ms=20, max_batch=8)
+
+        result = asyncio.run(batcher.complete(user("alone"), "stub"))
+
+        assert result.text == "Echo: alone"
+        assert stub_llm.stats.batches == 0
+        assert stub_llm.stats.requests == 1
+        assert 15 <= batcher.stats_snapshot()["max_added_latency_ms"] < 500
+
+    def test_backend_without_batching_gets_concurrent_calls(self, stub_llm):
+        """Test the fallback to concurrent single calls."""
+        batcher = MicroBatcher(ChatBackend(stub_llm.base_url), window_ms=10, max_batch=8)
+
+        async def burst():
+            return await asyncio.gather(*(batcher.complete(user(f"m{i}"), "stub") for i in range(3)))
+
+        results = asyncio.run(burst())
+
+        assert [result.text for result in results] == ["Echo: m0", "Echo: m1", "Echo: m2"]
+        assert stub_llm.stats.requests == 3
+        assert batcher.stats.batches == 1
+
+    def test_failed_batch_fails_every_caller(self, stub_llm):
+        """Test that a rejected batch call raises in every waiting request."""
+        stub_llm.app.state.stub.profile.rate_limit_rate = 1.0
+        batcher = MicroBatcher(ChatBackend(stub_llm.base_url, batch_path=BATCH_PATH), window_ms=10, max_batch=2)
+
+        async def burst():
+            return await asyncio.gather(
+                *(batcher.complete(user(f"m{i}"), "stub") for i in range(2)), return_exceptions=True
+            )
+
+        results = asyncio.run(burst())
+
+        assert all(isinstance(result, BackendError) and result.status_code == 429 for result in results)
+
+    def test_unexpected_errors_fail_every_caller(self):
+        """Test that an error other than BackendError does not leave callers waiting."""
+        class BrokenBackend:
+            name = "broken"
+            supports_batch = True
+
+            async def complete_batch(self, requests, **params):
+                raise KeyError("choices")
+
+        batcher = MicroBatcher(BrokenBackend(), window_ms=10, max_batch=2)
+
+        async def burst():
+            return await asyncio.wait_for(asyncio.gather(
+                *(batcher.complete(user(f"m{i}"), "stub") for i in range(2)), return_exceptions=True
+            ), timeout=2)
+
+        results = asyncio.run(burst())
+
+        assert all(isinstance(result, KeyError) for result in results)
+
+    def test_loops_on_other_threads_get_their_own_batches(self):
+        """Test that a call from another thread's loop does not orphan pending calls."""
+        class EchoBackend:
+            name = "echo"
+            supports_batch = True
+
+            async def complete_batch(self, requests, **params):
+                return [Completion(text=messages[-1]["content"], model=model) for messages, model in requests]
+
+        batcher = MicroBatcher(EchoBackend(), window_ms=100, max_batch=16)
+        results = {}
+
+        def call(name, delay):
+            async def run():
+                await asyncio.sleep(delay)
+                completions = await asyncio.wait_for(asyncio.gather(
+                    *(batcher.complete(user(f"{name}{i}"), "m") for i in range(2))
+                ), timeout=2)
+                return [completion.text for completion in completions]
+
+            results[name] = asyncio.run(run())
+
+        threads = [threading.Thread(target=call, args=(name, delay)) for name, delay in (("a", 0), ("b", 0.03))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == {"a": ["a0", "a1"], "b": ["b0", "b1"]}
+        assert batcher.stats.items == 4
+
+
+def test_shared_batcher_follows_new_settings(monkeypatch):
+    """Test that the shared batcher is rebuilt when its settings change, e.g. on reload."""
+    monkeypatch.setattr(batching, "_shared", {})
+    backend = ChatBackend("http://127.0.0.1:9/v1")
+
+    first = shared_batcher(backend, window_ms=5, max_batch=16)
+    assert shared_batcher(backend, window_ms=5, max_batch=16) is first
+
+    rebuilt = shared_batcher(backend, window_ms=20, max_batch=4)
+
+    assert rebuilt is not first
+    assert (rebuilt.window, rebuilt.max_batch) == (0.02, 4)
+    assert batching.stats_snapshot()[backend.name]["max_batch"] == 4
+
+
+def test_concurrent_chat_requests_are_batched(stub_llm, monkeypatch):
+    """Test that simultaneous /chat requests reach the backend in fewer calls."""
+    backend = ChatBackend(stub_llm.base_url, batch_path=BATCH_PATH)
+    batcher = MicroBatcher(backend, window_ms=50, max_batch=8)
+    agent = GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "stub", batcher=batcher)])
+    monkeypatch.setattr(api, "agent", agent)
+    responses = []
+
+    with TestClient(api.app) as client:
+        def ask(index):
+            responses.append(client.post("/chat", json={"message": f"question {index}"}))
+
+        threads = [threading.Thread(target=ask, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sorted(response.json()["response"] for response in responses) == sorted(
+        f"Echo: question {index}" for index in range(8)
+    )
+    assert stub_llm.stats.requests < 8
+    assert batcher.stats.items == 8
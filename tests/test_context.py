@@ -0,0 +1,282 @@
+"""Tests for conversation history compaction."""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api, context
+from src.tbbot.backends import BackendError, Completion
+from src.tbbot.context import SUMMARY_HEADER, ConversationContext, ModelSummarizer, Turn, extractive_summary
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.llm import LLMStage
+from src.tbbot.pipeline import AgentRequest, CostClass, Stage
+from src.tbbot.usage import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+
+
+class RecordingBackend:
+    """Backend recording the messages it is sent."""
+
+    name = "recording"
+
+    def __init__(self, text="ok", fail=False):
+        self.sent = []
+        self.text = text
+        self.fail = fail
+
+    async def complete(self, messages, model, **params):
+        self.sent.append(messages)
+        if self.fail:
+            raise BackendError("down", status_code=503)
+        return Completion(text=self.text, model=model, prompt_tokens=1, completion_tokens=1)
+
+
+class CountingSummarizer:
+    """Summarizer recording the segments it was asked to fold."""
+
+    def __init__(self):
+        self.segments = []
+
+    def __call__(self, previous, turns):
+        self.segments.append([turn.user for turn in turns])
+        return f"{previous}+{len(turns)}" if previous else str(len(turns))
+
+
+class EchoStage(Stage):
+    """In-memory stage answering every message."""
+
+    name = "echo"
+    cost = CostClass.CPU
+
+    def handle(self, request):
+        return f"echo: {request.message}"
+
+
+class ThreadRecordingSummarizer(CountingSummarizer):
+    """Counting summarizer also recording the thread it runs on."""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def __call__(self, previous, turns):
+        self.threads.add(threading.current_thread().name)
+        return super().__call__(previous, turns)
+
+
+def fill(manager, session_id, count):
+    """Record `count` answered turns q0, q1, ..."""
+    for index in range(count):
+        manager.record(session_id, f"q{index}", f"a{index}", "llm")
+
+
+def tokens(messages):
+    """Estimated size of history messages."""
+    return sum(MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message["content"]) for message in messages)
+
+
+class TestConversationContext:
+    """Test history recording and compaction."""
+
+    def test_short_conversations_are_sent_verbatim(self):
+        """Test that history below the window is unchanged."""
+        manager = ConversationContext(token_budget=1000, keep_turns=4, segment_turns=2)
+        fill(manager, "s", 3)
+
+        history = manager.history("s")
+
+        assert [message["content"] for message in history] == ["q0", "a0", "q1", "a1", "q2", "a2"]
+
+    def test_older_segments_are_summarized_once(self):
+        """Test that each segment is folded exactly once, however often history is built."""
+        summarizer = CountingSummarizer()
+        manager = ConversationContext(token_budget=1000, keep_turns=2, segment_turns=3, summarizer=summarizer)
+
+        fill(manager, "s", 7)
+        for _ in range(5):
+            history = manager.history("s")
+
+        # 7 turns, 2 kept: one complete segment of 3 is folded, 2 + 2 stay verbatim
+        assert summarizer.segments == [["q0", "q1", "q2"]]
+        assert history[0] == {"role": "system", "content": SUMMARY_HEADER + "3"}
+        assert [message["content"] for message in history[1::2]] == ["q3", "q4", "q5", "q6"]
+
+        manager.record("s", "q7", "a7", "llm")
+        history = manager.history("s")
+
+        assert summarizer.segments[1] == ["q3", "q4", "q5"]
+        assert history[0]["content"] == SUMMARY_HEADER + "3+3"
+        assert [message["content"] for message in history[1::2]] == ["q6", "q7"]
+        assert manager.stats.summaries == 2
+
+    def test_recording_alone_keeps_sessions_bounded(self):
+        """Test that turns are folded in the background without history ever being built."""
+        summarizer = CountingSummarizer()
+        manager = ConversationContext(token_budget=1000, keep_turns=2, segment_turns=3, summarizer=summarizer)
+
+        fill(manager, "s", 100)
+        assert manager.flush()
+
+        session = manager._sessions["s"]
+        assert len(session.turns) < 2 + 3
+        assert len(summarizer.segments) == 32
+        assert session.summary.count("+") == 31
+
+    def test_repeated_greetings_are_dropped(self):
+        """Test that only the first greeting turn of a session is kept."""
+        manager = ConversationContext(token_budget=1000)
+        manager.record("s", "hola", "Hola! Soy TBBot.", "greeting")
+        manager.record("s", "hola", "Hola! Soy TBBot.", "greeting")
+        manager.record("s", "what is RAG?", "Retrieval...", "llm")
+        manager.record("s", "hola de nuevo", "Hola! Soy TBBot.", "greeting")
+
+        history = manager.history("s")
+
+        assert [message["content"] for message in history[::2]] == ["hola", "what is RAG?"]
+        assert manager.stats.deduplicated_greetings == 2
+
+    def test_history_fits_the_budget(self):
+        """Test that the oldest verbatim turns are dropped first when over budget."""
+        manager = ConversationContext(token_budget=40, keep_turns=10, segment_turns=10)
+        for index in range(6):
+            manager.record("s", f"question {index} " * 3, f"answer {index} " * 3, "llm")
+
+        history = manager.history("s")
+
+        assert tokens(history) <= 40
+        assert history[-1]["content"].startswith("answer 5")
+        assert manager.stats.dropped_turns > 0
+
+    def test_budget_zero_disables_history(self):
+        """Test that nothing is recorded or sent when disabled."""
+        manager = ConversationContext(token_budget=0)
+        fill(manager, "s", 3)
+
+        assert manager.history("s") == []
+        assert manager.stats.turns == 0
+
+    def test_unknown_or_missing_session_has_no_history(self):
+        """Test requests without a known session."""
+        manager = ConversationContext()
+
+        assert manager.history(None) == []
+        assert manager.history("never-seen") == []
+
+    def test_sessions_are_bounded(self):
+        """Test that the least recently used sessions are forgotten."""
+        manager = ConversationContext(max_sessions=2)
+        for session_id in ("a", "b", "c"):
+            fill(manager, session_id, 1)
+
+        assert manager.history("a") == []
+        assert manager.stats_snapshot()["sessions"] == 2
+
+
+class TestSummarizers:
+    """Test the summary functions."""
+
+    def test_extractive_summary_is_incremental_and_bounded(self):
+        """Test that new turns are appended and the oldest lines dropped past the limit."""
+        first = extractive_summary("", [Turn("hola", "Hola!", "greeting"), Turn("what is RAG?", "Retrieval.")])
+        second = extractive_summary(first, [Turn("x" * 500, "y" * 500)], max_chars=250)
+
+        assert first == "- Student: what is RAG? | TBBot: Retrieval."
+        assert "what is RAG?" not in second
+        assert len(second) <= 350
+
+    def test_model_summarizer(self):
+        """Test that the model is asked to update the previous summary."""
+        backend = RecordingBackend(text=" Student is learning RAG. ")
+        summary = ModelSummarizer(backend, "small")("Earlier: tools.", [Turn("what is RAG?", "Retrieval.")])
+
+        assert summary == "Student is learning RAG."
+        assert "Earlier: tools." in backend.sent[0][-1]["content"]
+
+    def test_model_summarizer_falls_back_on_errors(self):
+        """Test that a failed summary call degrades to the extractive summary."""
+        summary = ModelSummarizer(RecordingBackend(fail=True), "small")("", [Turn("what is RAG?", "Retrieval.")])
+
+        assert summary == "- Student: what is RAG? | TBBot: Retrieval."
+
+
+def test_agent_sends_compacted_history(monkeypatch):
+    """Test that model calls carry earlier turns but not repeated greetings."""
+    backend = RecordingBackend()
+    manager = ConversationContext(token_budget=1000, keep_turns=4, segment_turns=4)
+    monkeypatch.setattr(context, "conversations", manager)
+    agent = GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "m", system_prompt="Tutor.")])
+
+    for message in ("hola", "what is RAG?", "hola", "and embeddings?"):
+        agent.process_message(message, session_id="s")
+
+    last = backend.sent[-1]
+    assert [message["content"] for message in last[1:]][::2] == ["hola", "what is RAG?", "and embeddings?"]
+    assert manager.stats.deduplicated_greetings == 1
+
+
+def test_chat_without_model_stage_never_summarizes(monkeypatch):
+    """Test that /chat keeps working past keep_turns when no stage uses history."""
+    backend = RecordingBackend()
+    manager = ConversationContext(
+        token_budget=1000, keep_turns=2, segment_turns=2, summarizer=ModelSummarizer(backend, "small")
+    )
+    monkeypatch.setattr(context, "conversations", manager)
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage(), EchoStage()]))
+    client = TestClient(api.app)
+
+    responses = [
+        client.post("/chat", json={"message": f"question {index}"}, headers={"X-Session-Id": "s"})
+        for index in range(8)
+    ]
+
+    assert [response.status_code for response in responses] == [200] * 8
+    assert backend.sent == []
+    assert manager.history("s") == []
+
+
+def test_turns_are_folded_off_the_request_thread(monkeypatch):
+    """Test that recording turns leaves summarizing to the background folder."""
+    summarizer = ThreadRecordingSummarizer()
+    manager = ConversationContext(token_budget=1000, keep_turns=2, segment_turns=2, summarizer=summarizer)
+    monkeypatch.setattr(context, "conversations", manager)
+    agent = GreetingAgent(stages=[LLMStage(RecordingBackend(), "m", system_prompt="Tutor.", conversations=manager)])
+    agent.pipeline.stages[0].handle = lambda request: "answer"  # Answer without reading history
+
+    for index in range(8):
+        agent.process_message(f"q{index}", session_id="s")
+    assert manager.flush()
+
+    assert summarizer.threads and all(name.startswith("tbbot-context-fold") for name in summarizer.threads)
+    assert len(summarizer.segments) == 3
+
+
+def test_stage_without_session_sends_no_history():
+    """Test that requests without a session are unaffected."""
+    backend = RecordingBackend()
+    stage = LLMStage(backend, "m", system_prompt="Tutor.", conversations=ConversationContext())
+
+    stage.handle(AgentRequest("first"))
+    stage.handle(AgentRequest("second"))
+
+    assert len(backend.sent[-1]) == 2
+
+
+def test_metrics_expose_context_statistics():
+    """Test that /metrics includes compaction counters."""
+    snapshot = TestClient(api.app).get("/metrics").json()
+
+    assert {"summaries", "deduplicated_greetings", "mean_history_tokens"} <= set(snapshot["context"])
+
+
+@pytest.mark.parametrize("keep_turns,segment_turns", [(0, 1), (3, 5)])
+def test_every_turn_is_summarized_or_verbatim(keep_turns, segment_turns):
+    """Test that no turn is lost between the summary and the verbatim window."""
+    summarizer = CountingSummarizer()
+    manager = ConversationContext(
+        token_budget=10_000, keep_turns=keep_turns, segment_turns=segment_turns, summarizer=summarizer
+    )
+    for count in range(1, 20):
+        manager.record("s", f"q{count - 1}", "a", "llm")
+        history = manager.history("s")
+        folded = [user for segment in summarizer.segments for user in segment]
+        verbatim = [message["content"] for message in history if message["role"] == "user"]
+        assert folded + verbatim == [f"q{index}" for index in range(count)]
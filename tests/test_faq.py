@@ -0,0 +1,213 @@
+"""Tests for fuzzy FAQ matching and its pipeline stage."""
+
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from hypothesis import given, settings, strategies as st
+from src.tbbot import api
+from src.tbbot.backends import ChatBackend
+from src.tbbot.faq import BKTree, FAQEntry, FAQIndex, FAQStage, edit_distance
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.llm import LLMStage
+from src.tbbot.pipeline import AgentRequest
+
+FAQ_FILE = Path(__file__).parent.parent / "src" / "tbbot" / "data" / "faq.json"
+
+
+@pytest.fixture(scope="module")
+def index():
+    """The bundled FAQ, indexed once."""
+    return FAQIndex.from_file(FAQ_FILE)
+
+
+class TestEditDistance:
+    """Test the distance metric behind the BK-tree."""
+
+    @pytest.mark.parametrize("a,b,expected", [
+        ("agent", "agent", 0),
+        ("agnet", "agent", 1),
+        ("wat", "what", 1),
+        ("test", "tset", 1),
+        ("create", "test", 4),
+    ])
+    def test_distances(self, a, b, expected):
+        """Test substitutions, insertions and adjacent transpositions."""
+        assert edit_distance(a, b, 10) == expected
+
+    def test_early_exit_caps_result(self):
+        """Test that distances beyond the limit are reported as limit + 1."""
+        assert edit_distance("prompt", "agent", 1) == 2
+
+    def test_bk_tree_search(self):
+        """Test that the tree returns exactly the words within tolerance."""
+        tree = BKTree(["agent", "agents", "urgent", "tool", "test"])
+
+        assert sorted(word for _, word in tree.search("agnet", 1)) == ["agent"]
+        assert sorted(word for _, word in tree.search("agnet", 2)) == ["agent", "agents"]
+
+    def test_bk_tree_finds_transpositions_missed_by_pruning(self):
+        """Test a match the alignment distance alone would prune away."""
+        tree = BKTree(["abc", "ac"])
+
+        assert tree.search("ca", 1) == [(1, "ac")]
+
+    @settings(max_examples=500)
+    @given(
+        words=st.lists(st.text(alphabet="abc", max_size=5), min_size=1, max_size=20),
+        query=st.text(alphabet="abc", max_size=5),
+        tolerance=st.integers(min_value=0, max_value=2),
+    )
+    def test_bk_tree_matches_brute_force(self, words, query, tolerance):
+        """Test that the tree returns the same words as comparing against each one."""
+        expected = sorted(
+            (distance, word) for word in set(words)
+            if (distance := edit_distance(query, word, tolerance)) <= tolerance
+        )
+
+        assert sorted(BKTree(words).search(query, tolerance)) == expected
+
+
+class TestFAQIndex:
+    """Test lookups against the bundled FAQ."""
+
+    def test_exact_question(self, index):
+        """Test that an exact question matches with full similarity."""
+        match = index.lookup("What is an AI agent?", 0.8)
+
+        assert match.entry.question == "What is an AI agent?"
+        assert match.similarity == 1.0
+
+    @pytest.mark.parametrize("message,question", [
+        ("wat is an agnet", "What is an AI agent?"),
+        ("how do i tset an agent", "How do I test an agent?"),
+        ("what is promt engineering", "What is prompt engineering?"),
+    ])
+    def test_typos_match(self, index, message, question):
+        """Test that misspelled questions still find their entry."""
+        match = index.lookup(message, 0.8)
+
+        assert match is not None
+        assert match.entry.question == question
+
+    @pytest.mark.parametrize("message", [
+        "how do I create an agent?",
+        "What is AI?",
+        "explain machine learning",
+        "hello",
+        "",
+    ])
+    def test_unrelated_messages_do_not_match(self, index, message):
+        """Test that different questions sharing filler words stay below the threshold."""
+        assert index.lookup(message, 0.8) is None
+
+    def test_threshold_is_configurable(self, index):
+        """Test that a lower threshold accepts looser matches."""
+        assert index.lookup("what is a tool", 0.8) is None
+        assert index.lookup("what is a tool", 0.6).entry.question == "What is a tool in an agent?"
+
+    def test_answers_per_language(self, index):
+        """Test that questions in other languages return their own answers."""
+        catalan = index.lookup("Què és un agent d'IA?", 0.8)
+        basque = index.lookup("zer da IA agente bat", 0.8)
+
+        assert catalan.entry.language == "ca"
+        assert catalan.entry.answer.startswith("Un agent d'IA")
+        assert basque.entry.language == "eu"
+
+    def test_lookup_is_sub_millisecond(self, index):
+        """Test that a lookup with typos stays well under a millisecond."""
+        messages = ["wat is an agnet", "how do I create an agent?", "què es una eina"]
+        for message in messages:
+            index.lookup(message, 0.8)
+
+        iterations = 300
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for message in messages:
+                index.lookup(message, 0.8)
+        per_lookup = (time.perf_counter() - start) / (iterations * len(messages))
+
+        assert per_lookup < 1e-3
+
+    def test_empty_index(self):
+        """Test that an index without entries never matches."""
+        assert FAQIndex([]).lookup("what is an agent", 0.5) is None
+
+    def test_best_match_wins(self):
+        """Test that the most similar question is returned."""
+        index = FAQIndex([
+            FAQEntry("en", "What is an agent?", "short"),
+            FAQEntry("en", "What is an agent loop?", "loop"),
+        ])
+
+        assert index.lookup("what is an agent loop", 0.5).entry.answer == "loop"
+        assert index.lookup("what is an agnet", 0.5).entry.answer == "short"
+
+    def test_detected_language_filters_candidates(self):
+        """Test that a known language only matches its own questions."""
+        index = FAQIndex([
+            FAQEntry("en", "What is an agent?", "An agent is..."),
+            FAQEntry("ca", "Què és un agent?", "Un agent és..."),
+        ])
+
+        assert index.lookup("what agent", 0.3).entry.language == "en"
+        assert index.lookup("what agent", 0.3, language="ca").entry.language == "ca"
+        assert index.lookup("what agent", 0.3, language="fr") is None
+
+
+class TestFAQStage:
+    """Test the FAQ stage inside the agent pipeline."""
+
+    def test_stage_answers_and_passes(self, index):
+        """Test that the stage answers FAQ messages and passes on the rest."""
+        stage = FAQStage(index)
+
+        assert stage.handle(AgentRequest("wat is an agnet")).startswith("An AI agent is")
+        assert stage.handle(AgentRequest("tell me a joke")) is None
+
+    def test_faq_answers_before_model(self, index, stub_llm):
+        """Test that FAQ hits never reach the model stage."""
+        agent = GreetingAgent(stages=[
+            LLMStage(ChatBackend(stub_llm.base_url), "stub"),
+            FAQStage(index),
+            GreetingStage(),
+        ])
+
+        assert [stage.name for stage in agent.pipeline.stages] == ["greeting", "faq", "llm"]
+        assert agent.process_message("wat is an agnet").startswith("An AI agent is")
+        assert agent.process_message("tell me a joke") == "Echo: tell me a joke"
+        assert stub_llm.stats.requests == 1
+
+    def test_enabled_by_config(self, monkeypatch):
+        """Test that setting FAQ_PATH adds the stage to the default agent."""
+        from src.tbbot.config import Config
+
+        monkeypatch.setattr(Config, "FAQ_PATH", str(FAQ_FILE))
+        monkeypatch.setattr(Config, "LLM_FALLBACK_ENABLED", False)
+        agent = GreetingAgent()
+
+        assert [stage.name for stage in agent.pipeline.stages] == ["greeting", "faq"]
+        assert agent.process_message("hello").startswith("Hi, my name is TBBot")
+        assert agent.process_message("what is prompt engineering").startswith("Prompt engineering is")
+
+    def test_conversation_language_selects_the_answer(self, monkeypatch):
+        """Test that after a Catalan greeting, a question sharing words with English gets the Catalan answer."""
+        index = FAQIndex([
+            FAQEntry("en", "What is an agent?", "An agent is..."),
+            FAQEntry("ca", "Què és un agent?", "Un agent és..."),
+        ])
+        monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage(), FAQStage(index, threshold=0.3)]))
+        client = TestClient(api.app)
+        greeting = client.post("/chat/history", json={"messages": [{"role": "user", "content": "hola"}]}).json()
+
+        reply = client.post("/chat/history", json={"messages": [
+            {"role": "user", "content": "hola"},
+            {"role": "assistant", "content": greeting["response"]},
+            {"role": "user", "content": "what agent"},
+        ]})
+        without_greeting = client.post("/chat/history", json={"messages": [{"role": "user", "content": "what agent"}]})
+
+        assert reply.json()["response"] == "Un agent és..."
+        assert without_greeting.json()["response"] == "An agent is..."
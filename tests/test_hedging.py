@@ -0,0 +1,216 @@
+"""Tests for hedged model calls."""
+
+import asyncio
+
+import pytest
+from src.tbbot import routing
+from src.tbbot.backends import BackendError, ChatBackend, Completion
+from src.tbbot.config import Config
+from src.tbbot.routing import RoutedBackend
+from src.tbbot.stub_llm import LatencyProfile, StubServer
+
+USER = [{"role": "user", "content": "hi"}]
+
+
+class ScriptedBackend:
+    """Backend whose calls take scripted delays; the last delay repeats."""
+
+    supports_batch = False
+
+    def __init__(self, name, delays, status_code=None):
+        self.name = name
+        self.delays = list(delays)
+        self.status_code = status_code
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, messages, model, **params):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.status_code is not None:
+            raise BackendError(f"{self.name}: HTTP {self.status_code}", self.status_code)
+        return Completion(text="ok", model=model, backend=self.name)
+
+    async def aclose(self):
+        pass
+
+
+def warm(router, times):
+    """Make `times` sequential completions; returns the last result."""
+    async def run():
+        result = None
+        for _ in range(times):
+            result = await router.complete(USER, "stub")
+        return result
+
+    return asyncio.run(run())
+
+
+def hedged_router(backends, fraction=1.0, samples=3):
+    """A router hedging after `samples` measurements, with no exploration."""
+    return RoutedBackend(backends, explore=0, hedge_fraction=fraction,
+                         hedge_min_delay_s=0.01, hedge_min_samples=samples)
+
+
+class TestHedging:
+    """Test when and where calls are hedged."""
+
+    def test_slow_call_is_hedged_to_another_backend(self):
+        """Test that a call slower than the p95 is duplicated and the first answer wins."""
+        primary = ScriptedBackend("primary", [0.001] * 3 + [2.0, 0.001])
+        spare = ScriptedBackend("spare", [0.02, 0.001])
+        router = hedged_router([primary, spare])
+        warm(router, 4)
+
+        result = warm(router, 1)
+
+        assert result.backend == "spare"
+        assert primary.cancelled == 1
+        snapshot = router.stats_snapshot()
+        assert (snapshot["hedges"], snapshot["hedge_wins"]) == (1, 1)
+
+    def test_single_backend_hedges_to_itself(self):
+        """Test that with one backend the duplicate goes to the same backend."""
+        only = ScriptedBackend("only", [0.001] * 3 + [2.0, 0.001])
+        router = hedged_router([only])
+        warm(router, 3)
+
+        assert warm(router, 1).backend == "only"
+        assert only.calls == 5
+        assert only.cancelled == 1
+
+    def test_no_hedging_before_enough_samples(self):
+        """Test that a backend is not hedged until its latency is known."""
+        primary = ScriptedBackend("primary", [0.05])
+        spare = ScriptedBackend("spare", [0.1])
+        router = hedged_router([primary, spare], samples=20)
+
+        warm(router, 4)
+
+        # Only the call measuring it
+        assert spare.calls == 1
+        assert router.stats_snapshot()["hedges"] == 0
+
+    def test_disabled_by_default(self):
+        """Test that routers without a hedge fraction never hedge."""
+        primary = ScriptedBackend("primary", [0.001] * 3 + [0.2])
+        spare = ScriptedBackend("spare", [0.02, 0.001])
+        router = RoutedBackend([primary, spare], explore=0, hedge_min_samples=1)
+
+        assert warm(router, 5).backend == "primary"
+        assert spare.calls == 1
+
+    def test_hedge_rate_is_capped(self):
+        """Test that hedges stay within the configured share of calls."""
+        # Every call is slower than all before it, so each one is a hedge candidate
+        delays = [0.001] * 3 + [0.01 + 0.003 * index for index in range(30)]
+        only = ScriptedBackend("only", delays)
+        router = hedged_router([only], fraction=0.1)
+
+        warm(router, 23)
+
+        snapshot = router.stats_snapshot()
+        assert snapshot["hedges"] == 2
+        # 18 candidates when every call takes exactly its delay; a scheduling
+        # pause in a call raises the p95 above the next few
+        assert 10 <= snapshot["hedges_suppressed"] <= 18
+        assert snapshot["hedge_rate"] == pytest.approx(2 / 23)
+
+    def test_failed_hedge_waits_for_the_primary(self):
+        """Test that a failing duplicate does not fail a call the primary still answers."""
+        primary = ScriptedBackend("primary", [0.001] * 3 + [0.1])
+        broken = ScriptedBackend("broken", [0.02, 0.001])
+        router = hedged_router([primary, broken])
+        warm(router, 4)
+        broken.status_code = 503
+
+        assert warm(router, 1).backend == "primary"
+        assert router.stats_snapshot()["hedge_wins"] == 0
+
+    def test_request_errors_are_not_hedged_around(self):
+        """Test that a 4xx refusal from the primary is raised as-is."""
+        primary = ScriptedBackend("primary", [0.001] * 3 + [0.05])
+        router = hedged_router([primary, ScriptedBackend("spare", [0.02, 1.0])])
+        warm(router, 4)
+        primary.status_code = 400
+
+        with pytest.raises(BackendError) as exc_info:
+            warm(router, 1)
+
+        assert exc_info.value.status_code == 400
+
+    def test_losing_backend_latency_is_not_underestimated(self):
+        """Test that cancelled hedges do not make the slow backend look fast."""
+        primary = ScriptedBackend("primary", [0.01] * 3 + [0.04])
+        slow = ScriptedBackend("slow", [0.2])
+        router = hedged_router([primary, slow])
+        warm(router, 4)
+        tracker = next(route.tracker for route in router.routes if route.backend is slow)
+        before = (tracker.ewma, list(tracker.samples))
+
+        warm(router, 3)
+
+        assert slow.cancelled >= 1
+        assert (tracker.ewma, list(tracker.samples)) == before
+
+    def test_cancelled_caller_cancels_its_attempts(self):
+        """Test that cancelling a call waiting for its hedge delay leaves nothing running."""
+        primary = ScriptedBackend("primary", [0.001] * 3 + [2.0])
+        router = hedged_router([primary], samples=3)
+        warm(router, 3)
+
+        async def run():
+            call = asyncio.ensure_future(router.complete(USER, "stub"))
+            await asyncio.sleep(0.005)  # Within the hedge delay
+            call.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await call
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        assert asyncio.run(run()) == []
+        assert primary.cancelled == 1
+        assert router.routes[0].breaker.available()
+
+
+def test_hedging_cuts_tail_latency_with_stub_servers():
+    """Test that a backend stalling on some calls no longer sets the tail."""
+    with StubServer(LatencyProfile(latency_ms=2)) as flaky, StubServer(LatencyProfile(latency_ms=20)) as steady:
+        backends = [ChatBackend(flaky.base_url, name="flaky"), ChatBackend(steady.base_url, name="steady")]
+        router = RoutedBackend(backends, explore=0, hedge_fraction=0.5, hedge_min_delay_s=0.02, hedge_min_samples=5)
+
+        async def run():
+            # Open connections first so setup time does not skew the measurements
+            for backend in backends:
+                await backend.complete(USER, "stub")
+            for _ in range(6):
+                await router.complete(USER, "stub")
+            flaky.app.state.stub.profile.latency_ms = 1000
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            result = await router.complete(USER, "stub")
+            return result, loop.time() - start
+
+        result, elapsed = asyncio.run(run())
+
+    assert result.backend == "steady"
+    assert elapsed < 0.5
+    assert router.stats_snapshot()["hedge_wins"] == 1
+
+
+def test_configured_hedging_wraps_a_single_backend(monkeypatch):
+    """Test that HEDGE_FRACTION routes even a single OPENAI_API_BASE."""
+    monkeypatch.setattr(Config, "OPENAI_API_BASES", "")
+    monkeypatch.setattr(Config, "OPENAI_API_BASE", "http://127.0.0.1:9/v1")
+    monkeypatch.setattr(Config, "HEDGE_FRACTION", 0.05)
+    monkeypatch.setattr(routing, "_shared", {})
+
+    router = routing.backend_from_config()
+
+    assert isinstance(router, RoutedBackend)
+    assert router.hedge_fraction == 0.05
+    assert len(router.routes) == 1
@@ -0,0 +1,176 @@
+"""Tests for the stateless chat endpoint and its prefix cache."""
+
+from fastapi.testclient import TestClient
+from src.tbbot import api, history
+from src.tbbot.backends import Completion
+from src.tbbot.context import SUMMARY_HEADER, ConversationContext
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.history import PrefixCache, prefix_hashes
+from src.tbbot.llm import LLMStage
+
+
+class RecordingBackend:
+    """Backend recording the messages it is sent and answering with a counter."""
+
+    name = "recording"
+
+    def __init__(self):
+        self.sent = []
+
+    async def complete(self, messages, model, **params):
+        self.sent.append(messages)
+        return Completion(text=f"answer {len(self.sent)}", model=model, prompt_tokens=1, completion_tokens=1)
+
+
+class CountingSummarizer:
+    """Summarizer recording the segments it was asked to fold."""
+
+    def __init__(self):
+        self.segments = []
+
+    def __call__(self, previous, turns):
+        self.segments.append([turn.user for turn in turns])
+        return f"{previous}+{len(turns)}" if previous else str(len(turns))
+
+
+def conversation(turns):
+    """A conversation of `turns` answered exchanges q0/a0, q1/a1, ..."""
+    messages = []
+    for index in range(turns):
+        messages += [{"role": "user", "content": f"q{index}"}, {"role": "assistant", "content": f"a{index}"}]
+    return messages
+
+
+def make_cache(summarizer=None, keep_turns=2, segment_turns=3, token_budget=1000):
+    """A prefix cache with its own compaction settings."""
+    context = ConversationContext(
+        token_budget=token_budget, keep_turns=keep_turns, segment_turns=segment_turns, summarizer=summarizer
+    )
+    return PrefixCache(token_budget=token_budget, conversations=context)
+
+
+def test_prefix_hashes_are_chained():
+    """Test that a prefix hashes the same alone and inside a longer conversation."""
+    messages = conversation(3)
+
+    assert prefix_hashes(messages)[:4] == prefix_hashes(messages[:3])
+    assert len(set(prefix_hashes(messages))) == 7
+    assert prefix_hashes(conversation(1)) != prefix_hashes([{"role": "assistant", "content": "q0"},
+                                                           {"role": "user", "content": "a0"}])
+
+
+class TestPrefixCache:
+    """Test incremental processing of client-held history."""
+
+    def test_matches_session_history(self):
+        """Test that the history equals what a server-held session would send."""
+        session = ConversationContext(token_budget=1000, keep_turns=2, segment_turns=3)
+        for index in range(8):
+            session.record("s", f"q{index}", f"a{index}", "llm")
+
+        prepared = make_cache().prepare(conversation(8))
+
+        assert prepared.messages == session.history("s")
+
+    def test_returning_client_only_costs_the_new_message(self):
+        """Test that a conversation echoed back with one new exchange reuses everything before it."""
+        summarizer = CountingSummarizer()
+        cache = make_cache(summarizer)
+        messages = []
+        for index in range(12):
+            prepared = cache.prepare(messages)
+            cache.remember(prepared, f"q{index}", f"a{index}")
+            messages += [{"role": "user", "content": f"q{index}"}, {"role": "assistant", "content": f"a{index}"}]
+
+        assert cache.stats.processed_messages == 0
+        assert cache.stats.hits == 11
+        # Every segment was folded exactly once
+        folded = [user for segment in summarizer.segments for user in segment]
+        assert folded == [f"q{index}" for index in range(9)]
+        assert cache.prepare(messages).messages[0]["content"] == SUMMARY_HEADER + "3+3+3"
+
+    def test_resumes_from_the_longest_known_prefix(self):
+        """Test that an edited conversation reprocesses only what follows the edit."""
+        cache = make_cache()
+        messages = conversation(6)
+        cache.prepare(messages[:6])
+
+        edited = messages[:6] + [{"role": "user", "content": "edited"}] + messages[7:]
+        prepared = cache.prepare(edited)
+
+        assert cache.stats.reused_messages == 6
+        assert cache.stats.processed_messages == 6 + 6
+        assert [message["content"] for message in prepared.messages if message["role"] == "user"] == [
+            "edited", "q4", "q5"]
+
+    def test_repeated_greetings_are_dropped_and_language_kept(self):
+        """Test greeting deduplication and the detected language."""
+        cache = make_cache()
+        messages = [
+            {"role": "user", "content": "kaixo"}, {"role": "assistant", "content": "Kaixo!"},
+            {"role": "user", "content": "what is RAG?"}, {"role": "assistant", "content": "Retrieval."},
+            {"role": "user", "content": "kaixo berriro"}, {"role": "assistant", "content": "Kaixo!"},
+        ]
+
+        prepared = cache.prepare(messages)
+
+        assert [message["content"] for message in prepared.messages[::2]] == ["kaixo", "what is RAG?"]
+        assert prepared.state.language == "eu"
+
+    def test_unanswered_messages_are_kept(self):
+        """Test consecutive user messages without answers."""
+        prepared = make_cache().prepare([{"role": "user", "content": "first"}, {"role": "user", "content": "second"}])
+
+        assert prepared.messages == [{"role": "user", "content": "first"}, {"role": "user", "content": "second"}]
+
+    def test_cache_is_bounded(self):
+        """Test that the least recently used prefixes are evicted."""
+        cache = PrefixCache(max_entries=2, conversations=ConversationContext())
+        for index in range(4):
+            cache.prepare([{"role": "user", "content": f"m{index}"}])
+
+        assert cache.stats_snapshot()["prefixes"] == 2
+        assert cache.stats.evictions == 2
+
+    def test_budget_zero_sends_no_history(self):
+        """Test that history is processed but not sent when the budget is 0."""
+        cache = make_cache(token_budget=0)
+
+        assert cache.prepare(conversation(3)).messages == []
+
+
+def test_endpoint_sends_history_and_reuses_prefixes(monkeypatch):
+    """Test /chat/history end to end over several turns."""
+    backend = RecordingBackend()
+    agent = GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "m", system_prompt="Tutor.")])
+    monkeypatch.setattr(api, "agent", agent)
+    cache = make_cache(keep_turns=10, segment_turns=10)
+    monkeypatch.setattr(history, "cache", cache)
+    client = TestClient(api.app)
+
+    messages = [{"role": "user", "content": "kaixo"}]
+    for question in ("what is RAG?", "and embeddings?"):
+        reply = client.post("/chat/history", json={"messages": messages})
+        assert reply.status_code == 200
+        messages += [{"role": "assistant", "content": reply.json()["response"]}, {"role": "user", "content": question}]
+    reply = client.post("/chat/history", json={"messages": messages})
+
+    body = reply.json()
+    assert body["response"] == "answer 2"
+    assert body["language"] == "eu"
+    assert body["prefix_hash"] == prefix_hashes(messages + [{"role": "assistant", "content": "answer 2"}])[-1]
+    last = backend.sent[-1]
+    assert [message["content"] for message in last[1:]] == [message["content"] for message in messages]
+    # Only the first request had anything to process
+    assert cache.stats.processed_messages == 0
+    assert cache.stats.hits == 2
+
+
+def test_endpoint_validates_the_conversation():
+    """Test that a conversation must end with a non-empty user message."""
+    client = TestClient(api.app)
+
+    assert client.post("/chat/history", json={"messages": []}).status_code == 422
+    assert client.post("/chat/history", json={"messages": [{"role": "assistant", "content": "hi"}]}).status_code == 422
+    assert client.post("/chat/history", json={"messages": [{"role": "system", "content": "hi"}]}).status_code == 422
+    assert client.post("/chat/history", json={"messages": [{"role": "user", "content": ""}]}).status_code == 422
@@ -0,0 +1,234 @@
+"""Tests for Idempotency-Key handling on /chat."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api, context, idempotency
+from src.tbbot.config import Config
+from src.tbbot.context import ConversationContext
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.idempotency import IdempotencyConflict, IdempotencyStore
+from src.tbbot.pipeline import CostClass, Stage
+
+
+class CountingStage(Stage):
+    """Stage answering every message with a counter, after an optional delay."""
+
+    name = "counting"
+    cost = CostClass.IO
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.started = threading.Event()
+
+    def handle(self, request):
+        self.calls += 1
+        self.started.set()
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return f"answer {self.calls}"
+
+
+@pytest.fixture
+def stage(monkeypatch):
+    """A counting agent behind a fresh idempotency store."""
+    stage = CountingStage()
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage(), stage]))
+    monkeypatch.setattr(idempotency, "store", IdempotencyStore())
+    return stage
+
+
+class TestIdempotencyStore:
+    """Test the store on its own."""
+
+    def test_concurrent_calls_share_one_computation(self):
+        """Test that calls arriving while the first runs attach to it."""
+        store = IdempotencyStore()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(store.run("k", "f", compute) for _ in range(3)))
+
+        results = asyncio.run(run())
+
+        assert results == [("value", False), ("value", True), ("value", True)]
+        assert len(calls) == 1
+        assert store.stats.attached == 2
+
+    def test_cancelled_first_caller_does_not_cancel_the_computation(self):
+        """Test that the computation survives the request that started it."""
+        store = IdempotencyStore()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def run():
+            first = asyncio.create_task(store.run("k", "f", compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await store.run("k", "f", compute)
+
+        assert asyncio.run(run()) == ("value", True)
+
+    def test_failures_are_not_stored(self):
+        """Test that a failed computation is retried by the next request."""
+        store = IdempotencyStore()
+        outcomes = iter([RuntimeError("down"), "value"])
+
+        async def compute():
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await store.run("k", "f", compute)
+            return await store.run("k", "f", compute)
+
+        assert asyncio.run(run()) == ("value", False)
+
+    def test_entries_expire_and_are_bounded(self, monkeypatch):
+        """Test TTL expiry and eviction of the oldest entries."""
+        store = IdempotencyStore(ttl_s=10, max_entries=2)
+        now = [1000.0]
+        monkeypatch.setattr(idempotency.time, "monotonic", lambda: now[0])
+
+        async def value():
+            return "value"
+
+        async def run(key):
+            return await store.run(key, "f", value)
+
+        for key in ("a", "b", "c"):
+            asyncio.run(run(key))
+        assert store.stats_snapshot()["stored"] == 2
+        assert store.stats.evictions == 1
+        assert asyncio.run(run("c")) == ("value", True)
+        assert asyncio.run(run("a")) == ("value", False)
+
+        now[0] += 11
+        assert asyncio.run(run("c")) == ("value", False)
+
+    def test_reused_key_is_a_conflict(self):
+        """Test that a key cannot be reused for another request."""
+        store = IdempotencyStore()
+
+        async def value():
+            return "value"
+
+        asyncio.run(store.run("k", "first", value))
+
+        with pytest.raises(IdempotencyConflict):
+            asyncio.run(store.run("k", "second", value))
+        assert store.stats.conflicts == 1
+
+
+def test_repeat_returns_stored_response(stage):
+    """Test that a retry after completion is answered without running the agent."""
+    client = TestClient(api.app)
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/chat", json={"message": "what is RAG?"}, headers=headers)
+    second = client.post("/chat", json={"message": "what is RAG?"}, headers=headers)
+
+    assert first.json() == second.json() == {"response": "answer 1"}
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert stage.calls == 1
+
+
+def test_requests_without_key_are_not_deduplicated(stage):
+    """Test that plain requests are all answered."""
+    client = TestClient(api.app)
+
+    client.post("/chat", json={"message": "what is RAG?"})
+    client.post("/chat", json={"message": "what is RAG?"})
+
+    assert stage.calls == 2
+    assert idempotency.store.stats.requests == 0
+
+
+def test_retry_attaches_to_running_request(stage, monkeypatch):
+    """Test that a retry arriving mid-computation waits for the original."""
+    stage.delay = 0.3
+    # Warm-up would run the stage before the first request
+    monkeypatch.setattr(Config, "WARMUP_ENABLED", False)
+    responses = {}
+
+    with TestClient(api.app) as client:
+        def send(name):
+            responses[name] = client.post("/chat", json={"message": "slow"}, headers={"Idempotency-Key": "k"})
+
+        original = threading.Thread(target=send, args=("original",))
+        original.start()
+        assert stage.started.wait(2)
+        send("retry")
+        original.join(5)
+
+    assert responses["original"].json() == responses["retry"].json() == {"response": "answer 1"}
+    assert responses["retry"].headers["idempotent-replayed"] == "true"
+    assert stage.calls == 1
+    assert idempotency.store.stats.attached == 1
+
+
+def test_retry_does_not_duplicate_conversation_turns(stage, monkeypatch):
+    """Test that a retried message is recorded once in the session history."""
+    # Turns are only recorded for agents with a model stage
+    stage.cost = CostClass.MODEL
+    conversations = ConversationContext()
+    monkeypatch.setattr(context, "conversations", conversations)
+    client = TestClient(api.app)
+    headers = {"Idempotency-Key": "turn-1", "X-Session-Id": "s1"}
+
+    for _ in range(3):
+        client.post("/chat", json={"message": "what is RAG?"}, headers=headers)
+
+    assert [message["content"] for message in conversations.history("s1")] == ["what is RAG?", "answer 1"]
+
+
+def test_reused_key_with_other_message_is_rejected(stage):
+    """Test that a key reused for a different message gets 422."""
+    client = TestClient(api.app)
+
+    client.post("/chat", json={"message": "first"}, headers={"Idempotency-Key": "k"})
+    response = client.post("/chat", json={"message": "second"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 422
+    assert stage.calls == 1
+
+
+def test_key_from_another_session_is_a_conflict(stage):
+    """Test that the session is part of the request a key identifies."""
+    client = TestClient(api.app)
+
+    client.post("/chat", json={"message": "m"}, headers={"Idempotency-Key": "k", "X-Session-Id": "a"})
+    response = client.post("/chat", json={"message": "m"}, headers={"Idempotency-Key": "k", "X-Session-Id": "b"})
+
+    assert response.status_code == 422
+
+
+def test_failed_request_can_be_retried(stage):
+    """Test that errors are not replayed to retries."""
+    stage.fail = True
+    client = TestClient(api.app)
+    headers = {"Idempotency-Key": "k"}
+
+    assert client.post("/chat", json={"message": "m"}, headers=headers).status_code == 500
+    stage.fail = False
+    response = client.post("/chat", json={"message": "m"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"response": "answer 2"}
@@ -0,0 +1,189 @@
+"""Property-based scaling tests for greeting detection and request models.
+
+These tests generate worst-case input shapes with Hypothesis (whitespace
+runs, huge numbers of tiny tokens, pathological Unicode, deeply nested or
+very wide JSON) and check that runtime and peak memory grow linearly with
+input size. Each shape is measured at a base size and at SCALE times that
+size; a quadratic regression would grow by SCALE**2 and fail the bound.
+"""
+
+import gc
+import json
+import time
+import tracemalloc
+
+import pytest
+from hypothesis import HealthCheck, given, settings, strategies as st
+from pydantic import ValidationError
+
+from src.tbbot.greeting import detect_greeting_language
+from src.tbbot.models import ChatRequest
+
+
+pytestmark = pytest.mark.perf
+
+# Input is grown by this factor between the two measurements
+SCALE = 8
+
+# Allowed slack over perfectly linear growth. Linear code stays well below
+# SCALE * SLACK; quadratic code lands near SCALE ** 2.
+SLACK = 3
+
+PERF_SETTINGS = settings(
+    max_examples=5,
+    deadline=None,
+    suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large],
+)
+
+UNICODE_WHITESPACE = [" ", "\t", "\n", "\r", "\x0b", "\x0c", " ", " ", "　", " "]
+
+# Characters that are expensive for case folding and tokenizing: combining
+# marks, zero-width joiners, characters that expand under lower(), RTL marks
+pathological_chars = st.sampled_from(
+    ["́", "‍", "İ", "ẞ", "‮", "﻿", "\U0001f44b", "ß", "ﬃ", "İ"]
+)
+
+
+def _best_time(func, arg, repeat: int = 5) -> float:
+    """Return the fastest of several timed calls, with GC paused."""
+    gc.disable()
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(arg)
+            best = min(best, time.perf_counter() - start)
+        return best
+    finally:
+        gc.enable()
+
+
+def _peak_memory(func, arg) -> int:
+    """Return the peak traced allocation size of a single call."""
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def assert_scales_linearly(func, build, base_size: int) -> None:
+    """
+    Assert that func's runtime and peak memory grow at most linearly.
+
+    Args:
+        func: Function under test, called with the built input
+        build: Callable returning an input of the given size
+        base_size: Size of the smaller input
+    """
+    small, large = build(base_size), build(base_size * SCALE)
+
+    # Warm up caches and lazy initialization before measuring
+    func(small)
+
+    time_ratio = _best_time(func, large) / max(_best_time(func, small), 1e-6)
+    assert time_ratio < SCALE * SLACK, f"runtime grew {time_ratio:.1f}x for {SCALE}x input"
+
+    memory_ratio = _peak_memory(func, large) / max(_peak_memory(func, small), 1)
+    assert memory_ratio < SCALE * SLACK, f"peak memory grew {memory_ratio:.1f}x for {SCALE}x input"
+
+
+def validate_chat_json(payload: str) -> None:
+    """Validate a raw JSON body as FastAPI would, ignoring rejections."""
+    try:
+        ChatRequest.model_validate_json(payload)
+    except ValidationError:
+        pass
+
+
+class TestGreetingDetectionScaling:
+    """Scaling of detect_greeting_language on adversarial inputs."""
+
+    @PERF_SETTINGS
+    @given(whitespace=st.lists(st.sampled_from(UNICODE_WHITESPACE), min_size=1, max_size=4))
+    def test_whitespace_runs(self, whitespace):
+        """Test huge runs of (Unicode) whitespace around a greeting."""
+        unit = "".join(whitespace)
+        assert_scales_linearly(
+            detect_greeting_language,
+            lambda n: unit * n + "hello" + unit * n,
+            base_size=20_000,
+        )
+
+    @PERF_SETTINGS
+    @given(token=st.text(alphabet="abcxyz", min_size=1, max_size=2))
+    def test_millions_of_tiny_tokens(self, token):
+        """Test messages made of very many one- or two-letter words."""
+        assert_scales_linearly(
+            detect_greeting_language,
+            lambda n: " ".join([token] * n),
+            base_size=125_000,
+        )
+
+    @PERF_SETTINGS
+    @given(chars=st.lists(pathological_chars, min_size=1, max_size=6))
+    def test_pathological_unicode(self, chars):
+        """Test combining marks, joiners and case-expanding characters."""
+        unit = "".join(chars)
+        assert_scales_linearly(
+            detect_greeting_language,
+            lambda n: "hola" + unit * n,
+            base_size=20_000,
+        )
+
+    @PERF_SETTINGS
+    @given(words=st.lists(st.sampled_from(["hello", "hola", "kaixo", "ola", "x"]), min_size=1, max_size=5))
+    def test_repeated_greeting_keywords(self, words):
+        """Test messages that are nothing but greeting keywords."""
+        unit = " ".join(words) + " "
+        assert_scales_linearly(
+            detect_greeting_language,
+            lambda n: unit * n,
+            base_size=10_000,
+        )
+
+
+class TestChatRequestScaling:
+    """Scaling of ChatRequest validation on adversarial JSON bodies."""
+
+    @PERF_SETTINGS
+    @given(text=st.text(min_size=1, max_size=8))
+    def test_long_messages(self, text):
+        """Test very long message strings with arbitrary Unicode."""
+        assert_scales_linearly(
+            validate_chat_json,
+            lambda n: json.dumps({"message": text * n}),
+            base_size=10_000,
+        )
+
+    @PERF_SETTINGS
+    @given(escape=st.sampled_from(["\\u00e9", "\\ud83d\\udc4b", "\\n", "\\\\", "\\\""]))
+    def test_escape_heavy_messages(self, escape):
+        """Test message strings made entirely of JSON escape sequences."""
+        assert_scales_linearly(
+            validate_chat_json,
+            lambda n: '{"message": "' + escape * n + '"}',
+            base_size=10_000,
+        )
+
+    @PERF_SETTINGS
+    @given(opener=st.sampled_from([("[", "]"), ('{"a":', "}")]))
+    def test_deeply_nested_json(self, opener):
+        """Test deeply nested arrays/objects in place of the message."""
+        start, end = opener
+        assert_scales_linearly(
+            validate_chat_json,
+            lambda n: '{"message": ' + start * n + "1" + end * n + "}",
+            base_size=2_000,
+        )
+
+    @PERF_SETTINGS
+    @given(value=st.sampled_from(["0", '"x"', "[]", "{}", "null"]))
+    def test_wide_json_with_unknown_fields(self, value):
+        """Test bodies with huge numbers of ignored extra fields."""
+        assert_scales_linearly(
+            validate_chat_json,
+            lambda n: '{"message": "hi", ' + ", ".join(f'"k{i}": {value}' for i in range(n)) + "}",
+            base_size=5_000,
+        )
@@ -0,0 +1,311 @@
+"""Tests for startup warm-up and graceful shutdown drain."""
+
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api
+from src.tbbot.backends import ChatBackend, Completion
+from src.tbbot.config import Config
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.lifecycle import InFlight, warm_agent, warm_up
+from src.tbbot.llm import LLMStage
+from src.tbbot.pipeline import CostClass, Stage
+from src.tbbot.registry import AgentRegistry, TenantConfig
+from src.tbbot.stub_llm import LatencyProfile, StubServer, _free_port
+
+
+class CountingBackend:
+    """Backend counting completions and warm-ups."""
+
+    name = "counting"
+
+    def __init__(self):
+        self.completions = 0
+        self.warmed = 0
+
+    async def complete(self, messages, model, **params):
+        self.completions += 1
+        return Completion(text="ok", model=model)
+
+    async def warm(self):
+        self.warmed += 1
+        return True
+
+
+class SlowStage(Stage):
+    """Stage answering every message after a delay, off the event loop."""
+
+    name = "slow"
+    cost = CostClass.IO
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.started = threading.Event()
+
+    def handle(self, request):
+        self.started.set()
+        time.sleep(self.delay)
+        return "done"
+
+
+class TestWarmup:
+    """Test warming agents and backends."""
+
+    def test_warm_agent_skips_model_stages_and_statistics(self):
+        """Test that warm-up makes no model call and leaves metrics untouched."""
+        backend = CountingBackend()
+        agent = GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "m")])
+
+        assert warm_agent(agent) == 5
+
+        assert backend.completions == 0
+        assert all(stats["calls"] == 0 for stats in agent.pipeline.stats_snapshot().values())
+
+    def test_warm_up_opens_backend_connections(self):
+        """Test that backends get a pooled connection before the first request."""
+        with StubServer(LatencyProfile()) as server:
+            backend = ChatBackend(server.base_url, name="stub")
+            agent = GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "stub")])
+
+            async def run():
+                report = await warm_up(agent)
+                # The connection opened by warm-up is reused by the first completion
+                await backend.complete([{"role": "user", "content": "hi"}], "stub")
+                pool = backend._get_client()._transport._pool
+                return report, len(pool.connections)
+
+            report, connections = asyncio.run(run())
+
+        assert report.completed
+        assert report.backends == {"stub": True}
+        assert connections == 1
+
+    def test_warm_up_builds_listed_tenants(self):
+        """Test that tenant agents are built ahead of their first request."""
+        registry = AgentRegistry({"course": TenantConfig(llm_fallback=False)})
+
+        report = asyncio.run(warm_up(GreetingAgent(), registry, ["course", "unknown"]))
+
+        assert report.tenants == ["course"]
+        assert report.messages == 10
+        assert registry.peek("course") is not None
+
+    def test_unreachable_backend_does_not_fail_warm_up(self):
+        """Test that a backend that cannot be reached is reported, not raised."""
+        backend = ChatBackend("http://127.0.0.1:9/v1", name="down", timeout=1)
+        agent = GreetingAgent(stages=[LLMStage(backend, "m")])
+
+        report = asyncio.run(warm_up(agent))
+
+        assert report.completed
+        assert report.backends == {"down": False}
+
+
+class TestInFlight:
+    """Test request tracking and draining."""
+
+    def test_drain_waits_for_requests_in_flight(self):
+        """Test that drain returns once the last request finishes."""
+        inflight = InFlight()
+
+        async def run():
+            async def request():
+                with inflight.track():
+                    await asyncio.sleep(0.1)
+
+            task = asyncio.create_task(request())
+            await asyncio.sleep(0)
+            drained = await inflight.drain(timeout=2, poll_interval=0.01)
+            await task
+            return drained
+
+        assert asyncio.run(run())
+        assert inflight.draining
+        assert 0.05 < inflight.drain_s < 1
+
+    def test_drain_gives_up_after_the_timeout(self):
+        """Test that a stuck request does not block shutdown forever."""
+        inflight = InFlight()
+
+        with inflight.track():
+            assert not asyncio.run(inflight.drain(timeout=0.05, poll_interval=0.01))
+
+        assert inflight.stats_snapshot()["in_flight"] == 0
+
+
+def test_app_reports_warm_up_and_becomes_ready(monkeypatch):
+    """Test that startup warms the default agent before readiness passes."""
+    backend = CountingBackend()
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "m")]))
+
+    with TestClient(api.app) as client:
+        readiness = client.get("/readyz").json()
+        warmup = client.get("/metrics").json()["lifecycle"]["warmup"]
+
+    assert readiness["checks"]["warmed_up"] is True
+    assert readiness["checks"]["accepting"] is True
+    assert warmup["completed"] and warmup["messages"] == 5
+    assert backend.warmed == 1
+    assert backend.completions == 0
+
+
+def test_warm_up_can_be_disabled(monkeypatch):
+    """Test that WARMUP_ENABLED=false skips warm-up but still becomes ready."""
+    monkeypatch.setattr(Config, "WARMUP_ENABLED", False)
+
+    with TestClient(api.app) as client:
+        assert client.get("/readyz").status_code == 200
+        assert client.get("/metrics").json()["lifecycle"]["warmup"]["messages"] == 0
+
+
+def test_default_shutdown_fits_the_platform_deadline():
+    """Test that pre-stop delay, drain and grace fit in Kubernetes' default 30 s."""
+    assert Config.shutdown_budget_s() == Config.PRE_STOP_DELAY_S + Config.DRAIN_TIMEOUT_S + Config.SHUTDOWN_GRACE_S
+    assert Config.shutdown_budget_s() <= Config.SHUTDOWN_DEADLINE_S == 30
+
+
+def test_shutdown_budget_over_the_deadline_is_logged(monkeypatch, caplog):
+    """Test that startup warns when a drain could be cut short by SIGKILL."""
+    monkeypatch.setattr(Config, "DRAIN_TIMEOUT_S", 60)
+    monkeypatch.setattr(Config, "WARMUP_ENABLED", False)
+
+    with caplog.at_level(logging.WARNING, logger="src.tbbot.api"):
+        with TestClient(api.app):
+            pass
+
+    assert any(record.getMessage().startswith("Shutdown may be killed mid-drain") for record in caplog.records)
+
+
+def test_shutdown_drains_requests_in_flight(monkeypatch):
+    """Test that shutdown waits for a running request and refuses new ones."""
+    stage = SlowStage(delay=0.5)
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage(), stage]))
+    monkeypatch.setattr(Config, "WARMUP_ENABLED", False)
+    responses = {}
+
+    with TestClient(api.app) as client:
+        def slow_request():
+            responses["slow"] = client.post("/chat", json={"message": "a slow question"})
+
+        def late_requests():
+            while not api.inflight.draining:
+                time.sleep(0.005)
+            responses["late"] = client.post("/chat", json={"message": "too late"})
+            responses["readyz"] = client.get("/readyz")
+
+        threads = [threading.Thread(target=slow_request), threading.Thread(target=late_requests)]
+        threads[0].start()
+        assert stage.started.wait(2)
+        threads[1].start()
+    for thread in threads:
+        thread.join(5)
+
+    assert responses["slow"].status_code == 200
+    assert responses["slow"].json() == {"response": "done"}
+    assert responses["late"].status_code == 503
+    assert responses["late"].headers["connection"] == "close"
+    assert responses["readyz"].status_code == 503
+    assert responses["readyz"].json()["checks"]["accepting"] is False
+    # Serving resumes once the app is started again
+    assert not api.inflight.draining
+
+
+@pytest.mark.parametrize("path", ["/livez", "/readyz"])
+def test_probes_are_served_while_draining(monkeypatch, path):
+    """Test that probes still answer so orchestrators can watch the drain."""
+    monkeypatch.setattr(api.inflight, "draining", True)
+
+    response = TestClient(api.app).get(path)
+
+    assert response.status_code in (200, 503)
+    assert response.headers.get("retry-after") is None
+
+
+def test_websocket_closes_after_the_reply_when_draining(monkeypatch):
+    """Test that a chat stream finishes its frame, then asks the client to reconnect."""
+    client = TestClient(api.app)
+
+    with client.websocket_connect("/ws/chat") as websocket:
+        monkeypatch.setattr(api.inflight, "draining", True)
+        websocket.send_text('{"id": "1", "message": "hello"}')
+
+        assert '"id":"1"' in websocket.receive_text()
+        assert websocket.receive()["code"] == 1012
+
+
+def wait_for(predicate, timeout=10.0):
+    """Poll until the predicate holds, or fail after the timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if predicate():
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    pytest.fail("Condition not met in time")
+
+
+def test_sigterm_fails_readiness_before_the_server_stops():
+    """Test the SIGTERM sequence against a real uvicorn server."""
+    port = _free_port("127.0.0.1")
+    url = f"http://127.0.0.1:{port}"
+    responses = {}
+
+    with StubServer(LatencyProfile(latency_ms=2000)) as stub:
+        env = {
+            **os.environ,
+            "OPENAI_API_BASE": stub.base_url,
+            "OPENAI_API_BASES": "",
+            "LLM_FALLBACK_ENABLED": "true",
+            "WARMUP_ENABLED": "false",
+            "READINESS_INTERVAL_S": "0.1",
+            "PRE_STOP_DELAY_S": "1",
+            "DRAIN_TIMEOUT_S": "10",
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-c", f"import sys; from src.tbbot.cli import main; sys.exit(main(['serve', '--port', '{port}']))"],
+            cwd=Path(__file__).parent.parent,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            with httpx.Client(base_url=url, timeout=10) as client:
+                wait_for(lambda: client.get("/readyz").status_code == 200, timeout=30)
+
+                def slow_request():
+                    with httpx.Client(base_url=url, timeout=10) as own:
+                        responses["slow"] = own.post("/chat", json={"message": "explain tool calling"})
+
+                slow = threading.Thread(target=slow_request)
+                slow.start()
+                wait_for(lambda: stub.stats.requests >= 1)
+                process.send_signal(signal.SIGTERM)
+
+                # Pre-stop: not ready, but still serving
+                wait_for(lambda: client.get("/readyz").status_code == 503, timeout=2)
+                assert client.post("/chat", json={"message": "hello"}).status_code == 200
+                # Draining: new requests are turned away on a closing connection
+                wait_for(lambda: client.post("/chat", json={"message": "hello"}).status_code == 503, timeout=3)
+                late = client.post("/chat", json={"message": "hello"})
+                assert late.headers["connection"] == "close"
+
+                slow.join(10)
+            assert process.wait(timeout=15) in (0, -signal.SIGTERM)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    assert responses["slow"].status_code == 200
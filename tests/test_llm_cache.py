@@ -0,0 +1,114 @@
+"""Unit tests for the scenario LLM record/replay cache."""
+
+import asyncio
+import pytest
+from src.tbbot.llm_cache import LLMCache, LLMCacheMiss, request_key
+
+
+MESSAGES = [{"role": "user", "content": "Say hello"}]
+
+
+def make_cache(tmp_path, mode="auto"):
+    """Build a cache whose replayed responses are plain dicts."""
+    return LLMCache(tmp_path, mode=mode, response_factory=lambda data: data)
+
+
+def fake_completion(calls):
+    """Return a completion function that counts calls."""
+    def completion(**kwargs):
+        calls.append(kwargs)
+        return {"choices": [{"message": {"content": f"reply {len(calls)}"}}]}
+    return completion
+
+
+class TestRequestKey:
+    """Test request normalization and hashing."""
+
+    def test_whitespace_differences_share_a_key(self):
+        """Test that prompts differing only in whitespace hash the same."""
+        spaced = [{"role": "user", "content": "  Say\n   hello "}]
+        assert request_key({"model": "m", "messages": MESSAGES}) == request_key({"model": "m", "messages": spaced})
+
+    def test_credentials_are_not_part_of_the_key(self):
+        """Test that api_key and api_base do not change the key."""
+        plain = request_key({"model": "m", "messages": MESSAGES})
+        with_credentials = request_key({"model": "m", "messages": MESSAGES, "api_key": "sk", "api_base": "http://x"})
+        assert plain == with_credentials
+
+    def test_model_and_namespace_change_the_key(self):
+        """Test that model and namespace are part of the key."""
+        base = request_key({"model": "m", "messages": MESSAGES})
+        assert base != request_key({"model": "other", "messages": MESSAGES})
+        assert base != request_key({"model": "m", "messages": MESSAGES}, namespace="v2")
+
+
+class TestRecordReplay:
+    """Test recording and replaying completions."""
+
+    def test_auto_mode_records_then_replays(self, tmp_path):
+        """Test that a repeated request is served from the store."""
+        calls = []
+        cache = make_cache(tmp_path)
+        completion = cache.wrap(fake_completion(calls))
+
+        first = completion(model="m", messages=MESSAGES)
+        second = completion(model="m", messages=MESSAGES)
+
+        assert first == second
+        assert len(calls) == 1
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    def test_replay_mode_never_calls_provider(self, tmp_path):
+        """Test that replay mode serves recordings and raises on misses."""
+        calls = []
+        make_cache(tmp_path).wrap(fake_completion(calls))(model="m", messages=MESSAGES)
+
+        replay = make_cache(tmp_path, mode="replay")
+        completion = replay.wrap(fake_completion(calls))
+
+        assert completion(model="m", messages=MESSAGES)["choices"][0]["message"]["content"] == "reply 1"
+        with pytest.raises(LLMCacheMiss):
+            completion(model="m", messages=[{"role": "user", "content": "unseen"}])
+        assert len(calls) == 1
+
+    def test_record_mode_refreshes_recordings(self, tmp_path):
+        """Test that record mode always calls the provider and overwrites."""
+        calls = []
+        cache = make_cache(tmp_path, mode="record")
+        completion = cache.wrap(fake_completion(calls))
+
+        completion(model="m", messages=MESSAGES)
+        completion(model="m", messages=MESSAGES)
+
+        replayed = make_cache(tmp_path, mode="replay").wrap(fake_completion([]))(model="m", messages=MESSAGES)
+        assert len(calls) == 2
+        assert replayed["choices"][0]["message"]["content"] == "reply 2"
+
+    def test_streaming_requests_bypass_the_cache(self, tmp_path):
+        """Test that streaming calls are passed through untouched."""
+        calls = []
+        completion = make_cache(tmp_path, mode="replay").wrap(fake_completion(calls))
+
+        completion(model="m", messages=MESSAGES, stream=True)
+
+        assert len(calls) == 1
+        assert not any(tmp_path.iterdir())
+
+    def test_async_wrapper_replays(self, tmp_path):
+        """Test that async completions are cached like sync ones."""
+        calls = []
+        sync_completion = fake_completion(calls)
+
+        async def acompletion(**kwargs):
+            return sync_completion(**kwargs)
+
+        cached = make_cache(tmp_path).wrap_async(acompletion)
+        asyncio.run(cached(model="m", messages=MESSAGES))
+        asyncio.run(cached(model="m", messages=MESSAGES))
+
+        assert len(calls) == 1
+
+    def test_unknown_mode_rejected(self, tmp_path):
+        """Test that an invalid mode is rejected at construction."""
+        with pytest.raises(ValueError):
+            LLMCache(tmp_path, mode="sometimes")
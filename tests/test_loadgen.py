@@ -0,0 +1,253 @@
+"""Tests for the load generator."""
+
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+
+import pytest
+from src.tbbot import api, cli, loadgen
+from src.tbbot.config import Config
+from src.tbbot.greeting import GreetingAgent, GreetingStage, detect_greeting_language
+from src.tbbot.loadgen import LatencyHistogram, LoadReport, MessageMix, run_closed, run_load, run_open
+from src.tbbot.stub_llm import AppServer
+
+
+def exact_percentile(values, percentile):
+    """Nearest-rank percentile of a list of values."""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * percentile / 100)) - 1]
+
+
+class TestLatencyHistogram:
+    """Test the HDR-style histogram."""
+
+    def test_percentiles_within_precision(self):
+        """Test that percentiles are within 0.1% of the exact values."""
+        rng = random.Random(1)
+        values = [rng.lognormvariate(-4, 1.5) for _ in range(20_000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        for percentile in (1, 50, 90, 99, 99.9, 100):
+            exact = exact_percentile(values, percentile)
+            assert histogram.value_at_percentile(percentile) == pytest.approx(exact, rel=1e-3, abs=1e-6)
+        assert histogram.mean == pytest.approx(sum(values) / len(values), rel=1e-3)
+
+    def test_merge_and_round_trip(self):
+        """Test that merged and reloaded histograms report the same percentiles."""
+        first, second, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for index in range(1, 1000):
+            (first if index % 2 else second).record(index / 1000)
+            combined.record(index / 1000)
+
+        first.merge(second)
+        reloaded = LatencyHistogram.from_dict(json.loads(json.dumps(first.as_dict())))
+
+        for percentile in (50, 99, 100):
+            assert reloaded.value_at_percentile(percentile) == combined.value_at_percentile(percentile)
+        assert reloaded.total == 999
+
+    def test_merge_requires_same_precision(self):
+        """Test that histograms of different precision are not merged."""
+        with pytest.raises(ValueError):
+            LatencyHistogram(3).merge(LatencyHistogram(2))
+
+
+class TestMessageMix:
+    """Test synthetic message generation."""
+
+    def test_ratio_and_languages(self):
+        """Test that the mix follows the greeting ratio and language weights."""
+        mix = MessageMix.bundled(greeting_ratio=0.25, weights={"en": 3, "eu": 1}, seed=7)
+        samples = [mix.sample() for _ in range(4000)]
+
+        languages = Counter(language for _, language, _ in samples)
+        greetings = sum(greeting for _, _, greeting in samples)
+        assert set(languages) == {"en", "eu"}
+        assert languages["en"] / len(samples) == pytest.approx(0.75, abs=0.03)
+        assert greetings / len(samples) == pytest.approx(0.25, abs=0.03)
+        # Greetings are detected as such, in their language
+        for message, language, greeting in samples[:200]:
+            assert (detect_greeting_language(message) == language) == greeting
+
+    def test_seed_is_reproducible(self):
+        """Test that the same seed gives the same messages."""
+        first, second = MessageMix.bundled(seed=3), MessageMix.bundled(seed=3)
+
+        assert [first.sample() for _ in range(50)] == [second.sample() for _ in range(50)]
+
+    def test_unknown_language_is_rejected(self):
+        """Test that weights must name bundled languages."""
+        with pytest.raises(ValueError, match="xx"):
+            MessageMix.bundled(weights={"xx": 1})
+
+    def test_parse_weights(self):
+        """Test the command-line weight syntax."""
+        assert loadgen.parse_weights("en=2, ca=1,eu") == {"en": 2.0, "ca": 1.0, "eu": 1.0}
+        assert loadgen.parse_weights("") is None
+
+
+class SerialServer:
+    """Fake endpoint that serves one request at a time."""
+
+    def __init__(self, service_s):
+        self.service_s = service_s
+        self.lock = asyncio.Lock()
+        self.served = 0
+
+    async def send(self, number):
+        async with self.lock:
+            await asyncio.sleep(self.service_s)
+            self.served += 1
+        return "200"
+
+
+class TestRunModes:
+    """Test open- and closed-loop scheduling."""
+
+    def test_open_loop_charges_queueing_to_latency(self):
+        """Test that an overloaded server shows growing latency, not a lower rate."""
+        server = SerialServer(service_s=0.02)
+
+        histogram, statuses, dropped = asyncio.run(run_open(server.send, rate=100, duration_s=0.5))
+
+        # Offered twice what the server can serve: later requests wait behind earlier ones
+        assert statuses == {"200": 50}
+        assert dropped == 0
+        assert histogram.value_at_percentile(100) > 0.4
+        assert histogram.value_at_percentile(0) < 0.05
+
+    def test_open_loop_drops_beyond_max_in_flight(self):
+        """Test that arrivals are dropped, not delayed, when too many are outstanding."""
+        server = SerialServer(service_s=0.05)
+
+        histogram, statuses, dropped = asyncio.run(run_open(server.send, rate=200, duration_s=0.2, max_in_flight=2))
+
+        assert dropped > 20
+        assert histogram.total + dropped == 40
+        # Dropped arrivals count as errors
+        assert statuses["dropped"] == dropped
+        assert LoadReport("chat", "open", 0.2, histogram, statuses, dropped).errors == dropped
+
+    def test_closed_loop_is_paced_by_the_server(self):
+        """Test that closed-loop clients wait for each answer."""
+        server = SerialServer(service_s=0.01)
+
+        histogram, _ = asyncio.run(run_closed(server.send, concurrency=2, duration_s=0.3, warmup_s=0.05))
+
+        # Two clients sharing one 10 ms server: about 30 answers, each waiting for the other
+        assert 20 <= histogram.total <= 35
+        assert histogram.value_at_percentile(50) == pytest.approx(0.02, abs=0.01)
+
+    def test_warmup_is_not_recorded(self):
+        """Test that requests scheduled during the warm-up are left out."""
+        server = SerialServer(service_s=0)
+
+        histogram, _, _ = asyncio.run(run_open(server.send, rate=100, duration_s=0.2, warmup_s=0.2))
+
+        assert server.served == 40
+        assert histogram.total == 20
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """The TBBot app served on a free port, answering greetings only."""
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage()]))
+    with AppServer(api.app) as app_server:
+        yield app_server.url
+
+
+@pytest.mark.parametrize("endpoint", ["chat", "history", "health", "ws"])
+def test_open_loop_against_a_server(server, endpoint):
+    """Test every endpoint at a fixed rate against a real server."""
+    report = asyncio.run(run_load(server, endpoint, rate=50, duration_s=0.4, warmup_s=0.1, concurrency=2, seed=1))
+
+    assert report.statuses == {"ok" if endpoint == "ws" else "200": 20}
+    assert report.errors == 0
+    assert report.throughput == pytest.approx(50)
+    assert 0 < report.percentiles_ms()["p50"] < 1000
+
+
+def test_closed_loop_against_a_server(server):
+    """Test closed-loop load with per-status counts."""
+    report = asyncio.run(run_load(server, "chat", mode="closed", concurrency=4, duration_s=0.3, warmup_s=0.05))
+
+    assert report.requests > 10
+    assert report.errors == 0
+    assert report.concurrency == 4 and report.target_rate is None
+
+
+def test_websocket_pool_replaces_failed_connections(server):
+    """Test that a connection left with a reply due is replaced, and an empty pool fails fast."""
+    pool = loadgen.WebSocketPool(server, size=1, timeout_s=0)
+    send = pool.sender(MessageMix.bundled(greeting_ratio=1.0, seed=1))
+
+    async def run():
+        await pool.open()
+        try:
+            statuses = [await send(0)]
+            pool.timeout_s = 5
+            statuses += [await send(1), await send(2)]
+            pool.timeout_s, pool.url = 0, "ws://127.0.0.1:9/ws/chat"
+            statuses += [await send(3)]
+            statuses += await asyncio.wait_for(asyncio.gather(send(4), send(5)), timeout=2)
+        finally:
+            await pool.close()
+        return statuses
+
+    assert asyncio.run(run()) == ["TimeoutError", "ok", "ok", "TimeoutError", "no_connection", "no_connection"]
+
+
+def test_unreachable_server_counts_errors():
+    """Test that connection failures are reported per type, not raised."""
+    report = asyncio.run(run_load("http://127.0.0.1:9", "health", rate=20, duration_s=0.1, warmup_s=0, timeout_s=1))
+
+    assert report.errors == report.requests == 2
+    assert set(report.statuses) == {"ConnectError"}
+
+
+def test_report_round_trip_and_compare():
+    """Test that saved reports reload and compare."""
+    histogram = LatencyHistogram()
+    for value in (0.01, 0.02, 0.03):
+        histogram.record(value)
+    report = LoadReport("chat", "open", 1.0, histogram, Counter({"200": 3}), target_rate=3)
+
+    reloaded = LoadReport.from_dict(json.loads(json.dumps(report.as_dict())))
+    faster = LoadReport("chat", "open", 1.0, LatencyHistogram(), Counter({"200": 3}), target_rate=3)
+    for value in (0.005, 0.01, 0.015):
+        faster.histogram.record(value)
+
+    assert reloaded.as_dict() == report.as_dict()
+    assert "p99 ms" in loadgen.compare(reloaded, faster)
+    assert "-50.0%" in loadgen.compare(reloaded, faster)
+
+
+def test_cli_local_run_writes_and_compares(monkeypatch, tmp_path, capsys):
+    """Test `tbbot load --local` against the LLM stand-in."""
+    settings = {name: getattr(Config, name) for name in ("OPENAI_API_BASE", "OPENAI_API_BASES", "LLM_FALLBACK_ENABLED")}
+    agent = api.agent
+    output = tmp_path / "report.json"
+    args = ["load", "--local", "--stub-latency-ms", "5", "--rate", "20", "--duration", "0.5",
+            "--warmup", "0.2", "--greeting-ratio", "0.5", "--seed", "2"]
+
+    assert cli.main(args + ["--output", str(output)]) == 0
+    assert cli.main(args + ["--compare", str(output)]) == 0
+
+    # local_server repoints the model settings and the default agent, then restores them
+    assert {name: getattr(Config, name) for name in settings} == settings
+    assert api.agent is agent
+    saved = json.loads(output.read_text())
+    assert saved["requests"] == 10 and saved["errors"] == 0
+    out = capsys.readouterr().out
+    assert "chat open loop, 20 req/s offered" in out
+    assert "baseline" in out
+
+
+def test_cli_needs_a_target(capsys):
+    """Test that a URL or --local is required."""
+    assert cli.main(["load"]) == 2
+    assert "--local" in capsys.readouterr().err
@@ -0,0 +1,172 @@
+"""Tests for the non-blocking structured logging pipeline."""
+
+import io
+import json
+import logging
+import queue
+import sys
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from src.tbbot.api import app
+from src.tbbot.config import Config
+from src.tbbot.logging_config import (
+    BatchWriter,
+    JsonFormatter,
+    QueueingHandler,
+    SignatureRateLimiter,
+    request_id_var,
+)
+
+client = TestClient(app)
+
+
+def make_record(msg="boom %s", args=("now",), level=logging.ERROR, lineno=10, exc=None, **extra):
+    """Build a log record as a logger call would."""
+    exc_info = None
+    if exc is not None:
+        try:
+            raise exc
+        except Exception:
+            exc_info = sys.exc_info()
+    record = logging.LogRecord("tbbot.test", level, "api.py", lineno, msg, args, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestJsonFormatter:
+    """Test JSON formatting of records."""
+
+    def test_extra_fields_are_structured(self):
+        """Test that `extra` values become top-level JSON fields."""
+        line = JsonFormatter().format(make_record(message_length=12, request_id="abc"))
+        entry = json.loads(line)
+
+        assert entry["message"] == "boom now"
+        assert entry["level"] == "ERROR"
+        assert entry["message_length"] == 12
+        assert entry["request_id"] == "abc"
+
+    def test_exception_is_included(self):
+        """Test that exception type and traceback are serialized."""
+        entry = json.loads(JsonFormatter().format(make_record(exc=ValueError("bad"))))
+
+        assert entry["exc_type"] == "ValueError"
+        assert "ValueError: bad" in entry["exc_text"]
+
+
+class TestSignatureRateLimiter:
+    """Test per-signature sampling of error storms."""
+
+    def test_storm_is_limited_per_signature(self):
+        """Test that only the burst passes for one signature."""
+        limiter = SignatureRateLimiter(rate=0.0, burst=3)
+
+        passed = [limiter.filter(make_record()) for _ in range(100)]
+
+        assert sum(passed) == 3
+
+    def test_distinct_signatures_are_independent(self):
+        """Test that a storm on one call site does not silence another."""
+        limiter = SignatureRateLimiter(rate=0.0, burst=1)
+
+        for _ in range(10):
+            limiter.filter(make_record(lineno=1))
+
+        assert limiter.filter(make_record(lineno=2)) is True
+        assert limiter.filter(make_record(lineno=1, exc=KeyError("k"))) is True
+
+    def test_suppressed_count_is_reported(self):
+        """Test that the next admitted record carries the suppressed count."""
+        limiter = SignatureRateLimiter(rate=0.0, burst=1)
+        limiter.filter(make_record())
+        for _ in range(5):
+            limiter.filter(make_record())
+
+        limiter._buckets[next(iter(limiter._buckets))][0] = 1.0
+        record = make_record()
+
+        assert limiter.filter(record) is True
+        assert record.suppressed == 5
+
+    def test_info_records_are_not_sampled(self):
+        """Test that records below WARNING are never dropped."""
+        limiter = SignatureRateLimiter(rate=0.0, burst=0)
+
+        assert limiter.filter(make_record(level=logging.INFO)) is True
+
+    def test_deprecated_setting_names_are_still_read(self, monkeypatch):
+        """Test that LOG_SAMPLE_* still configure the limiter, and lose to LOG_RATE_LIMIT_*."""
+        monkeypatch.setenv("LOG_SAMPLE_RATE", "0.5")
+        monkeypatch.setenv("LOG_SAMPLE_BURST", "4")
+
+        values = Config.load()
+        assert values["LOG_RATE_LIMIT_PER_S"] == 0.5
+        assert values["LOG_RATE_LIMIT_BURST"] == 4
+
+        monkeypatch.setenv("LOG_RATE_LIMIT_PER_S", "2.0")
+        assert Config.load()["LOG_RATE_LIMIT_PER_S"] == 2.0
+
+
+class TestQueueingPipeline:
+    """Test the queue handler and background batch writer."""
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that emitting to a full queue returns immediately."""
+        handler = QueueingHandler(queue.Queue(maxsize=2))
+
+        for _ in range(5):
+            handler.emit(make_record())
+
+        assert handler.dropped == 3
+
+    def test_request_id_captured_on_caller_context(self):
+        """Test that the caller's request id is attached before queueing."""
+        record_queue = queue.Queue()
+        handler = QueueingHandler(record_queue)
+
+        token = request_id_var.set("req-42")
+        try:
+            handler.emit(make_record())
+        finally:
+            request_id_var.reset(token)
+
+        record = record_queue.get_nowait()
+        assert record.request_id == "req-42"
+        assert record.msg == "boom now"
+
+    def test_writer_formats_and_flushes_batches(self):
+        """Test that the writer thread writes queued records as JSON lines."""
+        record_queue = queue.Queue()
+        stream = io.StringIO()
+        handler = QueueingHandler(record_queue)
+        writer = BatchWriter(record_queue, stream, JsonFormatter(), batch_size=4)
+
+        for index in range(10):
+            handler.emit(make_record(msg="record %d", args=(index,)))
+        writer.start()
+        writer.stop()
+
+        lines = stream.getvalue().splitlines()
+        assert [json.loads(line)["message"] for line in lines] == [f"record {i}" for i in range(10)]
+
+
+def test_request_id_header_is_generated_and_echoed():
+    """Test that /chat responses carry a request id, reusing the client's."""
+    generated = client.post("/chat", json={"message": "hello"})
+    echoed = client.post("/chat", json={"message": "hello"}, headers={"X-Request-ID": "client-id"})
+
+    assert generated.headers["x-request-id"]
+    assert echoed.headers["x-request-id"] == "client-id"
+
+
+def test_chat_error_log_has_structured_fields():
+    """Test that chat errors are logged with request id and message length."""
+    with patch('src.tbbot.api.agent.process_message') as mock_process, \
+         patch('src.tbbot.api.logger') as mock_logger:
+        mock_process.side_effect = ValueError("Test error")
+
+        client.post("/chat", json={"message": "test message"}, headers={"X-Request-ID": "r-1"})
+
+    call_args = mock_logger.error.call_args
+    assert call_args.args == ("Error processing message in chat endpoint",)
+    assert call_args.kwargs["extra"] == {"message_length": 12, "request_id": "r-1"}
@@ -0,0 +1,107 @@
+"""Tests for the event-loop lag monitor."""
+
+import asyncio
+import logging
+import time
+
+from fastapi.testclient import TestClient
+from src.tbbot import api
+from src.tbbot.greeting import GreetingAgent
+from src.tbbot.logging_config import request_id_var
+from src.tbbot.loopmonitor import LoopMonitor
+from src.tbbot.pipeline import CostClass, Stage
+
+
+def blocking_call(seconds):
+    """Stand-in for blocking I/O called from async code."""
+    time.sleep(seconds)
+
+
+class MislabelledStage(Stage):
+    """Stage declared in-memory that blocks, so it runs on the event loop."""
+
+    name = "mislabelled"
+    cost = CostClass.CPU
+
+    def handle(self, request):
+        blocking_call(0.3)
+        return "slow answer"
+
+
+def run_monitored(body, monitor):
+    """Run a coroutine function with the monitor started around it."""
+    async def run():
+        await monitor.start()
+        try:
+            await body()
+        finally:
+            await monitor.stop()
+
+    asyncio.run(run())
+
+
+def test_idle_loop_has_no_stalls():
+    """Test that lag is measured continuously and stays low without blocking."""
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.05)
+
+    run_monitored(lambda: asyncio.sleep(0.3), monitor)
+
+    stats = monitor.stats_snapshot()
+    assert stats["samples"] >= 15
+    assert stats["stalls"] == 0
+    assert stats["lag_ms"]["p50"] < 20
+    assert not stats["running"]
+
+
+def test_stall_is_logged_with_stack_and_request_id(caplog):
+    """Test that a blocking call is caught in the act and attributed to its request."""
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.05)
+
+    async def handler():
+        request_id_var.set("req-42")
+        await asyncio.sleep(0.05)
+        blocking_call(0.3)
+        await asyncio.sleep(0.05)
+
+    with caplog.at_level(logging.WARNING, logger="src.tbbot.loopmonitor"):
+        run_monitored(handler, monitor)
+
+    records = [record for record in caplog.records if record.getMessage() == "Event loop blocked"]
+    assert len(records) == 1
+    assert records[0].request_id == "req-42"
+    assert "blocking_call" in records[0].stack
+    assert "time.sleep(seconds)" in records[0].stack
+    stats = monitor.stats_snapshot()
+    assert stats["stalls"] == 1
+    assert stats["lag_ms"]["p100"] > 250
+    assert stats["last_stall"]["lag_ms"] > 250
+    assert stats["last_stall"]["location"].endswith("in blocking_call")
+
+
+def test_monitor_can_restart():
+    """Test that the monitor follows a new event loop after a restart."""
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.05)
+
+    run_monitored(lambda: asyncio.sleep(0.05), monitor)
+    run_monitored(lambda: asyncio.sleep(0.05), monitor)
+
+    assert monitor.stats_snapshot()["samples"] >= 6
+
+
+def test_app_flags_blocking_handler(monkeypatch, caplog):
+    """Test that a stall inside /chat is logged with the request's id."""
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.1)
+    monkeypatch.setattr(api, "loop_monitor", monitor)
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[MislabelledStage()]))
+
+    with caplog.at_level(logging.WARNING, logger="src.tbbot.loopmonitor"):
+        with TestClient(api.app) as client:
+            response = client.post("/chat", json={"message": "anything"}, headers={"X-Request-ID": "abc-123"})
+            stats = client.get("/metrics").json()["event_loop"]
+
+    assert response.json() == {"response": "slow answer"}
+    records = [record for record in caplog.records if record.getMessage() == "Event loop blocked"]
+    assert [record.request_id for record in records] == ["abc-123"]
+    assert "blocking_call(0.3)" in records[0].stack
+    assert stats["running"] and stats["stalls"] == 1
+    assert not monitor.running
@@ -0,0 +1,166 @@
+"""Tests for memory diagnostics and the soak harness."""
+
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api
+from src.tbbot.config import Config
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.memory import MemoryDiagnostics, rss_bytes
+from src.tbbot.soak import MemorySample, SoakReport, run_soak
+from src.tbbot.stub_llm import AppServer
+
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+# Allocations the diff test expects to find
+retained = []
+
+
+@pytest.fixture
+def diagnostics(monkeypatch):
+    """Memory diagnostics enabled on the app, stopped afterwards."""
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    diagnostics = MemoryDiagnostics(max_snapshots=2)
+    monkeypatch.setattr(api, "memory_diagnostics", diagnostics)
+    yield diagnostics
+    diagnostics.stop()
+    retained.clear()
+
+
+def test_disabled_by_default(monkeypatch):
+    """Test that nothing is traced and the endpoint is hidden unless enabled."""
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+
+    assert MemoryDiagnostics.from_config() is None
+    assert not tracemalloc.is_tracing()
+    response = TestClient(api.app).post("/admin/memory/snapshots", headers=ADMIN)
+    assert response.status_code == 404
+    assert TestClient(api.app).get("/metrics").json()["memory"]["tracing"] is False
+
+
+def test_snapshot_requires_admin_token(diagnostics):
+    """Test that snapshots are admin only."""
+    client = TestClient(api.app)
+
+    assert client.post("/admin/memory/snapshots").status_code == 403
+    assert client.post("/admin/memory/snapshots", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_snapshot_diff_shows_what_grew(diagnostics):
+    """Test that the diff against the previous snapshot points at the growing line."""
+    client = TestClient(api.app)
+    first = client.post("/admin/memory/snapshots", headers=ADMIN).json()
+
+    retained.extend(bytearray(1024) for _ in range(2000))
+    second = client.post("/admin/memory/snapshots", headers=ADMIN, params={"limit": 5}).json()
+
+    assert first["diff"] == [] and first["diff_from"] is None
+    assert second["diff_from"] == first["id"]
+    assert len(second["top"]) <= 5
+    growth = second["diff"][0]
+    assert __file__ in growth["location"]
+    assert growth["size_diff_bytes"] > 2_000_000
+    assert growth["count_diff"] >= 2000
+    assert second["traced_bytes"] > 2_000_000
+
+
+def test_only_recent_snapshots_are_kept(diagnostics):
+    """Test that old snapshots are dropped and cannot be diffed against."""
+    client = TestClient(api.app)
+    ids = [client.post("/admin/memory/snapshots", headers=ADMIN).json()["id"] for _ in range(3)]
+
+    response = client.post("/admin/memory/snapshots", headers=ADMIN, params={"diff_from": ids[0]})
+
+    assert response.status_code == 404
+    assert client.post("/admin/memory/snapshots", headers=ADMIN, params={"diff_from": ids[2]}).status_code == 200
+    assert client.get("/metrics").json()["memory"]["snapshots"] == [ids[2], ids[2] + 1]
+
+
+def test_group_by_is_validated(diagnostics):
+    """Test that an unknown grouping is rejected."""
+    response = TestClient(api.app).post("/admin/memory/snapshots", headers=ADMIN, params={"group_by": "module"})
+
+    assert response.status_code == 422
+
+
+def test_rss_is_reported():
+    """Test that the process RSS is available for soak sampling."""
+    assert rss_bytes() > 10 * 2**20
+
+
+class TestSoakReport:
+    """Test judging memory growth."""
+
+    def report(self, rss_values, warmup_s=2, errors=0):
+        samples = [MemorySample(float(index), rss, index * 10, errors) for index, rss in enumerate(rss_values)]
+        return SoakReport(max_growth_bytes=100, warmup_s=warmup_s, samples=samples)
+
+    def test_growth_during_warmup_is_ignored(self):
+        """Test that caches filling early do not count as growth."""
+        report = self.report([0, 5000, 10000, 10010, 10000, 10020, 10010, 10030, 10020, 10040])
+
+        assert report.growth_bytes <= 100
+        assert report.bounded
+
+    def test_steady_growth_is_not_bounded(self):
+        """Test that memory growing all along fails the check."""
+        report = self.report([1000 * index for index in range(12)])
+
+        assert report.growth_bytes > 100
+        assert not report.bounded
+        assert "NOT bounded" in report.format()
+
+    def test_too_few_samples_are_inconclusive(self):
+        """Test that a run too short to compare quarters does not pass."""
+        report = self.report([1000, 1000, 1000, 1000], warmup_s=2)
+
+        assert report.growth_bytes is None
+        assert not report.bounded
+        assert report.verdict.startswith("inconclusive")
+        assert "n/a" in report.format()
+
+    def test_failed_requests_fail_the_run(self):
+        """Test that flat memory does not pass when requests failed."""
+        report = self.report([1000] * 12, errors=3)
+
+        assert report.growth_bytes == 0
+        assert not report.bounded
+        assert report.verdict == "failed (3 of 110 requests failed)"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """The TBBot app served on a free port, answering greetings only."""
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage()]))
+    with AppServer(api.app) as app_server:
+        yield app_server.url
+
+
+def test_soak_samples_server_memory(server):
+    """Test that a short soak samples RSS at each interval."""
+    report = asyncio.run(run_soak(server, duration_s=1, rate=20, sample_interval_s=0.25, warmup_s=0))
+
+    assert len(report.samples) == 5
+    assert report.requests == 20 and report.errors == 0
+    assert all(sample.rss_bytes > 0 for sample in report.samples)
+
+
+@pytest.mark.perf
+def test_soak_memory_stays_bounded(server):
+    """Test that steady chat traffic does not grow the worker's memory.
+
+    Runs for SOAK_DURATION_S seconds (default 60); set it to hours before a release.
+    """
+    duration = float(os.getenv("SOAK_DURATION_S", "60"))
+
+    report = asyncio.run(run_soak(
+        server, duration_s=duration, rate=100, sample_interval_s=duration / 20, warmup_s=duration / 4,
+        max_growth_bytes=20 * 2**20,
+    ))
+
+    assert report.errors == 0
+    assert report.bounded, report.format()
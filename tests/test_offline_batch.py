@@ -0,0 +1,120 @@
+"""Tests for the offline batch-processing command."""
+
+import json
+
+import pytest
+from src.tbbot.cli import main
+from src.tbbot.offline import completed_records, run_batch
+
+GREETING = "Hi, my name is TBBot. I am here to help you with your questions"
+MESSAGES = ["hello", "what is AI?", "kaixo", "ola amigo", "hola"]
+
+
+def write_jsonl(path, count):
+    """Write `count` message records cycling through MESSAGES."""
+    with open(path, "w", encoding="utf-8") as handle:
+        for index in range(count):
+            handle.write(json.dumps({"id": index, "message": MESSAGES[index % len(MESSAGES)]}) + "\n")
+    return path
+
+
+def read_jsonl(path):
+    """Read every line of a JSONL file."""
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_results_are_written_in_input_order(tmp_path):
+    """Test that every record gets its response and stage, in order."""
+    source = write_jsonl(tmp_path / "in.jsonl", 23)
+    target = tmp_path / "out.jsonl"
+
+    summary = run_batch(source, target, workers=1, chunk_size=4)
+
+    results = read_jsonl(target)
+    assert summary.processed == 23
+    assert [result["id"] for result in results] == list(range(23))
+    assert results[0] == {"id": 0, "message": "hello", "response": GREETING, "stage": "greeting"}
+    assert results[1]["response"] == "" and results[1]["stage"] is None
+
+
+def test_process_pool_matches_inline_output(tmp_path):
+    """Test that worker processes produce the same ordered output."""
+    source = write_jsonl(tmp_path / "in.jsonl", 500)
+    inline, pooled = tmp_path / "inline.jsonl", tmp_path / "pooled.jsonl"
+
+    run_batch(source, inline, workers=1, chunk_size=32)
+    summary = run_batch(source, pooled, workers=2, chunk_size=32)
+
+    assert summary.processed == 500
+    assert pooled.read_bytes() == inline.read_bytes()
+
+
+def test_bad_records_keep_their_line(tmp_path):
+    """Test that unreadable records produce an error line instead of shifting output."""
+    source = tmp_path / "in.jsonl"
+    source.write_text('{"message": "hello"}\nnot json\n\n{"text": "hi"}\n[1]\n', encoding="utf-8")
+    target = tmp_path / "out.jsonl"
+
+    summary = run_batch(source, target, workers=1)
+
+    results = read_jsonl(target)
+    assert summary.errors == 3
+    assert [result.get("error") for result in results] == [
+        None, "invalid record", "missing message", "invalid record",
+    ]
+
+
+def test_csv_input(tmp_path):
+    """Test reading messages from a CSV column."""
+    source = tmp_path / "in.csv"
+    source.write_text('student,text\nane,"kaixo, zer moduz?"\njon,hello\n', encoding="utf-8")
+    target = tmp_path / "out.jsonl"
+
+    run_batch(source, target, workers=1, field="text")
+
+    results = read_jsonl(target)
+    assert results[0]["student"] == "ane"
+    assert results[0]["stage"] is None  # "kaixo," keeps its comma, so it is not a greeting word
+    assert results[1]["response"] == GREETING
+
+
+def test_resume_after_interruption(tmp_path):
+    """Test that a resumed run skips finished records and repairs a torn last line."""
+    source = write_jsonl(tmp_path / "in.jsonl", 50)
+    complete, target = tmp_path / "complete.jsonl", tmp_path / "out.jsonl"
+    run_batch(source, complete, workers=1, chunk_size=7)
+
+    # Simulate a crash half-way through writing line 21
+    data = complete.read_bytes()
+    cut = sum(len(line) for line in data.splitlines(keepends=True)[:20]) + 10
+    target.write_bytes(data[:cut])
+
+    summary = run_batch(source, target, workers=1, chunk_size=7, resume=True)
+
+    assert summary.skipped == 20
+    assert summary.processed == 30
+    assert target.read_bytes() == data
+
+
+def test_completed_records_of_missing_file(tmp_path):
+    """Test that resuming without earlier output starts from the beginning."""
+    assert completed_records(tmp_path / "missing.jsonl") == 0
+
+
+def test_cli_batch_command(tmp_path, capsys):
+    """Test the `tbbot batch` entry point."""
+    source = write_jsonl(tmp_path / "in.jsonl", 10)
+    target = tmp_path / "out.jsonl"
+
+    exit_code = main(["batch", str(source), str(target), "--workers", "1", "--quiet"])
+
+    assert exit_code == 0
+    assert len(read_jsonl(target)) == 10
+    assert "Processed 10 records" in capsys.readouterr().err
+
+
+def test_cli_requires_a_command():
+    """Test that running without a subcommand is a usage error."""
+    with pytest.raises(SystemExit) as exc_info:
+        main([])
+    assert exc_info.value.code == 2
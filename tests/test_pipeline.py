@@ -0,0 +1,133 @@
+"""Tests for the cost-ordered agent pipeline and its stages."""
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api
+from src.tbbot.backends import BackendError, ChatBackend
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.llm import LLMStage
+from src.tbbot.pipeline import AgentRequest, CostClass, Pipeline, Stage
+
+client = TestClient(api.app)
+
+
+class RecordingStage(Stage):
+    """Stage answering a fixed set of messages and recording its calls."""
+
+    def __init__(self, name, cost, answers, calls):
+        self.name = name
+        self.cost = cost
+        self.answers = answers
+        self.calls = calls
+
+    def handle(self, request):
+        self.calls.append(self.name)
+        return self.answers.get(request.message)
+
+
+class TestPipeline:
+    """Test ordering, short-circuiting and statistics."""
+
+    def test_stages_run_cheapest_first(self):
+        """Test that stages are sorted by cost class regardless of given order."""
+        calls = []
+        pipeline = Pipeline([
+            RecordingStage("model", CostClass.MODEL, {}, calls),
+            RecordingStage("faq", CostClass.CPU, {}, calls),
+            RecordingStage("greeting", CostClass.MICRO, {}, calls),
+        ])
+
+        result = pipeline.run(AgentRequest("anything"))
+
+        assert calls == ["greeting", "faq", "model"]
+        assert result.response == ""
+        assert result.stage is None
+
+    def test_first_answer_short_circuits(self):
+        """Test that later, more expensive stages are skipped once answered."""
+        calls = []
+        pipeline = Pipeline([
+            RecordingStage("cheap", CostClass.MICRO, {"q": "cheap answer"}, calls),
+            RecordingStage("expensive", CostClass.MODEL, {"q": "expensive answer"}, calls),
+        ])
+
+        result = pipeline.run(AgentRequest("q"))
+
+        assert result.response == "cheap answer"
+        assert result.stage == "cheap"
+        assert calls == ["cheap"]
+
+    def test_hit_rate_statistics(self):
+        """Test that per-stage calls, hits and hit rate are tracked."""
+        pipeline = Pipeline([GreetingStage()])
+        for message in ["hello", "hola", "what is AI?", "explain agents"]:
+            pipeline.run(AgentRequest(message))
+
+        stats = pipeline.stats_snapshot()["greeting"]
+
+        assert stats["cost"] == "MICRO"
+        assert stats["calls"] == 4
+        assert stats["hits"] == 2
+        assert stats["hit_rate"] == 0.5
+        assert stats["mean_us"] > 0
+
+    def test_max_cost(self):
+        """Test that the most expensive stage determines whether processing blocks."""
+        assert GreetingAgent(stages=[GreetingStage()]).is_blocking is False
+
+        backend = ChatBackend("http://127.0.0.1:9/v1")
+        assert GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "stub")]).is_blocking is True
+
+
+class TestLLMStage:
+    """Test the model fallback stage against the local stand-in server."""
+
+    def test_llm_answers_non_greetings(self, stub_llm):
+        """Test that non-greetings fall through to the model."""
+        agent = GreetingAgent(stages=[GreetingStage(), LLMStage(ChatBackend(stub_llm.base_url), "stub")])
+
+        assert agent.process_message("hello").startswith("Hi, my name is TBBot")
+        assert agent.process_message("what is AI?") == "Echo: what is AI?"
+        assert stub_llm.stats.requests == 1
+
+    def test_calls_without_a_server_reuse_one_connection(self, stub_llm):
+        """Test that synchronous callers, e.g. batch jobs, keep one client and connection."""
+        backend = ChatBackend(stub_llm.base_url)
+        agent = GreetingAgent(stages=[GreetingStage(), LLMStage(backend, "stub")])
+
+        for index in range(3):
+            assert agent.process_message(f"question {index}") == f"Echo: question {index}"
+
+        clients = list(backend._clients.values())
+        assert len(clients) == 1
+        assert len(clients[0]._transport._pool.connections) == 1
+
+    def test_backend_errors_propagate(self, stub_llm):
+        """Test that backend failures surface as BackendError."""
+        stub_llm.app.state.stub.profile.error_rate = 1.0
+        stage = LLMStage(ChatBackend(stub_llm.base_url), "stub")
+
+        with pytest.raises(BackendError) as exc_info:
+            stage.handle(AgentRequest("what is AI?"))
+        assert exc_info.value.status_code == 500
+
+
+def test_chat_endpoint_offloads_model_stage(stub_llm, monkeypatch):
+    """Test that /chat answers through a model stage without blocking the loop."""
+    agent = GreetingAgent(stages=[GreetingStage(), LLMStage(ChatBackend(stub_llm.base_url), "stub")])
+    monkeypatch.setattr(api, "agent", agent)
+
+    response = client.post("/chat", json={"message": "how do I build an agent?"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "Echo: how do I build an agent?"
+
+
+def test_metrics_endpoint_reports_stage_statistics():
+    """Test that /metrics exposes per-stage pipeline statistics."""
+    client.post("/chat", json={"message": "kaixo"})
+
+    pipeline_stats = client.get("/metrics").json()["pipeline"]
+
+    assert pipeline_stats["greeting"]["calls"] >= 1
+    assert pipeline_stats["greeting"]["hits"] >= 1
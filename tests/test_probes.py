@@ -0,0 +1,111 @@
+"""Tests for liveness/readiness probes and the container probe script."""
+
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+from fastapi.testclient import TestClient
+from src.tbbot.api import app, readiness
+from src.tbbot.health import ReadinessChecker
+from src.tbbot.probe import probe
+
+PROBE_SCRIPT = Path(__file__).resolve().parents[1] / "src" / "tbbot" / "probe.py"
+
+
+def test_livez_returns_200():
+    """Test that the liveness probe always answers."""
+    response = TestClient(app).get("/livez")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "healthy"}
+
+
+def test_readyz_reports_cached_checks_after_startup():
+    """Test that readiness is ready once the background checks have run."""
+    with TestClient(app) as client:
+        response = client.get("/readyz")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert body["checks"]["agent"] is True
+    assert body["checks"]["log_queue"] is True
+
+
+def test_readyz_does_not_run_checks_per_call(monkeypatch):
+    """Test that probes serve the cached state without calling checks."""
+    calls = []
+    with TestClient(app) as client:
+        monkeypatch.setitem(readiness._checks, "counted", lambda: calls.append(1) or True)
+        for _ in range(20):
+            client.get("/readyz")
+
+    assert calls == []
+
+
+class TestReadinessChecker:
+    """Test the background readiness checker."""
+
+    def test_not_ready_before_first_round(self):
+        """Test that a fresh checker reports not ready."""
+        assert ReadinessChecker().state.ready is False
+
+    def test_failing_or_raising_check_makes_not_ready(self):
+        """Test that a failing, raising or slow check fails readiness."""
+        checker = ReadinessChecker(timeout=0.05)
+        checker.register("ok", lambda: True)
+        checker.register("raises", lambda: 1 / 0)
+
+        async def slow():
+            await asyncio.sleep(1)
+            return True
+
+        checker.register("slow", slow)
+        state = asyncio.run(checker.run_checks())
+
+        assert state.ready is False
+        assert state.checks == {"ok": True, "raises": False, "slow": False}
+
+    def test_background_loop_refreshes_state(self):
+        """Test that the background task picks up a recovering dependency."""
+        healthy = {"value": False}
+        checker = ReadinessChecker(interval=0.01)
+        checker.register("dep", lambda: healthy["value"])
+
+        async def scenario():
+            await checker.start()
+            first = checker.state.ready
+            healthy["value"] = True
+            await asyncio.sleep(0.05)
+            await checker.stop()
+            return first, checker.state.ready
+
+        assert asyncio.run(scenario()) == (False, True)
+
+    def test_backend_check_against_stand_in(self, stub_llm):
+        """Test the backend reachability check against a live server."""
+        from src.tbbot.health import backend_check
+
+        checker = ReadinessChecker(timeout=1.0)
+        checker.register("up", backend_check(stub_llm.base_url))
+        checker.register("down", backend_check("http://127.0.0.1:9/v1"))
+
+        assert asyncio.run(checker.run_checks()).checks == {"up": True, "down": False}
+
+
+class TestProbeScript:
+    """Test the stdlib-only probe used by the Docker HEALTHCHECK."""
+
+    def test_probe_reports_status(self, stub_llm):
+        """Test that the probe succeeds on 200 and fails otherwise."""
+        assert probe(f"{stub_llm.base_url}/models") is True
+        assert probe(f"{stub_llm.base_url}/missing") is False
+        assert probe("http://127.0.0.1:9/livez", timeout=0.5) is False
+
+    def test_probe_runs_without_site_packages(self, stub_llm):
+        """Test that the script works under `python -I -S`."""
+        ok = subprocess.run([sys.executable, "-I", "-S", str(PROBE_SCRIPT), f"{stub_llm.base_url}/models"])
+        failed = subprocess.run([sys.executable, "-I", "-S", str(PROBE_SCRIPT), "http://127.0.0.1:9/livez"])
+
+        assert ok.returncode == 0
+        assert failed.returncode == 1
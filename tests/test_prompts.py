@@ -0,0 +1,133 @@
+"""Tests for prompt assembly and prefix reuse."""
+
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api, prompts
+from src.tbbot.backends import Completion
+from src.tbbot.llm import LLMStage
+from src.tbbot.pipeline import AgentRequest
+from src.tbbot.prompts import FewShotExample, PromptBuilder, PromptStats, compile_prefix, load_examples
+from src.tbbot.usage import estimate_prompt_tokens
+
+EXAMPLES = (FewShotExample("What is a tool?", "A function the agent can call."),)
+
+
+class RecordingBackend:
+    """Backend recording the messages it is sent."""
+
+    name = "recording"
+
+    def __init__(self):
+        self.sent = []
+
+    async def complete(self, messages, model, **params):
+        self.sent.append(messages)
+        return Completion(text="ok", model=model, prompt_tokens=1, completion_tokens=1)
+
+
+@pytest.fixture
+def fresh_stats(monkeypatch):
+    """Measure prompt builds from zero."""
+    local = PromptStats()
+    monkeypatch.setattr(prompts, "stats", local)
+    return local
+
+
+class TestPromptBuilder:
+    """Test prompt layout and caching."""
+
+    def test_layout_puts_static_segments_first(self):
+        """Test system, context and examples precede history and the message."""
+        builder = PromptBuilder("Be helpful.", context="Course: Agents 101", examples=EXAMPLES)
+        history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+        prompt = builder.build(AgentRequest("what is an agent?"), history=history)
+
+        assert [message["role"] for message in prompt.messages] == [
+            "system", "user", "assistant", "user", "assistant", "user",
+        ]
+        assert prompt.messages[0]["content"] == "Be helpful.\n\nCourse context:\nCourse: Agents 101"
+        assert prompt.messages[-1] == {"role": "user", "content": "what is an agent?"}
+        assert prompt.estimated_tokens == estimate_prompt_tokens(prompt.messages)
+
+    def test_prefix_is_compiled_once_and_byte_identical(self):
+        """Test that equal configurations share one compiled prefix."""
+        first = PromptBuilder("Be helpful.", examples=EXAMPLES)
+        second = PromptBuilder("Be helpful.", examples=list(EXAMPLES))
+
+        assert first.prefix is second.prefix
+        a = first.build(AgentRequest("one")).messages
+        b = second.build(AgentRequest("two")).messages
+        assert json.dumps(a[:-1]) == json.dumps(b[:-1])
+
+    def test_different_configuration_changes_digest(self):
+        """Test that the digest identifies the prefix content."""
+        assert compile_prefix("A").digest != compile_prefix("B").digest
+        assert compile_prefix("A").digest == compile_prefix("A").digest
+
+    def test_stats_measure_prefix_reuse(self, fresh_stats):
+        """Test that only the first prompt of a prefix counts as not reused."""
+        builder = PromptBuilder("Stable prefix for stats")
+        for message in ["a", "b", "c", "d"]:
+            builder.build(AgentRequest(message))
+        PromptBuilder("Another prefix for stats").build(AgentRequest("e"))
+
+        snapshot = fresh_stats.as_dict()
+        assert snapshot["builds"] == 5
+        assert snapshot["prefix_reuse_rate"] == pytest.approx(3 / 5)
+        assert snapshot["distinct_prefixes"] == 2
+        assert snapshot["mean_build_us"] > 0
+
+    def test_stats_are_exact_under_threads(self, monkeypatch):
+        """Test that concurrent builds neither corrupt the seen prefixes nor lose counts."""
+        monkeypatch.setattr(prompts, "_SEEN_PREFIXES", 8)
+        stats = PromptStats()
+        errors = []
+
+        def observe(offset):
+            try:
+                for index in range(5000):
+                    stats.observe(str((offset + index) % 16), 1)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=observe, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert stats.builds == 40_000
+        assert stats.as_dict()["distinct_prefixes"] == 8
+
+    def test_load_examples(self, tmp_path):
+        """Test loading few-shot examples from a file."""
+        path = tmp_path / "examples.json"
+        path.write_text(json.dumps([{"user": "q", "assistant": "a"}]))
+
+        assert load_examples(str(path)) == (FewShotExample("q", "a"),)
+
+
+def test_llm_stage_sends_stable_prefix():
+    """Test that consecutive model calls share the leading messages exactly."""
+    backend = RecordingBackend()
+    stage = LLMStage(backend, "m", system_prompt="Tutor.", context="Agents 101", examples=EXAMPLES)
+
+    stage.handle(AgentRequest("first question"))
+    stage.handle(AgentRequest("second question"))
+
+    first, second = backend.sent
+    assert first[:-1] == second[:-1]
+    assert len(first) == 4
+    assert second[-1]["content"] == "second question"
+
+
+def test_metrics_expose_prompt_statistics():
+    """Test that /metrics includes prompt build statistics."""
+    snapshot = TestClient(api.app).get("/metrics").json()
+
+    assert {"builds", "mean_build_us", "prefix_reuse_rate"} <= set(snapshot["prompts"])
@@ -0,0 +1,161 @@
+"""Tests for the per-tenant agent registry."""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from src.tbbot import api
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.registry import AgentRegistry, TenantConfig, UnknownTenantError, load_tenants
+
+FAQ_FILE = Path(__file__).parent.parent / "src" / "tbbot" / "data" / "faq.json"
+
+client = TestClient(api.app)
+
+
+def counting_factory(builds):
+    """Factory building greeting-only agents and recording the tenants built."""
+    def factory(tenant):
+        builds.append(tenant)
+        return GreetingAgent(stages=[GreetingStage()])
+    return factory
+
+
+class TestAgentRegistry:
+    """Test lazy construction, sharing and eviction."""
+
+    def test_agents_are_built_lazily_and_reused(self):
+        """Test that an agent is built on first use only."""
+        builds = []
+        registry = AgentRegistry({"a": TenantConfig(), "b": TenantConfig()}, factory=counting_factory(builds))
+
+        assert len(registry) == 0
+        first = registry.get("a")
+        assert registry.get("a") is first
+        assert len(builds) == 1
+        assert registry.stats_snapshot()["loaded"] == ["a"]
+
+    def test_unknown_tenant(self):
+        """Test that unconfigured tenants are rejected."""
+        registry = AgentRegistry({"a": TenantConfig()})
+
+        with pytest.raises(UnknownTenantError):
+            registry.get("nope")
+        assert registry.peek("nope") is None
+
+    def test_least_recently_used_is_evicted_over_cap(self):
+        """Test that the size cap evicts the least recently used agent."""
+        builds = []
+        registry = AgentRegistry(
+            {name: TenantConfig() for name in "abc"}, max_agents=2, factory=counting_factory(builds)
+        )
+
+        registry.get("a")
+        registry.get("b")
+        registry.get("a")
+        registry.get("c")
+
+        assert registry.stats_snapshot()["loaded"] == ["a", "c"]
+        assert registry.stats.evictions == 1
+
+        registry.get("b")
+        assert len(builds) == 4
+
+    def test_idle_agents_are_evicted(self):
+        """Test that agents unused for longer than the TTL are dropped."""
+        registry = AgentRegistry({"a": TenantConfig(), "b": TenantConfig()}, idle_ttl=0.05,
+                                 factory=counting_factory([]))
+        registry.get("a")
+        time.sleep(0.1)
+
+        registry.get("b")
+
+        assert registry.stats_snapshot()["loaded"] == ["b"]
+
+    def test_concurrent_first_use_builds_once(self):
+        """Test that simultaneous first requests for a tenant share one build."""
+        builds = []
+
+        def slow_factory(tenant):
+            time.sleep(0.05)
+            return counting_factory(builds)(tenant)
+
+        registry = AgentRegistry({"a": TenantConfig()}, factory=slow_factory)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(builds) == 1
+        assert all(agent is results[0] for agent in results)
+
+    def test_tenants_share_faq_index(self):
+        """Test that tenants using the same FAQ file share one index."""
+        registry = AgentRegistry({
+            "a": TenantConfig(faq_path=str(FAQ_FILE), llm_fallback=False),
+            "b": TenantConfig(faq_path=str(FAQ_FILE), faq_threshold=0.5, llm_fallback=False),
+        })
+
+        faq_a = registry.get("a").pipeline.stages[1]
+        faq_b = registry.get("b").pipeline.stages[1]
+
+        assert faq_a.index is faq_b.index
+        assert (faq_a.threshold, faq_b.threshold) == (0.8, 0.5)
+
+    def test_load_tenants(self, tmp_path):
+        """Test loading tenant settings and rejecting unknown keys."""
+        path = tmp_path / "tenants.json"
+        path.write_text(json.dumps({"course-a": {"llm_model": "small"}, "course-b": {}}))
+
+        tenants = load_tenants(path)
+
+        assert tenants["course-a"].llm_model == "small"
+        assert tenants["course-b"] == TenantConfig()
+
+        path.write_text(json.dumps({"course-a": {"colour": "blue"}}))
+        with pytest.raises(ValueError, match="course-a"):
+            load_tenants(path)
+
+
+@pytest.fixture
+def tenants(monkeypatch):
+    """Serve one FAQ-enabled tenant next to the default agent."""
+    registry = AgentRegistry({"course-a": TenantConfig(faq_path=str(FAQ_FILE), llm_fallback=False)})
+    monkeypatch.setattr(api, "registry", registry)
+    return registry
+
+
+def test_chat_selects_agent_by_tenant_header(tenants):
+    """Test that X-Tenant-Id routes a message to that tenant's agent."""
+    with_tenant = client.post("/chat", json={"message": "wat is an agnet"}, headers={"X-Tenant-Id": "course-a"})
+    without = client.post("/chat", json={"message": "wat is an agnet"})
+
+    assert with_tenant.json()["response"].startswith("An AI agent is")
+    assert without.json()["response"] == ""
+    assert tenants.stats_snapshot()["loaded"] == ["course-a"]
+
+
+def test_chat_unknown_tenant_is_404(tenants):
+    """Test that an unconfigured tenant is rejected."""
+    response = client.post("/chat", json={"message": "hello"}, headers={"X-Tenant-Id": "nope"})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Unknown tenant"
+
+
+def test_websocket_selects_agent_by_tenant_header(tenants):
+    """Test that the handshake header selects the agent for the whole session."""
+    with client.websocket_connect("/ws/chat", headers={"X-Tenant-Id": "course-a"}) as websocket:
+        websocket.send_text(json.dumps({"id": "1", "message": "what is promt engineering"}))
+        assert websocket.receive_json()["response"].startswith("Prompt engineering is")
+
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/ws/chat", headers={"X-Tenant-Id": "nope"}):
+            pass
+    assert exc_info.value.code == 1008
@@ -0,0 +1,216 @@
+"""Tests for hot reloading of greeting tables and configuration."""
+
+import json
+import statistics
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api, greeting
+from src.tbbot.config import Config
+from src.tbbot.greeting import DEFAULT_GREETINGS_PATH, GreetingTable
+from src.tbbot.tracing import tracer
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def write_table(path, english_response, extra_keyword=None):
+    """Write a greeting table file with a custom English response."""
+    data = json.loads(DEFAULT_GREETINGS_PATH.read_text(encoding="utf-8"))
+    data["languages"][0]["response"] = english_response
+    if extra_keyword:
+        data["languages"][0]["keywords"].append(extra_keyword)
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def reloadable(monkeypatch):
+    """Enable the admin endpoint and restore everything a reload swaps."""
+    for name, value in vars(Config).items():
+        if name.isupper():
+            monkeypatch.setattr(Config, name, value)
+    monkeypatch.setattr(greeting, "_table", greeting._table)
+    monkeypatch.setattr(api, "agent", api.agent)
+    monkeypatch.setattr(api, "registry", api.registry)
+    monkeypatch.setattr(tracer, "sample_rate", tracer.sample_rate)
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    return monkeypatch
+
+
+class TestGreetingTable:
+    """Test compiling greeting tables."""
+
+    def test_bundled_table_matches_original_behaviour(self):
+        """Test keyword priority, whole-word matching and default response."""
+        table = GreetingTable.from_file(DEFAULT_GREETINGS_PATH)
+
+        assert table.detect("kaixo hello") == "en"
+        assert table.detect("OLA amigo") == "gl"
+        assert table.detect("hello!") is None
+        assert table.detect("") is None
+        assert table.respond("xx") == table.respond("en")
+
+    @pytest.mark.parametrize("data", [
+        {},
+        {"languages": []},
+        {"languages": [{"code": "en", "keywords": ["hi"]}]},
+        {"languages": [{"code": "en", "keywords": ["hi"], "response": "Hi"}], "default_language": "fr"},
+    ])
+    def test_malformed_tables_are_rejected(self, data):
+        """Test that malformed tables raise ValueError."""
+        with pytest.raises(ValueError):
+            GreetingTable.compile(data)
+
+
+class TestAdminReload:
+    """Test the reload endpoint."""
+
+    def test_disabled_without_token(self, monkeypatch):
+        """Test that the endpoint does not exist unless ADMIN_TOKEN is set."""
+        monkeypatch.setattr(Config, "ADMIN_TOKEN", None)
+
+        assert TestClient(api.app).post("/admin/reload").status_code == 404
+
+    def test_wrong_token_is_forbidden(self, reloadable):
+        """Test that a wrong token is rejected."""
+        response = TestClient(api.app).post("/admin/reload", headers={"X-Admin-Token": "nope"})
+
+        assert response.status_code == 403
+
+    def test_reload_swaps_greetings_and_config(self, reloadable, tmp_path):
+        """Test that new tables and settings apply to the next request."""
+        client = TestClient(api.app)
+        path = write_table(tmp_path / "greetings.json", "Howdy from TBBot", extra_keyword="howdy")
+        reloadable.setenv("GREETINGS_PATH", str(path))
+        reloadable.setenv("FAQ_THRESHOLD", "0.6")
+
+        response = client.post("/admin/reload", headers=ADMIN)
+
+        assert response.status_code == 200
+        body = response.json()
+        assert {"GREETINGS_PATH", "FAQ_THRESHOLD"} <= set(body["changed"])
+        assert body["greetings_version"] == greeting.greeting_table().version
+        assert Config.FAQ_THRESHOLD == 0.6
+        assert client.post("/chat", json={"message": "howdy"}).json()["response"] == "Howdy from TBBot"
+
+    def test_failed_reload_keeps_previous_configuration(self, reloadable, tmp_path):
+        """Test that a malformed table leaves tables, settings and agent untouched."""
+        client = TestClient(api.app)
+        path = tmp_path / "greetings.json"
+        path.write_text("{not json", encoding="utf-8")
+        reloadable.setenv("GREETINGS_PATH", str(path))
+        table, agent = greeting.greeting_table(), api.agent
+
+        response = client.post("/admin/reload", headers=ADMIN)
+
+        assert response.status_code == 400
+        assert greeting.greeting_table() is table
+        assert api.agent is agent
+        assert Config.GREETINGS_PATH != str(path)
+
+
+def test_failed_reload_is_never_visible_to_readers(reloadable, tmp_path):
+    """Test that settings from a reload that fails are never read outside it."""
+    path = tmp_path / "greetings.json"
+    path.write_text("{not json", encoding="utf-8")
+    reloadable.setenv("GREETINGS_PATH", str(path))
+    reloadable.setenv("FAQ_THRESHOLD", "0.6")
+    original = Config.FAQ_THRESHOLD
+    load_table = GreetingTable.from_file.__func__
+    seen_while_building = []
+
+    def slow_load(cls, table_path):
+        seen_while_building.append(Config.FAQ_THRESHOLD)
+        time.sleep(0.2)
+        return load_table(cls, table_path)
+
+    reloadable.setattr(GreetingTable, "from_file", classmethod(slow_load))
+    read = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            read.append(Config.FAQ_THRESHOLD)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        with pytest.raises(ValueError):
+            api.reload_configuration()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert seen_while_building == [0.6]
+    assert read and set(read) == {original}
+    assert Config.FAQ_THRESHOLD == original
+
+
+def test_snapshots_never_mix_old_and_new_settings(reloadable):
+    """Test that a snapshot taken during reloads holds one version of every setting."""
+    versions = [{"HEDGE_FRACTION": value, "HEDGE_MIN_DELAY_MS": value} for value in (1, 2)]
+    stop = threading.Event()
+
+    def swap():
+        index = 0
+        while not stop.is_set():
+            Config.apply(versions[index % 2])
+            index += 1
+
+    swapper = threading.Thread(target=swap)
+    swapper.start()
+    try:
+        snapshots = [Config.snapshot() for _ in range(2000)]
+    finally:
+        stop.set()
+        swapper.join()
+
+    assert all(snapshot["HEDGE_FRACTION"] == snapshot["HEDGE_MIN_DELAY_MS"] for snapshot in snapshots)
+
+
+def test_chat_under_concurrent_reloads(reloadable, tmp_path):
+    """Test that /chat keeps answering consistently and quickly while reloading."""
+    first = write_table(tmp_path / "first.json", "Hi from the first table")
+    second = write_table(tmp_path / "second.json", "Hi from the second table")
+    reloadable.setenv("GREETINGS_PATH", str(first))
+    expected = {"Hi from the first table", "Hi from the second table"}
+
+    with TestClient(api.app) as client:
+        assert client.post("/admin/reload", headers=ADMIN).status_code == 200
+
+        def timed_chat():
+            start = time.perf_counter()
+            response = client.post("/chat", json={"message": "hello"})
+            return response, time.perf_counter() - start
+
+        baseline = [timed_chat()[1] for _ in range(50)]
+
+        results = []
+        stop = threading.Event()
+
+        def hammer():
+            while not stop.is_set():
+                results.append(timed_chat())
+
+        workers = [threading.Thread(target=hammer) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for index in range(20):
+            reloadable.setenv("GREETINGS_PATH", str(second if index % 2 == 0 else first))
+            assert client.post("/admin/reload", headers=ADMIN).status_code == 200
+            time.sleep(0.01)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    assert len(results) > 50
+    assert all(response.status_code == 200 for response, _ in results)
+    assert {response.json()["response"] for response, _ in results} <= expected
+
+    # Four concurrent clients share one loop; allow for that, not for stalls
+    latencies = sorted(latency for _, latency in results)
+    p95 = latencies[int(len(latencies) * 0.95)]
+    assert p95 < 10 * statistics.median(baseline) + 0.05
@@ -0,0 +1,282 @@
+"""Tests for latency-aware routing and circuit breakers across backends."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api, routing
+from src.tbbot.backends import BackendError, ChatBackend, Completion
+from src.tbbot.config import Config
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.llm import LLMStage
+from src.tbbot.routing import BreakerState, CircuitBreaker, LatencyTracker, RoutedBackend, parse_backends
+from src.tbbot.stub_llm import LatencyProfile, StubServer
+
+USER = [{"role": "user", "content": "hi"}]
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FailingBackend:
+    """Backend failing every call with a fixed status."""
+
+    supports_batch = False
+
+    def __init__(self, name, status_code):
+        self.name = name
+        self.status_code = status_code
+        self.calls = 0
+
+    async def complete(self, messages, model, **params):
+        self.calls += 1
+        raise BackendError(f"{self.name}: HTTP {self.status_code}", self.status_code)
+
+    async def aclose(self):
+        pass
+
+
+class EchoBackend(FailingBackend):
+    """Backend answering every call."""
+
+    async def complete(self, messages, model, **params):
+        self.calls += 1
+        return Completion(text="ok", model=model, backend=self.name)
+
+
+@pytest.fixture
+def servers():
+    """A fast and a slow stand-in server."""
+    with StubServer(LatencyProfile(latency_ms=2)) as fast, StubServer(LatencyProfile(latency_ms=60)) as slow:
+        yield fast, slow
+
+
+def call(router, times=1):
+    """Make `times` sequential completions and return the last."""
+    async def run():
+        result = None
+        for _ in range(times):
+            result = await router.complete(USER, "stub")
+        return result
+
+    return asyncio.run(run())
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions."""
+
+    def test_opens_after_consecutive_failures(self):
+        """Test that the threshold of consecutive failures ejects the backend."""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=10, clock=FakeClock())
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == BreakerState.CLOSED
+
+        breaker.record_failure()
+
+        assert breaker.state == BreakerState.OPEN
+        assert not breaker.available()
+
+    def test_half_open_allows_one_probe(self):
+        """Test that after the timeout exactly one probe is let through."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=10, clock=clock)
+        breaker.record_failure()
+
+        clock.now = 10
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.available()
+        breaker.acquire()
+        assert not breaker.available()
+
+        breaker.record_success()
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe starts a new open period."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        breaker.acquire()
+
+        breaker.record_failure()
+
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.trips == 2
+        clock.now = 19
+        assert breaker.state == BreakerState.OPEN
+
+
+def test_latency_tracker():
+    """Test the EWMA and windowed p95."""
+    tracker = LatencyTracker(alpha=0.5, window=20)
+    for latency in [0.1] * 19 + [1.0]:
+        tracker.observe(latency)
+
+    assert tracker.ewma == pytest.approx(0.55)
+    assert tracker.p95 == 1.0
+
+
+class TestRoutedBackend:
+    """Test routing between stand-in servers."""
+
+    def test_calls_go_to_the_fastest_backend(self, servers):
+        """Test that once both are measured, traffic goes to the lower latency."""
+        fast, slow = servers
+        router = RoutedBackend([ChatBackend(slow.base_url, name="slow"), ChatBackend(fast.base_url, name="fast")],
+                               explore=0)
+
+        call(router, times=12)
+
+        # One measuring call for the slow backend, the rest to the fast one
+        assert slow.stats.requests == 1
+        assert fast.stats.requests == 11
+        snapshot = router.stats_snapshot()["backends"]
+        assert snapshot["fast"]["ewma_ms"] < snapshot["slow"]["ewma_ms"]
+
+    @pytest.mark.parametrize("metric", ["ewma", "p95"])
+    def test_slow_backend_loses_traffic(self, servers, metric):
+        """Test that a backend becoming slow is routed around."""
+        fast, slow = servers
+        router = RoutedBackend([ChatBackend(fast.base_url, name="a"), ChatBackend(slow.base_url, name="b")],
+                               metric=metric, explore=0)
+        call(router, times=2)
+        fast.app.state.stub.profile.latency_ms = 400
+
+        call(router, times=6)
+
+        assert router.stats_snapshot()["backends"]["b"]["calls"] >= 5
+
+    def test_exploration_keeps_measuring_other_backends(self, servers):
+        """Test that with exploration every healthy backend keeps getting samples."""
+        fast, slow = servers
+        router = RoutedBackend([ChatBackend(fast.base_url, name="fast"), ChatBackend(slow.base_url, name="slow")],
+                               explore=1.0)
+
+        call(router, times=4)
+
+        assert slow.stats.requests >= 3
+        assert router.stats_snapshot()["backends"]["slow"]["explored"] >= 2
+
+    def test_failing_backend_is_ejected_and_failed_over(self, servers):
+        """Test that errors fail over and trip the breaker."""
+        fast, slow = servers
+        fast.app.state.stub.profile.error_rate = 1.0
+        router = RoutedBackend([ChatBackend(fast.base_url, name="fast"), ChatBackend(slow.base_url, name="slow")],
+                               failure_threshold=2, explore=0)
+
+        results = [call(router) for _ in range(5)]
+
+        assert all(result.backend == "slow" for result in results)
+        assert fast.stats.requests == 2
+        snapshot = router.stats_snapshot()
+        assert snapshot["backends"]["fast"]["state"] == "open"
+        assert snapshot["failovers"] == 2
+
+    def test_ejected_backend_is_probed_back_in(self, servers):
+        """Test that a recovered backend rejoins after a successful probe."""
+        fast, slow = servers
+        clock = FakeClock()
+        fast.app.state.stub.profile.error_rate = 1.0
+        router = RoutedBackend([ChatBackend(fast.base_url, name="fast"), ChatBackend(slow.base_url, name="slow")],
+                               failure_threshold=1, reset_timeout_s=30, explore=0, clock=clock)
+        call(router, times=3)
+        assert router.stats_snapshot()["backends"]["fast"]["state"] == "open"
+
+        fast.app.state.stub.profile.error_rate = 0.0
+        clock.now = 30
+        assert call(router).backend == "fast"
+
+        assert router.stats_snapshot()["backends"]["fast"]["state"] == "closed"
+
+    def test_all_backends_ejected(self):
+        """Test that with every breaker open calls fail fast with 503."""
+        backends = [FailingBackend("a", 503), FailingBackend("b", None)]
+        router = RoutedBackend(backends, failure_threshold=1, explore=0)
+
+        with pytest.raises(BackendError):
+            call(router)
+        with pytest.raises(BackendError) as exc_info:
+            call(router)
+
+        assert exc_info.value.status_code == 503
+        assert [backend.calls for backend in backends] == [1, 1]
+        assert router.stats_snapshot()["unavailable"] == 1
+
+    def test_request_errors_do_not_fail_over(self):
+        """Test that a 4xx refusal is returned as-is and does not count against the backend."""
+        refusing, spare = FailingBackend("refusing", 400), EchoBackend("spare", 200)
+        router = RoutedBackend([refusing, spare], failure_threshold=1, explore=0)
+
+        with pytest.raises(BackendError) as exc_info:
+            call(router)
+
+        assert exc_info.value.status_code == 400
+        assert spare.calls == 0
+        assert router.stats_snapshot()["backends"]["refusing"]["state"] == "closed"
+
+    def test_batches_are_routed_to_batch_capable_backends(self, servers):
+        """Test that batched calls only go to backends with a batch endpoint."""
+        fast, slow = servers
+        router = RoutedBackend([ChatBackend(fast.base_url, name="fast"),
+                                ChatBackend(slow.base_url, name="slow", batch_path="/batch/chat/completions")])
+
+        results = asyncio.run(router.complete_batch([(USER, "stub"), (USER, "stub")]))
+
+        assert router.supports_batch
+        assert [result.text for result in results] == ["Echo: hi", "Echo: hi"]
+        assert slow.stats.batches == 1
+
+    def test_needs_backends_and_a_known_metric(self):
+        """Test constructor validation."""
+        with pytest.raises(ValueError):
+            RoutedBackend([])
+        with pytest.raises(ValueError):
+            RoutedBackend([EchoBackend("a", 200)], metric="p50")
+
+
+def test_parse_backends():
+    """Test named and unnamed OPENAI_API_BASES entries."""
+    assert parse_backends("main=https://a/v1, http://b:8001/v1,") == [
+        ("main", "https://a/v1"), (None, "http://b:8001/v1"),
+    ]
+
+
+def test_configured_router_is_shared_and_exposed_in_metrics(servers, monkeypatch):
+    """Test that OPENAI_API_BASES builds one shared router shown in /metrics."""
+    fast, slow = servers
+    monkeypatch.setattr(Config, "OPENAI_API_BASES", f"fast={fast.base_url},slow={slow.base_url}")
+    monkeypatch.setattr(routing, "_shared", {})
+
+    router = routing.backend_from_config()
+    assert routing.backend_from_config() is router
+    assert isinstance(LLMStage.from_config().backend, RoutedBackend)
+
+    snapshot = TestClient(api.app).get("/metrics").json()["routing"]
+    assert set(snapshot[router.name]["backends"]) == {"fast", "slow"}
+
+
+def test_chat_survives_a_failing_backend(servers, monkeypatch):
+    """Test that /chat keeps answering while one backend fails every call."""
+    fast, slow = servers
+    fast.app.state.stub.profile.error_rate = 1.0
+    router = RoutedBackend([ChatBackend(fast.base_url, name="fast"), ChatBackend(slow.base_url, name="slow")],
+                           failure_threshold=2, explore=0)
+    monkeypatch.setattr(api, "agent", GreetingAgent(stages=[GreetingStage(), LLMStage(router, "stub")]))
+
+    with TestClient(api.app) as client:
+        responses = [client.post("/chat", json={"message": f"question {index}"}) for index in range(4)]
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert responses[-1].json()["response"] == "Echo: question 3"
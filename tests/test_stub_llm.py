@@ -0,0 +1,120 @@
+"""Tests for the local OpenAI-compatible stand-in server."""
+
+import json
+import time
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot.stub_llm import LatencyProfile, StubState, create_stub_app
+
+
+REQUEST = {"model": "stub", "messages": [{"role": "user", "content": "what is an agent"}]}
+
+
+def make_client(**profile):
+    """Build a test client for a stand-in server with the given profile."""
+    return TestClient(create_stub_app(LatencyProfile(seed=7, **profile)))
+
+
+class TestChatCompletions:
+    """Test the non-streaming chat-completions API."""
+
+    def test_echoes_last_user_message_with_usage(self):
+        """Test that the default reply echoes the prompt and reports usage."""
+        response = make_client().post("/v1/chat/completions", json=REQUEST)
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["object"] == "chat.completion"
+        assert body["choices"][0]["message"] == {"role": "assistant", "content": "Echo: what is an agent"}
+        assert body["usage"] == {"prompt_tokens": 4, "completion_tokens": 5, "total_tokens": 9}
+
+    def test_fixed_reply(self):
+        """Test that a configured reply replaces the echo."""
+        response = make_client(reply="fixed answer").post("/v1/chat/completions", json=REQUEST)
+
+        assert response.json()["choices"][0]["message"]["content"] == "fixed answer"
+
+    def test_latency_is_applied(self):
+        """Test that the configured first-token latency delays the reply."""
+        client = make_client(latency_ms=50)
+
+        start = time.perf_counter()
+        client.post("/v1/chat/completions", json=REQUEST)
+
+        assert time.perf_counter() - start >= 0.05
+
+
+class TestFailureProfiles:
+    """Test simulated errors and rate limiting."""
+
+    def test_rate_limit_returns_429_with_retry_after(self):
+        """Test that rate-limited requests get a 429 and Retry-After."""
+        response = make_client(rate_limit_rate=1.0, retry_after_s=3).post("/v1/chat/completions", json=REQUEST)
+
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "3"
+        assert response.json()["error"]["type"] == "rate_limit_error"
+
+    def test_error_rate_returns_500(self):
+        """Test that failing requests get an OpenAI-style 500 error."""
+        response = make_client(error_rate=1.0).post("/v1/chat/completions", json=REQUEST)
+
+        assert response.status_code == 500
+        assert response.json()["error"]["type"] == "server_error"
+
+    def test_error_rate_is_reproducible_with_seed(self):
+        """Test that the same seed yields the same failure sequence."""
+        def statuses():
+            client = make_client(error_rate=0.5)
+            return [client.post("/v1/chat/completions", json=REQUEST).status_code for _ in range(20)]
+
+        first = statuses()
+        assert first == statuses()
+        assert set(first) == {200, 500}
+
+    def test_unknown_distribution_rejected(self):
+        """Test that an invalid latency distribution is rejected."""
+        with pytest.raises(ValueError):
+            LatencyProfile(distribution="bimodal")
+
+    @pytest.mark.parametrize("distribution", ["uniform", "exponential", "lognormal"])
+    def test_distributions_draw_non_negative_delays(self, distribution):
+        """Test that every distribution yields non-negative delays."""
+        state = StubState(profile=LatencyProfile(distribution=distribution, latency_ms=10, jitter_ms=20, seed=1))
+
+        assert all(state.first_token_delay() >= 0 for _ in range(200))
+
+    def test_lognormal_median_is_the_configured_latency(self):
+        """Test the lognormal parameterization: latency_ms is the median, and the mean lies above it."""
+        state = StubState(profile=LatencyProfile(distribution="lognormal", latency_ms=100, jitter_ms=50, seed=1))
+
+        delays = sorted(state.first_token_delay() * 1000 for _ in range(4000))
+
+        assert delays[len(delays) // 2] == pytest.approx(100, rel=0.05)
+        # exp(sigma^2 / 2) with sigma = 0.5
+        assert sum(delays) / len(delays) == pytest.approx(100 * 1.133, rel=0.05)
+
+
+def test_streaming_response_reassembles_to_full_text():
+    """Test that SSE chunks reassemble into the completion text."""
+    with make_client().stream("POST", "/v1/chat/completions", json={**REQUEST, "stream": True}) as response:
+        lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert lines[-1] == "data: [DONE]"
+    chunks = [json.loads(line[len("data: "):]) for line in lines[:-1]]
+    text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+    assert text == "Echo: what is an agent"
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+
+def test_fixture_serves_over_http_and_sets_api_base(stub_llm):
+    """Test that the pytest fixture runs a real server and points config at it."""
+    from tbbot.config import Config
+
+    assert Config.OPENAI_API_BASE == stub_llm.base_url
+
+    response = httpx.post(f"{stub_llm.base_url}/chat/completions", json=REQUEST)
+
+    assert response.status_code == 200
+    assert stub_llm.stats.requests == 1
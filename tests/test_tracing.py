@@ -0,0 +1,148 @@
+"""Tests for request tracing across the agent pipeline."""
+
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot.api import app
+from src.tbbot.tracing import InMemoryExporter, JsonlFileExporter, Tracer, tracer
+
+client = TestClient(app)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Trace every request into an in-memory exporter."""
+    memory = InMemoryExporter()
+    monkeypatch.setattr(tracer, "exporter", memory)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    return memory
+
+
+def test_sampled_chat_request_records_pipeline_spans(exporter):
+    """Test that a traced /chat request has spans for each pipeline stage."""
+    response = client.post("/chat", json={"message": "hello"})
+
+    trace_id = response.headers["x-trace-id"]
+    spans = {span.name: span for span in exporter.spans}
+    assert {"POST /chat", "request.validate", "agent.process_message", "stage.greeting",
+            "greeting.detect", "greeting.respond"} <= set(spans)
+    assert all(span.trace_id == trace_id for span in exporter.spans)
+
+    root = spans["POST /chat"]
+    assert root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+    assert spans["agent.process_message"].parent_id == root.span_id
+    assert spans["stage.greeting"].parent_id == spans["agent.process_message"].span_id
+    assert spans["greeting.detect"].parent_id == spans["stage.greeting"].span_id
+    assert spans["greeting.detect"].attributes["language"] == "en"
+
+
+def test_traceparent_header_is_honoured(exporter):
+    """Test that an upstream W3C traceparent sets trace id, parent and sampling."""
+    sampled = client.post(
+        "/chat", json={"message": "hola"},
+        headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"},
+    )
+    root = next(span for span in exporter.spans if span.name == "POST /chat")
+
+    assert sampled.headers["x-trace-id"] == TRACE_ID
+    assert root.trace_id == TRACE_ID
+    assert root.parent_id == "00f067aa0ba902b7"
+
+    exporter.clear()
+    client.post("/chat", json={"message": "hola"},
+                headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-00"})
+    assert len(exporter.spans) == 0
+
+
+def test_trace_id_header_is_reused(exporter):
+    """Test that a plain X-Trace-Id header is accepted."""
+    response = client.get("/health", headers={"X-Trace-Id": TRACE_ID})
+
+    assert response.headers["x-trace-id"] == TRACE_ID
+    assert exporter.spans[0].trace_id == TRACE_ID
+
+
+def test_unsampled_requests_record_nothing_but_return_trace_id(monkeypatch):
+    """Test that unsampled requests still get a trace id and export no spans."""
+    memory = InMemoryExporter()
+    monkeypatch.setattr(tracer, "exporter", memory)
+    monkeypatch.setattr(tracer, "sample_rate", 0.0)
+
+    response = client.post("/chat", json={"message": "hello"})
+
+    assert len(response.headers["x-trace-id"]) == 32
+    assert len(memory.spans) == 0
+
+
+def test_span_outside_a_trace_is_noop():
+    """Test that spans opened outside a traced request are cheap no-ops."""
+    local = Tracer(sample_rate=1.0, exporter=InMemoryExporter())
+
+    with local.span("orphan") as span:
+        span.set_attribute("ignored", True)
+
+    assert len(local.exporter.spans) == 0
+
+
+def test_failing_span_records_error():
+    """Test that an exception inside a span is recorded as an attribute."""
+    local = Tracer(sample_rate=1.0, exporter=InMemoryExporter())
+
+    with pytest.raises(KeyError):
+        with local.trace("root", "a" * 32, sampled=True):
+            with local.span("stage"):
+                raise KeyError("missing")
+
+    stage = next(span for span in local.exporter.spans if span.name == "stage")
+    assert stage.attributes["error"] == "KeyError"
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    """Test that the file exporter appends one JSON object per span."""
+    path = tmp_path / "traces.jsonl"
+    file_exporter = JsonlFileExporter(str(path))
+    local = Tracer(sample_rate=1.0, exporter=file_exporter)
+
+    with local.trace("root", "b" * 32, sampled=True):
+        with local.span("child"):
+            pass
+    file_exporter.close()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["root", "child"]
+    assert lines[1]["parent_id"] == lines[0]["span_id"]
+
+
+def test_app_shutdown_writes_queued_spans(tmp_path, monkeypatch):
+    """Test that spans queued when the app stops are written, and the exporter reopens after."""
+    path = tmp_path / "traces.jsonl"
+    file_exporter = JsonlFileExporter(str(path))
+    monkeypatch.setattr(tracer, "exporter", file_exporter)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+
+    with TestClient(app) as client:
+        client.post("/chat", json={"message": "hello"})
+    written = len(path.read_text().splitlines())
+    with TestClient(app) as client:
+        client.post("/chat", json={"message": "hello"})
+
+    assert written > 0
+    assert len(path.read_text().splitlines()) == 2 * written
+
+
+def test_unsampled_span_overhead_is_small():
+    """Test that opening a span on an untraced path stays cheap."""
+    local = Tracer(sample_rate=0.0, exporter=InMemoryExporter())
+    iterations = 20_000
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with local.span("hot"):
+            pass
+    per_span = (time.perf_counter() - start) / iterations
+
+    assert per_span < 20e-6
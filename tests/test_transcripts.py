@@ -0,0 +1,197 @@
+"""Tests for the columnar transcript store and the analytics over it."""
+
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import analytics, api
+from src.tbbot.cli import main
+from src.tbbot.transcripts import TranscriptRecord, TranscriptWriter
+
+HOUR = 3600
+# 2026-03-02 09:00 UTC
+BASE = datetime(2026, 3, 2, 9, tzinfo=timezone.utc).timestamp()
+
+
+def record(offset=0.0, stage=None, language=None, latency_ms=10.0, **fields):
+    """Build a record `offset` seconds after BASE."""
+    return TranscriptRecord(
+        timestamp=BASE + offset,
+        channel="http",
+        status="ok",
+        latency_ms=latency_ms,
+        message_chars=5,
+        response_chars=20,
+        stage=stage,
+        language=language,
+        **fields,
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A store with three hours of traffic: 6, 3 and 1 requests."""
+    writer = TranscriptWriter(tmp_path, flush_interval_s=60)
+    for index in range(6):
+        writer.record(record(index, stage="greeting", language="en", latency_ms=1.0 + index))
+    for index in range(3):
+        writer.record(record(HOUR + index, stage="greeting", language="eu", latency_ms=2.0))
+    writer.record(record(2 * HOUR, latency_ms=100.0))
+    writer.stop()
+    return tmp_path
+
+
+class TestTranscriptWriter:
+    """Test the background writer."""
+
+    def test_records_are_partitioned_by_date_and_hour(self, store):
+        """Test that each hour of records lands in its own partition."""
+        directories = sorted(path.relative_to(store).as_posix() for path in store.glob("date=*/hour=*"))
+
+        assert directories == [
+            "date=2026-03-02/hour=09", "date=2026-03-02/hour=10", "date=2026-03-02/hour=11",
+        ]
+        assert not list(store.rglob("*.tmp"))
+
+    def test_batches_are_written_when_full(self, tmp_path):
+        """Test that a full batch is written without waiting for the interval."""
+        writer = TranscriptWriter(tmp_path, batch_size=4, flush_interval_s=60)
+        for index in range(8):
+            writer.record(record(index))
+        assert writer.flush()
+
+        assert writer.stats.written == 8
+        assert writer.stats.files == 2
+        writer.stop()
+
+    def test_interval_flushes_partial_batches(self, tmp_path):
+        """Test that a partial batch is written once the interval elapses."""
+        writer = TranscriptWriter(tmp_path, batch_size=1000, flush_interval_s=0.05)
+        writer.record(record())
+
+        deadline = time.monotonic() + 2
+        while writer.stats.written == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer.stats.written == 1
+        writer.stop()
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        """Test that records are dropped and counted when the queue is full."""
+        writer = TranscriptWriter(tmp_path, queue_size=1)
+        writer.stop()  # Nothing drains the queue any more
+
+        writer.record(record())
+        writer.record(record())
+
+        assert writer.stats.dropped == 1
+
+    def test_text_is_only_kept_when_enabled(self, tmp_path):
+        """Test that message text is left out by default."""
+        plain, verbose = tmp_path / "plain", tmp_path / "verbose"
+        for directory, include_text in ((plain, False), (verbose, True)):
+            writer = TranscriptWriter(directory, include_text=include_text)
+            writer.record(record(message="hello", response="Hi!"))
+            writer.stop()
+
+        assert analytics.load(plain)["message"].isna().all()
+        assert analytics.load(verbose)["message"].to_list() == ["hello"]
+
+
+class TestAnalytics:
+    """Test queries over a store."""
+
+    def test_hourly_load(self, store):
+        """Test requests and greeting share per hour."""
+        load = analytics.hourly_load(store)
+
+        assert load["requests"].to_list() == [6, 3, 1]
+        assert load["greeting_share"].to_list() == [1.0, 1.0, 0.0]
+
+    def test_partitions_outside_the_range_are_skipped(self, store):
+        """Test that a time range only selects matching partitions."""
+        selected = analytics.partitions(store, "2026-03-02T10:30", "2026-03-02T11:00")
+
+        assert [partition.start.hour for partition in selected] == [10]
+        assert analytics.hourly_load(store, start="2026-03-02T10:00")["requests"].to_list() == [3, 1]
+
+    def test_language_mix(self, store):
+        """Test language shares, with non-greetings under "none"."""
+        mix = analytics.language_mix(store)
+
+        assert mix["requests"].to_dict() == {"en": 6, "eu": 3, "none": 1}
+        assert mix["share"].sum() == pytest.approx(1.0)
+
+    def test_latency_percentiles(self, store):
+        """Test per-stage and overall latency percentiles."""
+        latencies = analytics.latency_percentiles(store, percentiles=(0.5, 1.0))
+
+        assert latencies.loc["greeting", "requests"] == 9
+        assert latencies.loc["greeting", "p100"] == 6.0
+        assert latencies.loc["none", "p50"] == 100.0
+        assert latencies.loc["all", "requests"] == 10
+
+    def test_latency_percentiles_span_partitions(self, tmp_path):
+        """Test that percentiles over several partitions match those over all rows."""
+        writer = TranscriptWriter(tmp_path, flush_interval_s=60)
+        latencies = [float(index % 97) + 0.5 for index in range(300)]
+        for index, latency in enumerate(latencies):
+            writer.record(record((index % 3) * HOUR + index, stage="greeting", latency_ms=latency))
+        writer.stop()
+
+        result = analytics.latency_percentiles(tmp_path, percentiles=(0.5, 0.99, 1.0))
+
+        assert len(analytics.partitions(tmp_path)) == 3
+        ranked = sorted(latencies)
+        for name, rank in (("p50", 150), ("p99", 297), ("p100", 300)):
+            assert result.loc["all", name] == pytest.approx(ranked[rank - 1], rel=1e-3)
+        assert result.loc["greeting"].to_list() == result.loc["all"].to_list()
+
+    def test_empty_store(self, tmp_path):
+        """Test that queries over an empty store return empty results."""
+        assert analytics.hourly_load(tmp_path).empty
+        assert analytics.language_mix(tmp_path).empty
+        assert analytics.latency_percentiles(tmp_path).empty
+
+    def test_cli_report(self, store, capsys):
+        """Test the `tbbot report` command."""
+        assert main(["report", str(store), "--by", "language"]) == 0
+
+        output = capsys.readouterr().out
+        assert "Hourly load" in output
+        assert "Latency (ms) by language" in output
+
+
+def test_chat_requests_are_recorded(tmp_path, monkeypatch):
+    """Test that /chat records stage, language and status off the request path."""
+    writer = TranscriptWriter(tmp_path)
+    monkeypatch.setattr(api, "transcripts", writer)
+
+    with TestClient(api.app) as client:
+        client.post("/chat", json={"message": "kaixo"}, headers={"X-Session-Id": "s1"})
+        client.post("/chat", json={"message": "what is AI?"})
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_text('{"id": "1", "message": "hello"}')
+            websocket.receive_text()
+    writer.stop()
+
+    records = analytics.load(tmp_path).sort_values("timestamp", kind="stable")
+    assert records["channel"].to_list() == ["http", "http", "ws"]
+    assert records["stage"].fillna("none").to_list() == ["greeting", "none", "greeting"]
+    assert records["language"].fillna("none").to_list() == ["eu", "none", "en"]
+    assert records["session_id"].iloc[0] == "s1"
+    assert (records["status"] == "ok").all()
+    assert (records["latency_ms"] >= 0).all()
+
+
+def test_api_does_not_import_pyarrow_without_transcripts():
+    """Test that pyarrow is only loaded when TRANSCRIPTS_DIR is set."""
+    code = "import sys; import src.tbbot.api; print('pyarrow' in sys.modules)"
+    env = {key: value for key, value in os.environ.items() if key != "TRANSCRIPTS_DIR"}
+
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip() == "False"
@@ -0,0 +1,211 @@
+"""Tests for token and cost accounting and usage budgets."""
+
+import pytest
+from fastapi.testclient import TestClient
+from src.tbbot import api
+from src.tbbot.backends import ChatBackend, Completion
+from src.tbbot.config import Config
+from src.tbbot.greeting import GreetingAgent, GreetingStage
+from src.tbbot.llm import LLMStage
+from src.tbbot.pipeline import AgentRequest
+from src.tbbot.usage import (
+    Action,
+    BudgetExceeded,
+    Budgets,
+    UsageLedger,
+    estimate_prompt_tokens,
+    estimate_tokens,
+)
+
+client = TestClient(api.app)
+
+
+class SilentBackend:
+    """Backend that answers without reporting token usage."""
+
+    name = "silent"
+
+    def __init__(self):
+        self.models = []
+
+    async def complete(self, messages, model, **params):
+        self.models.append(model)
+        return Completion(text="x" * 40, model=model, backend=self.name)
+
+
+class TestEstimates:
+    """Test local token estimates."""
+
+    def test_estimate_tokens(self):
+        """Test the character-based estimate rounds up."""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("abcd") == 1
+        assert estimate_tokens("abcde") == 2
+
+    def test_estimate_prompt_tokens_counts_framing(self):
+        """Test that each message adds framing tokens."""
+        messages = [{"role": "system", "content": "abcd"}, {"role": "user", "content": "abcd"}]
+
+        assert estimate_prompt_tokens(messages) == 2 * (4 + 1) + 3
+
+
+class TestUsageLedger:
+    """Test aggregation and budget decisions."""
+
+    def test_record_aggregates_scopes_and_cost(self):
+        """Test that a call counts towards global, tenant and session totals."""
+        ledger = UsageLedger(prices={"m": (1.0, 2.0)})
+
+        cost = ledger.record("m", 1_000_000, 500_000, session_id="s1", tenant="t1")
+        ledger.record("other", 10, 5, session_id="s2", estimated=True)
+
+        assert cost == pytest.approx(2.0)
+        snapshot = ledger.snapshot()
+        assert snapshot["total"]["requests"] == 2
+        assert snapshot["total"]["estimated"] == 1
+        assert snapshot["total"]["cost_usd"] == pytest.approx(2.0)
+        assert snapshot["tenants"]["t1"]["total_tokens"] == 1_500_000
+        assert snapshot["sessions"] == 2
+        assert ledger.session("s2").total_tokens == 15
+
+    def test_sessions_are_bounded(self):
+        """Test that the least recently used sessions are dropped over the cap."""
+        ledger = UsageLedger(max_sessions=2)
+        for session in ["a", "b", "a", "c"]:
+            ledger.record("m", 1, 1, session_id=session)
+
+        assert ledger.session("b") is None
+        assert ledger.session("a").requests == 2
+
+    def test_no_budgets_always_allow(self):
+        """Test that unlimited ledgers allow everything."""
+        ledger = UsageLedger()
+        ledger.record("m", 10**9, 10**9, session_id="s")
+
+        assert ledger.check(10**6, session_id="s") == Action.ALLOW
+
+    def test_session_budget_rejects(self):
+        """Test that an exhausted session is rejected while others continue."""
+        ledger = UsageLedger(Budgets(session_tokens=100))
+        ledger.record("m", 80, 20, session_id="s1")
+
+        with pytest.raises(BudgetExceeded) as exc_info:
+            ledger.check(10, session_id="s1")
+        assert exc_info.value.scope == "session"
+        assert ledger.check(10, session_id="s2") == Action.ALLOW
+        assert ledger.session("s1").rejected == 1
+
+    def test_tenant_budget_downgrades(self):
+        """Test that an over-budget tenant is downgraded when configured."""
+        budgets = Budgets(tenant_cost_usd=0.5, over_budget=Action.DOWNGRADE, downgrade_model="small")
+        ledger = UsageLedger(budgets, prices={"big": (1.0, 1.0)})
+        ledger.record("big", 500_000, 0, tenant="t")
+
+        assert ledger.check(10, tenant="t") == Action.DOWNGRADE
+        assert ledger.snapshot()["tenants"]["t"]["downgraded"] == 1
+
+    def test_downgrade_without_model_rejects(self):
+        """Test that downgrading falls back to rejecting without a cheaper model."""
+        ledger = UsageLedger(Budgets(session_tokens=1, over_budget=Action.DOWNGRADE))
+        ledger.record("m", 1, 0, session_id="s")
+
+        with pytest.raises(BudgetExceeded):
+            ledger.check(1, session_id="s")
+
+    def test_oversized_request_is_rejected(self):
+        """Test that a single request above the per-request limit is rejected."""
+        ledger = UsageLedger(Budgets(request_tokens=50, over_budget=Action.DOWNGRADE, downgrade_model="small"))
+
+        with pytest.raises(BudgetExceeded) as exc_info:
+            ledger.check(51)
+        assert exc_info.value.scope == "request"
+
+
+class TestLLMStageAccounting:
+    """Test accounting around model calls."""
+
+    def test_backend_usage_is_recorded(self, stub_llm):
+        """Test that reported usage is recorded against session and tenant."""
+        ledger = UsageLedger()
+        stage = LLMStage(ChatBackend(stub_llm.base_url), "stub", ledger=ledger)
+
+        stage.handle(AgentRequest("what is AI?", session_id="s", tenant="t"))
+
+        totals = ledger.session("s")
+        assert totals.requests == 1
+        assert totals.prompt_tokens > 0
+        assert totals.completion_tokens > 0
+        assert totals.estimated == 0
+
+    def test_missing_usage_is_estimated(self):
+        """Test that calls without usage reports are estimated locally."""
+        ledger = UsageLedger()
+        stage = LLMStage(SilentBackend(), "m", system_prompt="abcd", ledger=ledger)
+
+        stage.handle(AgentRequest("abcd", session_id="s"))
+
+        totals = ledger.session("s")
+        assert totals.estimated == 1
+        assert totals.prompt_tokens == 2 * (4 + 1) + 3
+        assert totals.completion_tokens == 10
+
+    def test_downgrade_switches_model(self):
+        """Test that an over-budget session is served by the downgrade model."""
+        backend = SilentBackend()
+        ledger = UsageLedger(Budgets(session_tokens=1, over_budget=Action.DOWNGRADE, downgrade_model="small"))
+        stage = LLMStage(backend, "big", ledger=ledger)
+
+        stage.handle(AgentRequest("hi there", session_id="s"))
+        stage.handle(AgentRequest("hi again", session_id="s"))
+
+        assert backend.models == ["big", "small"]
+
+
+def test_chat_returns_429_when_session_budget_is_spent(stub_llm, monkeypatch):
+    """Test that /chat rejects an exhausted session and reports usage."""
+    ledger = UsageLedger(Budgets(session_tokens=1))
+    monkeypatch.setattr(api, "ledger", ledger)
+    agent = GreetingAgent(stages=[GreetingStage(), LLMStage(ChatBackend(stub_llm.base_url), "stub", ledger=ledger)])
+    monkeypatch.setattr(api, "agent", agent)
+    headers = {"X-Session-Id": "student-1"}
+
+    first = client.post("/chat", json={"message": "what is AI?"}, headers=headers)
+    second = client.post("/chat", json={"message": "and agents?"}, headers=headers)
+    greeting = client.post("/chat", json={"message": "hello"}, headers=headers)
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.json()["detail"] == "Usage budget exceeded"
+    assert greeting.status_code == 200
+
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    admin = {"X-Admin-Token": "secret"}
+    session = client.get("/usage/sessions/student-1", headers=admin).json()
+    assert session["requests"] == 1
+    assert session["rejected"] == 1
+    assert client.get("/usage", headers=admin).json()["total"]["requests"] == 1
+    assert client.get("/usage/sessions/unknown", headers=admin).status_code == 404
+
+
+def test_session_budget_does_not_limit_requests_without_a_session(stub_llm, monkeypatch):
+    """Test that session budgets are advisory: requests without X-Session-Id are not held to them."""
+    ledger = UsageLedger(Budgets(session_tokens=1))
+    monkeypatch.setattr(api, "ledger", ledger)
+    agent = GreetingAgent(stages=[GreetingStage(), LLMStage(ChatBackend(stub_llm.base_url), "stub", ledger=ledger)])
+    monkeypatch.setattr(api, "agent", agent)
+
+    responses = [client.post("/chat", json={"message": f"question {index}?"}) for index in range(3)]
+
+    assert [response.status_code for response in responses] == [200] * 3
+    assert ledger.snapshot()["total"]["requests"] == 3
+    assert ledger.snapshot()["sessions"] == 0
+
+
+@pytest.mark.parametrize("path", ["/usage", "/usage/sessions/student-1"])
+def test_usage_endpoints_require_the_admin_token(monkeypatch, path):
+    """Test that usage is hidden without a token and refused with a wrong one."""
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "")
+    assert client.get(path).status_code == 404
+
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
@@ -0,0 +1,68 @@
+"""Tests for the /ws/chat WebSocket endpoint."""
+
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from src.tbbot.api import app
+
+client = TestClient(app)
+
+ENGLISH_RESPONSE = "Hi, my name is TBBot. I am here to help you with your questions"
+CATALAN_RESPONSE = "Hola, el meu nom és TBBot. Estic aquí per ajudar-te amb les teves preguntes"
+
+
+def test_websocket_greeting_reply_carries_correlation_id():
+    """Test that a greeting frame is answered with the same correlation id."""
+    with client.websocket_connect("/ws/chat") as websocket:
+        websocket.send_text(json.dumps({"id": "m1", "message": "hello"}))
+        reply = websocket.receive_json()
+
+    assert reply == {"id": "m1", "response": ENGLISH_RESPONSE}
+
+
+def test_websocket_pipelined_messages_are_answered_in_order():
+    """Test that several frames sent before reading are all answered in order."""
+    messages = [("a", "hello"), ("b", "what is AI?"), ("c", "hola")]
+
+    with client.websocket_connect("/ws/chat") as websocket:
+        for frame_id, message in messages:
+            websocket.send_text(json.dumps({"id": frame_id, "message": message}))
+        replies = [websocket.receive_json() for _ in messages]
+
+    assert [reply["id"] for reply in replies] == ["a", "b", "c"]
+    assert replies[0]["response"] == ENGLISH_RESPONSE
+    assert replies[1]["response"] == ""
+    assert replies[2]["response"] == CATALAN_RESPONSE
+
+
+def test_websocket_invalid_frame_keeps_session_open():
+    """Test that an invalid frame returns an error without closing the session."""
+    with client.websocket_connect("/ws/chat") as websocket:
+        websocket.send_text(json.dumps({"id": "bad", "message": ""}))
+        error_reply = websocket.receive_json()
+
+        websocket.send_text("not json")
+        garbage_reply = websocket.receive_json()
+
+        websocket.send_text(json.dumps({"id": "ok", "message": "kaixo"}))
+        ok_reply = websocket.receive_json()
+
+    assert error_reply == {"id": "bad", "error": "Invalid frame"}
+    assert garbage_reply == {"error": "Invalid frame"}
+    assert ok_reply["id"] == "ok"
+    assert ok_reply["response"].startswith("Kaixo")
+
+
+def test_websocket_internal_error_does_not_expose_details():
+    """Test that agent failures are reported generically and the session survives."""
+    with patch('src.tbbot.api.agent.process_message') as mock_process:
+        mock_process.side_effect = [Exception("password=secret123"), "recovered"]
+
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_text(json.dumps({"id": "x", "message": "hello"}))
+            failed = websocket.receive_json()
+            websocket.send_text(json.dumps({"id": "y", "message": "hello"}))
+            recovered = websocket.receive_json()
+
+    assert failed == {"id": "x", "error": "Internal server error"}
+    assert recovered == {"id": "y", "response": "recovered"}